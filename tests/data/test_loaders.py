@@ -438,6 +438,9 @@ def test_default_collate():
     bboxes = [[BBox(0, [0, 0, 1, 1])], [], [BBox(0, [0, 0, 1, 1]), BBox(0, [0, 0, 1, 1])]]
     batch = thelper.data.loaders.default_collate(bboxes)
     assert batch == bboxes
+    bboxes = [thelper.data.BoundingBoxArray.from_bboxes(bset) for bset in bboxes]
+    batch = thelper.data.loaders.default_collate(bboxes)
+    assert isinstance(batch, list) and all([b1 is b2 for b1, b2 in zip(batch, bboxes)])
 
     class Potato:
         def __init__(self):
@@ -741,3 +744,113 @@ def test_loader_factory(class_split_config, mocker):
     assert factory.seeds["torch"] == 2
     assert factory.seeds["numpy"] == 3
     assert factory.seeds["random"] == 4
+
+
+class CustomDictDataset(torch.utils.data.Dataset):
+
+    def __init__(self, size):
+        self.size = size
+        self.transforms = thelper.transforms.Compose([
+            thelper.transforms.TransformWrapper(thelper.transforms.NormalizeMinMax(0, 255), target_keys=["input"]),
+            thelper.transforms.TransformWrapper(thelper.transforms.Unsqueeze(0), target_keys=["input"]),
+        ])
+
+    def __getitem__(self, index):
+        return self.transforms({"input": np.full((4, 5), index, dtype=np.uint8), "idx": index})
+
+    def __len__(self):
+        return self.size
+
+
+@pytest.mark.parametrize("num_workers", [0, 2])
+def test_loader_transforms_profiling(num_workers):
+    dataset = CustomDictDataset(10)
+    loader = thelper.data.DataLoader(dataset, num_workers=num_workers, batch_size=2, profile_transforms=True,
+                                     collate_fn=torch.utils.data.default_collate)
+    for _ in range(2):
+        batches = [batch for batch in loader]
+        assert len(batches) == 5
+        assert all([set(batch.keys()) == {"input", "idx"} for batch in batches])
+        assert batches[0]["input"].shape == (2, 1, 4, 5)
+        assert set(loader.stage_stats.keys()) == {"0.TransformWrapper", "0.TransformWrapper/NormalizeMinMax",
+                                                  "1.TransformWrapper", "1.TransformWrapper/Unsqueeze"}
+        assert all([stats[0] == 10 for stats in loader.stage_stats.values()])
+        assert loader.stage_stats["1.TransformWrapper/Unsqueeze"][2] == 10 * 4 * 5 * 4
+    loader = thelper.data.DataLoader(dataset, num_workers=num_workers, batch_size=2,
+                                     collate_fn=torch.utils.data.default_collate)
+    assert all([set(batch.keys()) == {"input", "idx"} for batch in loader])
+    assert not loader.stage_stats
+
+
+def test_loader_autotune(class_split_config, tmpdir, mocker):
+    loaders_config = copy.deepcopy(class_split_config["loaders"])
+    loaders_config["autotune"] = {"num_workers": [0, 2], "batch_sizes": [2, 4], "prefetch_factors": [2], "iters": 2}
+    factory = thelper.data.loaders.LoaderFactory(loaders_config)
+    assert factory.autotune["set"] == "train" and factory.autotune["num_workers"] == [0, 2]
+    assert thelper.data.loaders.LoaderFactory(class_split_config["loaders"]).autotune is None
+    dataset = CustomDictDataset(20)
+    loaders = [thelper.data.DataLoader(dataset, batch_size=4, collate_fn=torch.utils.data.default_collate)
+               for _ in range(2)] + [None]
+    samples_per_sec, rss_mb = factory._probe_loader(loaders[0].clone(num_workers=2), 2)
+    assert samples_per_sec > 0 and (rss_mb is None or rss_mb > 0)
+    fake_probe = mocker.patch.object(thelper.data.loaders.LoaderFactory, "_probe_loader",
+                                     side_effect=lambda loader, iters: (100. * loader.batch_size, 10. * (loader.num_workers + 1)))
+    train_loader, valid_loader, test_loader = factory.autotune_loaders(loaders, save_dir=str(tmpdir))
+    assert fake_probe.call_count == 4
+    # the fastest configs use 4-sample batches, and the one without workers uses the least memory
+    assert train_loader.num_workers == 0 and train_loader.batch_size == 4
+    assert valid_loader.num_workers == 0 and valid_loader.batch_size == 4 and test_loader is None
+    assert len([batch for batch in train_loader]) == 5
+    assert os.path.isfile(os.path.join(str(tmpdir), "logs", "loader_autotune.json"))
+    # the decision should be reloaded when resuming with the same settings
+    factory = thelper.data.loaders.LoaderFactory(loaders_config)
+    _ = factory.autotune_loaders(loaders, save_dir=str(tmpdir))
+    assert fake_probe.call_count == 4
+    # if no config fits in the memory budget, the smallest one is used
+    loaders_config["autotune"].update(num_workers=[1, 2], memory_budget_mb=15)
+    factory = thelper.data.loaders.LoaderFactory(loaders_config)
+    train_loader, valid_loader, _ = factory.autotune_loaders(loaders, save_dir=str(tmpdir))
+    assert fake_probe.call_count == 8
+    assert factory.workers == 1 and factory.train_batch_size == 2
+    assert train_loader.num_workers == 1 and train_loader.batch_size == 2 and train_loader.prefetch_factor == 2
+    assert valid_loader.num_workers == 1 and valid_loader.batch_size == 4
+
+
+@pytest.mark.parametrize("storage", ["ram", "memmap"])
+def test_cached_loader(storage, tmpdir, mocker):
+    factory_config = {"batch_size": 2, "valid_split": {"A": 1.0}, "valid_cache": {"storage": storage, "dir": str(tmpdir)}}
+    factory = thelper.data.loaders.LoaderFactory(factory_config)
+    assert factory.valid_cache["storage"] == storage and factory.valid_cache["max_size_mb"] == 1024
+    getitem = mocker.patch.object(CustomDictDataset, "__getitem__", autospec=True, side_effect=CustomDictDataset.__getitem__)
+    dataset = CustomDictDataset(10)
+    sampler = torch.utils.data.SequentialSampler(dataset)
+    loader = thelper.data.DataLoader(dataset, batch_size=2, sampler=sampler, collate_fn=torch.utils.data.default_collate)
+    expected = [batch for batch in loader]
+    getitem.reset_mock()
+    cache = thelper.data.BatchCache(storage=storage, cache_dir=str(tmpdir))
+    cached_loader = thelper.data.CachedDataLoader(loader, cache)
+    assert len(cached_loader) == 5 and cached_loader.batch_size == 2
+    for _ in range(3):
+        batches = [batch for batch in cached_loader]
+        assert len(batches) == 5 and cache.complete
+        for batch, expected_batch in zip(batches, expected):
+            assert torch.equal(batch["input"], expected_batch["input"]) and torch.equal(batch["idx"], expected_batch["idx"])
+    assert getitem.call_count == 10  # samples are only loaded in the first epoch
+    if storage == "memmap":
+        # the cache should be reloaded from disk (e.g. when resuming)
+        cached_loader = thelper.data.CachedDataLoader(loader, thelper.data.BatchCache(storage=storage, cache_dir=str(tmpdir)))
+        assert len(cached_loader.cache) == 5 and len([batch for batch in cached_loader]) == 5
+        assert getitem.call_count == 10
+    # ...and invalidated if the transforms change
+    dataset.transforms.transforms.pop()
+    batches = [batch for batch in cached_loader]
+    assert getitem.call_count == 20 and batches[0]["input"].shape == (2, 4, 5)
+    # with a budget of two minibatches, the samples of the cached ones should never be loaded again
+    cache = thelper.data.BatchCache(storage=storage, max_bytes=2 * (2 * 4 * 5 * 4 + 2 * 8), cache_dir=str(tmpdir), name="small")
+    cached_loader = thelper.data.CachedDataLoader(loader, cache)
+    getitem.reset_mock()
+    for _ in range(2):
+        batches = [batch for batch in cached_loader]
+        assert [batch["idx"].tolist() for batch in batches] == [[idx, idx + 1] for idx in range(0, 10, 2)]
+    assert len(cache) == 2 and cache.full and not cache.complete
+    assert getitem.call_count == 10 + 6
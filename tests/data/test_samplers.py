@@ -184,3 +184,28 @@ def test_subset_random_epoch_step(fake_dataset, sampler_type):
     for idx in sampler:
         epoch0_reset_label_groups[fake_dataset[1][idx]].append(fake_dataset[0][idx])
     assert epoch0_reset_label_groups == epoch0_label_groups
+
+
+def test_sharded_sampler():
+
+    class FakeEpochSampler(list):
+        def set_epoch(self, epoch=0):
+            self[:] = [(idx + epoch) % 10 for idx in range(10)]
+
+    sampler = FakeEpochSampler(range(10))
+    shards = [thelper.data.ShardedSampler(sampler, num_replicas=3, rank=rank) for rank in range(3)]
+    assert all([len(shard) == 4 for shard in shards])
+    indices = [list(shard) for shard in shards]
+    assert all([len(idxs) == 4 for idxs in indices])
+    assert sorted(sum(indices, [])) == sorted(list(range(10)) + [0, 1])  # padded with the first indices
+    shards[0].set_epoch(1)
+    assert list(shards[0]) == [1, 4, 7, 0]
+    with pytest.raises(AssertionError):
+        _ = thelper.data.ShardedSampler(sampler, num_replicas=2, rank=2)
+    assert len(thelper.data.ShardedSampler(sampler)) == 10  # not distributed (single replica)
+    sampler.set_epoch(0)
+    shards = [thelper.data.ShardedSampler(sampler, num_replicas=3, rank=rank, pad=False) for rank in range(3)]
+    assert [len(shard) for shard in shards] == [4, 3, 3]
+    indices = [list(shard) for shard in shards]
+    assert [len(idxs) for idxs in indices] == [4, 3, 3]
+    assert sorted(sum(indices, [])) == list(range(10))  # no duplicates, each sample is seen once
@@ -54,3 +54,86 @@ def test_bbox_map():
     res = thelper.optim.compute_pascalvoc_metrics(preds, targets, task, iou_threshold=0.3)
     ap = res["person"]["AP"]
     assert np.isclose(ap, 0.24568668046928915)  # obtained via the original example
+    assert res["person"]["total TP"] == 7 and res["person"]["total FP"] == 17
+    res = thelper.optim.compute_pascalvoc_metrics(preds, targets, task, iou_threshold=0.3, method="11-points")
+    assert np.isclose(res["person"]["AP"], 0.26839826839826836)  # obtained via the original example
+
+
+def test_average_precision():
+    precision = [1.0, 0.5, 0.6666666666666666, 0.5, 0.4, 0.5]
+    recall = [0.25, 0.25, 0.5, 0.5, 0.5, 0.75]
+    ap, mpre, mrec, idxs = thelper.optim.compute_average_precision(precision, recall, "all-points")
+    assert np.isclose(ap, 0.25 * 1.0 + 0.25 * 0.6666666666666666 + 0.25 * 0.5)
+    assert mrec == [0, *recall] and idxs == [1, 3, 6, 7]
+    assert mpre == [1.0, 1.0, 0.6666666666666666, 0.6666666666666666, 0.5, 0.5, 0.5]
+    ap_arr, *_ = thelper.optim.compute_average_precision(np.asarray(precision), np.asarray(recall), "all-points")
+    assert ap_arr == ap
+    ap, _, _, idxs = thelper.optim.compute_average_precision(precision, recall, "11-points")
+    assert np.isclose(ap, (3 * 1.0 + 3 * 0.6666666666666666 + 2 * 0.5) / 11) and idxs is None
+    ap, *_ = thelper.optim.compute_average_precision([], [], "11-points")
+    assert ap == 0
+
+
+def test_bbox_array_map():
+    curr_path = os.path.dirname(os.path.abspath(__file__))
+    preds = get_bboxes(os.path.join(curr_path, "detections"), False)
+    targets = get_bboxes(os.path.join(curr_path, "groundtruths"), True)
+    pred_array = thelper.data.BoundingBoxArray.from_bboxes(preds)
+    target_array = thelper.data.BoundingBoxArray.from_bboxes(targets)
+    assert len(pred_array) == len(preds) and len(target_array) == len(targets)
+    for bbox, view in zip(preds, pred_array):
+        assert isinstance(view, thelper.data.BoundingBox)
+        assert view.json() == bbox.json()
+    ious = pred_array.iou(target_array)
+    assert ious.shape == (len(preds), len(targets))
+    for pred_idx in range(0, len(preds), 7):
+        for target_idx in range(len(targets)):
+            assert np.isclose(ious[pred_idx, target_idx],
+                              thelper.optim.eval.compute_bbox_iou(preds[pred_idx], targets[target_idx]))
+    subset = pred_array[pred_array.confidences > 0.5]
+    assert len(subset) == sum([bbox.confidence > 0.5 for bbox in preds])
+    task = thelper.tasks.Detection(["person"], "in", "gt")
+    res = thelper.optim.compute_pascalvoc_metrics(pred_array, target_array, task, iou_threshold=0.3)
+    assert np.isclose(res["person"]["AP"], 0.24568668046928915)
+    metric = thelper.optim.metrics.AveragePrecision(iou_threshold=0.3)
+    for iter_idx in range(2):  # split the predictions/targets in two batches of per-image arrays
+        image_ids = np.unique(target_array.image_ids)[iter_idx::2]
+        metric.update(task=task, input=None, sample=None, loss=None, iter_idx=iter_idx, max_iters=2,
+                      epoch_idx=0, max_epochs=1, output_path=None,
+                      pred=[pred_array[pred_array.image_ids == image_id] for image_id in image_ids],
+                      target=[target_array[target_array.image_ids == image_id] for image_id in image_ids])
+    assert np.isclose(metric.eval(), 0.24568668046928915)
+
+
+def test_bbox_coco_map():
+    curr_path = os.path.dirname(os.path.abspath(__file__))
+    preds = get_bboxes(os.path.join(curr_path, "detections"), False)
+    targets = get_bboxes(os.path.join(curr_path, "groundtruths"), True)
+    pred_array = thelper.data.BoundingBoxArray.from_bboxes(preds)
+    target_array = thelper.data.BoundingBoxArray.from_bboxes(targets)
+    task = thelper.tasks.Detection(["person"], "in", "gt")
+    res = thelper.optim.compute_coco_metrics(pred_array, target_array, task)  # reference values from pycocotools
+    assert res["precision"].shape == (10, 101, 1, 4) and res["AP"].shape == (10, 1, 4)
+    assert np.isclose(res["mAP"], 0.0046204620462046205)
+    assert np.isclose(res["AP50"], 0.0231023102310231)
+    assert np.isclose(res["AP75"], 0.0)
+    assert np.isnan(res["mAP (small)"]) and np.isnan(res["mAP (large)"])
+    assert np.isclose(res["mAP (medium)"], res["mAP"])
+    assert res["classes"]["person"]["total positives"] == 15
+    res = thelper.optim.compute_coco_metrics(pred_array, target_array, task, iou_thresholds=[0.3, 0.5])
+    assert np.isclose(res["AP"][1, 0, 0], 0.0231023102310231)  # thresholds are evaluated independently
+    assert res["AP"][0, 0, 0] > res["AP"][1, 0, 0]
+    metrics = [thelper.optim.metrics.COCOAveragePrecision(),
+               thelper.optim.metrics.COCOAveragePrecision(target_class="person", target_iou=0.5)]
+    for metric in metrics:
+        for iter_idx in range(2):
+            image_ids = np.unique(target_array.image_ids)[iter_idx::2]
+            metric.update(task=task, input=None, sample=None, loss=None, iter_idx=iter_idx, max_iters=2,
+                          epoch_idx=0, max_epochs=1, output_path=None,
+                          pred=[pred_array[pred_array.image_ids == image_id] for image_id in image_ids],
+                          target=[target_array[target_array.image_ids == image_id] for image_id in image_ids])
+    assert np.isclose(metrics[0].eval(), 0.0046204620462046205)
+    assert np.isclose(metrics[1].eval(), 0.0231023102310231)
+    assert "person,0.0046,0.0231,0.0000,15" in metrics[0].report()
+    metrics[0].reset()
+    assert np.isnan(metrics[0].eval()) and metrics[0].report() is None
@@ -334,6 +334,59 @@ def test_roccurve():
     assert metric_auc.eval() == auc_res
 
 
+def test_roccurve_streaming():
+    batch_size = 32
+    iter_count = 64
+    class_count = 3
+    class_names = [str(i) for i in range(class_count)]
+    task = thelper.tasks.Classification(class_names, "input", "gt", ["idx"])
+    targets = [torch.randint(low=0, high=class_count, size=(batch_size,)) for _ in range(iter_count)]
+    preds = [torch.randn((batch_size, class_count)) for _ in range(iter_count)]
+    for target_name in ["1", "!1"]:
+        for target_args in [{}, {"target_tpr": 0.9}, {"target_fpr": 0.2}]:
+            metric_ref = thelper.optim.metrics.ROCCurve(target_name, **target_args)
+            metric_exact = [thelper.optim.metrics.ROCCurve(target_name, streaming=True, bins=None, **target_args)
+                            for _ in range(2)]  # second instance is merged into the first one below
+            metric_hist = thelper.optim.metrics.ROCCurve(target_name, streaming=True, bins=10000, **target_args)
+            assert metric_hist.live_eval and not metric_exact[0].live_eval and not metric_ref.live_eval
+            assert repr(metric_hist)
+            for iter_idx in range(iter_count):
+                for metric in [metric_ref, metric_exact[iter_idx % 2], metric_hist]:
+                    metric.update(task, None, preds[iter_idx], targets[iter_idx], None,
+                                  None, iter_idx, iter_count, 0, 1, test_save_path)
+            metric_exact[0].merge(metric_exact[1])
+            ref_res, exact_res, hist_res = metric_ref.eval(), metric_exact[0].eval(), metric_hist.eval()
+            assert isinstance(exact_res, float) and isinstance(hist_res, float)
+            assert np.isclose(ref_res, exact_res)
+            assert np.isclose(ref_res, hist_res, atol=0.01)
+            assert metric_hist.counts.shape == (class_count, 2, 10000)
+            assert metric_hist.counts.sum() == batch_size * iter_count * class_count
+            metric_hist.reset()
+            assert metric_hist.eval() is None
+
+
+def test_roccurve_streaming_epochs():
+    batch_size = 16
+    iter_count = 4
+    task = thelper.tasks.Classification(["0", "1"], "input", "gt", ["idx"])
+    metrics = [thelper.optim.metrics.ROCCurve("1", **kwargs) for kwargs in
+               [{}, {"streaming": True, "bins": None}, {"streaming": True, "bins": 100}]]
+    targets = [torch.randint(low=0, high=2, size=(batch_size,)) for _ in range(iter_count)]
+    for epoch_idx in range(2):
+        for iter_idx, target in enumerate(targets):
+            if epoch_idx == 0:
+                pred = torch.randn((batch_size, 2))  # worst-case scores in the first epoch...
+                pred[:, 1] = -pred[:, 1].abs() * (target * 2 - 1)
+            else:
+                pred = torch.nn.functional.one_hot(target, 2).float() * 10  # ...and perfect ones in the second
+            for metric in metrics:
+                metric.update(task, None, pred, target, None, None, iter_idx, iter_count, epoch_idx, 2, test_save_path)
+        results = [metric.eval() for metric in metrics]
+        assert np.allclose(results, results[0], atol=0.01)
+    assert np.allclose(results, 1.0)
+    assert len(metrics[1].counts[1]) == 1  # exact counts are merged once on evaluation
+
+
 def test_psnr(mocker):
     batch_size = 16
     iter_count = 32
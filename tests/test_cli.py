@@ -438,3 +438,46 @@ def test_export_model_weights(export_config):
     ckptdata = thelper.utils.load_checkpoint(export_ckpt_path)
     model = thelper.nn.create_model(config=None, task=None, ckptdata=ckptdata)
     assert model(torch.rand(1, 3, 224, 224)).shape == (1, 10)
+
+
+def test_benchmark_session(simple_config, mocker):
+    task = thelper.tasks.Classification([str(idx) for idx in range(10)], "input", "label")
+    dataset = [{"input": torch.randn(3, 8, 8), "label": idx % 10} for idx in range(20)]
+    loader = thelper.data.DataLoader(dataset, batch_size=4, collate_fn=torch.utils.data.default_collate)
+    mocker.patch.object(thelper.data, "create_loaders", return_value=(task, loader, None, None))
+    simple_config["model"]["params"] = {"flexible_input_res": True}
+    simple_config["trainer"]["metrics"] = {"acc": {"type": "thelper.optim.Accuracy"}}
+    simple_config["bench"] = {"iters": 2, "num_workers": [0], "batch_sizes": [2, 4]}
+    report_path = os.path.join(test_save_path, "bench.json")
+    report = thelper.cli.benchmark_session(simple_config, test_save_path, report_path=report_path)
+    assert os.path.isfile(report_path) and thelper.utils.load_config(report_path, add_name_if_missing=False) == report
+    assert report["parser"]["samples_per_sec"] > 0 and report["collate"]["samples_per_sec"] > 0
+    assert sorted(report["loader"]) == ["workers0-batch2", "workers0-batch4"]
+    assert report["model"]["forward"]["samples_per_sec"] > 0 and "forward_backward" in report["model"]
+    assert "acc" in report["metrics"]
+    slower_report = copy.deepcopy(report)
+    slower_report["model"]["forward"]["samples_per_sec"] /= 2
+    slower_report["collate"]["mean_ms"] *= 1.05
+    comparison = thelper.cli.compare_bench_reports(slower_report, report, tolerance=0.1)
+    assert comparison["model/forward/samples_per_sec"]["regression"]
+    assert not comparison["collate/mean_ms"]["regression"]
+    assert not any([val["regression"] for val in thelper.cli.compare_bench_reports(report, report).values()])
+
+
+def test_find_batch_size(simple_config, mocker):
+    task = thelper.tasks.Classification([str(idx) for idx in range(10)], "input", "label")
+    dataset = [{"input": torch.randn(3, 8, 8), "label": idx % 10} for idx in range(20)]
+    loader = thelper.data.DataLoader(dataset, batch_size=4, collate_fn=torch.utils.data.default_collate)
+    mocker.patch.object(thelper.data, "create_loaders", return_value=(task, loader, None, None))
+    mocker.patch.object(thelper.train.utils, "get_peak_memory",
+                        side_effect=lambda func, device: (func(), (100 + func.args[0]) * 2 ** 20))
+    simple_config["model"]["params"] = {"flexible_input_res": True}
+    simple_config["loaders"]["batch_size"] = 4
+    simple_config["trainer"]["batch_size_finder"] = {"memory_budget_mb": 110, "scale_lr": "sqrt"}
+    simple_config["trainer"]["optimization"]["optimizer"]["params"]["lr"] = 0.1
+    output_path = os.path.join(test_save_path, "batchsize.json")
+    assert thelper.cli.find_batch_size(simple_config, test_save_path, output_path=output_path) == 10
+    output_config = thelper.utils.load_config(output_path)
+    assert output_config["loaders"]["batch_size"] == 10 and "batch_size_finder" not in output_config["trainer"]
+    assert np.isclose(output_config["trainer"]["optimization"]["optimizer"]["params"]["lr"], 0.1 * np.sqrt(10 / 4))
+    assert simple_config["loaders"]["batch_size"] == 4
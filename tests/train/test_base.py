@@ -0,0 +1,207 @@
+import copy
+import pickle
+import unittest.mock
+
+import numpy as np
+import pytest
+import torch
+
+import thelper
+
+from tests.train.train_utils import get_trainer  # noqa: F401 isort:skip
+
+
+def test_trainer_config(tmpdir):
+    trainer = get_trainer(str(tmpdir))
+    assert not trainer.batch_augments and trainer.augments_max_batch_size == 0
+    assert trainer.precision == "fp32" and trainer.grad_scaler is None
+    assert trainer.accumulation_steps == 1 and trainer.micro_batch_size == 0
+    assert not trainer.async_metrics and trainer.metrics_updater is None
+    assert trainer.save_iter_freq == 0 and trainer.save_time_freq == 0
+    assert trainer.compile_config is None and trainer.memory_format is None
+    assert trainer.phase_timer is None and trainer.profiler_config is None and trainer.batch_size_finder is None
+    assert trainer.checkpoint_writer.keep_count == 0 and not trainer.checkpoint_writer.background
+    trainer = get_trainer(str(tmpdir), batch_augments=True, augments_max_batch_size=8, precision="bfloat16",
+                          accumulation_steps=4, micro_batch_size=2, async_metrics=True, async_metrics_queue_size=2,
+                          save_iter_freq=10, save_time_freq=0.5, compile="script", memory_format="channels_last",
+                          profile_phases=True, profile_percentiles=[50], profiler=True,
+                          batch_size_finder={"memory_budget_mb": 100}, keep_checkpoints=2, async_checkpoints=True)
+    assert trainer.batch_augments and trainer.augments_max_batch_size == 8
+    assert trainer.precision == "bf16" and trainer.autocast_dtype == torch.bfloat16
+    assert trainer.accumulation_steps == 4 and trainer.micro_batch_size == 2
+    assert trainer.async_metrics and trainer.async_metrics_queue_size == 2
+    assert trainer.save_iter_freq == 10 and trainer.save_time_freq == 0.5
+    assert trainer.compile_config["type"] == "script" and trainer.memory_format == torch.channels_last
+    assert trainer.phase_timer.percentiles == [50.0] and trainer.profiler_config["sets"] == ["train"]
+    assert trainer.batch_size_finder["memory_budget_mb"] == 100
+    assert trainer.checkpoint_writer.keep_count == 2 and trainer.checkpoint_writer.background
+    for bad_config in [{"precision": "fp8"}, {"accumulation_steps": 0}, {"micro_batch_size": -1},
+                       {"augments_max_batch_size": -1}, {"async_metrics_queue_size": -1}, {"save_iter_freq": -1},
+                       {"compile": {"type": "potato"}}, {"profiler": {"sets": ["potato"]}},
+                       {"batch_size_finder": {"scale_lr": "cubic"}}, {"keep_checkpoints": -1}]:
+        with pytest.raises(AssertionError):
+            get_trainer(str(tmpdir), **bad_config)
+
+
+def test_batched_augments(mocker, tmpdir):
+    model = torch.nn.Linear(4, 3)
+    inputs = [torch.randn(5, 4) for _ in range(3)]
+    labels = [torch.randint(0, 3, (5,)) for _ in range(3)]
+    results = []
+    for batch_augments, max_batch_size in [(False, 0), (True, 0), (True, 10)]:
+        curr_model = copy.deepcopy(model)
+        trainer = get_trainer(str(tmpdir), model=curr_model, batch_augments=batch_augments,
+                              augments_max_batch_size=max_batch_size)
+        optimizer = torch.optim.SGD(curr_model.parameters(), lr=0.1)
+        metric = mocker.MagicMock()
+        loader = [{"input": [v.clone() for v in inputs], "label": [v.clone() for v in labels]}]
+        loss = trainer.train_epoch(curr_model, 0, None, torch.nn.CrossEntropyLoss(), optimizer, loader, {"m": metric}, None)
+        train_pred = metric.update.call_args[1]["pred"]
+        assert torch.equal(metric.update.call_args[1]["target"], torch.cat(labels))
+        loader = [{"input": [v.clone() for v in inputs], "label": [labels[0].clone()] * 3}]
+        trainer.eval_epoch(curr_model, 0, None, loader, {"m": metric}, None)
+        eval_pred = metric.update.call_args[1]["pred"]
+        assert eval_pred.shape == (5, 3)
+        results.append((loss, curr_model.weight.detach(), train_pred, eval_pred))
+    for loss, weight, train_pred, eval_pred in results[1:]:
+        assert np.isclose(loss, results[0][0])
+        assert torch.allclose(weight, results[0][1], atol=1e-6)
+        assert torch.allclose(train_pred, results[0][2], atol=1e-6)
+        assert torch.allclose(eval_pred, results[0][3], atol=1e-6)
+
+
+def test_mixed_precision(mocker, tmpdir):
+    model = torch.nn.Linear(4, 3)
+    # fp16 autocast is not supported on cpu, it should fall back to bf16 without a gradient scaler
+    trainer = get_trainer(str(tmpdir), model=model, precision="fp16")
+    assert trainer.precision == "bf16" and trainer.autocast_dtype == torch.bfloat16 and trainer.grad_scaler is None
+    assert trainer._load_precision("float32") == ("fp32", "cpu", None, None)
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+    metric = mocker.MagicMock()
+    loader = [{"input": torch.randn(5, 4), "label": torch.randint(0, 3, (5,))}]
+    loss = trainer.train_epoch(model, 0, None, torch.nn.CrossEntropyLoss(), optimizer, loader, {"m": metric}, None)
+    assert np.isfinite(loss)
+    assert model.weight.dtype == torch.float32
+    assert metric.update.call_args[1]["pred"].dtype == torch.float32
+    trainer.eval_epoch(model, 0, None, loader, {"m": metric}, None)
+    assert metric.update.call_args[1]["pred"].dtype == torch.float32
+
+
+def test_accumulation_micro_batches(mocker, tmpdir):
+    model = torch.nn.Linear(4, 3)
+    inputs, labels = torch.randn(12, 4), torch.randint(0, 3, (12,))
+    results = []
+    # the reference is a single step over the full batch; others split it in loader batches and/or micro-batches
+    for batch_size, accumulation_steps, micro_batch_size in [(12, 1, 0), (12, 1, 5), (4, 3, 0), (4, 3, 3), (5, 3, 2)]:
+        curr_model = copy.deepcopy(model)
+        trainer = get_trainer(str(tmpdir), model=curr_model, accumulation_steps=accumulation_steps,
+                              micro_batch_size=micro_batch_size)
+        optimizer = torch.optim.SGD(curr_model.parameters(), lr=0.1)
+        optimizer.step = mocker.MagicMock(wraps=optimizer.step)
+        metric = mocker.MagicMock()
+        loader = [{"input": inputs[idx:idx + batch_size], "label": labels[idx:idx + batch_size]}
+                  for idx in range(0, len(inputs), batch_size)]
+        trainer.train_epoch(curr_model, 0, None, torch.nn.CrossEntropyLoss(), optimizer, loader, {"m": metric}, None)
+        assert optimizer.step.call_count == 1
+        assert metric.update.call_count == len(loader)
+        assert metric.update.call_args[1]["pred"].shape == (len(loader[-1]["input"]), 3)
+        results.append(curr_model.weight.detach())
+    for weight in results[1:4]:
+        assert torch.allclose(weight, results[0], atol=1e-6)
+    # with uneven batches, the accumulated gradients are the average of the per-batch average gradients
+    assert not torch.allclose(results[4], model.weight)
+
+
+def test_compile_model(tmpdir):
+    model = torch.nn.Sequential(torch.nn.Linear(4, 3), torch.nn.BatchNorm1d(3))
+    trainer = get_trainer(str(tmpdir), model=model, compile={"type": "script", "timing_iters": 2})
+    assert trainer._load_compile_config(None) is None and trainer._load_compile_config(False) is None
+    assert trainer._load_compile_config(True)["type"] == "auto"
+    dataset = [{"input": torch.randn(4), "label": idx % 3} for idx in range(6)]
+    loader = torch.utils.data.DataLoader(dataset, batch_size=4, collate_fn=torch.utils.data.default_collate)
+    compiled = trainer._compile_model(model, loader, training=False)
+    assert isinstance(compiled, torch.jit.ScriptModule)
+    assert trainer._compile_model(compiled, loader, training=False) is compiled
+    input_val = torch.randn(5, 4)
+    assert torch.allclose(compiled(input_val), model.eval()(input_val), atol=1e-6)
+    # scripted models cannot be trained, the eager model should be returned (without modified stats)
+    model.train()
+    assert trainer._compile_model(model, loader, training=True) is model
+    assert model.training and torch.equal(model[1].running_mean, torch.zeros(3))
+    # training warm-up passes should go through backward, then leave no gradients (nor modified stats) behind
+    trainer = get_trainer(str(tmpdir), model=model, compile={"type": "compile", "params": {"backend": "eager"}})
+    model.eval()
+    with unittest.mock.patch("torch.autograd.backward", wraps=torch.autograd.backward) as backward:
+        compiled = trainer._compile_model(model, loader, training=True)
+    assert compiled is not model and backward.call_count == trainer.compile_config["warmup_iters"]
+    assert not model.training and torch.equal(model[1].running_mean, torch.zeros(3))
+    assert all([param.grad is None for param in model.parameters()])
+
+
+def test_channels_last_memory_format(tmpdir):
+    model = torch.nn.Sequential(torch.nn.Conv2d(3, 4, 3), torch.nn.Flatten())
+    trainer = get_trainer(str(tmpdir), model=model, memory_format="channels_last")
+    assert trainer._apply_memory_format(model) is model
+    assert model[0].weight.is_contiguous(memory_format=torch.channels_last)
+    assert trainer._apply_memory_format(model) is model and not model._forward_pre_hooks
+    pickle.dumps(model)  # no hook (or other local object) should be attached to the model
+    batch = torch.randn(2, 3, 6, 6)
+    uploaded = trainer._move_tensor({"input": batch, "label": torch.zeros(2, 1, 6, 6, dtype=torch.long)}, [])
+    assert uploaded["input"].is_contiguous(memory_format=torch.channels_last) and torch.equal(uploaded["input"], batch)
+    assert uploaded["label"].is_contiguous()  # only floating point tensors are converted
+    assert torch.allclose(model(batch), model(uploaded["input"]), atol=1e-6)
+    collated = torch.stack([batch[0], batch[1]], 0, out=thelper.data.loaders._get_stack_output(
+        [batch[0], batch[1]], torch.channels_last, shared=False))
+    assert collated.is_contiguous(memory_format=torch.channels_last) and torch.equal(collated, batch)
+    for memory_format in [None, torch.channels_last]:  # as done in background workers
+        collated = torch.stack([batch[0], batch[1]], 0, out=thelper.data.loaders._get_shared_stack_output(
+            [batch[0], batch[1]], memory_format))
+        assert collated.is_shared() and torch.equal(collated, batch)
+        assert collated.is_contiguous(memory_format=memory_format or torch.contiguous_format)
+
+
+def test_async_metrics_dispatch(mocker, tmpdir):
+    class_names = ["0", "1"]
+    task = thelper.tasks.Classification(class_names, "input", "gt")
+    trainer = get_trainer(str(tmpdir), task=task, model=torch.nn.Linear(4, 2), async_metrics=True)
+    metrics = {
+        "confmat": thelper.train.utils.ConfusionMatrix(class_names=class_names),
+        "roc": thelper.optim.ROCCurve("1", class_names=class_names),
+        "live_roc": thelper.optim.ROCCurve("1", class_names=class_names, streaming=True),
+        "accuracy": thelper.optim.Accuracy(),
+    }
+    assert metrics["roc"].thread_safe and not metrics["live_roc"].thread_safe
+    push = mocker.spy(thelper.train.utils.AsyncConsumerUpdater, "push")
+    kwargs = dict(task=task, input=None, pred=torch.rand((4, 2)), target=torch.randint(0, 2, (4,)),
+                  sample={}, loss=None, iter_idx=0, max_iters=1, epoch_idx=0, max_epochs=1, output_path=None)
+    trainer._update_metrics(metrics, **kwargs)
+    assert push.call_args[0][1] == [metrics["confmat"], metrics["roc"]]
+    # live-evaluated metrics must be up to date as soon as the update call returns
+    assert metrics["live_roc"].eval() is not None and metrics["accuracy"].eval() is not None
+    trainer._flush_metrics(close=True)
+    assert int(metrics["confmat"].confmat.sum()) == 4 and trainer.metrics_updater is None
+
+
+def test_find_max_batch_size(mocker, tmpdir):
+    model = torch.nn.Sequential(torch.nn.Linear(4, 3), torch.nn.BatchNorm1d(3))
+    samples = [{"input": torch.randn(4), "label": idx % 3} for idx in range(10)]
+    loaders = [thelper.data.DataLoader(samples, batch_size=8, collate_fn=torch.utils.data.default_collate)
+               for _ in range(2)] + [None]
+    trainer = get_trainer(str(tmpdir), model=model, loaders=loaders,
+                          batch_size_finder={"memory_budget_mb": 2 ** 20, "max_batch_size": 16})
+    trainer.config["loaders"] = {"batch_size": 8}
+    assert trainer._load_batch_size_finder_config(False) is None
+    running_mean = trainer.model[1].running_mean.clone()
+    assert trainer.find_max_batch_size(apply=False) == 16
+    assert torch.equal(trainer.model[1].running_mean, running_mean)
+    assert trainer.model[0].weight.grad is None and trainer.train_loader.batch_size == 8
+    # with a fake memory usage of 100 MB + 1 MB per sample, the largest batch size in 150 MB is 50
+    fake_peak = mocker.patch.object(thelper.train.utils, "get_peak_memory",
+                                    side_effect=lambda func, device: (func(), (100 + func.args[0]) * 2 ** 20))
+    trainer.batch_size_finder = trainer._load_batch_size_finder_config({"memory_budget_mb": 150, "scale_lr": True})
+    assert trainer.find_max_batch_size() == 50
+    assert [call[0][0].args[0] for call in fake_peak.call_args_list] == [2, 4, 8, 16, 32, 64, 48, 56, 52, 50, 51]
+    assert trainer.config["loaders"]["batch_size"] == 50
+    assert trainer.train_loader.batch_size == 50 and trainer.valid_loader.batch_size == 50
+    assert np.isclose(trainer.optimization_config["optimizer"]["params"]["lr"], 0.1 * 50 / 8)
+    assert len(next(iter(trainer.train_loader))["input"]) == 10
@@ -0,0 +1,92 @@
+import copy
+import os
+
+import numpy as np
+import pytest
+import torch
+
+import thelper
+
+from tests.train.train_utils import get_trainer  # noqa: F401 isort:skip
+
+
+def test_mid_epoch_resume(tmpdir):
+
+    class DictDataset(torch.utils.data.Dataset):
+        def __init__(self, inputs, labels):
+            self.inputs, self.labels, self.loaded_idxs = inputs, labels, []
+
+        def __getitem__(self, idx):
+            self.loaded_idxs.append(idx)
+            return {"input": self.inputs[idx], "label": self.labels[idx], "idx": idx}
+
+        def __len__(self):
+            return len(self.inputs)
+
+    task = thelper.tasks.Classification(["0", "1", "2"], "input", "label")
+    inputs, labels = torch.randn(10, 4), torch.randint(0, 3, (10,))
+    # checkpoints hold the model's name and config, so it must derive from the framework's model interface
+    model = thelper.nn.utils.ExternalModule(torch.nn.Linear, task, in_features=4, out_features=3)
+    iter_idxs, sample_idxs = [], []
+
+    def callback(task, input, pred, target, sample, loss, iter_idx, max_iters, epoch_idx, max_epochs, output_path):
+        iter_idxs.append(iter_idx)
+        sample_idxs.append(sample["idx"].tolist())
+
+    def get_resumable_trainer(curr_model, ckptdata=None):
+        dataset = DictDataset(inputs, labels)
+        sampler = torch.utils.data.RandomSampler(dataset, generator=torch.Generator().manual_seed(42))
+        loader = thelper.data.DataLoader(dataset, batch_size=2, sampler=sampler, collate_fn=torch.utils.data.default_collate)
+        trainer = get_trainer(str(tmpdir), task=task, model=curr_model, loaders=[loader, None, None], ckptdata=ckptdata,
+                              save_iter_freq=2)
+        trainer.train_metrics = {"callback": thelper.train.utils.PredictionCallback(callback),
+                                 "acc": thelper.optim.Accuracy()}
+        return trainer, dataset, loader
+
+    curr_model = copy.deepcopy(model)
+    trainer, _, loader = get_resumable_trainer(curr_model)
+    optimizer = torch.optim.SGD(curr_model.parameters(), lr=0.1, momentum=0.9)
+    ref_loss = trainer.train_epoch(curr_model, 0, None, torch.nn.CrossEntropyLoss(), optimizer, loader,
+                                   trainer.train_metrics, None)
+    ref_weight, ref_accuracy = curr_model.model.weight.detach().clone(), trainer.train_metrics["acc"].eval()
+    ref_order = list(sample_idxs)
+    # only the latest mid-epoch checkpoint (saved after the 4th minibatch) should be kept
+    ckpt_names = os.listdir(trainer.checkpoint_dir)
+    assert len(ckpt_names) == 1 and ckpt_names[0].endswith(thelper.utils.CheckpointWriter.mid_epoch_suffix)
+    ckptdata = thelper.utils.load_checkpoint(trainer.checkpoint_dir, always_load_latest=True)
+    assert ckptdata["resume"]["loader"]["batch_idx"] == 4
+    iter_idxs.clear()
+    resumed_model = copy.deepcopy(model)
+    resumed_model.load_state_dict(ckptdata["model"])
+    trainer, dataset, loader = get_resumable_trainer(resumed_model, ckptdata=ckptdata)
+    optimizer = torch.optim.SGD(resumed_model.parameters(), lr=0.1, momentum=0.9)
+    optimizer.load_state_dict(ckptdata["optimizer"])
+    resumed_loss = trainer.train_epoch(resumed_model, 0, None, torch.nn.CrossEntropyLoss(), optimizer, loader,
+                                       trainer.train_metrics, None)
+    # only the samples of the remaining minibatches should be loaded, in the original order
+    assert dataset.loaded_idxs == [idx for batch in ref_order[4:] for idx in batch]
+    assert iter_idxs == [4]
+    assert torch.allclose(resumed_model.model.weight, ref_weight)
+    assert trainer.train_metrics["acc"].eval() == ref_accuracy
+    # the losses of the minibatches seen before the interruption should still be part of the epoch loss
+    assert np.isclose(resumed_loss, ref_loss)
+
+
+def test_checkpoint_writer_closed_on_error(mocker, tmpdir):
+    samples = [{"input": torch.randn(4), "label": idx % 3} for idx in range(4)]
+    loader = thelper.data.DataLoader(samples, batch_size=2, collate_fn=torch.utils.data.default_collate)
+    task = thelper.tasks.Classification(["0", "1", "2"], "input", "label")
+    model = thelper.nn.utils.ExternalModule(torch.nn.Linear, task, in_features=4, out_features=3)
+    trainer = get_trainer(str(tmpdir), task=task, model=model, loaders=[loader, None, None], async_checkpoints=True)
+
+    def interrupted_epoch(model, epoch, dev, loss, optimizer, *args):
+        trainer._save(epoch, 0, optimizer, None, resume_state={"epoch": epoch})
+        raise RuntimeError("interrupted")
+
+    mocker.patch.object(trainer, "train_epoch", side_effect=interrupted_epoch)
+    close = mocker.spy(trainer.checkpoint_writer, "close")
+    with pytest.raises(RuntimeError):
+        trainer.train()
+    # the queued checkpoint should have been written, and the writer thread stopped
+    assert close.call_count == 1 and trainer.checkpoint_writer._thread is None
+    assert len(os.listdir(trainer.checkpoint_dir)) == 1
@@ -2,6 +2,8 @@ import os
 import tempfile
 
 import numpy as np
+import pytest
+import sklearn.metrics
 import torch
 
 import thelper
@@ -150,6 +152,64 @@ def test_confmat():
     assert consumer.report() == report
 
 
+def test_confmat_accumulation():
+    batch_size = 16
+    iter_count = 8
+    class_count = 12
+    class_names = [str(i) for i in range(class_count)]
+    task = thelper.tasks.Classification(class_names, "input", "gt", ["idx"])
+    targets = [torch.randint(low=0, high=class_count - 1, size=(batch_size,)) for _ in range(iter_count)]
+    preds = [torch.cat([torch.rand((batch_size, class_count - 1)), torch.zeros((batch_size, 1))], dim=1)
+             for _ in range(iter_count)]  # last class is never predicted
+    consumers = {
+        "confmat": thelper.train.utils.ConfusionMatrix(),
+        "confmat_sparse": thelper.train.utils.ConfusionMatrix(sparse=True),
+        "report": thelper.train.utils.ClassifReport(),
+        "report_sparse": thelper.train.utils.ClassifReport(sparse=True),
+    }
+    split_consumers = [thelper.train.utils.ClassifReport(sparse=True) for _ in range(2)]
+    for epoch_idx in range(2):  # counts of the first epoch should be dropped when the second one starts
+        for iter_idx in range(iter_count):
+            for consumer in [*consumers.values(), split_consumers[iter_idx % 2]]:
+                consumer.update(task, None, preds[iter_idx], targets[iter_idx], None,
+                                None, iter_idx, iter_count, epoch_idx, 2, test_save_path)
+    assert isinstance(consumers["confmat"].confmat, np.ndarray)
+    assert isinstance(consumers["confmat_sparse"].confmat, tuple)
+    assert len(consumers["confmat_sparse"].confmat[0]) <= batch_size * iter_count
+    y_true = torch.cat(targets).numpy()
+    y_pred = torch.cat([pred.topk(1, dim=1)[1].view(-1) for pred in preds]).numpy()
+    confmat = sklearn.metrics.confusion_matrix(y_true, y_pred, labels=list(range(class_count)))
+    assert np.array_equal(thelper.train.utils.get_dense_confmat(consumers["confmat_sparse"].confmat, class_count), confmat)
+    assert consumers["confmat"].report() == consumers["confmat_sparse"].report()
+    report = sklearn.metrics.classification_report([class_names[idx] for idx in y_true],
+                                                   [class_names[idx] for idx in y_pred], digits=4)
+    assert consumers["report"].gen_report() == report
+    assert consumers["report_sparse"].gen_report() == report
+    split_consumers[1].merge(split_consumers[0])
+    assert split_consumers[1].gen_report() == report
+    report_dict = consumers["report"].gen_report(as_dict=True)
+    assert str(class_count - 1) not in report_dict  # never predicted nor present in the groundtruth
+    assert np.isclose(report_dict["accuracy"], np.count_nonzero(y_true == y_pred) / len(y_true))
+    assert report_dict["weighted avg"]["support"] == batch_size * iter_count
+    assert isinstance(report_dict["weighted avg"]["support"], int)  # supports are only floats with sample weights
+    assert report_dict == sklearn.metrics.classification_report([class_names[idx] for idx in y_true],
+                                                                [class_names[idx] for idx in y_pred], output_dict=True)
+
+
+def test_classif_report_sample_weight(mocker):
+    class_names = ["0", "1"]
+    task = thelper.tasks.Classification(class_names, "input", "gt")
+    consumer = thelper.train.utils.ClassifReport(sample_weight=[1.0, 2.0, 3.0, 4.0])
+    consumer.update(task, None, torch.tensor([[1.0, 0.0], [0.0, 1.0]] * 2), torch.tensor([0, 0, 1, 1]), None,
+                    None, 0, 1, 0, 1, test_save_path)
+    report_dict = consumer.gen_report(as_dict=True)
+    assert report_dict["0"]["support"] == 3.0 and report_dict["1"]["support"] == 7.0
+    assert isinstance(report_dict["1"]["support"], float)
+    mocker.patch("thelper.utils.get_distributed_info", return_value=(0, 2))
+    with pytest.raises(AssertionError):  # weights are indexed by arrival order, which differs in each process
+        consumer.update(task, None, torch.tensor([[1.0, 0.0]]), torch.tensor([0]), None, None, 0, 1, 1, 2, test_save_path)
+
+
 def test_segm_output_generator():
     batch_size = 16
     iter_count = 32
@@ -208,3 +268,32 @@ def test_segm_output_generator():
                             None, iter_idx, iter_count, 0, 1, tmp_dir)
             tot_idx += targets[iter_idx].shape[0]
     assert consumer.report() == report
+
+
+def test_async_consumer_updater(mocker):
+    class_names = [str(i) for i in range(5)]
+    task = thelper.tasks.Classification(class_names, "input", "gt")
+    sync_consumer = thelper.train.utils.ConfusionMatrix(class_names=class_names)
+    async_consumer = thelper.train.utils.ConfusionMatrix(class_names=class_names)
+    assert async_consumer.thread_safe
+    assert not thelper.optim.Accuracy().thread_safe
+    updater = thelper.train.utils.AsyncConsumerUpdater(max_queue_size=2)
+    assert repr(updater)
+    iter_count = 20
+    for iter_idx in range(iter_count):
+        kwargs = dict(task=task, input=None, pred=torch.rand((8, 5)), target=torch.randint(0, 5, (8,)),
+                      sample={}, loss=None, iter_idx=iter_idx, max_iters=iter_count, epoch_idx=0,
+                      max_epochs=1, output_path=test_save_path)
+        sync_consumer.update(**kwargs)
+        updater.push([async_consumer], **kwargs)
+    updater.flush()
+    assert async_consumer.report() == sync_consumer.report()
+    failing_consumer = mocker.MagicMock()
+    failing_consumer.update.side_effect = ValueError("oops")
+    updater.push([failing_consumer, async_consumer], **kwargs)
+    with pytest.raises(RuntimeError):
+        updater.flush()
+    assert async_consumer.report() == sync_consumer.report()  # updates skipped after failure
+    updater.close()
+    with pytest.raises(AssertionError):
+        updater.push([async_consumer], **kwargs)
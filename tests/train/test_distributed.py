@@ -0,0 +1,38 @@
+import unittest.mock
+
+import numpy as np
+import torch
+
+import thelper
+
+from tests.train.train_utils import get_trainer  # noqa: F401 isort:skip
+
+
+def _run_distributed_step(session_dir):
+    rank, world_size = thelper.utils.get_distributed_info()
+    trainer = get_trainer(session_dir)
+    torch.manual_seed(rank)  # parameters will be synchronized from the main process when wrapped
+    model = trainer._upload_model(torch.nn.Linear(4, 2, bias=False), trainer.devices)
+    assert isinstance(model, torch.nn.parallel.DistributedDataParallel)
+    with trainer._grad_sync(model, sync=False):  # e.g. for the first micro-batch of an accumulation window
+        model(torch.full((2, 4), float(rank))).sum().backward()
+    local_grad = model.module.weight.grad.tolist()
+    model(torch.full((2, 4), float(rank))).sum().backward()  # accumulated gradients are averaged over processes
+    task = thelper.tasks.Classification(["0", "1"], "input", "label")
+    metrics = {"accuracy": thelper.optim.Accuracy(), "report": thelper.train.ClassifReport(),
+               "local": unittest.mock.MagicMock(mergeable=False)}  # would not be picklable if gathered
+    pred, target = torch.tensor([[1.0, 0.0], [0.0, 1.0]]), torch.tensor([0, 1]) if rank == 0 else torch.tensor([1, 0])
+    for metric in metrics.values():
+        metric.update(task=task, input=None, pred=pred, target=target, sample=None, loss=None, iter_idx=0, max_iters=1,
+                      epoch_idx=0, max_epochs=1, output_path=None)
+    loss = trainer._reduce_metrics(metrics, loss=float(rank))
+    assert not metrics["local"].merge.called
+    return world_size, local_grad, model.module.weight.grad.tolist(), metrics["accuracy"].eval(), \
+        int(metrics["report"].confmat.sum()), loss
+
+
+def test_distributed_step(tmpdir):
+    world_size, local_grad, grad, accuracy, report_size, loss = \
+        thelper.cli.launch_distributed(_run_distributed_step, 2, str(tmpdir))
+    assert world_size == 2 and np.allclose(local_grad, np.zeros((2, 4))) and np.allclose(grad, np.full((2, 4), 2.0))
+    assert accuracy == 50.0 and report_size == 4 and loss == 0.5
@@ -0,0 +1,70 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+import torch
+
+import thelper
+
+from tests.train.train_utils import get_trainer  # noqa: F401 isort:skip
+
+
+def test_phase_timer(mocker, tmpdir):
+    model = torch.nn.Linear(4, 3)
+    trainer = get_trainer(str(tmpdir), model=model, profile_phases=True, profile_percentiles=[50, 90])
+    hooks = trainer._register_phase_hooks(model)
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+    metric = mocker.MagicMock()
+    loader = [{"input": torch.randn(5, 4), "label": torch.randint(0, 3, (5,))},
+              {"input": torch.randn(3, 4), "label": torch.randint(0, 3, (3,))}]
+    trainer.train_epoch(model, 0, None, torch.nn.CrossEntropyLoss(), optimizer, loader, {"m": metric}, None)
+    phases = ["loader_wait", "to_tensor", "transfer", "forward", "backward", "step", "metrics", "other", "total"]
+    assert sorted(trainer.phase_timer.times) == sorted(phases)
+    assert trainer.phase_timer.sample_counts == [5, 3]
+    assert all([len(times) == 2 for times in trainer.phase_timer.times.values()])
+    for idx in range(2):
+        iter_times = [trainer.phase_timer.times[name][idx] for name in phases[:-1]]
+        assert np.isclose(sum(iter_times), trainer.phase_timer.times["total"][idx])
+    summary = trainer.phase_timer.summary()
+    assert "forward/p90_ms" in summary and summary["samples_per_sec"] > 0
+    assert "forward" in trainer.phase_timer.report()
+    trainer.eval_epoch(model, 0, None, loader, {"m": metric}, None)
+    assert trainer.phase_timer.sample_counts == [5, 3] and "backward" not in trainer.phase_timer.times
+    unpickled_model = pickle.loads(pickle.dumps(model))  # e.g. for checkpoints saved mid-epoch
+    unpickled_model(torch.randn(2, 4))  # hooks of unpickled models are no-ops
+    for hook in hooks:
+        hook.remove()
+    # nested or overlapping phases are ignored, so that phase times never add up to more than the iteration time
+    timer = thelper.train.utils.PhaseTimer()
+    timer.start_iter()
+    with timer.phase("a"):
+        with timer.phase("b"), timer.phase("a"):
+            pass
+    timer.end_iter(1)
+    assert sorted(timer.last) == ["a", "other", "total"]
+
+
+def test_profiler_window(mocker, tmpdir):
+    trainer = get_trainer(str(tmpdir), profiler={"wait": 1, "warmup": 1, "active": 2})
+    assert trainer._load_profiler_config(None) is None and trainer._load_profiler_config(False) is None
+    with pytest.raises(AssertionError):
+        trainer._load_profiler_config({"sets": ["potato"]})
+    profiler_states = []
+    model = torch.nn.Linear(4, 3)
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+    loader = [{"input": torch.randn(2, 4), "label": torch.randint(0, 3, (2,))} for _ in range(6)]
+    metrics = {"m": mocker.MagicMock()}
+    metrics["m"].update.side_effect = lambda **kwargs: profiler_states.append(torch.autograd._profiler_enabled())
+    trainer.train_epoch(model, 0, None, torch.nn.CrossEntropyLoss(), optimizer, loader, metrics, None)
+    # events should only be recorded in the active iterations (i.e. after the wait and warmup iterations)
+    assert profiler_states == [False, False, True, True, False, False]
+    profiler_dir = os.path.join(trainer.output_paths["train"], "profiler")
+    output_files = os.listdir(profiler_dir)
+    assert len([f for f in output_files if f.endswith(".pt.trace.json")]) == 1
+    assert len([f for f in output_files if f.endswith(".chrome.json")]) == 1
+    assert len([f for f in output_files if f.endswith(".txt")]) == 1
+    # by default, only the first epoch of each set is traced
+    trainer.train_epoch(model, 0, None, torch.nn.CrossEntropyLoss(), optimizer, loader, metrics, None)
+    assert profiler_states[6:] == [False] * 6
+    assert len(os.listdir(profiler_dir)) == len(output_files)
@@ -2,6 +2,9 @@ import os
 import shutil
 
 import pytest
+import torch
+
+import thelper
 
 test_save_path = ".pytest_cache"
 
@@ -105,3 +108,27 @@ def mnist_config(request):
             }
         }
     }
+
+
+def get_trainer(session_dir, task=None, model=None, loaders=None, ckptdata=None, **trainer_config):
+    """Returns a classification trainer built from a minimal session configuration for trainer-level tests.
+
+    The trainer options given as keyword arguments are added to the trainer configuration, and are parsed
+    by the trainer's constructor like in real sessions.
+    """
+    task = thelper.tasks.Classification(["0", "1", "2"], "input", "label") if task is None else task
+    model = torch.nn.Linear(4, 3) if model is None else model
+    if loaders is None:
+        loaders = [[{"input": torch.randn(2, 4), "label": torch.randint(0, 3, (2,))}], None, None]
+    config = {
+        "trainer": {
+            "epochs": 1,
+            "device": "cpu",
+            "optimization": {
+                "loss": {"type": "torch.nn.CrossEntropyLoss"},
+                "optimizer": {"type": "torch.optim.SGD", "params": {"lr": 0.1}},
+            },
+            **trainer_config,
+        }
+    }
+    return thelper.train.ImageClassifTrainer("test-trainer", session_dir, model, task, loaders, config, ckptdata=ckptdata)
@@ -141,3 +141,76 @@ def test_custom_compose(mocker):
         test = composer.invert({})
         assert fake_resize_inv.call_count == 1
         assert test == "invert"
+
+
+def test_fused_compose():
+    stages = [
+        {"operation": "thelper.transforms.SelectChannels", "params": {"channels": [2, 0, 1]}},
+        {"operation": "thelper.transforms.NormalizeZeroMeanUnitVar",
+         "params": {"mean": [10, 20, 30], "std": [2, 4, 8]}},
+        {"operation": "thelper.transforms.NormalizeMinMax", "params": {"min": -5, "max": 5}},
+        {"operation": "thelper.transforms.ToNumpy"},
+        {"operation": "thelper.transforms.Transpose", "params": {"axes": [2, 0, 1]}},
+        {"operation": "thelper.transforms.CopyTo"},
+    ]
+    composer = thelper.transforms.load_transforms(stages)
+    fused_composer = thelper.transforms.load_transforms(stages, fuse=True)
+    assert isinstance(fused_composer, thelper.transforms.Compose) and fused_composer.fuse
+    assert len(fused_composer.transforms) == len(stages) and len(fused_composer.stages) == 1
+    sample = {"input": np.random.randint(0, 255, size=(16, 12, 4), dtype=np.uint8), "label": 1}
+    sample_copy = {"input": sample["input"].copy(), "label": 1}
+    out = composer(sample)
+    fused_out = fused_composer(sample_copy)
+    assert np.array_equal(sample["input"], sample_copy["input"])
+    assert out["input"].dtype == fused_out["input"].dtype == np.float32
+    assert np.array_equal(out["input"], fused_out["input"])
+    assert not np.shares_memory(fused_out["input"], sample_copy["input"])
+    bytes_before, bytes_after = fused_composer.get_alloc_bytes(sample)
+    assert bytes_before == composer.get_alloc_bytes(sample)[0]
+    assert 0 < bytes_after < bytes_before
+    assert bytes_after == 16 * 12 * 3 + 16 * 12 * 3 * 4  # one gather + one float buffer
+
+
+def test_fused_compose_keys():
+    composer = thelper.transforms.Compose([
+        thelper.transforms.TransformWrapper(thelper.transforms.NormalizeMinMax(0, 255), target_keys=["a"]),
+        thelper.transforms.TransformWrapper(thelper.transforms.Unsqueeze(0), target_keys=["a"]),
+        thelper.transforms.TransformWrapper(thelper.transforms.Unsqueeze(0), target_keys=["b"]),
+        thelper.transforms.TransformWrapper(thelper.transforms.Unsqueeze(0), target_keys=["b"], probability=0.5),
+    ], fuse=True)
+    assert len(composer.stages) == 3
+    assert isinstance(composer.stages[0].opcall.func, thelper.transforms.FusedTransform)
+    assert composer.stages[2] is composer.transforms[3]
+    sample = {"a": np.full((4, 5), 255, dtype=np.uint8), "b": np.zeros((4, 5))}
+    out = composer(sample)
+    assert out["a"].shape == (1, 4, 5) and np.all(out["a"] == 1)
+
+
+def test_compose_stage_profiling():
+    composer = thelper.transforms.Compose([
+        thelper.transforms.TransformWrapper(thelper.transforms.NormalizeMinMax(0, 255), target_keys=["a"]),
+        thelper.transforms.Compose([thelper.transforms.TransformWrapper(thelper.transforms.Unsqueeze(0))]),
+    ])
+    sample = {"a": np.full((4, 5), 255, dtype=np.uint8)}
+    thelper.transforms.utils.get_stage_stats(reset=True)
+    assert not thelper.transforms.utils.is_stage_profiling_enabled()
+    composer(sample)
+    assert not thelper.transforms.utils.get_stage_stats()
+    thelper.transforms.utils.set_stage_profiling(True)
+    try:
+        composer({"a": np.full((4, 5), 255, dtype=np.uint8)})
+        composer({"a": np.full((4, 5), 255, dtype=np.uint8)})
+    finally:
+        thelper.transforms.utils.set_stage_profiling(False)
+    stats = thelper.transforms.utils.get_stage_stats(reset=True)
+    assert not thelper.transforms.utils.get_stage_stats()
+    assert set(stats.keys()) == {"0.TransformWrapper", "0.TransformWrapper/NormalizeMinMax", "1.Compose",
+                                 "1.Compose/0.TransformWrapper", "1.Compose/0.TransformWrapper/Unsqueeze"}
+    assert all([count == 2 and elapsed_time >= 0 for count, elapsed_time, _ in stats.values()])
+    assert stats["0.TransformWrapper/NormalizeMinMax"][2] == 2 * 4 * 5 * 4
+    assert stats["1.Compose"][1] >= stats["1.Compose/0.TransformWrapper/Unsqueeze"][1]
+    merged = thelper.transforms.utils.merge_stage_stats({}, stats)
+    merged = thelper.transforms.utils.merge_stage_stats(merged, stats)
+    assert merged["1.Compose"][0] == 4
+    report = thelper.transforms.utils.report_stage_stats(merged)
+    assert all([key in report for key in stats])
@@ -136,3 +136,34 @@ def test_randomresizedcrop():
         _ = thelper.transforms.RandomResizedCrop(output_size=None, input_size=(0.1, 1.0), probability=-1)
     op8 = thelper.transforms.RandomResizedCrop(output_size=None, flags="cv2.INTER_LINEAR")
     assert op8.flags == cv.INTER_LINEAR
+
+
+def test_tile():
+    image = np.arange(12 * 16 * 2).reshape((12, 16, 2)).astype(np.float32)
+    op1 = thelper.transforms.Tile(tile_size=(4, 6), tile_overlap=0.5)
+    tiles = op1(image)
+    assert len(tiles) == op1.count_tiles(image) == 2 * 7  # step size = (2, 4)
+    assert all([tile.shape == (6, 4, 2) for tile in tiles])
+    assert np.array_equal(tiles[0], image[0:6, 0:4]) and np.array_equal(tiles[8], image[4:10, 2:6])
+    assert all([np.shares_memory(tile, image) for tile in tiles])
+    op2 = thelper.transforms.Tile(tile_size=(4, 6), tile_overlap=0.5, offset_overlap=True, borderval=-1)
+    tiles = op2(image)
+    assert tiles[0].shape == (6, 4, 2) and np.all(tiles[0][:2, :, 0] == -1) and np.all(tiles[0][:, :1, 0] == -1)
+    assert np.array_equal(tiles[0][2:, 1:], image[0:4, 0:3])
+    op3 = thelper.transforms.Tile(tile_size=(4, 6), tile_overlap=0.5, force_copy=True)
+    assert not any([np.shares_memory(tile, image) for tile in op3(image)])
+    mask = np.zeros((12, 16), dtype=np.uint8)
+    mask[5:, 7:] = 255
+    op4 = thelper.transforms.Tile(tile_size=(4, 6), min_mask_iou=0.5)
+    rects = op4._get_tile_rects(image, mask)
+    expected_rects = [(x, y, 4, 6) for y in range(0, 7) for x in range(0, 13)
+                      if np.count_nonzero(mask[y:y + 6, x:x + 4]) >= 12]
+    assert rects[0] == expected_rects[0]
+    assert all([rect in expected_rects for rect in rects])
+    assert all([(rect[0] - rects[0][0]) % 4 == 0 and (rect[1] - rects[0][1]) % 6 == 0 for rect in rects])
+    tiles = op4(image, mask)
+    assert len(tiles) == len(rects)
+    assert all([np.array_equal(tile, image[r[1]:r[1] + 6, r[0]:r[0] + 4]) for tile, r in zip(tiles, rects)])
+    assert op4([image, np.zeros_like(mask)]) == []
+    op5 = eval(repr(op3))
+    assert op3.__dict__ == op5.__dict__
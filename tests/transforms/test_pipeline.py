@@ -51,3 +51,19 @@ def test_transform_stochastic_pipeline(fake_op1, fake_op2):
     ])
     out = transforms(sample)
     assert np.array_equal(out, sample)
+
+
+def test_transform_wrapper_native_path():
+    wrapper = thelper.transforms.TransformWrapper("torchvision.transforms.CenterCrop", params={"size": 4}, convert_pil=True)
+    image = np.random.rand(8, 8, 6).astype(np.float32)
+    with mock.patch("PIL.Image.fromarray") as fake_cvt:
+        out = wrapper(image)
+        assert fake_cvt.call_count == 0  # single call on the full array instead of one per channel
+    assert isinstance(out, np.ndarray) and out.dtype == np.float32
+    assert np.array_equal(out, image[2:6, 2:6])
+    image = np.random.randint(255, size=(8, 8, 3), dtype=np.uint8)
+    assert np.array_equal(wrapper(image[:, ::-1]), image[2:6, 5:1:-1])
+    assert np.array_equal(wrapper({"a": image[..., 0]})["a"], image[2:6, 2:6, 0])
+    assert np.array_equal(wrapper([image, image]), [image[2:6, 2:6]] * 2)
+    wrapper = thelper.transforms.TransformWrapper("torchvision.transforms.ToTensor", convert_pil=True)
+    assert not wrapper._is_native_input(image)
@@ -1,6 +1,8 @@
 import os
 
 import mock
+import pytest
+import torch
 
 import thelper
 
@@ -60,6 +62,63 @@ def test_load_checkpoint_not_default_cpu_with_devices(mock_torch_load, mock_thel
     mock_torch_load.assert_called_once_with(checkpoint_file, map_location=None)
 
 
+@pytest.mark.parametrize("background", [False, True])
+def test_checkpoint_writer(tmpdir, background):
+    ckpt_dir = str(tmpdir)
+    writer = thelper.utils.CheckpointWriter(ckpt_dir, keep_count=2, background=background)
+    assert repr(writer)
+    weights = torch.zeros(4)
+    for epoch in range(4):
+        state = {"epoch": epoch, "model": {"weights": weights}}
+        if background:
+            state = writer.snapshot(state)
+            assert state["model"]["weights"] is not weights
+        writer.write(state, f"ckpt.{epoch:04d}.fake-0-0.pth", save_best=(epoch == 1))
+        weights += 1  # snapshot must not be affected by in-place updates
+    writer.close()
+    assert sorted(os.listdir(ckpt_dir)) == ["ckpt.0002.fake-0-0.pth", "ckpt.0003.fake-0-0.pth", "ckpt.best.pth"]
+    best_state = torch.load(os.path.join(ckpt_dir, "ckpt.best.pth"))
+    assert best_state["epoch"] == 1 and torch.equal(best_state["model"]["weights"], torch.full((4, ), 1.))
+    last_state = torch.load(os.path.join(ckpt_dir, "ckpt.0003.fake-0-0.pth"))
+    assert torch.equal(last_state["model"]["weights"], torch.full((4, ), 3.))
+    assert thelper.utils.load_checkpoint(ckpt_dir, check_version=False)["epoch"] == 1
+    assert thelper.utils.load_checkpoint(ckpt_dir, always_load_latest=True, check_version=False)["epoch"] == 3
+
+
+@pytest.mark.parametrize("background", [False, True])
+def test_checkpoint_writer_mid_epoch(tmpdir, background):
+    ckpt_dir = str(tmpdir)
+    writer = thelper.utils.CheckpointWriter(ckpt_dir, keep_count=1, background=background)
+    writer.write({"epoch": 0}, writer.get_epoch_name(0, "fake-0-0"))
+    for iter in range(3):
+        writer.write({"epoch": 1, "iter": iter}, writer.get_mid_epoch_name(1, f"fake-0-{iter}"))
+    if background:
+        assert writer._thread is not None and not writer._thread.daemon
+    writer.flush()
+    # mid-epoch checkpoints use a single slot, and are not counted as epoch checkpoints
+    assert sorted(os.listdir(ckpt_dir)) == ["ckpt.0000.fake-0-0.pth", "ckpt.0001.fake-0-2.mid.pth"]
+    ckptdata = thelper.utils.load_checkpoint(ckpt_dir, always_load_latest=True, check_version=False)
+    assert ckptdata["epoch"] == 1 and ckptdata["iter"] == 2
+    writer.write({"epoch": 1}, writer.get_epoch_name(1, "fake-0-3"))
+    writer.close()
+    assert sorted(os.listdir(ckpt_dir)) == ["ckpt.0001.fake-0-3.pth"]
+
+
+def test_load_checkpoint_mmap_sections(tmpdir):
+    ckpt_dir = str(tmpdir)
+    state = {"name": "test", "version": thelper.__version__, "model": {"weights": torch.arange(4.)},
+             "optimizer": {"state": torch.zeros(8)}, "outputs": {0: {"loss": 1.0}}}
+    torch.save(state, os.path.join(ckpt_dir, "ckpt.0000.fake-0-0.pth"))
+    ckptdata = thelper.utils.load_checkpoint(ckpt_dir, mmap=True, sections=["name", "model"])
+    assert list(ckptdata.keys()) == ["name", "model"]
+    assert torch.equal(ckptdata["model"]["weights"], state["model"]["weights"])
+    with mock.patch("glob.glob", wraps=thelper.utils.glob.glob) as mock_glob:
+        assert thelper.utils.load_checkpoint(ckpt_dir, check_version=False)["name"] == "test"
+        mock_glob.assert_not_called()  # directory scan result should be cached
+    torch.save({**state, "name": "best"}, os.path.join(ckpt_dir, "ckpt.best.pth"))
+    assert thelper.utils.load_checkpoint(ckpt_dir, check_version=False)["name"] == "best"
+
+
 def test_check_version_correct_parsing_and_not_future():
     versions_tests = [
         # not-future, check, required, expected check parts, expected required parts
@@ -9,11 +9,18 @@ outputs, the path to a directory where to save the data is also needed.
 """
 
 import argparse
+import bisect
+import copy
+import itertools
+import json
 import logging
 import os
+import socket
+import time
 from pathlib import Path as pth
 from typing import Any, Union
 
+import numpy as np
 import torch
 import tqdm
 
@@ -22,12 +29,64 @@ import thelper
 TASK_COMPAT_CHOICES = frozenset(["old", "new", "compat"])
 
 
-def create_session(config, save_dir,backup_ext='.json'):
+def launch_distributed(func, nprocs, *args, backend="gloo", **kwargs):
+    """Runs a session function in several processes that share a distributed process group.
+
+    The processes are spawned on the local machine, and each one of them calls ``func(*args, **kwargs)``
+    once the default ``torch.distributed`` process group is initialized. Session runners then wrap their
+    models in ``torch.nn.parallel.DistributedDataParallel``, and the data loaders shard their samplers by
+    process rank (see :class:`thelper.data.samplers.ShardedSampler`). The intra-op thread pool of the
+    machine is split between the processes, unless ``OMP_NUM_THREADS`` is defined.
+
+    Note that processes cannot query the user for inputs; all session parameters must be resolved beforehand.
+
+    Args:
+        func: the session function to run in each process (e.g. :func:`thelper.cli.resume_session`).
+        nprocs: number of processes to spawn.
+        backend: ``torch.distributed`` backend to use (``gloo`` for CPU, ``nccl`` for GPUs).
+
+    Returns:
+        The value returned by the function in the main (rank 0) process.
+    """
+    assert isinstance(nprocs, int) and nprocs > 1, "distributed sessions require at least two processes"
+    assert torch.distributed.is_available(), "torch.distributed is not available in this build of PyTorch"
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("localhost", 0))
+        port = sock.getsockname()[1]
+    num_threads = None if "OMP_NUM_THREADS" in os.environ else max(torch.get_num_threads() // nprocs, 1)
+    result_queue = torch.multiprocessing.get_context("spawn").SimpleQueue()
+    log_level = min([h.level for h in thelper.logger.handlers if isinstance(h, logging.StreamHandler)], default=logging.INFO)
+    thelper.logger.info(f"launching distributed session with {nprocs} processes ({backend} backend)")
+    torch.multiprocessing.spawn(_run_distributed, nprocs=nprocs, join=True,
+                                args=(nprocs, backend, port, num_threads, log_level, result_queue, func, args, kwargs))
+    return result_queue.get() if not result_queue.empty() else None
+
+
+def _run_distributed(rank, nprocs, backend, port, num_threads, log_level, result_queue, func, args, kwargs):
+    """Initializes the process group of a distributed session process, and runs the session function in it."""
+    os.environ.setdefault("MASTER_ADDR", "localhost")
+    os.environ["MASTER_PORT"] = str(port)
+    thelper.utils.init_logger(log_level if rank == 0 else max(log_level, logging.WARNING))
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+    torch.distributed.init_process_group(backend, rank=rank, world_size=nprocs)
+    try:
+        result = func(*args, **kwargs)
+        if rank == 0:
+            result_queue.put(result)
+    finally:
+        torch.distributed.destroy_process_group()
+
+
+def create_session(config, save_dir, backup_ext='.json', nprocs=1, backend="gloo"):
     """Creates a session to train a model.
 
     All generated outputs (model checkpoints and logs) will be saved in a directory named after the
     session (the name itself is specified in ``config``), and located in ``save_dir``.
 
+    If ``nprocs`` is greater than one, the session is distributed over that many local processes (see
+    :func:`thelper.cli.launch_distributed`) once the output directory has been resolved.
+
     Args:
         config: a dictionary that provides all required data configuration and trainer parameters; see
             :class:`thelper.train.base.Trainer` and :func:`thelper.data.utils.create_loaders` for more information.
@@ -35,6 +94,9 @@ def create_session(config, save_dir,backup_ext='.json'):
         save_dir: the path to the root directory where the session directory should be saved. Note that
             this is not the path to the session directory itself, but its parent, which may also contain
             other session directories.
+        backup_ext: extension to use when creating configuration file backups.
+        nprocs: number of processes to distribute the session over.
+        backend: ``torch.distributed`` backend to use in distributed sessions.
 
     .. seealso::
         | :class:`thelper.train.base.Trainer`
@@ -46,6 +108,16 @@ def create_session(config, save_dir,backup_ext='.json'):
     thelper.utils.setup_globals(config)
     save_dir = pth(thelper.utils.get_save_dir(save_dir, session_name, config, backup_ext=backup_ext))
     logger.debug("session will be saved at '%s'" % save_dir.absolute())
+    if nprocs > 1:
+        # the session directory is resolved (and the user is queried) only once, before spawning the processes
+        return launch_distributed(_run_new_session, nprocs, config, session_name, save_dir, backend=backend)
+    return _run_new_session(config, session_name, save_dir)
+
+
+def _run_new_session(config, session_name, save_dir):
+    """Instantiates the loaders, model, and trainer of a new session (in its output directory), and runs it."""
+    logger = thelper.utils.get_func_logger()
+    thelper.utils.setup_globals(config)  # must be done again in spawned processes for distributed sessions
     task, train_loader, valid_loader, test_loader = thelper.data.create_loaders(config, save_dir)
     model = thelper.nn.create_model(config, task, save_dir=save_dir)
     loaders = (train_loader, valid_loader, test_loader)
@@ -56,11 +128,12 @@ def create_session(config, save_dir,backup_ext='.json'):
     else:
         trainer.eval()
     logger.debug("all done")
-    thelper.utils.report_orion_results(trainer)
+    if thelper.utils.is_main_process():
+        thelper.utils.report_orion_results(trainer)
     return trainer.outputs
 
 
-def resume_session(ckptdata, save_dir, config=None, eval_only=False, task_compat=None):
+def resume_session(ckptdata, save_dir, config=None, eval_only=False, task_compat=None, nprocs=1, backend="gloo"):
     """Resumes a previously created training session.
 
     Since the saved checkpoints contain the original session's configuration, the ``config`` argument
@@ -90,6 +163,9 @@ def resume_session(ckptdata, save_dir, config=None, eval_only=False, task_compat
             Here, it is only expected to contain a ``name`` field that specifies the name of the session.
         eval_only: specifies whether training should be resumed or the model should only be evaluated.
         task_compat: specifies how to handle discrepancy between old task from checkpoint and new task from config
+        nprocs: number of processes to distribute the session over (see :func:`thelper.cli.launch_distributed`).
+            In that case, ``task_compat`` must be specified if the tasks might differ, as processes cannot query it.
+        backend: ``torch.distributed`` backend to use in distributed sessions.
 
     .. seealso::
         | :class:`thelper.train.base.Trainer`
@@ -97,6 +173,9 @@ def resume_session(ckptdata, save_dir, config=None, eval_only=False, task_compat
     logger = thelper.utils.get_func_logger()
     if ckptdata is None or not ckptdata:
         raise AssertionError("must provide valid checkpoint data to resume a session!")
+    if nprocs > 1:
+        return launch_distributed(resume_session, nprocs, ckptdata, save_dir, config=config, eval_only=eval_only,
+                                  task_compat=task_compat, backend=backend)
     if not config:
         if "config" not in ckptdata or not ckptdata["config"]:
             raise AssertionError("checkpoint data missing 'config' field")
@@ -149,7 +228,8 @@ def resume_session(ckptdata, save_dir, config=None, eval_only=False, task_compat
         logger.info("resuming training session '%s' @ epoch %d" % (trainer.name, trainer.current_epoch))
         trainer.train()
     logger.debug("all done")
-    thelper.utils.report_orion_results(trainer)
+    if thelper.utils.is_main_process():
+        thelper.utils.report_orion_results(trainer)
     return trainer.outputs
 
 
@@ -347,7 +427,10 @@ def inference_session(config, save_dir=None, ckpt_path=None):
     if not os.path.exists(ckpt_path):
         logger.fatal("Model not found: %s", ckpt_path)
         raise AssertionError("Model checkpoint missing to run inference")
-    ckptdata = thelper.utils.load_checkpoint(ckpt_path, map_location=None, always_load_latest=False)
+    # only the model-related sections are needed here (the optimizer state and outputs history are never loaded)
+    ckptdata = thelper.utils.load_checkpoint(ckpt_path, map_location=None, always_load_latest=False, mmap=True,
+                                             sections=["name", "version", "task", "config", "model",
+                                                       "model_type", "model_params"])
     if "task" not in ckptdata or not isinstance(ckptdata["task"], (thelper.tasks.Task, str)):
         raise AssertionError("invalid checkpoint, cannot reload model task")
     task = ckptdata["task"]
@@ -487,6 +570,319 @@ def export_model(config, save_dir):
     logger.debug("all done")
 
 
+def benchmark_session(config, save_dir, report_path=None, baseline_path=None):
+    """Benchmarks each stage of the data loading and model pipelines of a session in isolation.
+
+    This mode instantiates the loaders, model, and trainer of a session like :func:`thelper.cli.create_session`
+    would, but instead of training, it measures the dataset parser ``__getitem__`` rate (with transforms
+    disabled), the transform pipeline throughput, the collate function cost, the loader throughput for
+    different ``num_workers`` and ``batch_size`` values, the model forward and forward+backward throughputs,
+    and the update cost of each consumer (metric) of the benchmarked set. The results are written to a JSON
+    report that can be compared against the report of a previous run in order to catch regressions.
+
+    The configuration dictionary can contain a 'bench' section with the following (optional) parameters:
+
+    - ``set`` (default="train"): name of the loader to benchmark (the first available one is used otherwise).
+    - ``iters`` (default=20): number of samples, minibatches, or passes to time for each stage.
+    - ``num_workers`` (default=[0, <loader value>]): list of worker counts to time the loader with.
+    - ``batch_sizes`` (default=[<loader value>]): list of minibatch sizes to time the loader with.
+    - ``tolerance`` (default=0.1): relative slowdown with respect to the baseline above which a stage is
+      reported as a regression.
+
+    Args:
+        config: a dictionary that provides all required data configuration and trainer parameters; see
+            :class:`thelper.train.base.Trainer` and :func:`thelper.data.utils.create_loaders` for more information.
+        save_dir: the path to the root directory where the session directory should be located. The trainer
+            outputs and the report will be written in a ``bench`` folder of that session directory.
+        report_path: path to the JSON report to write (default: a time-stamped file in the ``bench`` folder).
+        baseline_path: path to the JSON report of a previous run to compare the results against (if any).
+
+    Returns:
+        The report dictionary, which contains a ``regressions`` list of the stages that slowed down with
+        respect to the baseline (if one was provided).
+
+    .. seealso::
+        | :func:`thelper.cli.compare_bench_reports`
+        | :meth:`thelper.data.loaders.DataLoader.clone`
+    """
+    logger = thelper.utils.get_func_logger()
+    session_name = thelper.utils.get_config_session_name(config)
+    assert session_name is not None, "config missing 'name' field required for output directory"
+    bench_config = thelper.utils.get_key_def("bench", config, default={})
+    assert isinstance(bench_config, dict), "unexpected bench config type"
+    iters = int(thelper.utils.get_key_def("iters", bench_config, 20))
+    assert iters > 0, "benchmark iteration count should be strictly positive integer"
+    tolerance = float(thelper.utils.get_key_def("tolerance", bench_config, 0.1))
+    logger.info("creating benchmarking session '%s'..." % session_name)
+    thelper.utils.setup_globals(config)
+    bench_dir = os.path.join(save_dir, session_name, "bench")
+    os.makedirs(os.path.join(bench_dir, "logs"), exist_ok=True)
+    task, train_loader, valid_loader, test_loader = thelper.data.create_loaders(config, bench_dir)
+    loaders = {"train": train_loader, "valid": valid_loader, "test": test_loader}
+    set_name = thelper.utils.get_key_def("set", bench_config, "train")
+    if not loaders.get(set_name):
+        set_name = next(iter([name for name, loader in loaders.items() if loader]), None)
+        assert set_name is not None, "no available data to benchmark"
+    loader = loaders[set_name]
+    report = {"name": session_name, "set": set_name, "stamp": thelper.utils.get_log_stamp(),
+              "torch": torch.__version__, "iters": iters}
+    logger.info(f"benchmarking '{set_name}' dataset parser and transforms...")
+    report["parser"], report["transforms"], samples = _bench_dataset(loader, iters)
+    logger.info(f"benchmarking '{set_name}' collate function...")
+    batch = [samples[idx % len(samples)] for idx in range(loader.batch_size or 1)]
+    times = _time_calls(lambda: loader._base_collate_fn(copy.deepcopy(batch)), iters)
+    report["collate"] = _get_time_stats(times, len(batch))
+    report["loader"] = {}
+    num_workers_vals = thelper.utils.get_key_def("num_workers", bench_config, sorted({0, loader.num_workers}))
+    batch_size_vals = thelper.utils.get_key_def("batch_sizes", bench_config, [loader.batch_size])
+    for num_workers in num_workers_vals:
+        for batch_size in batch_size_vals:
+            logger.info(f"benchmarking '{set_name}' loader with num_workers={num_workers}, batch_size={batch_size}...")
+            curr_loader = loader.clone(num_workers=int(num_workers), batch_size=int(batch_size))
+            report["loader"][f"workers{num_workers}-batch{batch_size}"] = _bench_loader(curr_loader, task, iters)
+    if "trainer" in config and config["trainer"]:
+        model = thelper.nn.create_model(config, task, save_dir=bench_dir)
+        trainer = thelper.train.create_trainer(session_name, bench_dir, config, model, task,
+                                               (train_loader, valid_loader, test_loader))
+        logger.info("benchmarking model forward/backward passes...")
+        report["model"], iter_data = _bench_model(trainer, loader.collate_fn(batch), iters)
+        metrics = {"train": trainer.train_metrics, "valid": trainer.valid_metrics, "test": trainer.test_metrics}[set_name]
+        logger.info(f"benchmarking '{set_name}' consumers...")
+        report["metrics"] = _bench_metrics(metrics, task, iter_data, iters, trainer.output_paths[set_name])
+    else:
+        logger.warning("config missing 'trainer' section, will not benchmark model and metrics")
+    if baseline_path is not None:
+        baseline = thelper.utils.load_config(baseline_path, as_json=True, add_name_if_missing=False)
+        report["comparison"] = compare_bench_reports(report, baseline, tolerance)
+        report["regressions"] = [key for key, val in report["comparison"].items() if val["regression"]]
+        for key, val in report["comparison"].items():
+            logger.info(f"{key}: {val['baseline']:.4f} => {val['current']:.4f} ({val['change'] * 100:+.1f}%)" +
+                        ("  REGRESSION" if val["regression"] else ""))
+        if report["regressions"]:
+            logger.warning(f"found {len(report['regressions'])} regression(s) with respect to '{baseline_path}'")
+    if report_path is None:
+        report_path = os.path.join(bench_dir, f"bench-{report['stamp']}.json")
+    with open(report_path, "w") as fd:
+        json.dump(report, fd, indent=4)
+    logger.info(f"benchmark report written to '{os.path.abspath(report_path)}'")
+    return report
+
+
+def compare_bench_reports(report, baseline, tolerance=0.1):
+    """Compares the results of a benchmark report with the ones of a baseline report.
+
+    The values whose key ends with ``_per_sec`` are throughputs (higher is better), and the values whose key ends
+    with ``_ms`` are latencies (lower is better). Only values found in both reports are compared. Returns a flat
+    dictionary that maps each value's path (e.g. ``model/forward/samples_per_sec``) to its baseline and current
+    values, its relative change, and whether that change is a regression beyond the given tolerance.
+    """
+    assert tolerance >= 0, "regression tolerance should be positive (or zero)"
+
+    def flatten(data, prefix=""):
+        flat = {}
+        for key, val in data.items():
+            if isinstance(val, dict):
+                flat.update(flatten(val, prefix + key + "/"))
+            elif isinstance(val, (int, float)) and (key.endswith("_per_sec") or key.endswith("_ms")):
+                flat[prefix + key] = float(val)
+        return flat
+
+    curr_vals, base_vals = flatten(report), flatten(baseline)
+    res = {}
+    for key in sorted(set(curr_vals) & set(base_vals)):
+        if base_vals[key] <= 0:
+            continue
+        change = (curr_vals[key] - base_vals[key]) / base_vals[key]
+        regression = change < -tolerance if key.endswith("_per_sec") else change > tolerance
+        res[key] = {"baseline": base_vals[key], "current": curr_vals[key], "change": change, "regression": regression}
+    return res
+
+
+def _time_calls(func, iters, warmup=1, synchronize=False):
+    """Returns the wall times (in seconds) of a given number of calls to a function, after untimed warm-up calls."""
+    for _ in range(warmup):
+        func()
+    times = []
+    for _ in range(iters):
+        if synchronize:
+            torch.cuda.synchronize()
+        start_time = time.perf_counter()
+        func()
+        if synchronize:
+            torch.cuda.synchronize()
+        times.append(time.perf_counter() - start_time)
+    return times
+
+
+def _get_time_stats(times, sample_count=1):
+    """Returns the mean/median times (in ms) and the throughput of a list of call times (in seconds)."""
+    return {"mean_ms": 1000 * float(np.mean(times)), "median_ms": 1000 * float(np.median(times)),
+            "samples_per_sec": sample_count * len(times) / max(float(np.sum(times)), 1e-12)}
+
+
+def _get_leaf_dataset(dataset, idx):
+    """Returns the dataset parser (and the index inside it) that provides a sample of a (concat/subset) dataset."""
+    if isinstance(dataset, torch.utils.data.ConcatDataset):
+        dataset_idx = bisect.bisect_right(dataset.cumulative_sizes, idx)
+        offset = dataset.cumulative_sizes[dataset_idx - 1] if dataset_idx > 0 else 0
+        return _get_leaf_dataset(dataset.datasets[dataset_idx], idx - offset)
+    if isinstance(dataset, torch.utils.data.Subset):
+        return _get_leaf_dataset(dataset.dataset, dataset.indices[idx])
+    return dataset, idx
+
+
+def _bench_dataset(loader, iters):
+    """Times the parsing (without transforms) and the transforms of the first samples of a loader's epoch."""
+    sample_idxs = list(itertools.islice(iter(loader.sampler) if loader.sampler is not None else range(len(loader.dataset)),
+                                        iters))
+    parser_times, transform_times, samples = [], [], []
+    for idx in sample_idxs:
+        dataset, idx = _get_leaf_dataset(loader.dataset, idx)
+        transforms = getattr(dataset, "transforms", None)
+        if transforms is not None:
+            dataset.transforms = None
+        try:
+            start_time = time.perf_counter()
+            sample = dataset[idx]
+            parser_times.append(time.perf_counter() - start_time)
+        finally:
+            if transforms is not None:
+                dataset.transforms = transforms
+        if transforms is not None:
+            sample = copy.deepcopy(sample)  # some parsers might return cached samples that should not be modified
+            start_time = time.perf_counter()
+            sample = transforms(sample)
+            transform_times.append(time.perf_counter() - start_time)
+        samples.append(sample)
+    assert samples, "no available samples to benchmark"
+    return _get_time_stats(parser_times), _get_time_stats(transform_times) if transform_times else {}, samples
+
+
+def _bench_loader(loader, task, iters):
+    """Times the startup (first minibatch) and the steady-state throughput of a loader over a few minibatches."""
+    start_time = time.perf_counter()
+    iterator = iter(loader)
+    batch_times, sample_count, startup_time = [], 0, None
+    for batch in itertools.islice(iterator, iters + 1):
+        curr_time = time.perf_counter()
+        if startup_time is None:
+            startup_time = curr_time - start_time
+        else:
+            batch_times.append(curr_time - start_time)
+            sample_count += thelper.train.utils.get_batch_size(batch, task.input_key)
+        start_time = time.perf_counter()
+    del iterator  # shuts down the worker processes (if any)
+    res = {"startup_ms": 1000 * (startup_time or 0.)}
+    if batch_times:
+        res.update(_get_time_stats(batch_times, sample_count / len(batch_times)))
+    return res
+
+
+def _bench_model(trainer, batch, iters):
+    """Times the forward and forward+backward passes of a trainer's model on a minibatch.
+
+    Returns the results along with the iteration data (input, prediction, target) used to benchmark consumers.
+    """
+    logger = thelper.utils.get_func_logger()
+    model = trainer._upload_model(trainer._apply_memory_format(trainer.model), trainer.devices)
+    input_val, target_val = trainer._to_tensor(batch)
+    if isinstance(input_val, list):  # augmented copies are forwarded one at a time by default, keep only one
+        input_val, target_val = input_val[0], target_val[0] if isinstance(target_val, list) else target_val
+    input_dev = trainer._move_tensor(input_val, trainer.devices)
+    batch_size = thelper.train.utils.get_batch_size(input_val, None)
+    synchronize = bool(trainer.devices) and torch.cuda.is_available()
+    res = {}
+
+    def forward():
+        with trainer._autocast():
+            return model(input_dev)
+
+    model.eval()
+    with torch.no_grad():
+        res["forward"] = _get_time_stats(_time_calls(forward, iters, synchronize=synchronize), batch_size)
+        pred = trainer._to_fp32_cpu(forward())
+    if trainer.train_loader and target_val is not None and trainer.optimization_config:
+        loss, optimizer, _, _ = trainer._load_optimization(model, trainer.devices)
+        target_dev = trainer._move_tensor(target_val, trainer.devices)
+        if isinstance(target_dev, torch.Tensor) and not target_dev.is_floating_point():
+            target_dev = target_dev.long()  # e.g. segmentation label maps
+
+        def forward_backward():
+            optimizer.zero_grad()
+            with trainer._autocast():
+                iter_loss = loss(model(input_dev), target_dev)
+            trainer._backward(iter_loss)
+
+        model.train()
+        try:
+            times = _time_calls(forward_backward, iters, synchronize=synchronize)
+            res["forward_backward"] = _get_time_stats(times, batch_size)
+        except Exception as e:  # custom trainers might forward/evaluate losses differently
+            logger.warning(f"could not benchmark model backward pass: {e}")
+        optimizer.zero_grad()
+    target_cpu = trainer._move_tensor(target_val, dev="cpu", detach=True) if target_val is not None else None
+    return res, {"input": input_val, "pred": pred, "target": target_cpu, "sample": batch}
+
+
+def _bench_metrics(metrics, task, iter_data, iters, output_path):
+    """Times the updates of each consumer (except callbacks) using the same iteration data, and resets them."""
+    res = {}
+    for metric_name, metric in metrics.items():
+        if isinstance(metric, thelper.train.utils.PredictionCallback):
+            continue  # callbacks (e.g. iteration loggers) rely on the state of a running session
+        iter_idx = [0]
+
+        def update():
+            metric.update(task=task, loss=None, iter_idx=iter_idx[0], max_iters=iters + 1, epoch_idx=0, max_epochs=1,
+                          output_path=output_path, **iter_data)
+            iter_idx[0] += 1
+
+        res[metric_name] = _get_time_stats(_time_calls(update, iters), len(iter_data["pred"]))
+        metric.reset()
+    return res
+
+
+def find_batch_size(config, save_dir, output_path=None):
+    """Searches for the largest training batch size of a session that fits in a memory budget.
+
+    The loaders, model, and trainer of the session are instantiated in a ``batchsize`` folder of the session
+    directory, and the search is done by :meth:`thelper.train.base.Trainer.find_max_batch_size` based on the
+    ``batch_size_finder`` section of the trainer configuration (or on its default values). The configuration is
+    then saved with the batch size written in its loaders section (and with its learning rate scaled, if requested)
+    so that it can be used to create the training session. The search section is removed from the saved
+    configuration, as the training session does not need to search again.
+
+    Args:
+        config: a dictionary that provides all required data configuration and trainer parameters; see
+            :class:`thelper.train.base.Trainer` and :func:`thelper.data.utils.create_loaders` for more information.
+        save_dir: the path to the root directory where the session directory should be located.
+        output_path: path to the updated configuration file to write (default: ``config.json`` in the
+            ``batchsize`` folder of the session directory).
+
+    Returns:
+        The largest batch size that fits in the memory budget.
+    """
+    logger = thelper.utils.get_func_logger()
+    session_name = thelper.utils.get_config_session_name(config)
+    assert session_name is not None, "config missing 'name' field required for output directory"
+    logger.info("searching for the maximum batch size of session '%s'..." % session_name)
+    thelper.utils.setup_globals(config)
+    config = copy.deepcopy(config)
+    finder_dir = os.path.join(save_dir, session_name, "batchsize")
+    os.makedirs(os.path.join(finder_dir, "logs"), exist_ok=True)
+    task, train_loader, valid_loader, test_loader = thelper.data.create_loaders(config, finder_dir)
+    model = thelper.nn.create_model(config, task, save_dir=finder_dir)
+    trainer = thelper.train.create_trainer(session_name, finder_dir, config, model, task,
+                                           (train_loader, valid_loader, test_loader))
+    batch_size = trainer.find_max_batch_size()
+    thelper.utils.get_key(["trainer", "runner", "tester"], trainer.config).pop("batch_size_finder", None)
+    if output_path is None:
+        output_path = os.path.join(finder_dir, "config.json")
+    thelper.utils.save_config(trainer.config, output_path)
+    logger.info(f"updated config (batch size = {batch_size}) written to '{os.path.abspath(output_path)}'")
+    return batch_size
+
+
 def make_argparser():
     # type: () -> argparse.ArgumentParser
     """Creates the (default) argument parser to use for the main entrypoint.
@@ -505,6 +901,8 @@ def make_argparser():
     new_ap.add_argument("-c", "--config", required=True, type=str, help="path to the session configuration file")
     new_ap.add_argument("-d", "--save-dir", required=True, type=str, help="path to the session output root directory")
     new_ap.add_argument("-b", "--backup_ext", required=False, type=str, default=".json", help="backup config file extension")
+    new_ap.add_argument("-n", "--nprocs", default=1, type=int, help="number of distributed data-parallel processes (default=1)")
+    new_ap.add_argument("--dist-backend", default="gloo", type=str, help="torch.distributed backend (default=gloo)")
     cl_new_ap = subparsers.add_parser("cl_new", help="creates a new session from a config file for the cluster")
     cl_new_ap.add_argument("-c", "--config", required=True, type=str, help="path to the session configuration file")
     cl_new_ap.add_argument("-d", "--save-dir", required=True, type=str, help="path to the session output root directory")
@@ -516,6 +914,8 @@ def make_argparser():
     resume_ap.add_argument("-e", "--eval-only", default=False, action="store_true", help="only run evaluation pass (valid+test)")
     resume_ap.add_argument("-t", "--task-compat", default=None, type=str, choices=TASK_COMPAT_CHOICES,
                            help="task compatibility mode to use to resolve any discrepancy between loaded tasks")
+    resume_ap.add_argument("-n", "--nprocs", default=1, type=int, help="number of distributed data-parallel processes (default=1)")
+    resume_ap.add_argument("--dist-backend", default="gloo", type=str, help="torch.distributed backend (default=gloo)")
     viz_ap = subparsers.add_parser("viz", help="visualize the loaded data for a training/eval session")
     viz_ap.add_argument("-c", "--config", required=True, type=str, help="path to the session configuration file (or session directory)")
     annot_ap = subparsers.add_parser("annot", help="launches a dataset annotation session with a GUI tool")
@@ -532,6 +932,15 @@ def make_argparser():
                                                         "(otherwise uses model checkpoint from configuration)")
     infer_ap.add_argument("-c", "--config", type=str, help="path to the session configuration file (or session directory)")
     infer_ap.add_argument("-d", "--save-dir", type=str, help="path to the session output root directory")
+    bench_ap = subparsers.add_parser("bench", help="benchmarks the data and model pipelines of a session from a config file")
+    bench_ap.add_argument("-c", "--config", required=True, type=str, help="path to the session configuration file (or session directory)")
+    bench_ap.add_argument("-d", "--save-dir", required=True, type=str, help="path to the session output root directory")
+    bench_ap.add_argument("-o", "--output", default=None, type=str, help="path to the JSON report to write (default=auto)")
+    bench_ap.add_argument("-b", "--baseline", default=None, type=str, help="path to a previous JSON report to compare against")
+    batch_ap = subparsers.add_parser("batchsize", help="searches for the largest training batch size that fits in memory")
+    batch_ap.add_argument("-c", "--config", required=True, type=str, help="path to the session configuration file (or session directory)")
+    batch_ap.add_argument("-d", "--save-dir", required=True, type=str, help="path to the session output root directory")
+    batch_ap.add_argument("-o", "--output", default=None, type=str, help="path to the updated config file to write (default=auto)")
     return ap
 
 
@@ -575,6 +984,8 @@ def main(args=None, argparser=None):
         | :func:`thelper.cli.annotate_data`
         | :func:`thelper.cli.split_data`
         | :func:`thelper.cli.inference_session`
+        | :func:`thelper.cli.benchmark_session`
+        | :func:`thelper.cli.find_batch_size`
     """
     args = setup(args=args, argparser=argparser)
     if isinstance(args, int):
@@ -588,7 +999,8 @@ def main(args=None, argparser=None):
             if device is not None:
                 raise AssertionError("cannot specify device in config for cluster sessions, it is determined at runtime")
         backup_ext=args.backup_ext
-        create_session(config, args.save_dir, backup_ext=backup_ext)
+        nprocs, backend = getattr(args, "nprocs", 1), getattr(args, "dist_backend", "gloo")
+        create_session(config, args.save_dir, backup_ext=backup_ext, nprocs=nprocs, backend=backend)
     elif args.mode == "resume":
         ckptdata = None
         if args.ckpt_path is not None:
@@ -603,7 +1015,8 @@ def main(args=None, argparser=None):
             save_dir = thelper.utils.get_checkpoint_session_root(args.ckpt_path)
         if save_dir is None:
             save_dir = thelper.utils.get_save_dir(out_root=None, dir_name=None, config=override_config)
-        resume_session(ckptdata, save_dir, config=override_config, eval_only=args.eval_only, task_compat=args.task_compat)
+        resume_session(ckptdata, save_dir, config=override_config, eval_only=args.eval_only, task_compat=args.task_compat,
+                       nprocs=args.nprocs, backend=args.dist_backend)
     elif args.mode == "infer":
         thelper.logger.debug(f"parsing config at: {args.config}")
         config = thelper.utils.load_config(args.config)
@@ -617,6 +1030,11 @@ def main(args=None, argparser=None):
             annotate_data(config, args.save_dir)
         elif args.mode == "export":
             export_model(config, args.save_dir)
+        elif args.mode == "bench":
+            report = benchmark_session(config, args.save_dir, report_path=args.output, baseline_path=args.baseline)
+            return 1 if report.get("regressions") else 0
+        elif args.mode == "batchsize":
+            find_batch_size(config, args.save_dir, output_path=args.output)
         else:  # if args.mode == "split":
             split_data(config, args.save_dir)
     return 0
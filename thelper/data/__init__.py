@@ -14,6 +14,8 @@ import thelper.data.parsers  # noqa: F401
 import thelper.data.pascalvoc  # noqa: F401
 import thelper.data.samplers  # noqa: F401
 import thelper.data.utils  # noqa: F401
+from thelper.data.loaders import BatchCache  # noqa: F401
+from thelper.data.loaders import CachedDataLoader  # noqa: F401
 from thelper.data.loaders import DataLoader  # noqa: F401
 from thelper.data.loaders import DataLoaderWrapper  # noqa: F401
 from thelper.data.loaders import default_collate  # noqa: F401
@@ -28,6 +30,7 @@ from thelper.data.parsers import SuperResDataset  # noqa: F401
 from thelper.data.parsers import ImageCopyDataset # noqa: F401
 
 from thelper.data.pascalvoc import PASCALVOC  # noqa: F401
+from thelper.data.samplers import ShardedSampler  # noqa: F401
 from thelper.data.samplers import SubsetRandomSampler  # noqa: F401
 from thelper.data.samplers import SubsetSequentialSampler  # noqa: F401
 from thelper.data.samplers import WeightedSubsetRandomSampler  # noqa: F401
@@ -36,6 +39,7 @@ from thelper.data.utils import create_loaders  # noqa: F401
 from thelper.data.utils import create_parsers  # noqa: F401
 from thelper.data.utils import get_class_weights  # noqa: F401
 from thelper.tasks.detect import BoundingBox  # noqa: F401
+from thelper.tasks.detect import BoundingBoxArray  # noqa: F401
 
 logger = logging.getLogger("thelper.data")
 
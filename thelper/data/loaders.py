@@ -4,10 +4,16 @@ This module contains a dataset loader specialization used to properly seed sampl
 """
 
 import copy
+import functools
+import itertools
 import logging
 import math
+import os
+import pickle
+import platform
 import random
 import sys
+import tempfile
 import time
 from collections import Counter
 
@@ -24,13 +30,42 @@ import thelper.utils
 logger = logging.getLogger(__name__)
 
 
-def default_collate(batch, force_tensor=True):
+def _get_shared_stack_output(batch, memory_format=None):
+    """Returns a tensor allocated in shared memory in which a list of tensors can be stacked in a given memory format.
+
+    As in PyTorch's own ``default_collate``, background workers stack their minibatches directly into shared memory
+    to avoid an extra copy when sending them to the main process. The default memory format is contiguous.
+    """
+    elem = batch[0]
+    size = (len(batch), *elem.shape)
+    numel = sum([x.numel() for x in batch])
+    if not hasattr(elem, "untyped_storage"):  # pragma: no cover  (torch < 2.0)
+        out = elem.new(elem.storage()._new_shared(numel))
+        if memory_format is None:
+            return out.resize_(size)
+        return out.as_strided(size, torch.empty(size, memory_format=memory_format, device="meta").stride())
+    strides = torch.empty(size, memory_format=memory_format or torch.contiguous_format, device="meta").stride()
+    storage = elem.untyped_storage()._new_shared(numel * elem.element_size(), device=elem.device)
+    return torch.empty(0, dtype=elem.dtype, device=elem.device).set_(storage, 0, size, strides)
+
+
+def _get_stack_output(batch, memory_format, shared):
+    """Returns the (possibly shared) tensor in which a list of 3D tensors should be stacked in a given memory format."""
+    if not shared:
+        return torch.empty((len(batch), *batch[0].shape), dtype=batch[0].dtype, memory_format=memory_format)
+    return _get_shared_stack_output(batch, memory_format)
+
+
+def default_collate(batch, force_tensor=True, memory_format=None):
     """Puts each data field into a tensor with outer dimension batch size.
 
     This function is copied from PyTorch's `torch.utils.data._utils.collate.default_collate`, but
     additionally supports custom objects from the framework (such as bounding boxes). These will not
     be converted to tensors, and it will be up to the trainer to handle them accordingly.
 
+    If a memory format is provided (e.g. ``torch.channels_last``), 3D (CHW) tensors will be stacked
+    directly into a 4D minibatch tensor in that format, without requiring a separate copy later.
+
     See ``torch.utils.data.DataLoader`` for more information.
     """
     from torch._six import container_abcs, string_classes, int_classes
@@ -42,27 +77,24 @@ def default_collate(batch, force_tensor=True):
         return None  # compress and return entire field as unavailable
     elif isinstance(batch[0], torch.Tensor):
         out = None
+        if memory_format is not None and memory_format != torch.contiguous_format and batch[0].dim() == 3:
+            out = _get_stack_output(batch, memory_format, shared=torch.utils.data.get_worker_info() is not None)
+            return torch.stack(batch, 0, out=out)
         if torch_ver[0] > 1 or torch_ver[1] > 1:  # ver > 1.1
             if torch.utils.data.get_worker_info() is not None:
-                numel = sum([x.numel() for x in batch])
-                storage = batch[0].storage()._new_shared(numel)
-                out = batch[0].new(storage)
+                out = _get_shared_stack_output(batch)
             return torch.stack(batch, 0, out=out)
         elif torch_ver[0] == 1 and torch_ver[1] == 1:  # ver == 1.1  # pragma: no cover
             if torch.utils.data._utils.collate._use_shared_memory:
                 # If we're in a background process, concatenate directly into a
                 # shared memory tensor to avoid an extra copy
-                numel = sum([x.numel() for x in batch])
-                storage = batch[0].storage()._new_shared(numel)
-                out = batch[0].new(storage)
+                out = _get_shared_stack_output(batch)
             return torch.stack(batch, 0, out=out)
         else:  # ver < 1.1  # pragma: no cover
             if torch.utils.data.dataloader._use_shared_memory:
                 # If we're in a background process, concatenate directly into a
                 # shared memory tensor to avoid an extra copy
-                numel = sum([x.numel() for x in batch])
-                storage = batch[0].storage()._new_shared(numel)
-                out = batch[0].new(storage)
+                out = _get_shared_stack_output(batch)
             return torch.stack(batch, 0, out=out)
     elif elem_type.__module__ == 'numpy' and elem_type.__name__ != 'str_' and \
             elem_type.__name__ != 'string_':
@@ -76,7 +108,7 @@ def default_collate(batch, force_tensor=True):
                 import re
                 if re.search('[SaUO]', elem.dtype.str) is not None:
                     raise TypeError(error_msg_fmt.format(elem.dtype))
-            return default_collate([torch.from_numpy(b) for b in batch], force_tensor=force_tensor)
+            return default_collate([torch.from_numpy(b) for b in batch], force_tensor=force_tensor, memory_format=memory_format)
         if elem.shape == ():  # scalars  # pragma: no cover
             # simplified as of PyTorch v1.2.0, and similar to <1.1.0
             return torch.as_tensor(batch)
@@ -87,28 +119,90 @@ def default_collate(batch, force_tensor=True):
     elif isinstance(batch[0], string_classes):
         return batch
     elif isinstance(batch[0], container_abcs.Mapping):
-        return {key: default_collate([d[key] for d in batch], force_tensor=force_tensor) for key in batch[0]}
+        return {key: default_collate([d[key] for d in batch], force_tensor=force_tensor, memory_format=memory_format)
+                for key in batch[0]}
     elif isinstance(batch[0], tuple) and hasattr(batch[0], '_fields'):  # namedtuple
-        return type(batch[0])(*(default_collate(samples, force_tensor=force_tensor) for samples in zip(*batch)))
+        return type(batch[0])(*(default_collate(samples, force_tensor=force_tensor, memory_format=memory_format)
+                                for samples in zip(*batch)))
+    elif isinstance(batch[0], thelper.data.BoundingBoxArray):
+        return list(batch)  # each image keeps its own array; they are concatenated only when needed
     elif isinstance(batch[0], container_abcs.Sequence):
         if isinstance(batch, list) and all([isinstance(lbl, list) for lbl in batch]) and \
                 all([isinstance(b, thelper.data.BoundingBox) for lbl in batch for b in lbl]):
             return batch
         transposed = zip(*batch)
-        return [default_collate(samples, force_tensor=force_tensor) for samples in transposed]
+        return [default_collate(samples, force_tensor=force_tensor, memory_format=memory_format) for samples in transposed]
     assert not force_tensor, error_msg_fmt.format(type(batch[0]))
     return batch
 
 
+_stage_stats_key = "_transforms_stage_stats"
+
+
+def _collate_with_stage_stats(batch, collate_fn):
+    """Collates a batch and attaches the transform stage stats accumulated in the current process to it."""
+    batch = collate_fn(batch)
+    stats = thelper.transforms.utils.get_stage_stats(reset=True)
+    if isinstance(batch, dict):
+        batch[_stage_stats_key] = stats
+    return batch
+
+
+class _ResumableSampler(torch.utils.data.sampler.Sampler):
+    """Sampler proxy that records the index order generated for each epoch, and that can resume from a position.
+
+    All attributes that are not defined here (e.g. ``epoch`` or ``set_epoch``) are forwarded to the wrapped sampler.
+    """
+
+    def __init__(self, sampler):
+        self.sampler = sampler
+        self.indices = None  # indices generated for the current (latest) epoch
+        self.resume_indices, self.resume_offset = None, 0
+
+    def __getattr__(self, name):
+        if name.startswith("__") or name in ["sampler", "indices", "resume_indices", "resume_offset"]:
+            raise AttributeError(name)  # avoids infinite recursions while the object is copied/unpickled
+        return getattr(self.sampler, name)
+
+    def __iter__(self):
+        offset = 0
+        if self.resume_indices is not None:
+            self.indices, offset = self.resume_indices, self.resume_offset
+            self.resume_indices, self.resume_offset = None, 0
+        else:
+            self.indices = list(self.sampler)
+        return iter(self.indices[offset:])
+
+    def __len__(self):
+        return len(self.sampler)
+
+
 class DataLoader(torch.utils.data.DataLoader):
     """Specialized data loader used to load minibatches from a dataset parser.
 
-    This specialization handles the seeding of samplers and workers.
+    This specialization handles the seeding of samplers and workers. It can also profile the transform
+    stages of the dataset in each worker (see :func:`thelper.transforms.utils.set_stage_profiling`). In
+    that case, the statistics of each worker are attached to the (dictionary-based) minibatches they
+    produce, and they are accumulated in the ``stage_stats`` attribute of the loader in the main process
+    over the current epoch.
+
+    When a sampler is provided, the sample index order it generates for each epoch is recorded so that
+    the loader can be resumed mid-epoch (see :meth:`get_resume_state` and :meth:`set_resume_state`). The
+    samples of the minibatches that were already processed are never loaded again in that case.
 
     See ``torch.utils.data.DataLoader`` for more information on attributes/methods.
     """
-    def __init__(self, *args, seeds=None, epoch=0, collate_fn=default_collate, **kwargs):
+    def __init__(self, *args, seeds=None, epoch=0, collate_fn=default_collate, profile_transforms=False, **kwargs):
+        self.profile_transforms = thelper.utils.str2bool(profile_transforms)
+        self._base_collate_fn = collate_fn  # kept to clone the loader without stacking profiling wrappers
+        if self.profile_transforms:
+            collate_fn = functools.partial(_collate_with_stage_stats, collate_fn=collate_fn)
+        if kwargs.get("sampler", None) is not None and kwargs.get("batch_sampler", None) is None:
+            kwargs["sampler"] = _ResumableSampler(kwargs["sampler"])
         super().__init__(*args, collate_fn=collate_fn, worker_init_fn=self._worker_init_fn, **kwargs)
+        self.start_batch_idx = 0  # index of the first minibatch of the current epoch (non-zero if resumed)
+        self._resume_batch_idx = 0
+        self.stage_stats = {}
         self.seeds = {}
         if seeds is not None:
             if not isinstance(seeds, dict):
@@ -118,22 +212,59 @@ class DataLoader(torch.utils.data.DataLoader):
             raise AssertionError("invalid epoch value")
         self.epoch = epoch
         self.num_workers = kwargs["num_workers"] if "num_workers" in kwargs else 0
+        # the processes of a distributed session share seeds, but their transforms should not draw the same values
+        self.rank_seed_offset = thelper.utils.get_distributed_info()[0] * 100003
 
     def __iter__(self):
         """Advances the epoch number for the workers initialization function."""
         self.set_epoch(self.epoch)  # preset for all attributes
         if self.num_workers == 0:
+            seed_offset = self.rank_seed_offset + self.epoch
             if "torch" in self.seeds:
-                torch.manual_seed(self.seeds["torch"] + self.epoch)
-                torch.cuda.manual_seed_all(self.seeds["torch"] + self.epoch)
+                torch.manual_seed(self.seeds["torch"] + seed_offset)
+                torch.cuda.manual_seed_all(self.seeds["torch"] + seed_offset)
             if "numpy" in self.seeds:
-                np.random.seed(self.seeds["numpy"] + self.epoch)
+                np.random.seed(self.seeds["numpy"] + seed_offset)
             if "random" in self.seeds:
-                random.seed(self.seeds["random"] + self.epoch)
+                random.seed(self.seeds["random"] + seed_offset)
+            thelper.transforms.utils.set_stage_profiling(self.profile_transforms)
+        self.start_batch_idx, self._resume_batch_idx = self._resume_batch_idx, 0
         result = super().__iter__()
         self.epoch += 1
+        if self.profile_transforms:
+            self.stage_stats.clear()  # cleared in-place, as wrappers might share this dict
+            return self._pop_stage_stats(result)
         return result
 
+    def _pop_stage_stats(self, iterator):
+        """Removes the transform stage stats from the loaded minibatches and accumulates them."""
+        for batch in iterator:
+            if isinstance(batch, dict) and _stage_stats_key in batch:
+                thelper.transforms.utils.merge_stage_stats(self.stage_stats, batch.pop(_stage_stats_key))
+            yield batch
+
+    def clone(self, **kwargs):
+        """Returns a new loader over the same dataset and sampler, with some of its parameters overridden.
+
+        This is useful to benchmark or tune the loading parameters (e.g. ``batch_size`` or ``num_workers``) without
+        recreating the dataset parsers. The new loader starts at the current epoch of this loader.
+        """
+        params = {"dataset": self.dataset, "num_workers": self.num_workers, "collate_fn": self._base_collate_fn,
+                  "pin_memory": self.pin_memory, "timeout": self.timeout, "seeds": self.seeds, "epoch": self.epoch,
+                  "profile_transforms": self.profile_transforms}
+        if self.num_workers > 0:
+            params.update(prefetch_factor=self.prefetch_factor, persistent_workers=self.persistent_workers)
+        if self.batch_size is not None:
+            sampler = self.sampler.sampler if isinstance(self.sampler, _ResumableSampler) else self.sampler
+            params.update(batch_size=self.batch_size, sampler=sampler, drop_last=self.drop_last)
+        else:
+            params["batch_sampler"] = self.batch_sampler
+        params.update(kwargs)
+        if params["num_workers"] == 0:  # these cannot be specified without worker processes
+            params.pop("prefetch_factor", None)
+            params.pop("persistent_workers", None)
+        return DataLoader(**params)
+
     def set_epoch(self, epoch=0):
         """Sets the current epoch number in order to offset RNG states for the workers and the sampler."""
         if not isinstance(epoch, int) or epoch < 0:
@@ -148,9 +279,35 @@ class DataLoader(torch.utils.data.DataLoader):
             if hasattr(self.dataset.transforms, "set_epoch") and callable(self.dataset.transforms.set_epoch):
                 self.dataset.transforms.set_epoch(epoch)
 
+    def get_resume_state(self, batch_idx):
+        """Returns the state required to resume the current epoch at the given minibatch index.
+
+        The state contains the sample index order generated by the sampler for the current epoch, and it
+        can be restored via :meth:`set_resume_state`. If no sampler is used, ``None`` is returned instead.
+        """
+        if not isinstance(self.sampler, _ResumableSampler) or self.sampler.indices is None:
+            return None
+        assert 0 <= batch_idx <= len(self), "invalid minibatch index"
+        return {"epoch": self.epoch - 1, "batch_idx": batch_idx, "indices": list(self.sampler.indices)}
+
+    def set_resume_state(self, state):
+        """Prepares the loader to resume an epoch using a state obtained from :meth:`get_resume_state`.
+
+        On the next iteration over the loader, the sample index order of the interrupted epoch will be reused,
+        and only the minibatches starting from the saved index will be loaded. The index of the first loaded
+        minibatch will be available via the ``start_batch_idx`` attribute. Returns that index.
+        """
+        assert isinstance(self.sampler, _ResumableSampler), "loader cannot be resumed without a sampler"
+        assert isinstance(state, dict) and all([k in state for k in ["batch_idx", "indices"]]), "invalid resume state"
+        batch_idx = state["batch_idx"]
+        self.sampler.resume_indices = state["indices"]
+        self.sampler.resume_offset = batch_idx * self.batch_size
+        self._resume_batch_idx = batch_idx
+        return batch_idx
+
     def _worker_init_fn(self, worker_id):
         """Sets up the RNGs state of each worker based on their unique id and the epoch number."""
-        seed_offset = self.num_workers * self.epoch
+        seed_offset = self.rank_seed_offset + self.num_workers * self.epoch
         if "torch" in self.seeds:
             torch.manual_seed(self.seeds["torch"] + seed_offset + worker_id)
             torch.cuda.manual_seed_all(self.seeds["torch"] + seed_offset + worker_id)
@@ -158,6 +315,7 @@ class DataLoader(torch.utils.data.DataLoader):
             np.random.seed(self.seeds["numpy"] + seed_offset + worker_id)
         if "random" in self.seeds:
             random.seed(self.seeds["random"] + seed_offset + worker_id)
+        thelper.transforms.utils.set_stage_profiling(self.profile_transforms)
 
     @property
     def sample_count(self):
@@ -182,6 +340,207 @@ class DataLoaderWrapper(DataLoader):
             yield self._callback(sample)
 
 
+class BatchCache:
+    """Minibatch storage used to stream the minibatches of a loader without loading them again.
+
+    The minibatches are stored either as-is in RAM (``storage="ram"``), or with their tensors written in a
+    memory-mapped file (``storage="memmap"``) in the given directory. In the latter case, the other objects of
+    the minibatches are kept in an index that is saved along with the file, so that the cache can be reloaded by
+    another session (e.g. when resuming). Minibatches are only added while the total size of their tensors
+    stays under ``max_bytes`` (zero means unlimited); once a minibatch does not fit, the cache is ``full``.
+
+    The cache is tied to a ``hash`` of the loader configuration it was built for; see :class:`CachedDataLoader`.
+    """
+
+    def __init__(self, storage="ram", max_bytes=0, cache_dir=None, name="batches"):
+        assert storage in ["ram", "memmap"], f"unexpected cache storage type '{storage}'"
+        assert max_bytes >= 0, "cache size budget should be positive (or zero, if unlimited)"
+        self.storage, self.max_bytes = storage, max_bytes
+        self.data_path, self.index_path = None, None
+        if storage == "memmap":
+            if cache_dir is None:
+                cache_dir = tempfile.mkdtemp(prefix="thelper-cache-")
+            os.makedirs(cache_dir, exist_ok=True)
+            self.data_path = os.path.join(cache_dir, name + ".bin")
+            self.index_path = os.path.join(cache_dir, name + ".index.pkl")
+        self._memmap = None  # lazily (re)opened after the data file grows
+        if not self._load():
+            self.reset()
+
+    def _load(self):
+        """Reloads the index of a previously saved memory-mapped cache, and returns whether it was found."""
+        if self.index_path is None or not os.path.isfile(self.index_path) or not os.path.isfile(self.data_path):
+            return False
+        with open(self.index_path, "rb") as fd:
+            index = pickle.load(fd)
+        if os.path.getsize(self.data_path) < index["nbytes"]:
+            return False
+        for key in ["hash", "batches", "nbytes", "full", "complete", "resume_state"]:
+            setattr(self, key, index[key])
+        return True
+
+    def reset(self, cache_hash=None):
+        """Removes all minibatches from the cache, and ties it to a new loader configuration hash."""
+        self.hash, self.batches, self.nbytes = cache_hash, [], 0
+        self.full, self.complete, self.resume_state = False, False, None
+        if self.data_path is not None:
+            self._memmap = None
+            open(self.data_path, "wb").close()
+
+    def save(self):
+        """Saves the index of the minibatches stored in the memory-mapped file (no-op for RAM storage)."""
+        if self.index_path is not None:
+            with open(self.index_path, "wb") as fd:
+                pickle.dump({"hash": self.hash, "batches": self.batches, "nbytes": self.nbytes, "full": self.full,
+                             "complete": self.complete, "resume_state": self.resume_state}, fd)
+
+    def append(self, batch):
+        """Adds a minibatch to the cache if it fits in the budget, and returns whether it was added."""
+        if self.full:
+            return False
+        batch_nbytes = self._get_nbytes(batch)
+        if self.max_bytes and self.nbytes + batch_nbytes > self.max_bytes:
+            self.full = True
+            return False
+        if self.data_path is not None:
+            with open(self.data_path, "ab") as fd:
+                batch = self._pack(batch, fd)
+            self._memmap = None
+        self.batches.append(batch)
+        self.nbytes += batch_nbytes
+        return True
+
+    def __len__(self):
+        return len(self.batches)
+
+    def __getitem__(self, idx):
+        batch = self.batches[idx]
+        if self.data_path is not None:
+            if self._memmap is None:
+                self._memmap = np.memmap(self.data_path, dtype=np.uint8, mode="r")
+            return self._unpack(batch)
+        return dict(batch) if isinstance(batch, dict) else batch  # shallow copy, keys may be overwritten by the user
+
+    @staticmethod
+    def _get_nbytes(data):
+        if isinstance(data, torch.Tensor):
+            return data.element_size() * data.nelement()
+        if isinstance(data, dict):
+            data = list(data.values())
+        if isinstance(data, (list, tuple)):
+            return sum([BatchCache._get_nbytes(val) for val in data])
+        return 0
+
+    def _pack(self, data, fd):
+        """Writes the tensors of a minibatch in the data file, and returns the minibatch with references to them."""
+        if isinstance(data, torch.Tensor):
+            offset, nbytes = fd.tell(), data.element_size() * data.nelement()
+            fd.write(data.detach().cpu().contiguous().reshape(-1).view(torch.uint8).numpy().tobytes())
+            return _CachedTensor(offset, nbytes, str(data.dtype).split(".")[-1], tuple(data.shape))
+        if isinstance(data, dict):
+            return {key: self._pack(val, fd) for key, val in data.items()}
+        if isinstance(data, (list, tuple)):
+            return type(data)([self._pack(val, fd) for val in data])
+        return data
+
+    def _unpack(self, data):
+        """Returns a copy of a packed minibatch with its tensors read back from the memory-mapped file."""
+        if isinstance(data, _CachedTensor):
+            buffer = np.array(self._memmap[data.offset:data.offset + data.nbytes])
+            return torch.from_numpy(buffer).view(getattr(torch, data.dtype)).reshape(data.shape)
+        if isinstance(data, dict):
+            return {key: self._unpack(val) for key, val in data.items()}
+        if isinstance(data, (list, tuple)):
+            return type(data)([self._unpack(val) for val in data])
+        return data
+
+
+class _CachedTensor:
+    """Reference to a tensor stored in the memory-mapped file of a :class:`BatchCache`."""
+
+    def __init__(self, offset, nbytes, dtype, shape):
+        self.offset, self.nbytes, self.dtype, self.shape = offset, nbytes, dtype, shape
+
+
+class CachedDataLoader(DataLoader):
+    """Data loader wrapper that caches the minibatches it produces and streams them back in later epochs.
+
+    The minibatches of the first epoch are stored in a :class:`BatchCache` as they are loaded, collated, and
+    transformed, and the following epochs are streamed from the cache. This is only meant for loaders whose
+    samples and transforms are deterministic (e.g. for validation), as the cached minibatches are reused as-is.
+    If the cache size budget is exceeded, the remaining minibatches are loaded normally in each epoch; when the
+    loader supports it, the samples of the cached minibatches are then skipped without being loaded.
+
+    The cache is invalidated (and filled again) when the hash of the loader configuration changes, i.e. when the
+    dataset parsers or their transforms, the sampled indices, the batch size, or the collate function change.
+
+    The wrapped data loader should be compatible with :class:`thelper.data.loaders.DataLoader`.
+    """
+
+    def __init__(self, loader, cache):
+        self.__class__ = type(loader.__class__.__name__, (self.__class__, loader.__class__), {})
+        self.__dict__ = {**loader.__dict__, "_wrapped_loader": loader, "_cache": cache}
+
+    @property
+    def cache(self):
+        return self._cache
+
+    def get_cache_hash(self):
+        """Returns the hash of the loader configuration that the cached minibatches depend on."""
+        loader = self._wrapped_loader
+        datasets = loader.dataset.datasets if isinstance(loader.dataset, torch.utils.data.ConcatDataset) else [loader.dataset]
+        samplers, sampler = [], loader.sampler
+        sampler = sampler.sampler if isinstance(sampler, _ResumableSampler) else sampler
+        while isinstance(sampler, torch.utils.data.sampler.Sampler):
+            samplers.append((type(sampler).__qualname__, getattr(sampler, "indices", None),
+                             getattr(sampler, "rank", None), getattr(sampler, "num_replicas", None)))
+            sampler = getattr(sampler, "sampler", None)  # e.g. for sharded samplers
+        return thelper.utils.get_params_hash([(repr(d), repr(getattr(d, "transforms", None)), len(d)) for d in datasets],
+                                             samplers, loader.batch_size, loader.drop_last, repr(loader._base_collate_fn))
+
+    def set_epoch(self, epoch=0):
+        super().set_epoch(epoch)
+        self._wrapped_loader.set_epoch(epoch)
+
+    def clone(self, **kwargs):
+        """Returns a new cached loader with some of its parameters overridden (the cache is invalidated if needed)."""
+        return CachedDataLoader(self._wrapped_loader.clone(**kwargs), self._cache)
+
+    def __iter__(self):
+        cache, loader = self._cache, self._wrapped_loader
+        cache_hash = self.get_cache_hash()
+        if cache.hash != cache_hash:
+            if cache.hash is not None:
+                logger.info("loader configuration changed, will invalidate the cached minibatches")
+            cache.reset(cache_hash)
+        cached_count = len(cache)
+        for batch_idx in range(cached_count):
+            yield cache[batch_idx]
+        if cache.complete:
+            return
+        if cached_count and cache.resume_state is not None:
+            loader.set_resume_state(cache.resume_state)
+            iterator = iter(loader)
+        else:
+            iterator = itertools.islice(iter(loader), cached_count, None)
+        batch_idx = cached_count
+        try:
+            for batch in iterator:
+                if len(cache) == batch_idx and not cache.full:
+                    cache.append(batch)
+                batch_idx += 1
+                yield batch
+            cache.complete = not cache.full and len(cache) == batch_idx
+        finally:
+            if not cache.complete and len(cache) > cached_count and hasattr(loader, "get_resume_state"):
+                # the samples of the cached minibatches will be skipped in the next epochs by resuming the loader
+                cache.resume_state = loader.get_resume_state(len(cache))
+            if len(cache) > cached_count or cache.complete:
+                cache.save()
+                logger.debug(f"cached {len(cache)} minibatches ({cache.nbytes / 2 ** 20:.1f} MB in {cache.storage})" +
+                             ("" if cache.complete else ", cache is incomplete"))
+
+
 class LoaderFactory:
     """Factory used for preparing and splitting dataset parsers into usable data loader objects.
 
@@ -221,6 +580,12 @@ class LoaderFactory:
         self.train_collate_fn = thelper.utils.import_function(thelper.utils.get_key_def("train_collate_fn", config, default_collate_fn))
         self.valid_collate_fn = thelper.utils.import_function(thelper.utils.get_key_def("valid_collate_fn", config, default_collate_fn))
         self.test_collate_fn = thelper.utils.import_function(thelper.utils.get_key_def("test_collate_fn", config, default_collate_fn))
+        self.memory_format = thelper.utils.get_memory_format(thelper.utils.get_key_def("memory_format", config, None))
+        if self.memory_format is not None:
+            # only the framework's collate function knows how to stack minibatches in a specific memory format
+            self.train_collate_fn, self.valid_collate_fn, self.test_collate_fn = \
+                [functools.partial(default_collate, memory_format=self.memory_format) if fn is default_collate else fn
+                 for fn in [self.train_collate_fn, self.valid_collate_fn, self.test_collate_fn]]
         self.train_shuffle = thelper.utils.str2bool(thelper.utils.get_key_def(["shuffle", "train_shuffle"], config, True))
         self.valid_shuffle = thelper.utils.str2bool(thelper.utils.get_key_def(["shuffle", "valid_shuffle"], config, False))
         self.test_shuffle = thelper.utils.str2bool(thelper.utils.get_key_def(["shuffle", "test_shuffle"], config, False))
@@ -230,6 +595,11 @@ class LoaderFactory:
         torch_seed = self._get_seed(["torch_seed"], config, int)
         numpy_seed = self._get_seed(["numpy_seed"], config, int)
         random_seed = self._get_seed(["random_seed"], config, int)
+        if thelper.utils.get_distributed_info()[1] > 1:
+            # all processes of a distributed session must split and shuffle the samples identically
+            seeds = [test_seed, valid_seed, torch_seed, numpy_seed, random_seed]
+            torch.distributed.broadcast_object_list(seeds, src=0)
+            test_seed, valid_seed, torch_seed, numpy_seed, random_seed = seeds
         torch.manual_seed(torch_seed)
         torch.cuda.manual_seed_all(torch_seed)
         np.random.seed(numpy_seed)
@@ -242,6 +612,8 @@ class LoaderFactory:
             "random": random_seed
         }
         self.workers = config["workers"] if "workers" in config and config["workers"] >= 0 else 1
+        self.prefetch_factor = thelper.utils.get_key_def("prefetch_factor", config, None)
+        assert self.prefetch_factor is None or int(self.prefetch_factor) > 0, "prefetch factor should be strictly positive integer"
         self.pin_memory = thelper.utils.str2bool(config["pin_memory"]) if "pin_memory" in config else False
         self.drop_last = thelper.utils.str2bool(config["drop_last"]) if "drop_last" in config else False
         default_sampler_config = None
@@ -266,8 +638,11 @@ class LoaderFactory:
         self.valid_augments, self.valid_augments_append = self._get_augments(valid_augs_targets, "valid", config)
         self.test_augments, self.test_augments_append = self._get_augments(test_augs_targets, "test", config)
         self.base_transforms = None
+        self.fuse_transforms = thelper.utils.str2bool(thelper.utils.get_key_def("fuse_transforms", config, False))
+        self.profile_transforms = thelper.utils.str2bool(thelper.utils.get_key_def("profile_transforms", config, False))
         if "base_transforms" in config and config["base_transforms"]:
-            self.base_transforms = thelper.transforms.load_transforms(config["base_transforms"])
+            self.base_transforms = thelper.transforms.load_transforms(config["base_transforms"],
+                                                                      fuse=self.fuse_transforms)
         self.train_split = self._get_ratios_split("train", config)
         self.valid_split = self._get_ratios_split("valid", config)
         self.test_split = self._get_ratios_split("test", config)
@@ -299,6 +674,8 @@ class LoaderFactory:
                         if name in subset:
                             subset[name] /= usage
         self.skip_verif = thelper.utils.str2bool(config["skip_verif"]) if "skip_verif" in config else True
+        self.autotune = self._get_autotune_config(thelper.utils.get_key_def("autotune", config, None))
+        self.valid_cache = self._get_cache_config(thelper.utils.get_key_def("valid_cache", config, None))
         logger.debug("batch sizes:" +
                      (f"\n\ttrain = {self.train_batch_size}" if self.train_split else "") +
                      (f"\n\tvalid = {self.valid_batch_size}" if self.valid_split else "") +
@@ -313,6 +690,10 @@ class LoaderFactory:
                      (f"\n\ttest = {self.test_scale}" if self.test_split else ""))
         if self.drop_last:
             logger.debug("loaders will drop last batch if sample count not multiple of batch size")
+        if self.autotune:
+            logger.debug(f"loaders will be auto-tuned using:\n\t{self.autotune}")
+        if self.valid_cache:
+            logger.debug(f"validation minibatches will be cached using:\n\t{self.valid_cache}")
         if self.base_transforms:
             logger.debug("base transforms: %s" % str(self.base_transforms))
 
@@ -351,6 +732,54 @@ class LoaderFactory:
                 return augments, augments_append
         return None, False
 
+    def _get_autotune_config(self, config):
+        """Parses the loader auto-tuning settings, returning ``None`` if auto-tuning is disabled."""
+        if config is None or isinstance(config, (bool, str)):
+            if config is None or not thelper.utils.str2bool(config):
+                return None
+            config = {}
+        assert isinstance(config, dict), "invalid autotune config (should be dict or bool)"
+        set_name = thelper.utils.get_key_def("set", config, "train")
+        assert set_name in ["train", "valid", "test"], f"invalid autotune set name '{set_name}'"
+        max_workers = os.cpu_count() or 1
+        default_workers = [0, self.workers] + [2 ** p for p in range(int(math.log2(max_workers)) + 1)]
+        default_batch_size = getattr(self, f"{set_name}_batch_size")
+        autotune = {
+            "set": set_name,
+            "num_workers": sorted({int(w) for w in thelper.utils.get_key_def("num_workers", config, default_workers)}),
+            "batch_sizes": sorted({int(b) for b in thelper.utils.get_key_def("batch_sizes", config, [default_batch_size])}),
+            "prefetch_factors": sorted({int(p) for p in thelper.utils.get_key_def(
+                "prefetch_factors", config, [self.prefetch_factor or 2])}),
+            "iters": int(thelper.utils.get_key_def("iters", config, 10)),
+            "memory_budget_mb": float(thelper.utils.get_key_def("memory_budget_mb", config, 0)),
+            "tolerance": float(thelper.utils.get_key_def("tolerance", config, 0.05)),
+        }
+        assert autotune["num_workers"] and all([w >= 0 for w in autotune["num_workers"]]), "invalid autotune worker counts"
+        assert autotune["batch_sizes"] and all([b > 0 for b in autotune["batch_sizes"]]), "invalid autotune batch sizes"
+        assert autotune["prefetch_factors"] and all([p > 0 for p in autotune["prefetch_factors"]]), \
+            "invalid autotune prefetch factors"
+        assert autotune["iters"] > 0, "autotune iteration count should be strictly positive"
+        assert autotune["memory_budget_mb"] >= 0, "autotune memory budget should be positive (or zero, if unlimited)"
+        assert autotune["tolerance"] >= 0, "autotune tolerance should be positive"
+        return autotune
+
+    @staticmethod
+    def _get_cache_config(config):
+        """Parses the minibatch cache settings, returning ``None`` if caching is disabled."""
+        if config is None or isinstance(config, (bool, str)):
+            if config is None or not thelper.utils.str2bool(config):
+                return None
+            config = {}
+        assert isinstance(config, dict), "invalid cache config (should be dict or bool)"
+        cache_config = {
+            "storage": str(thelper.utils.get_key_def("storage", config, "ram")).lower(),
+            "max_size_mb": float(thelper.utils.get_key_def("max_size_mb", config, 1024)),
+            "dir": thelper.utils.get_key_def("dir", config, None),
+        }
+        assert cache_config["storage"] in ["ram", "memmap"], f"unexpected cache storage type '{cache_config['storage']}'"
+        assert cache_config["max_size_mb"] >= 0, "cache size budget should be positive (or zero, if unlimited)"
+        return cache_config
+
     def _get_raw_split(self, indices):
         for name in self.total_usage:
             assert name in indices, f"dataset '{name}' does not exist"
@@ -508,7 +937,7 @@ class LoaderFactory:
             train_idxs, valid_idxs, test_idxs = self._get_raw_split(dataset_indices)
         return train_idxs, valid_idxs, test_idxs
 
-    def create_loaders(self, datasets, train_idxs, valid_idxs, test_idxs):
+    def create_loaders(self, datasets, train_idxs, valid_idxs, test_idxs, save_dir=None):
         """Returns the data loaders for the train/valid/test sets based on a prior split.
 
         This function essentially takes the dataset parser interfaces and indices maps, and instantiates
@@ -516,11 +945,18 @@ class LoaderFactory:
         parsers will be deep-copied in each data loader, meaning that they should ideally not contain a
         persistent loading state or a large buffer.
 
+        If auto-tuning is enabled, the loading parameters are tuned once the loaders are created (see
+        :meth:`autotune_loaders`), and the loaders are rebuilt with the selected parameters. If the validation
+        cache is enabled, the validation loader is then wrapped in a :class:`CachedDataLoader`.
+
         Args:
             datasets: the map of dataset parsers, where each has a name (key) and a parser (value).
             train_idxs: training data samples indices map.
             valid_idxs: validation data samples indices map.
             test_idxs: test data samples indices map.
+            save_dir: the session directory where the auto-tuning results and the memory-mapped validation
+                cache are saved (and reloaded when resuming). If ``None``, the loaders will be tuned again on
+                every call, and the memory-mapped cache will be written in a temporary directory.
 
         Returns:
             A three-element tuple containing the training, validation, and test data loaders, respectively.
@@ -593,13 +1029,35 @@ class LoaderFactory:
                         assert scale == 1.0, "sequential sampler currently does not handle scale changes (turn on shuffling)"
                         sampler = thelper.data.SubsetSequentialSampler(loader_sample_idxs)
                 assert hasattr(sampler, "__len__")
+                world_size = thelper.utils.get_distributed_info()[1]
+                if world_size > 1:
+                    # evaluation shards are not padded so that merged metrics do not count duplicated samples twice,
+                    # unless some processes would get no samples at all (they must all forward at least once)
+                    is_train = not loaders  # loaders are created in train/valid/test order
+                    pad = is_train or len(sampler) < world_size
+                    if pad and not is_train:
+                        logger.warning("evaluation set is smaller than the process count, some of its samples will be "
+                                       "duplicated across processes and counted more than once by metrics")
+                    sampler = thelper.data.ShardedSampler(sampler, pad=pad)
                 assert batch_size > 0
+                prefetch_params = {"prefetch_factor": self.prefetch_factor} if self.prefetch_factor and self.workers > 0 else {}
                 loaders.append(DataLoader(dataset=dataset, batch_size=batch_size, sampler=sampler,
                                           num_workers=self.workers, collate_fn=collate_fn,
                                           pin_memory=self.pin_memory, drop_last=self.drop_last,
-                                          seeds=self.seeds))
+                                          seeds=self.seeds, profile_transforms=self.profile_transforms,
+                                          **prefetch_params))
             else:
                 loaders.append(None)
+        if self.autotune:
+            loaders = self.autotune_loaders(loaders, save_dir=save_dir)
+        if self.valid_cache and loaders[1]:
+            cache_dir = self.valid_cache["dir"]
+            if cache_dir is None and save_dir is not None:
+                cache_dir = os.path.join(save_dir, "cache")
+            rank, world_size = thelper.utils.get_distributed_info()
+            cache = BatchCache(storage=self.valid_cache["storage"], max_bytes=int(self.valid_cache["max_size_mb"] * 2 ** 20),
+                               cache_dir=cache_dir, name="valid" + (f"-rank{rank}" if world_size > 1 else ""))
+            loaders[1] = CachedDataLoader(loaders[1], cache)
         train_loader, valid_loader, test_loader = loaders
         logger.info("initialized loaders with batch counts:" +
                     (f"\n\ttrain = {len(train_loader)}" if train_loader else "") +
@@ -607,6 +1065,110 @@ class LoaderFactory:
                     (f"\n\ttest = {len(test_loader)}" if test_loader else ""))
         return train_loader, valid_loader, test_loader
 
+    def autotune_loaders(self, loaders, save_dir=None):
+        """Tunes the loading parameters using one of the given loaders, and returns the loaders rebuilt with them.
+
+        The candidate worker counts, batch sizes, and prefetch factors specified in the ``autotune`` field
+        of the configuration are probed on the loader of the tuned set (``train`` by default) for a few
+        minibatches each. The steady-state throughput (in samples per second) and the peak resident memory
+        of the process and its workers are measured for each candidate. Among the candidates that fit in
+        the memory budget, the configuration with the lowest memory usage whose throughput is within the
+        tolerance of the best throughput is selected. The worker count and prefetch factor are then applied
+        to all loaders, while the batch size is only applied to the loader of the tuned set.
+
+        If a session directory is provided, the decision is saved in its ``logs`` folder, and reused as long
+        as the host, the tuning settings, and the dataset size do not change (e.g. when resuming a session).
+        In distributed sessions, the tuning is done by the main process, and its decision is shared.
+        """
+        assert len(loaders) == 3, "expected train/valid/test loaders"
+        set_name = self.autotune["set"]
+        set_idx = ["train", "valid", "test"].index(set_name)
+        if not loaders[set_idx]:
+            logger.warning(f"cannot auto-tune loaders without {set_name} data; will keep default parameters")
+            return loaders
+        tuned_loader = loaders[set_idx]
+        autotune_hash = thelper.utils.get_params_hash(self.autotune, len(tuned_loader.dataset), tuned_loader.sample_count)
+        autotune_path = os.path.join(save_dir, "logs", "loader_autotune.json") if save_dir is not None else None
+        decision = None
+        if autotune_path is not None and os.path.isfile(autotune_path):
+            prev_decision = thelper.utils.load_config(autotune_path, add_name_if_missing=False)
+            if prev_decision.get("hash") == autotune_hash and prev_decision.get("host") == platform.node():
+                logger.info(f"reusing loader auto-tuning decision from '{autotune_path}'")
+                decision = prev_decision
+            else:
+                logger.info("previous loader auto-tuning decision is outdated; will tune again")
+        if decision is None and thelper.utils.is_main_process():
+            decision = self._autotune_loader(tuned_loader)
+            decision.update(hash=autotune_hash, host=platform.node())
+            if autotune_path is not None:
+                os.makedirs(os.path.dirname(autotune_path), exist_ok=True)
+                thelper.utils.save_config(decision, autotune_path)
+        if thelper.utils.get_distributed_info()[1] > 1:
+            decision = [decision]
+            torch.distributed.broadcast_object_list(decision, src=0)
+            decision = decision[0]
+        self.workers, self.prefetch_factor = decision["num_workers"], decision["prefetch_factor"]
+        setattr(self, f"{set_name}_batch_size", decision["batch_size"])
+        logger.info(f"auto-tuned loaders will use num_workers={self.workers}, prefetch_factor={self.prefetch_factor}, "
+                    f"and {set_name}_batch_size={decision['batch_size']}")
+        return [loader.clone(num_workers=self.workers, prefetch_factor=self.prefetch_factor,
+                             **({"batch_size": decision["batch_size"]} if idx == set_idx else {}))
+                if loader else loader for idx, loader in enumerate(loaders)]
+
+    def _autotune_loader(self, loader):
+        """Probes all candidate loading parameters on a loader, and returns the selected configuration."""
+        budget_mb, probes = self.autotune["memory_budget_mb"], []
+        for num_workers in self.autotune["num_workers"]:
+            # the prefetch factor is irrelevant without workers, so we only probe it once in that case
+            for prefetch_factor in self.autotune["prefetch_factors"] if num_workers > 0 else self.autotune["prefetch_factors"][:1]:
+                for batch_size in self.autotune["batch_sizes"]:
+                    probe_loader = loader.clone(num_workers=num_workers, batch_size=batch_size, prefetch_factor=prefetch_factor)
+                    samples_per_sec, rss_mb = self._probe_loader(probe_loader, self.autotune["iters"])
+                    probes.append({"num_workers": num_workers, "prefetch_factor": prefetch_factor, "batch_size": batch_size,
+                                   "samples_per_sec": samples_per_sec, "rss_mb": rss_mb,
+                                   "in_budget": not budget_mb or rss_mb is None or rss_mb <= budget_mb})
+        logger.info("loader auto-tuning probes:\n\t" + "\n\t".join([
+            f"workers={p['num_workers']:<3} prefetch={p['prefetch_factor']:<3} batch={p['batch_size']:<5} "
+            f"{p['samples_per_sec']:10.1f} samples/sec   " + (f"{p['rss_mb']:8.1f} MB" if p["rss_mb"] is not None else "   ? MB") +
+            ("" if p["in_budget"] else "   (over budget)") for p in probes]))
+        candidates = [p for p in probes if p["in_budget"]]
+        if not candidates:
+            logger.warning(f"no loader configuration fits in the {budget_mb} MB memory budget; will use the smallest one")
+            candidates = [min(probes, key=lambda p: p["rss_mb"] or 0)]
+        best_throughput = max([p["samples_per_sec"] for p in candidates])
+        min_throughput = best_throughput * (1 - self.autotune["tolerance"])
+        candidates = [p for p in candidates if p["samples_per_sec"] >= min_throughput]
+        # among the (near-)fastest configs, we prefer the one using the least memory and the least workers
+        decision = min(candidates, key=lambda p: (p["rss_mb"] or 0, p["num_workers"], p["prefetch_factor"], -p["batch_size"]))
+        return {"num_workers": decision["num_workers"], "prefetch_factor": decision["prefetch_factor"],
+                "batch_size": decision["batch_size"], "samples_per_sec": decision["samples_per_sec"],
+                "rss_mb": decision["rss_mb"], "probes": probes}
+
+    @staticmethod
+    def _probe_loader(loader, iters):
+        """Returns the throughput (in samples/sec) and peak memory usage (in MB) of a loader over a few minibatches.
+
+        The first minibatch is not timed, as it also accounts for the startup of the workers.
+        """
+        rss = thelper.utils.get_rss_bytes()
+        peak_rss, start_time, sample_count, batch_count = rss, None, 0, 0
+        iterator = iter(loader)
+        for _ in iterator:
+            if start_time is None:
+                start_time = time.perf_counter()
+            else:
+                sample_count += loader.batch_size
+                batch_count += 1
+            rss = thelper.utils.get_rss_bytes()
+            if rss is not None:
+                peak_rss = max(peak_rss or 0, rss)
+            if batch_count >= iters:
+                break
+        elapsed = time.perf_counter() - start_time if start_time is not None else 0
+        del iterator  # shuts down the workers (if any) before the next probe
+        samples_per_sec = sample_count / elapsed if elapsed > 0 else 0.
+        return samples_per_sec, (peak_rss / 2 ** 20 if peak_rss is not None else None)
+
     def get_base_transforms(self):
         """Returns the (global) sample transformation operations parsed in the data configuration."""
         return self.base_transforms
@@ -15,6 +15,7 @@ import torch
 import torch.utils.data.sampler
 
 import thelper.data.utils
+import thelper.utils
 
 logger = logging.getLogger(__name__)
 
@@ -397,3 +398,52 @@ class FixedWeightSubsetSampler(torch.utils.data.sampler.Sampler):
         This number is the scaled size of the originally provided sample indices list.
         """
         return self.nb_samples
+
+
+class ShardedSampler(torch.utils.data.sampler.Sampler):
+    r"""Provides the shard of the sample indices of another sampler that belongs to a distributed process.
+
+    This wrapper is used to split the indices generated by any sampler of this module (or any other
+    torch-compatible sampler) between the processes of a distributed session. The wrapped sampler must
+    generate the same sequence of indices in all processes, which is the case for seeded samplers as long
+    as the seeds are identical across processes (see :class:`thelper.data.loaders.LoaderFactory`). By default,
+    the sequence is padded by repeating its first indices so that all shards contain the same number of samples,
+    and every process thus runs the same number of iterations per epoch (which is required for training). The
+    padded indices are duplicates, meaning that the consumers of all processes would count them twice once merged;
+    padding should thus be disabled for evaluation, in which case shard sizes may differ by one sample.
+
+    Arguments:
+        sampler (Sampler): the sampler whose indices should be sharded.
+        num_replicas (int): number of processes (shards); default is the current distributed world size.
+        rank (int): index of the shard to provide; default is the rank of the current distributed process.
+        pad (bool): specifies whether shards should be padded with duplicate indices to all have the same size.
+    """
+
+    def __init__(self, sampler, num_replicas=None, rank=None, pad=True):
+        dist_rank, dist_world_size = thelper.utils.get_distributed_info()
+        self.sampler = sampler
+        self.num_replicas = dist_world_size if num_replicas is None else num_replicas
+        self.rank = dist_rank if rank is None else rank
+        self.pad = pad
+        assert isinstance(self.num_replicas, int) and self.num_replicas > 0, "invalid number of replicas"
+        assert isinstance(self.rank, int) and 0 <= self.rank < self.num_replicas, "invalid replica rank"
+        assert hasattr(sampler, "__len__"), "wrapped sampler must define its length"
+
+    def set_epoch(self, epoch=0):
+        """Sets the current epoch number of the wrapped sampler (if it supports it)."""
+        if hasattr(self.sampler, "set_epoch") and callable(self.sampler.set_epoch):
+            self.sampler.set_epoch(epoch)
+
+    def __iter__(self):
+        indices = list(self.sampler)
+        if not self.pad:
+            return iter(indices[self.rank::self.num_replicas])
+        total_size = len(self) * self.num_replicas
+        if 0 < len(indices) < total_size:
+            indices += (indices * (total_size // len(indices)))[:total_size - len(indices)]
+        return iter(indices[self.rank:total_size:self.num_replicas])
+
+    def __len__(self):
+        if not self.pad:
+            return len(range(self.rank, len(self.sampler), self.num_replicas))
+        return (len(self.sampler) + self.num_replicas - 1) // self.num_replicas
@@ -55,6 +55,25 @@ def create_loaders(config, save_dir=None):
       time-related seed.
     - ``workers`` (optional, default=1): specifies the number of threads to use to preload batches in
       parallel; can be 0 (loading will be on main thread), or an integer >= 1.
+    - ``prefetch_factor`` (optional, default=None): specifies the number of batches preloaded by each
+      worker; only used if ``workers`` is non-zero. If not specified, the PyTorch default will be used.
+    - ``autotune`` (optional, default=False): specifies whether the number of workers, the prefetch factor,
+      and the batch size should be tuned by briefly probing candidate values on the loader of one set. It
+      can be a boolean, or a dictionary with the candidate ``num_workers``, ``batch_sizes``, and
+      ``prefetch_factors`` lists, the tuned ``set`` name (default=train), the number of probed batches
+      per candidate ``iters`` (default=10), the ``memory_budget_mb`` of the process and its workers
+      (default=0, i.e. unlimited), and the throughput ``tolerance`` (default=0.05) under which a faster
+      but more memory-hungry candidate is not preferred. The decision is logged and saved in the session
+      directory so that it can be reused when resuming. See
+      :meth:`thelper.data.loaders.LoaderFactory.autotune_loaders` for more information.
+    - ``valid_cache`` (optional, default=False): specifies whether the collated and transformed validation
+      minibatches should be cached the first time they are loaded, and streamed from the cache in the next
+      epochs. This should only be used if the validation samples and transforms are deterministic. It can be
+      a boolean, or a dictionary with the ``storage`` type (``ram`` or ``memmap``; default=ram), the
+      ``max_size_mb`` budget of the cached tensors (default=1024; 0 means unlimited), and the ``dir`` in which
+      memory-mapped files are written (default: the ``cache`` folder of the session directory). The cache is
+      invalidated if the datasets, transforms, or loader settings change. See
+      :class:`thelper.data.loaders.CachedDataLoader` for more information.
     - ``pin_memory`` (optional, default=False): specifies whether the data loaders will copy tensors
       into CUDA-pinned memory before returning them.
     - ``drop_last`` (optional, default=False): specifies whether to drop the last incomplete batch
@@ -75,6 +94,14 @@ def create_loaders(config, save_dir=None):
     - ``base_transforms`` (optional): provides a list of transformation operations to apply to all
       loaded samples. This list will be passed to the constructor of all instantiated dataset parsers.
       See :func:`thelper.transforms.utils.load_transforms` for more info.
+    - ``fuse_transforms`` (optional, default=False): specifies whether consecutive array operations of the
+      base transforms should be fused into a single pass. See :class:`thelper.transforms.composers.Compose`.
+    - ``profile_transforms`` (optional, default=False): specifies whether the call count, wall time, and
+      output size of each transform stage should be recorded in the loader workers. These statistics are
+      aggregated in the main process and written with the other epoch-level results of the session.
+    - ``memory_format`` (optional, default=None): memory format in which 3D (CHW) sample tensors should be
+      stacked by the default collate function (e.g. ``channels_last``). This should match the ``memory_format``
+      option of the trainer so that minibatches can be forwarded through the model without conversions.
     - ``train_split`` (optional): provides the proportion of samples of each dataset to hand off to the
       training data loader. These proportions are given in a dictionary format (``name: ratio``).
     - ``valid_split`` (optional): provides the proportion of samples of each dataset to hand off to the
@@ -262,7 +289,7 @@ def create_loaders(config, save_dir=None):
             # now, always overwrite, as it can get too big otherwise
             with open(dataset_log_file, "w") as fd:
                 json.dump(log_content, fd, indent=4, sort_keys=False)
-    train_loader, valid_loader, test_loader = loader_factory.create_loaders(datasets, train_idxs, valid_idxs, test_idxs)
+    train_loader, valid_loader, test_loader = loader_factory.create_loaders(datasets, train_idxs, valid_idxs, test_idxs, save_dir=save_dir)
     return task, train_loader, valid_loader, test_loader
 
 
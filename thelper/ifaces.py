@@ -31,6 +31,13 @@ class PredictionConsumer(abc.ABC):
     :mod:`thelper.train.utils` will instead log predictions to local files, create graphs, etc.
     """
 
+    mergeable = False
+    """Defines whether this consumer can merge the internal state of other consumers (see :meth:`merge`) or not.
+
+    If not, each process of a distributed session will only consider its own state. Consumers that implement
+    :meth:`merge` must set this to ``True``.
+    """
+
     def __repr__(self) -> str:
         """Returns a generic print-friendly string containing info about this consumer."""
         return self.__class__.__module__ + "." + self.__class__.__qualname__ + "()"
@@ -72,6 +79,41 @@ class PredictionConsumer(abc.ABC):
         """
         raise NotImplementedError
 
+    @property
+    def thread_safe(self) -> bool:
+        """Returns whether this consumer can be updated from a background thread or not.
+
+        By default, this returns ``False``. Consumers that only modify their own internal state in ``update``
+        (and that do not need to be queried while updates are pending) may return ``True`` so that trainers
+        using asynchronous consumer updates can process them outside of the training loop.
+        """
+        return False
+
+    def merge(self, other: "PredictionConsumer") -> None:
+        """Merges the internal state of another consumer of the same type and configuration into this one.
+
+        This is used in distributed sessions to combine the states accumulated by each process over an epoch
+        before consumers are evaluated or rendered. It is only called if :attr:`mergeable` is ``True``.
+        """
+        raise NotImplementedError
+
+    def _merge_iter_arrays(self, other: "PredictionConsumer", *attr_names: str) -> None:
+        """Concatenates the per-iteration arrays (or dicts of arrays) of another consumer to the ones of this consumer.
+
+        The merged arrays will be longer than the iteration count of an epoch, meaning that they will be
+        reallocated on the next update.
+        """
+        for attr_name in attr_names:
+            ours, theirs = getattr(self, attr_name), getattr(other, attr_name)
+            if theirs is None:
+                continue
+            if ours is None:
+                setattr(self, attr_name, copy.deepcopy(theirs))
+            elif isinstance(ours, dict):
+                setattr(self, attr_name, {key: np.concatenate([ours[key], theirs[key]]) for key in ours})
+            else:
+                setattr(self, attr_name, np.concatenate([ours, theirs]))
+
 
 class ClassNamesHandler(abc.ABC):
     """Generic interface to handle class names operations for inheriting classes.
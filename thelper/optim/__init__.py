@@ -13,6 +13,7 @@ import thelper.optim.optimizers  # noqa: F401
 import thelper.optim.utils  # noqa: F401
 from thelper.optim.eval import compute_average_precision  # noqa: F401
 from thelper.optim.eval import compute_bbox_iou  # noqa: F401
+from thelper.optim.eval import compute_coco_metrics  # noqa: F401
 from thelper.optim.eval import compute_mask_iou  # noqa: F401
 from thelper.optim.eval import compute_pascalvoc_metrics  # noqa: F401
 from thelper.optim.losses import FocalLoss  # noqa: F401
@@ -20,6 +21,7 @@ from thelper.optim.metrics import PSNR  # noqa: F401
 from thelper.optim.metrics import ENL  # noqa: F401
 from thelper.optim.metrics import Accuracy  # noqa: F401
 from thelper.optim.metrics import AveragePrecision  # noqa: F401
+from thelper.optim.metrics import COCOAveragePrecision  # noqa: F401
 from thelper.optim.metrics import ExternalMetric  # noqa: F401
 from thelper.optim.metrics import IntersectionOverUnion  # noqa: F401
 from thelper.optim.metrics import MeanAbsoluteError  # noqa: F401
@@ -55,6 +55,33 @@ def compute_mask_iou(mask1, mask2, class_indices=None, dontcare=None):
     return iou_dict
 
 
+def _get_class_idxs(bboxes, task):
+    """Returns the contiguous class indices of an array of bboxes whose ids may be indices or names (-1 if unknown)."""
+    class_idxs = np.full(len(bboxes), -1, dtype=np.int64)
+    for class_idx, class_name in enumerate(task.class_names):
+        class_idxs[bboxes.get_class_mask(class_idx, class_name)] = class_idx
+    return class_idxs
+
+
+def _get_image_idxs(pred_bboxes, gt_bboxes):
+    """Returns the contiguous image indices (shared by predictions and groundtruth bboxes) of both bbox arrays."""
+    image_ids = thelper.data.BoundingBoxArray.concat([pred_bboxes, gt_bboxes]).image_ids
+    _, image_idxs = np.unique(image_ids, return_inverse=True)
+    return image_idxs[:len(pred_bboxes)], image_idxs[len(pred_bboxes):]
+
+
+def _get_image_bbox_groups(pred_image_idxs, gt_image_idxs):
+    """Yields the indices of the predicted and groundtruth bboxes of each image that contains both types."""
+    image_count = max(pred_image_idxs.max(initial=-1), gt_image_idxs.max(initial=-1)) + 1
+    gt_sorted_idxs = np.argsort(gt_image_idxs, kind="stable")
+    gt_image_bounds = np.searchsorted(gt_image_idxs[gt_sorted_idxs], np.arange(image_count + 1))
+    pred_sorted_idxs = np.argsort(pred_image_idxs, kind="stable")
+    pred_image_bounds = np.searchsorted(pred_image_idxs[pred_sorted_idxs], np.arange(image_count + 1))
+    for image_idx in np.flatnonzero(np.diff(pred_image_bounds) * np.diff(gt_image_bounds)):
+        yield pred_sorted_idxs[pred_image_bounds[image_idx]:pred_image_bounds[image_idx + 1]], \
+            gt_sorted_idxs[gt_image_bounds[image_idx]:gt_image_bounds[image_idx + 1]]
+
+
 @thelper.concepts.detection
 def compute_pascalvoc_metrics(pred_bboxes, gt_bboxes, task, iou_threshold=0.5, method="all-points"):
     """Computes the metrics used by the VOC Pascal 2012 challenge.
@@ -64,8 +91,8 @@ def compute_pascalvoc_metrics(pred_bboxes, gt_bboxes, task, iou_threshold=0.5, m
     The original code is distributed under the MIT License, Copyright (c) 2018 Rafael Padilla.
 
     Args:
-        pred_bboxes: list of bbox predictions generated by the model under evaluation.
-        gt_bboxes: list of groundtruth bounding boxes defined by the dataset.
+        pred_bboxes: list or array of bbox predictions generated by the model under evaluation.
+        gt_bboxes: list or array of groundtruth bounding boxes defined by the dataset.
         task: task definition object that holds a vector of all class names.
         iou_threshold: Intersection Over Union (IOU) threshold for true/false positive classification.
         method: the evaluation method to use; can be the the latest & official PASCAL VOC toolkit
@@ -83,57 +110,49 @@ def compute_pascalvoc_metrics(pred_bboxes, gt_bboxes, task, iou_threshold=0.5, m
         - ``total TP``: total number of True Positive detections;
         - ``total FP``: total number of False Negative detections.
     """
-    assert isinstance(pred_bboxes, (list, np.ndarray)) and all([isinstance(b, thelper.data.BoundingBox) for b in pred_bboxes]), \
-        "invalid predictions format (expected list of bounding box objects)"
-    assert all([isinstance(bbox.confidence, float) and 0 <= bbox.confidence <= 1 for bbox in pred_bboxes]), \
+    assert isinstance(pred_bboxes, (list, np.ndarray, thelper.data.BoundingBoxArray)), \
+        "invalid predictions format (expected list or array of bounding boxes)"
+    assert isinstance(gt_bboxes, (list, np.ndarray, thelper.data.BoundingBoxArray)), \
+        "invalid input groundtruth format (expected list or array of bounding boxes)"
+    pred_bboxes = thelper.data.BoundingBoxArray.from_bboxes(pred_bboxes)
+    gt_bboxes = thelper.data.BoundingBoxArray.from_bboxes(gt_bboxes)
+    assert ((pred_bboxes.confidences >= 0) & (pred_bboxes.confidences <= 1)).all(), \
         "predicted bounding boxes must be provided with confidence values in [0,1]"
-    assert all([bbox.image_id is not None for bbox in pred_bboxes]), "predicted bbox image id must be defined"
-    assert isinstance(gt_bboxes, (list, np.ndarray)) and all([isinstance(b, thelper.data.BoundingBox) for b in gt_bboxes]), \
-        "invalid input groundtruth format (expected list of bounding box objects)"
-    assert all([bbox.image_id is not None for bbox in gt_bboxes]), "gt bbox image id must be defined"
+    assert not np.equal(pred_bboxes.image_ids, None).any(), "predicted bbox image id must be defined"
+    assert not np.equal(gt_bboxes.image_ids, None).any(), "gt bbox image id must be defined"
     assert isinstance(task, thelper.tasks.Detection) and task.class_names, "invalid task object (should be detection)"
     assert 0 < iou_threshold <= 1, "invalid intersection over union value (should be in ]0,1])"
     assert method in ["all-points", "11-points"], "invalid method (should be 'all-points' or '11-points')"
-    image_ids = list(set([bbox.image_id for bbox in pred_bboxes]) | set([bbox.image_id for bbox in gt_bboxes]))
-    image_ids = {k: idx for idx, k in enumerate(image_ids)}
-    gt_used_flags = [[[[bbox, False] for bbox in gt_bboxes
-                       if (((isinstance(bbox.class_id, int) and bbox.class_id == ci) or bbox.class_id == cn) and
-                           bbox.image_id == iid)] for iid in image_ids] for ci, cn in enumerate(task.class_names)]
+    pred_class_idxs, gt_class_idxs = _get_class_idxs(pred_bboxes, task), _get_class_idxs(gt_bboxes, task)
+    # find the best groundtruth bbox (same image & class, first in case of ties) for each prediction
+    best_gt_bbox_idxs = np.full(len(pred_bboxes), -1, dtype=np.int64)
+    best_gt_bbox_ious = np.full(len(pred_bboxes), -np.inf)
+    for curr_pred_idxs, curr_gt_idxs in _get_image_bbox_groups(*_get_image_idxs(pred_bboxes, gt_bboxes)):
+        ious = pred_bboxes[curr_pred_idxs].iou(gt_bboxes[curr_gt_idxs])
+        ious[np.isnan(ious) | (pred_class_idxs[curr_pred_idxs][:, None] != gt_class_idxs[curr_gt_idxs][None, :])] = -np.inf
+        best_idxs = np.argmax(ious, axis=1)
+        best_gt_bbox_idxs[curr_pred_idxs] = curr_gt_idxs[best_idxs]
+        best_gt_bbox_ious[curr_pred_idxs] = ious[np.arange(len(curr_pred_idxs)), best_idxs]
     ret = {}
     for class_idx, class_name in enumerate(task.class_names):
         if task.background is not None and class_name == "background":
             continue
-        curr_pred_bboxes = [bbox for bbox in pred_bboxes if (isinstance(bbox.class_id, int) and bbox.class_id == class_idx) or
-                            bbox.class_id == class_name]
-        curr_pred_bboxes = sorted(curr_pred_bboxes, key=lambda bbox: bbox.confidence, reverse=True)
-        true_positives = np.zeros(len(curr_pred_bboxes))
-        false_positives = np.zeros(len(curr_pred_bboxes))
-        for pred_bbox_idx, pred_bbox in enumerate(curr_pred_bboxes):
-            curr_gt_bboxes = gt_used_flags[class_idx][image_ids[pred_bbox.image_id]]
-            best_gt_bbox_idx, best_gt_bbox_iou = -1, float("-inf")
-            for gt_bbox_idx, (gt_bbox, gt_bbox_flag) in enumerate(curr_gt_bboxes):
-                iou = compute_bbox_iou(pred_bbox, gt_bbox)
-                if iou > best_gt_bbox_iou:
-                    best_gt_bbox_iou = iou
-                    best_gt_bbox_idx = gt_bbox_idx
-            if best_gt_bbox_iou >= iou_threshold:
-                curr_best_gt_bbox_used_flag = curr_gt_bboxes[best_gt_bbox_idx][1]
-                if not curr_best_gt_bbox_used_flag:
-                    true_positives[pred_bbox_idx] = 1
-                    # we can only use GT bboxes once, flag them as 'seen' after that
-                    curr_gt_bboxes[best_gt_bbox_idx][1] = True
-                else:
-                    # if best GT bbox was already used, we discard this detection
-                    # (note: we could do some combinatorial optim w/ hungarian method to solve ideally instead)
-                    false_positives[pred_bbox_idx] = 1
-            else:
-                # if we fail to meet the minimum iou threshold, discard this detection
-                false_positives[pred_bbox_idx] = 1
+        curr_pred_idxs = np.flatnonzero(pred_class_idxs == class_idx)
+        curr_pred_idxs = curr_pred_idxs[np.argsort(-pred_bboxes.confidences[curr_pred_idxs], kind="stable")]
+        # if we fail to meet the minimum iou threshold, we discard the detection; otherwise, since we can only
+        # use GT bboxes once, only the most confident detection matched to each GT bbox is a true positive
+        # (note: we could do some combinatorial optim w/ hungarian method to solve ideally instead)
+        matched = best_gt_bbox_ious[curr_pred_idxs] >= iou_threshold
+        matched_idxs = np.flatnonzero(matched)
+        _, first_match_idxs = np.unique(best_gt_bbox_idxs[curr_pred_idxs[matched_idxs]], return_index=True)
+        true_positives = np.zeros(len(curr_pred_idxs))
+        true_positives[matched_idxs[first_match_idxs]] = 1
+        false_positives = 1 - true_positives
         true_positive_cumsum = np.cumsum(true_positives)
-        npos = sum([len(bboxes) for bboxes in gt_used_flags[class_idx]])
+        npos = int(np.count_nonzero(gt_class_idxs == class_idx))
         recall = true_positive_cumsum / npos
         precision = np.divide(true_positive_cumsum, (np.cumsum(false_positives) + true_positive_cumsum))
-        avg_prec, mpre, mrec, _ = compute_average_precision(precision.tolist(), recall.tolist(), method)
+        avg_prec, mpre, mrec, _ = compute_average_precision(precision, recall, method)
         ret[class_name] = {
             "class_name": class_name,
             "iou_threshold": iou_threshold,
@@ -150,6 +169,167 @@ def compute_pascalvoc_metrics(pred_bboxes, gt_bboxes, task, iou_threshold=0.5, m
     return ret
 
 
+@thelper.concepts.detection
+def compute_coco_metrics(pred_bboxes, gt_bboxes, task, iou_thresholds=None, area_ranges=None, max_detections=100):
+    """Computes the multi-threshold average precision metrics used by the COCO detection challenge.
+
+    This function follows the bounding box evaluation protocol of the official COCO API (``pycocotools``),
+    but the IoU matrix of each image is only computed once, and detections are matched for all IoU thresholds
+    and area ranges at the same time. Groundtruth bounding boxes flagged as crowds are matched using the
+    detection area instead of the union area, and can absorb multiple detections without penalty.
+    See https://cocodataset.org/#detection-eval for more information.
+
+    Args:
+        pred_bboxes: list or array of bbox predictions generated by the model under evaluation.
+        gt_bboxes: list or array of groundtruth bounding boxes defined by the dataset.
+        task: task definition object that holds a vector of all class names.
+        iou_thresholds: list of Intersection Over Union (IOU) thresholds for true/false positive
+            classification. By default, uses the ten COCO thresholds, i.e. ``[0.5:0.05:0.95]``.
+        area_ranges: dictionary of named ``(min, max)`` bbox area ranges to evaluate separately. By
+            default, uses the COCO ranges, i.e. ``all``, ``small``, ``medium``, and ``large``. The first
+            range is used to compute the main summary values.
+        max_detections: maximum number of (most confident) detections to evaluate per image and class.
+
+    Returns:
+        A dictionary containing evaluation information and metrics. It contains:
+        - ``iou thresholds``: array of IoU thresholds (T) used for the evaluation;
+        - ``area ranges``: dictionary of area ranges (A) used for the evaluation;
+        - ``precision``: TxRxKxA array of interpolated precision values at 101 recall points (R) for
+          all classes (K), with -1 for undefined values;
+        - ``recall``: TxKxA array of maximum recall values, with -1 for undefined values;
+        - ``AP``: TxKxA array of average precision values, with NaN for undefined values;
+        - ``mAP``: AP averaged over all IoU thresholds and classes for the first area range;
+        - ``AP50`` and ``AP75``: mAP for the 0.5 and 0.75 IoU thresholds (if evaluated);
+        - ``mAP (<range>)``: mAP for each other area range;
+        - ``classes``: dictionary of per-class ``AP``, ``AP50``, ``AP75``, and ``total positives``.
+    """
+    assert isinstance(pred_bboxes, (list, np.ndarray, thelper.data.BoundingBoxArray)), \
+        "invalid predictions format (expected list or array of bounding boxes)"
+    assert isinstance(gt_bboxes, (list, np.ndarray, thelper.data.BoundingBoxArray)), \
+        "invalid input groundtruth format (expected list or array of bounding boxes)"
+    pred_bboxes = thelper.data.BoundingBoxArray.from_bboxes(pred_bboxes)
+    gt_bboxes = thelper.data.BoundingBoxArray.from_bboxes(gt_bboxes)
+    assert not np.isnan(pred_bboxes.confidences).any(), "predicted bounding boxes must be provided with confidence values"
+    assert not np.equal(pred_bboxes.image_ids, None).any(), "predicted bbox image id must be defined"
+    assert not np.equal(gt_bboxes.image_ids, None).any(), "gt bbox image id must be defined"
+    assert isinstance(task, thelper.tasks.Detection) and task.class_names, "invalid task object (should be detection)"
+    if iou_thresholds is None:
+        iou_thresholds = np.linspace(0.5, 0.95, 10)
+    iou_thresholds = np.asarray(iou_thresholds, dtype=np.float64)
+    assert iou_thresholds.ndim == 1 and len(iou_thresholds) > 0 and \
+        ((iou_thresholds > 0) & (iou_thresholds <= 1)).all(), "invalid intersection over union values (should be in ]0,1])"
+    if area_ranges is None:
+        area_ranges = {"all": (0, 1e5 ** 2), "small": (0, 32 ** 2), "medium": (32 ** 2, 96 ** 2), "large": (96 ** 2, 1e5 ** 2)}
+    assert isinstance(area_ranges, dict) and len(area_ranges) > 0 and \
+        all([len(r) == 2 and r[0] <= r[1] for r in area_ranges.values()]), "invalid area ranges (should be dict of (min, max))"
+    assert max_detections is None or (isinstance(max_detections, int) and max_detections > 0), "invalid max detection count"
+    range_bounds = np.asarray(list(area_ranges.values()), dtype=np.float64)
+    recall_thresholds = np.linspace(0, 1, 101)
+    pred_class_idxs, gt_class_idxs = _get_class_idxs(pred_bboxes, task), _get_class_idxs(gt_bboxes, task)
+    pred_image_idxs, gt_image_idxs = _get_image_idxs(pred_bboxes, gt_bboxes)
+    # sort predictions by image, class, and decreasing confidence, and only keep the top ones for each image & class
+    sorted_idxs = np.lexsort((-pred_bboxes.confidences, pred_class_idxs, pred_image_idxs))
+    group_starts = np.flatnonzero((np.diff(pred_image_idxs[sorted_idxs], prepend=-1) != 0) |
+                                  (np.diff(pred_class_idxs[sorted_idxs], prepend=-2) != 0))
+    group_ranks = np.arange(len(sorted_idxs)) - np.repeat(group_starts, np.diff(group_starts, append=len(sorted_idxs)))
+    keep_mask = np.zeros(len(pred_bboxes), dtype=bool)
+    keep_mask[sorted_idxs[group_ranks < max_detections] if max_detections else sorted_idxs] = True
+    keep_mask &= pred_class_idxs >= 0
+    pred_areas, gt_areas = pred_bboxes.areas, gt_bboxes.areas
+    # matching state arrays have AxTxN dims; the groundtruth bboxes outside each area range are ignored
+    pred_out_of_range = (pred_areas[None, :] < range_bounds[:, :1]) | (pred_areas[None, :] > range_bounds[:, 1:])
+    gt_ignored = gt_bboxes.iscrowd[None, :] | (gt_areas[None, :] < range_bounds[:, :1]) | (gt_areas[None, :] > range_bounds[:, 1:])
+    pred_matched = np.zeros((len(range_bounds), len(iou_thresholds), len(pred_bboxes)), dtype=bool)
+    pred_ignored = np.zeros((len(range_bounds), len(iou_thresholds), len(pred_bboxes)), dtype=bool)
+    min_ious = np.minimum(iou_thresholds, 1 - 1e-10)[None, :, None]
+    for curr_pred_idxs, curr_gt_idxs in _get_image_bbox_groups(pred_image_idxs[keep_mask], gt_image_idxs):
+        curr_pred_idxs = np.flatnonzero(keep_mask)[curr_pred_idxs]
+        curr_pred_idxs = curr_pred_idxs[np.argsort(-pred_bboxes.confidences[curr_pred_idxs], kind="stable")]
+        curr_crowd = gt_bboxes.iscrowd[curr_gt_idxs]
+        intersection_area = pred_bboxes[curr_pred_idxs].intersection(gt_bboxes[curr_gt_idxs])
+        union_area = pred_areas[curr_pred_idxs][:, None] + gt_areas[curr_gt_idxs][None, :] - intersection_area
+        union_area[:, curr_crowd] = pred_areas[curr_pred_idxs][:, None]  # crowds are matched on detection area only
+        ious = intersection_area / union_area
+        ious[np.isnan(ious) | (pred_class_idxs[curr_pred_idxs][:, None] != gt_class_idxs[curr_gt_idxs][None, :])] = -1
+        curr_gt_ignored = gt_ignored[:, None, curr_gt_idxs]
+        curr_gt_matched = np.zeros((len(range_bounds), len(iou_thresholds), len(curr_gt_idxs)), dtype=bool)
+        for pred_idx, pred_ious in zip(curr_pred_idxs, ious):
+            if pred_ious.max() < min_ious.min():
+                continue  # this prediction cannot be matched, whatever the threshold
+            candidates = ((~curr_gt_matched) | curr_crowd) & (pred_ious >= min_ious)
+            # like in the COCO API, prefer non-ignored groundtruth bboxes, then the highest IoU (last in case of ties)
+            match_idxs = np.full(curr_gt_matched.shape[:2], -1)
+            for candidate_mask in [candidates & curr_gt_ignored, candidates & ~curr_gt_ignored]:
+                best_idxs = len(curr_gt_idxs) - 1 - np.argmax(np.where(candidate_mask, pred_ious, -1)[..., ::-1], axis=-1)
+                match_idxs = np.where(candidate_mask.any(axis=-1), best_idxs, match_idxs)
+            range_idxs, thres_idxs = np.nonzero(match_idxs >= 0)
+            curr_gt_matched[range_idxs, thres_idxs, match_idxs[range_idxs, thres_idxs]] = True
+            pred_matched[range_idxs, thres_idxs, pred_idx] = True
+            pred_ignored[range_idxs, thres_idxs, pred_idx] = \
+                curr_gt_ignored[range_idxs, 0, match_idxs[range_idxs, thres_idxs]]
+    # unmatched predictions outside an area range are also ignored in that range
+    pred_ignored |= ~pred_matched & pred_out_of_range[:, None, :]
+    precision = -np.ones((len(iou_thresholds), len(recall_thresholds), len(task.class_names), len(range_bounds)))
+    recall = -np.ones((len(iou_thresholds), len(task.class_names), len(range_bounds)))
+    total_positives = np.zeros((len(task.class_names), len(range_bounds)), dtype=np.int64)
+    for class_idx, class_name in enumerate(task.class_names):
+        if task.background is not None and class_name == "background":
+            continue
+        total_positives[class_idx] = np.count_nonzero(~gt_ignored[:, gt_class_idxs == class_idx], axis=1)
+        curr_pred_idxs = np.flatnonzero(keep_mask & (pred_class_idxs == class_idx))
+        # sort by decreasing confidence (ties are sorted by image, then by confidence rank in their image)
+        curr_pred_idxs = curr_pred_idxs[np.lexsort((-pred_bboxes.confidences[curr_pred_idxs], pred_image_idxs[curr_pred_idxs]))]
+        curr_pred_idxs = curr_pred_idxs[np.argsort(-pred_bboxes.confidences[curr_pred_idxs], kind="stable")]
+        matched, ignored = pred_matched[..., curr_pred_idxs], pred_ignored[..., curr_pred_idxs]
+        true_positive_cumsum = np.cumsum(matched & ~ignored, axis=-1, dtype=np.float64)
+        false_positive_cumsum = np.cumsum(~matched & ~ignored, axis=-1, dtype=np.float64)
+        for range_idx in np.flatnonzero(total_positives[class_idx]):
+            curr_recall = true_positive_cumsum[range_idx] / total_positives[class_idx, range_idx]
+            curr_precision = true_positive_cumsum[range_idx] / \
+                (false_positive_cumsum[range_idx] + true_positive_cumsum[range_idx] + np.spacing(1))
+            recall[:, class_idx, range_idx] = curr_recall[:, -1] if len(curr_pred_idxs) else 0
+            # run backwards through precision values, eliminate ridges
+            curr_precision = np.maximum.accumulate(curr_precision[:, ::-1], axis=-1)[:, ::-1]
+            for thres_idx in range(len(iou_thresholds)):
+                recall_idxs = np.searchsorted(curr_recall[thres_idx], recall_thresholds, side="left")
+                valid_mask = recall_idxs < len(curr_pred_idxs)
+                precision[thres_idx, :, class_idx, range_idx] = 0
+                precision[thres_idx, valid_mask, class_idx, range_idx] = curr_precision[thres_idx, recall_idxs[valid_mask]]
+    valid_mask = (precision > -1).all(axis=1)
+    avg_prec = np.full(recall.shape, np.nan)
+    avg_prec[valid_mask] = precision.mean(axis=1)[valid_mask]
+
+    def get_mean(values):
+        values = values[~np.isnan(values)]
+        return float(np.mean(values)) if values.size else float("nan")
+
+    ret = {
+        "iou thresholds": iou_thresholds,
+        "area ranges": area_ranges,
+        "precision": precision,
+        "recall": recall,
+        "AP": avg_prec,
+        "mAP": get_mean(avg_prec[..., 0]),
+        "classes": {},
+    }
+    thres_names = {f"AP{int(round(thres * 100))}": thres_idx for thres_idx, thres in enumerate(iou_thresholds)
+                   if np.isclose(thres, [0.5, 0.75]).any()}
+    for thres_name, thres_idx in thres_names.items():
+        ret[thres_name] = get_mean(avg_prec[thres_idx, :, 0])
+    for range_idx, range_name in enumerate(area_ranges):
+        if range_idx > 0:
+            ret[f"mAP ({range_name})"] = get_mean(avg_prec[..., range_idx])
+    for class_idx, class_name in enumerate(task.class_names):
+        if task.background is not None and class_name == "background":
+            continue
+        ret["classes"][class_name] = {
+            "AP": get_mean(avg_prec[:, class_idx, 0]),
+            **{thres_name: get_mean(avg_prec[thres_idx, class_idx, :1]) for thres_name, thres_idx in thres_names.items()},
+            "total positives": int(total_positives[class_idx, 0]),
+        }
+    return ret
+
+
 @thelper.concepts.detection
 def compute_average_precision(precision, recall, method="all-points"):
     """Computes the average precision given an array of precision and recall values.
@@ -159,8 +339,8 @@ def compute_average_precision(precision, recall, method="all-points"):
     The original code is distributed under the MIT License, Copyright (c) 2018 Rafael Padilla.
 
     Args:
-        precision: list of precision values for the evaluated predictions of a class.
-        recall: list of recall values for the evaluated predictions of a class.
+        precision: list or array of precision values for the evaluated predictions of a class.
+        recall: list or array of recall values for the evaluated predictions of a class.
         method: the evaluation method to use; can be the the latest & official PASCAL VOC toolkit
             approach ("all-points"), or the 11-point approach ("11-points") described in the original
             paper ("The PASCAL Visual Object Classes(VOC) Challenge").
@@ -169,29 +349,32 @@ def compute_average_precision(precision, recall, method="all-points"):
         A 4-element tuple containing the average precision, rectified precision/recall arrays, and
         the indices used for the integral.
     """
-    assert isinstance(precision, list) and all([0 <= p <= 1 for p in precision])
-    assert isinstance(recall, list) and all([0 <= r <= 1 for r in recall])
+    assert isinstance(precision, (list, np.ndarray)) and isinstance(recall, (list, np.ndarray))
+    precision, recall = np.asarray(precision, dtype=np.float64), np.asarray(recall, dtype=np.float64)
+    assert ((precision >= 0) & (precision <= 1)).all()
+    assert ((recall >= 0) & (recall <= 1)).all()
     assert method in ["all-points", "11-points"]
     if method == "all-points":
-        mprecision = [0, *precision, 0]  # pad with extrema
+        mprecision = np.concatenate([[0], precision, [0]])  # pad with extrema
         # run backwards through precision values, eliminate ridges
-        for idx in range(len(mprecision) - 1, 0, -1):
-            mprecision[idx - 1] = max(mprecision[idx - 1], mprecision[idx])
-        mrecall = [0, *recall, 1]  # pad with extrema
+        mprecision = np.maximum.accumulate(mprecision[::-1])[::-1]
+        mrecall = np.concatenate([[0], recall, [1]])  # pad with extrema
         # eliminate duplicates
-        idxs = [idx + 1 for idx in range(len(mrecall) - 1) if mrecall[1:][idx] != mrecall[0:-1][idx]]
-        avg_prec = 0
-        # compute integral (AUC)
-        for idx in idxs:
-            avg_prec = avg_prec + np.sum((mrecall[idx] - mrecall[idx - 1]) * mprecision[idx])
-        return avg_prec, mprecision[0:len(mprecision) - 1], mrecall[0:len(mprecision) - 1], idxs
+        idxs = np.flatnonzero(mrecall[1:] != mrecall[:-1]) + 1
+        # compute integral (AUC); the cumulative sum keeps the same summation order as a sequential loop
+        areas = (mrecall[idxs] - mrecall[idxs - 1]) * mprecision[idxs]
+        avg_prec = np.cumsum(areas)[-1] if len(areas) else 0
+        return avg_prec, mprecision[:-1].tolist(), mrecall[:-1].tolist(), idxs.tolist()
     else:
-        mprecision = [*precision]
-        rho_interp, recall_val_id = [], []
-        for r in np.linspace(0, 1, 11)[::-1]:
-            ridxs = np.argwhere(np.asarray(recall) >= r)
-            rho_interp.append(max(mprecision[ridxs.min():]) if ridxs.size != 0 else 0)
-            recall_val_id.append(r)
+        recall_val_id = np.linspace(0, 1, 11)[::-1]
+        # the interpolated precision is the max precision for all recall values above each threshold
+        max_precision = np.maximum.accumulate(precision[::-1])[::-1]
+        recall_mask = recall[None, :] >= recall_val_id[:, None]
+        has_recall = recall_mask.any(axis=1)
+        rho_interp = np.zeros(len(recall_val_id))
+        if has_recall.any():
+            rho_interp[has_recall] = max_precision[np.argmax(recall_mask[has_recall], axis=1)]
+        rho_interp, recall_val_id = rho_interp.tolist(), recall_val_id.tolist()
         avg_prec = sum(rho_interp) / 11
         rvals = [recall_val_id[0], *recall_val_id, 0]
         pvals = [0, *rho_interp, 0]
@@ -6,6 +6,7 @@ instantiated by the framework from a configuration file, and evaluated automatic
 session. For more information on this, refer to :class:`thelper.train.base.Trainer`.
 """
 
+import copy
 import logging
 from abc import abstractmethod
 from typing import Any, AnyStr, Optional  # noqa: F401
@@ -146,6 +147,8 @@ class Accuracy(Metric):
         warned_eval_bad: toggles whether the division-by-zero warning has been flagged or not.
     """
 
+    mergeable = True
+
     def __init__(self, top_k=1, max_win_size=None):
         """Receives the number of predictions to consider for matches (``top_k``) and the moving average
         window size (``window_size``).
@@ -229,6 +232,10 @@ class Accuracy(Metric):
             return 0.0
         return (float(np.sum(self.correct)) / float(np.sum(self.total))) * 100
 
+    def merge(self, other):
+        """Merges the accumulated per-iteration values of another (distributed) instance into this one."""
+        self._merge_iter_arrays(other, "correct", "total")
+
     def reset(self):
         """Toggles a reset of the metric's internal state, deallocating count arrays."""
         self.correct = None
@@ -289,6 +296,8 @@ class MeanAbsoluteError(Metric):
         warned_eval_bad: toggles whether the division-by-zero warning has been flagged or not.
     """
 
+    mergeable = True
+
     def __init__(self, reduction="mean", max_win_size=None):
         """Receives the reduction strategy and the moving average window size (``window_size``).
 
@@ -358,6 +367,10 @@ class MeanAbsoluteError(Metric):
             return 0.0
         return np.mean([d for d in self.errors if d is not None])
 
+    def merge(self, other):
+        """Merges the accumulated per-iteration values of another (distributed) instance into this one."""
+        self._merge_iter_arrays(other, "errors")
+
     def reset(self):
         """Toggles a reset of the metric's internal state, deallocating the errors array."""
         self.errors = None
@@ -417,6 +430,8 @@ class MeanSquaredError(Metric):
         warned_eval_bad: toggles whether the division-by-zero warning has been flagged or not.
     """
 
+    mergeable = True
+
     def __init__(self, reduction="mean", max_win_size=None):
         """Receives the reduction strategy and the moving average window size (``window_size``).
 
@@ -486,6 +501,10 @@ class MeanSquaredError(Metric):
             return 0.0
         return np.mean([d for d in self.errors if d is not None])
 
+    def merge(self, other):
+        """Merges the accumulated per-iteration values of another (distributed) instance into this one."""
+        self._merge_iter_arrays(other, "errors")
+
     def reset(self):
         """Toggles a reset of the metric's internal state, deallocating the errors array."""
         self.errors = None
@@ -585,6 +604,8 @@ class ExternalMetric(Metric, ClassNamesHandler):
         target: queue used to store groundtruth-related values for window-based averaging.
     """
 
+    mergeable = True
+
     def __init__(self, metric_name, metric_type, metric_goal, metric_params=None, target_name=None,
                  class_names=None, max_win_size=None, force_softmax=True, live_eval=True):
         """Receives all necessary arguments for wrapper initialization and external metric instantiation.
@@ -735,6 +756,10 @@ class ExternalMetric(Metric, ClassNamesHandler):
         else:  # if self.metric_type == "regression":
             raise NotImplementedError
 
+    def merge(self, other):
+        """Merges the accumulated per-iteration values of another (distributed) instance into this one."""
+        self._merge_iter_arrays(other, "pred", "target")
+
     def reset(self):
         """Toggles a reset of the metric's internal state, emptying pred/target queues."""
         self.pred = None
@@ -767,6 +792,16 @@ class ROCCurve(Metric, ClassNamesHandler):
     By default, evaluating this metric returns the Area Under the Curve (AUC). If a target operating point is
     set, it will instead return the false positive/negative prediction rate of the model at that point.
 
+    In streaming mode, the prediction scores are not stored; instead, per-class counts of positive and
+    negative samples are accumulated in fixed-resolution score histograms. The AUC and operating points
+    are then derived from these counts in O(bins) time and memory, the counts of different (distributed)
+    instances can be merged by summing them, and the metric can be evaluated at every iteration. With
+    histograms, scores that fall in the same bin are considered tied. If ``bins`` is ``None``, the counts
+    are instead kept for every unique score value, and the results are identical to the ones obtained
+    from sklearn; in that case, the per-minibatch counts are only merged (sorted) once when the metric
+    is evaluated, so it is not evaluated at every iteration. Note that sample weights are not supported
+    in this mode. Streaming counts are cleared when a new epoch (or evaluation loop) starts.
+
     Usage examples inside a session configuration file::
 
         # ...
@@ -795,6 +830,16 @@ class ROCCurve(Metric, ClassNamesHandler):
                     "target_tpr": 0.99
                 }
             },
+            # this is the name of the third example; it will output the AUC of the "reject" class using
+            # a 1000-bin score histogram instead of storing all prediction scores
+            "roc_reject_auc_streaming": {
+                "type": "thelper.optim.metrics.ROCCurve",
+                "params": {
+                    "target_name": "reject",
+                    "streaming": true,
+                    "bins": 1000
+                }
+            },
             # ...
         }
         # ...
@@ -813,10 +858,18 @@ class ROCCurve(Metric, ClassNamesHandler):
         auc: auc score generator function, called at evaluation time to generate the output string.
         score: queue used to store prediction score values for window-based averaging.
         true: queue used to store groundtruth label values for window-based averaging.
+        streaming: specifies whether to accumulate score counts instead of storing all prediction scores.
+        bins: number of score histogram bins to use in streaming mode (``None`` means exact counts).
+        score_range: range of the prediction scores covered by the histogram bins in streaming mode.
+        counts: per-class negative/positive sample counts accumulated in streaming mode.
+        last_iter_idx: index of the last iteration that was accumulated in streaming mode.
     """
 
+    mergeable = True
+
     def __init__(self, target_name, target_tpr=None, target_fpr=None, class_names=None,
-                 force_softmax=True, sample_weight=None, drop_intermediate=True):
+                 force_softmax=True, sample_weight=None, drop_intermediate=True,
+                 streaming=False, bins=1000, score_range=(0.0, 1.0)):
         """Receives the target class/operating point info, log parameters, and roc computation arguments.
 
         Args:
@@ -829,6 +882,11 @@ class ROCCurve(Metric, ClassNamesHandler):
                 obtained from the trainer.
             sample_weight: passed to ``sklearn.metrics.roc_curve`` and ``sklearn.metrics.roc_auc_score``.
             drop_intermediate: passed to ``sklearn.metrics.roc_curve``.
+            streaming: specifies whether to accumulate score counts instead of storing all prediction scores.
+            bins: number of score histogram bins to use in streaming mode. If ``None``, the counts will be
+                kept for every unique score value instead (exact, but memory grows with the sample count).
+            score_range: range of the prediction scores covered by the histogram bins in streaming mode;
+                scores outside this range are clipped to the first/last bin.
         """
         assert target_name is not None, "must provide a target (class) name for ROC metric"
         self.target_inv = False
@@ -851,22 +909,26 @@ class ROCCurve(Metric, ClassNamesHandler):
         self.force_softmax = force_softmax
         self.sample_weight = sample_weight
         self.drop_intermediate = drop_intermediate
+        assert not streaming or sample_weight is None, "sample weights are not supported in streaming mode"
+        assert bins is None or (isinstance(bins, int) and bins > 0), "invalid histogram bin count"
+        assert len(score_range) == 2 and score_range[0] < score_range[1], "invalid histogram score range"
+        self.streaming = streaming
+        self.bins = bins
+        self.score_range = tuple(score_range)
+        self.counts = None
+        self.last_iter_idx = None
 
         def gen_curve(y_true, y_score, _target_idx, _target_inv, _sample_weight=sample_weight, _drop_intermediate=drop_intermediate):
             assert _target_idx is not None, "missing positive target idx at run time"
-            _y_true, _y_score = [], []
-            for sample_idx, label_idx in enumerate(y_true):
-                _y_true.append(label_idx != _target_idx if _target_inv else label_idx == _target_idx)
-                _y_score.append(1 - y_score[sample_idx, _target_idx] if _target_inv else y_score[sample_idx, _target_idx])
+            _y_true = y_true != _target_idx if _target_inv else y_true == _target_idx
+            _y_score = 1 - y_score[:, _target_idx] if _target_inv else y_score[:, _target_idx]
             res = sklearn.metrics.roc_curve(_y_true, _y_score, sample_weight=_sample_weight, drop_intermediate=_drop_intermediate)
             return res
 
         def gen_auc(y_true, y_score, _target_idx, _target_inv, _sample_weight=sample_weight):
             assert _target_idx is not None, "missing positive target idx at run time"
-            _y_true, _y_score = [], []
-            for sample_idx, label_idx in enumerate(y_true):
-                _y_true.append(label_idx != _target_idx if _target_inv else label_idx == _target_idx)
-                _y_score.append(1 - y_score[sample_idx, _target_idx] if _target_inv else y_score[sample_idx, _target_idx])
+            _y_true = y_true != _target_idx if _target_inv else y_true == _target_idx
+            _y_score = 1 - y_score[:, _target_idx] if _target_inv else y_score[:, _target_idx]
             res = sklearn.metrics.roc_auc_score(_y_true, _y_score, sample_weight=_sample_weight)
             return res
 
@@ -882,7 +944,8 @@ class ROCCurve(Metric, ClassNamesHandler):
             f"(target_name={repr(self.target_name)}, target_tpr={repr(self.target_tpr)}, " + \
             f"target_fpr={repr(self.target_fpr)}, class_names={repr(self.class_names)}, " + \
             f"force_softmax={repr(self.force_softmax)}, sample_weight={repr(self.sample_weight)}, " + \
-            f"drop_intermediate={repr(self.drop_intermediate)})"
+            f"drop_intermediate={repr(self.drop_intermediate)}, streaming={repr(self.streaming)}, " + \
+            f"bins={repr(self.bins)}, score_range={repr(self.score_range)})"
 
     @ClassNamesHandler.class_names.setter
     def class_names(self, class_names):
@@ -919,15 +982,20 @@ class ROCCurve(Metric, ClassNamesHandler):
         assert not task.multi_label, "roc curve only impl for non-multi-label classif tasks"
         assert iter_idx is not None and max_iters is not None and iter_idx < max_iters, \
             "bad iteration indices given to metric update function"
-        if self.score is None or self.score.size != max_iters:
+        if self.streaming and (self.last_iter_idx is None or iter_idx <= self.last_iter_idx):
+            # new epoch (or evaluation loop), drop the counts of the previous one
+            self.counts = None
+        self.last_iter_idx = iter_idx
+        if not self.streaming and (self.score is None or self.score.size != max_iters):
             self.score = np.asarray([None] * max_iters)
             self.true = np.asarray([None] * max_iters)
         if task.class_names != self.class_names:
             self.class_names = task.class_names
         if target is None or target.numel() == 0:
             # only accumulate results when groundtruth is available
-            self.score[iter_idx] = None
-            self.true[iter_idx] = None
+            if not self.streaming:
+                self.score[iter_idx] = None
+                self.true[iter_idx] = None
             return
         assert pred.dim() == 2 or target.dim() == 1, "current classif report impl only supports batched 1D outputs"
         assert pred.shape[0] == target.shape[0], "prediction/gt tensors batch size mismatch"
@@ -935,9 +1003,68 @@ class ROCCurve(Metric, ClassNamesHandler):
         if self.force_softmax:
             with torch.no_grad():
                 pred = torch.nn.functional.softmax(pred, dim=1)
+        if self.streaming:
+            self._update_counts(pred.numpy(), target.numpy())
+            return
         self.score[iter_idx] = pred.numpy()
         self.true[iter_idx] = target.numpy()
 
+    def _update_counts(self, score, true):
+        """Accumulates the per-class negative/positive sample counts of a minibatch (streaming mode only)."""
+        class_count = score.shape[1]
+        is_pos = (true.reshape(-1, 1) == np.arange(class_count)).astype(np.int64)
+        if self.bins is not None:
+            min_score, max_score = self.score_range
+            bin_idxs = np.clip((score - min_score) / (max_score - min_score) * self.bins, 0, self.bins - 1)
+            flat_idxs = (np.arange(class_count) * 2 + is_pos) * self.bins + bin_idxs.astype(np.int64)
+            counts = np.bincount(flat_idxs.ravel(), minlength=class_count * 2 * self.bins)
+            counts = counts.reshape(class_count, 2, self.bins)
+            self.counts = counts if self.counts is None else self.counts + counts
+        else:
+            # the minibatch counts are only merged (i.e. sorted) once, when evaluating the metric
+            if self.counts is None:
+                self.counts = [[] for _ in range(class_count)]
+            for class_idx in range(class_count):
+                class_counts = np.stack([1 - is_pos[:, class_idx], is_pos[:, class_idx]])
+                self.counts[class_idx].append((score[:, class_idx], class_counts))
+
+    @staticmethod
+    def _merge_exact_counts(*counts):
+        """Merges (score values, negative/positive counts) pairs into a single pair with sorted unique values."""
+        values, unique_idxs = np.unique(np.concatenate([c[0] for c in counts]), return_inverse=True)
+        merged_counts = np.concatenate([c[1] for c in counts], axis=1)
+        merged_counts = np.stack([np.bincount(unique_idxs, weights=merged_counts[idx], minlength=len(values))
+                                  for idx in range(2)]).astype(np.int64)
+        return values, merged_counts
+
+    def _get_streaming_curve(self):
+        """Returns the (fpr, tpr, thresholds) arrays of the ROC curve derived from the accumulated counts.
+
+        The curve points are ordered by decreasing score threshold, as with ``sklearn.metrics.roc_curve``
+        (without dropping intermediate points). If the targeted class has no positive or no negative
+        samples, the corresponding rates are undefined (NaN).
+        """
+        assert self.target_idx is not None, "missing positive target idx at run time"
+        if self.bins is not None:
+            min_score, max_score = self.score_range
+            values = min_score + (max_score - min_score) * np.arange(self.bins) / self.bins
+            counts = self.counts[self.target_idx]
+        else:
+            # the merged counts are kept so that further minibatches will be merged with them later
+            values, counts = self._merge_exact_counts(*self.counts[self.target_idx])
+            self.counts[self.target_idx] = [(values, counts)]
+        if self.target_inv:
+            # inverted scores are in the same order as the original ones, and positives become negatives
+            values, (neg_counts, pos_counts) = 1 - values, counts[::-1]
+        else:
+            values, (neg_counts, pos_counts) = values[::-1], counts[:, ::-1]
+        valid_mask = (neg_counts + pos_counts) > 0
+        tps, fps = np.cumsum(pos_counts[valid_mask]), np.cumsum(neg_counts[valid_mask])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            tpr = np.r_[0, tps / tps[-1]] if tps.size else np.zeros(1)
+            fpr = np.r_[0, fps / fps[-1]] if fps.size else np.zeros(1)
+        return fpr, tpr, np.r_[np.inf, values[valid_mask]]
+
     def eval(self):
         """Returns the evaluation result (AUC/TPR/FPR).
 
@@ -945,16 +1072,21 @@ class ROCCurve(Metric, ClassNamesHandler):
         target TPR is set, the returned value is the FPR for that operating point. If a target FPR is set,
         the returned value is the TPR for that operating point.
         """
-        if self.score is None or self.true is None:
-            return None
-        score, true = zip(*[(score, true) for scores, trues in zip(self.score, self.true)
-                            if trues is not None for score, true in zip(scores, trues)])
-        # if we did not specify a target operating point in terms of true/false positive rate, return AUC
-        if self.target_tpr is None and self.target_fpr is None:
-            return self.auc(np.stack(true, axis=0), np.stack(score, axis=0), self.target_idx, self.target_inv)
-        # otherwise, find the opposite rate at the requested target operating point
-        _fpr, _tpr, _thrs = self.curve(np.stack(true, axis=0), np.stack(score, axis=0), self.target_idx,
-                                       self.target_inv, _drop_intermediate=False)
+        if self.streaming:
+            if self.counts is None:
+                return None
+            _fpr, _tpr, _thrs = self._get_streaming_curve()
+            if self.target_tpr is None and self.target_fpr is None:
+                return float(np.sum(np.diff(_fpr) * (_tpr[1:] + _tpr[:-1]) / 2))
+        else:
+            if self.score is None or self.true is None:
+                return None
+            score, true = self._get_scores()
+            # if we did not specify a target operating point in terms of true/false positive rate, return AUC
+            if self.target_tpr is None and self.target_fpr is None:
+                return self.auc(true, score, self.target_idx, self.target_inv)
+            # otherwise, find the opposite rate at the requested target operating point
+            _fpr, _tpr, _thrs = self.curve(true, score, self.target_idx, self.target_inv, _drop_intermediate=False)
         for fpr, tpr, thrs in zip(_fpr, _tpr, _thrs):
             if self.target_tpr is not None and tpr >= self.target_tpr:
                 # print("for target tpr = %.5f, fpr = %.5f at threshold = %f" % (self.target_tpr, fpr, thrs))
@@ -972,11 +1104,15 @@ class ROCCurve(Metric, ClassNamesHandler):
 
     def render(self):
         """Returns the ROC curve as a numpy-compatible RGBA image drawn by pyplot."""
-        if self.score is None:
-            return None
-        score, true = zip(*[(score, true) for scores, trues in zip(self.score, self.true)
-                            if trues is not None for score, true in zip(scores, trues)])
-        fpr, tpr, t = self.curve(np.stack(true, axis=0), np.stack(score, axis=0), self.target_idx, self.target_inv)
+        if self.streaming:
+            if self.counts is None:
+                return None
+            fpr, tpr, t = self._get_streaming_curve()
+        else:
+            if self.score is None:
+                return None
+            score, true = self._get_scores()
+            fpr, tpr, t = self.curve(true, score, self.target_idx, self.target_inv)
         try:
             fig, ax = thelper.draw.draw_roc_curve(fpr, tpr)
             array = thelper.draw.fig2array(fig)
@@ -986,10 +1122,33 @@ class ROCCurve(Metric, ClassNamesHandler):
             # return None if rendering fails (probably due to matplotlib on displayless server)
             return None
 
+    def _get_scores(self):
+        """Returns the stacked prediction scores and groundtruth labels of all valid iterations."""
+        valid_idxs = [idx for idx, trues in enumerate(self.true) if trues is not None]
+        return np.concatenate([self.score[idx] for idx in valid_idxs], axis=0), \
+            np.concatenate([self.true[idx] for idx in valid_idxs], axis=0)
+
+    def merge(self, other):
+        """Merges the accumulated per-iteration values (or counts) of another (distributed) instance into this one."""
+        if not self.streaming:
+            self._merge_iter_arrays(other, "score", "true")
+        elif other.counts is not None:
+            assert other.streaming and other.bins == self.bins and other.score_range == self.score_range, \
+                "cannot merge streaming roc counts with different histogram configurations"
+            if self.counts is None:
+                self.counts = copy.deepcopy(other.counts)
+            elif self.bins is not None:
+                self.counts = self.counts + other.counts
+            else:
+                for ours, theirs in zip(self.counts, other.counts):
+                    ours.extend(copy.deepcopy(theirs))
+
     def reset(self):
         """Toggles a reset of the metric's internal state, emptying queues."""
         self.score = None
         self.true = None
+        self.counts = None
+        self.last_iter_idx = None
 
     @property
     def goal(self):
@@ -1005,7 +1164,18 @@ class ROCCurve(Metric, ClassNamesHandler):
     @property
     def live_eval(self):
         """Returns whether this metric can/should be evaluated at every backprop iteration or not."""
-        return False  # some operating modes might be pretty slow, check back impl later
+        # non-streaming operating modes (and exact counts) might be pretty slow, check back impl later
+        return self.streaming and self.bins is not None
+
+    @property
+    def thread_safe(self):
+        """Returns whether this metric can be updated from a background thread or not.
+
+        With score histograms, the accumulated counts are evaluated live at every iteration on the main thread,
+        so they cannot be updated in the background. Otherwise, updates only fill the per-iteration slots (or
+        append the per-minibatch counts) of this metric, which are read at epoch end.
+        """
+        return not self.live_eval
 
 
 @thelper.concepts.regression
@@ -1052,6 +1222,8 @@ class PSNR(Metric):
         warned_eval_bad: toggles whether the division-by-zero warning has been flagged or not.
     """
 
+    mergeable = True
+
     def __init__(self, data_range=1.0, max_win_size=None):
         """Receives all necessary initialization arguments to compute signal PSNRs,
 
@@ -1114,6 +1286,10 @@ class PSNR(Metric):
             return 0.0
         return np.mean([v for v in self.psnrs if v is not None])
 
+    def merge(self, other):
+        """Merges the accumulated per-iteration values of another (distributed) instance into this one."""
+        self._merge_iter_arrays(other, "psnrs")
+
     def reset(self):
         """Toggles a reset of the metric's internal state, deallocating the psnrs array."""
         self.psnrs = None
@@ -1162,6 +1338,8 @@ class ENL(Metric):
         copolar_chns: list of channels number corresponding to intensity (copolar) in a T9 coherence/covariance matrix
     """
 
+    mergeable = True
+
     def __init__(self, max_win_size=None, copolar_chns=[0,5,8]):
         """Receives all necessary initialization arguments to compute signal ENLs,
 
@@ -1228,6 +1406,10 @@ class ENL(Metric):
             return 0.0
         return np.mean([v for v in self.enls if v is not None])
 
+    def merge(self, other):
+        """Merges the accumulated per-iteration values of another (distributed) instance into this one."""
+        self._merge_iter_arrays(other, "enls")
+
     def reset(self):
         """Toggles a reset of the metric's internal state, deallocating the enls array."""
         self.enls = None
@@ -1271,10 +1453,12 @@ class AveragePrecision(Metric):
             approach ("all-points"), or the 11-point approach ("11-points") described in the original
             paper ("The PASCAL Visual Object Classes(VOC) Challenge").
         max_win_size: maximum moving average window size to use (default=None, which equals dataset size).
-        preds: array holding the predicted bounding boxes for all input samples.
-        targets: array holding the target bounding boxes for all input samples.
+        preds: array holding the predicted bounding box arrays for all input batches.
+        targets: array holding the target bounding box arrays for all input batches.
     """
 
+    mergeable = True
+
     def __init__(self, target_class=None, iou_threshold=0.5, method="all-points", max_win_size=None):
         """Initializes metric attributes.
 
@@ -1333,12 +1517,13 @@ class AveragePrecision(Metric):
         if not pred:
             pred = [[]] * len(target)
         assert isinstance(pred, list) and isinstance(target, list)
-        assert all([isinstance(b, list) and
-                    all([isinstance(p, thelper.tasks.detect.BoundingBox) for p in b]) for b in pred])
-        assert all([isinstance(b, list) and
-                    all([isinstance(t, thelper.tasks.detect.BoundingBox) for t in b]) for b in target])
-        self.preds[curr_idx] = pred
-        self.targets[curr_idx] = target
+        assert all([isinstance(b, thelper.tasks.detect.BoundingBoxArray) or (isinstance(b, list) and
+                    all([isinstance(p, thelper.tasks.detect.BoundingBox) for p in b])) for b in pred])
+        assert all([isinstance(b, thelper.tasks.detect.BoundingBoxArray) or (isinstance(b, list) and
+                    all([isinstance(t, thelper.tasks.detect.BoundingBox) for t in b])) for b in target])
+        # the bboxes of the whole batch are packed into a single array (possible due to image ids)
+        self.preds[curr_idx] = thelper.tasks.detect.BoundingBoxArray.from_bboxes(pred)
+        self.targets[curr_idx] = thelper.tasks.detect.BoundingBoxArray.from_bboxes(target)
 
     def eval(self):
         """Returns the current accuracy (in percentage) based on the accumulated prediction counts.
@@ -1346,10 +1531,9 @@ class AveragePrecision(Metric):
         Will issue a warning if no predictions have been accumulated yet.
         """
         assert self.targets.size == self.preds.size, "internal window size mismatch"
-        pred, target = zip(*[(pred, target) for preds, targets in zip(self.preds, self.targets)
-                             if targets for pred, target in zip(preds, targets)])
-        # maybe need to concat?
-        pred, target = np.concatenate(pred), np.concatenate(target)  # possible due to image ids
+        valid_idxs = [idx for idx, targets in enumerate(self.targets) if targets is not None]
+        pred = thelper.tasks.detect.BoundingBoxArray.concat([self.preds[idx] for idx in valid_idxs])
+        target = thelper.tasks.detect.BoundingBoxArray.concat([self.targets[idx] for idx in valid_idxs])
         if len(pred) == 0:  # no predictions made by model
             return float("nan")
         metrics = thelper.optim.eval.compute_pascalvoc_metrics(pred, target, self.task,
@@ -1359,6 +1543,10 @@ class AveragePrecision(Metric):
             return np.mean([m["AP"] for m in metrics.values() if m["total positives"] > 0])
         return metrics[self.target_class]["AP"]
 
+    def merge(self, other):
+        """Merges the accumulated per-iteration values of another (distributed) instance into this one."""
+        self._merge_iter_arrays(other, "preds", "targets")
+
     def reset(self):
         """Toggles a reset of the metric's internal state, deallocating bbox arrays."""
         self.preds = None
@@ -1375,6 +1563,148 @@ class AveragePrecision(Metric):
         return False  # the current PascalVOC implementation is preeetty slow with lots of bboxes
 
 
+@thelper.concepts.detection
+class COCOAveragePrecision(AveragePrecision):
+    r"""Object detection average precision score over multiple IoU thresholds and area ranges from COCO.
+
+    This metric is computed based on the evaluator function implemented in :mod:`thelper.optim.eval`. Unlike
+    :class:`thelper.optim.metrics.AveragePrecision`, all IoU thresholds and bbox area ranges are evaluated at
+    once from a single copy of the accumulated predictions, and from a single IoU computation per image. By
+    default, it returns the COCO mAP (i.e. the AP averaged over all classes and IoU thresholds in [0.5:0.95]),
+    but it can also target a specific class, IoU threshold, or area range. The full report (mAP, AP50, AP75,
+    area-based mAPs and per-class values) is also available as text.
+
+    Usage example inside a session configuration file::
+
+        # ...
+        # lists all metrics to instantiate as a dictionary
+        "metrics": {
+            # ...
+            # this is the name of the example metric; it is used for lookup/printing only
+            "coco_mAP": {
+                # this type is used to instantiate the AP metric
+                "type": "thelper.optim.metrics.COCOAveragePrecision",
+                # these parameters are passed to the wrapper's constructor
+                "params": {
+                    # no parameters means we will compute the mAP over IoU thresholds in [0.5:0.95]
+                }
+            },
+            # this is the name of the second example; it will output the AP at IoU=0.5 for a single class
+            "person_AP50": {
+                "type": "thelper.optim.metrics.COCOAveragePrecision",
+                "params": {
+                    "target_class": "person",
+                    "target_iou": 0.5
+                }
+            },
+            # ...
+        }
+        # ...
+
+    Attributes:
+        target_class: name of the class to target; if 'None', will compute mAP instead of AP.
+        target_iou: IoU threshold to target; if 'None', will average the AP over all thresholds.
+        target_area: name of the area range to target (the first range is used by default).
+        iou_thresholds: list of Intersection Over Union (IOU) thresholds to evaluate.
+        area_ranges: dictionary of named ``(min, max)`` bbox area ranges to evaluate.
+        max_detections: maximum number of (most confident) detections to evaluate per image and class.
+        max_win_size: maximum moving average window size to use (default=None, which equals dataset size).
+        preds: array holding the predicted bounding box arrays for all input batches.
+        targets: array holding the target bounding box arrays for all input batches.
+        results: dictionary of evaluation results, cached until the next update.
+    """
+
+    def __init__(self, target_class=None, target_iou=None, target_area=None, iou_thresholds=None,
+                 area_ranges=None, max_detections=100, max_win_size=None):
+        """Initializes metric attributes.
+
+        Note that by default, if ``max_win_size`` is not provided here, the value given to ``max_iters`` on
+        the first update call will be used instead to fix the sliding window length. In any case, the
+        smallest of ``max_iters`` and ``max_win_size`` will be used to determine the actual window size.
+        """
+        super().__init__(target_class=target_class, max_win_size=max_win_size)
+        self.iou_thresholds = np.linspace(0.5, 0.95, 10) if iou_thresholds is None else np.asarray(iou_thresholds)
+        assert target_iou is None or np.isclose(self.iou_thresholds, target_iou).any(), \
+            "target IoU threshold should be part of the evaluated thresholds"
+        self.target_iou = target_iou
+        self.area_ranges = area_ranges
+        assert target_area is None or (area_ranges is not None and target_area in area_ranges) or \
+            (area_ranges is None and target_area in ["all", "small", "medium", "large"]), "unknown target area range"
+        self.target_area = target_area
+        self.max_detections = max_detections
+        self.iou_threshold, self.method = None, None  # unused, all thresholds are evaluated at once
+        self.results = None
+
+    def __repr__(self):
+        """Returns a generic print-friendly string containing info about this metric."""
+        return self.__class__.__module__ + "." + self.__class__.__qualname__ + \
+            f"(target_class={repr(self.target_class)}, target_iou={repr(self.target_iou)}, " + \
+            f"target_area={repr(self.target_area)}, iou_thresholds={repr(self.iou_thresholds.tolist())}, " + \
+            f"area_ranges={repr(self.area_ranges)}, max_detections={repr(self.max_detections)}, " + \
+            f"max_win_size={repr(self.max_win_size)})"
+
+    def update(self, *args, **kwargs):
+        """Receives the latest bbox predictions and targets from the training session.
+
+        See :meth:`thelper.optim.metrics.AveragePrecision.update` for more information.
+        """
+        self.results = None
+        super().update(*args, **kwargs)
+
+    def compute(self):
+        """Returns the dictionary of evaluation results based on the accumulated predictions (or None if empty)."""
+        if self.preds is None or self.targets is None:
+            return None
+        if self.results is None:
+            assert self.targets.size == self.preds.size, "internal window size mismatch"
+            valid_idxs = [idx for idx, targets in enumerate(self.targets) if targets is not None]
+            pred = thelper.tasks.detect.BoundingBoxArray.concat([self.preds[idx] for idx in valid_idxs])
+            target = thelper.tasks.detect.BoundingBoxArray.concat([self.targets[idx] for idx in valid_idxs])
+            if len(pred) == 0:  # no predictions made by model
+                return None
+            self.results = thelper.optim.eval.compute_coco_metrics(pred, target, self.task, self.iou_thresholds,
+                                                                   self.area_ranges, self.max_detections)
+        return self.results
+
+    def eval(self):
+        """Returns the current mAP (or AP for the targeted class) based on the accumulated predictions."""
+        results = self.compute()
+        if results is None:
+            return float("nan")
+        area_idx = 0 if self.target_area is None else list(results["area ranges"]).index(self.target_area)
+        avg_prec = results["AP"][..., area_idx]
+        if self.target_iou is not None:
+            avg_prec = avg_prec[np.isclose(self.iou_thresholds, self.target_iou)]
+        if self.target_class is not None:
+            avg_prec = avg_prec[:, self.task.class_names.index(self.target_class)]
+        avg_prec = avg_prec[~np.isnan(avg_prec)]
+        return float(np.mean(avg_prec)) if avg_prec.size else float("nan")
+
+    def report(self):
+        """Returns the mAP, AP50, AP75, area-based and per-class AP values as a print-friendly string."""
+        results = self.compute()
+        if results is None:
+            return None
+        thres_names = [key for key in ["AP50", "AP75"] if key in results]
+        res = "\n".join([f"{key}: {results[key]:.4f}" for key in ["mAP", *thres_names] +
+                         [key for key in results if key.startswith("mAP (")]]) + "\n\n"
+        res += ",".join(["class_name", "AP", *thres_names, "total_positives"]) + "\n"
+        for class_name, class_results in results["classes"].items():
+            res += ",".join([class_name, *[f"{class_results[key]:.4f}" for key in ["AP", *thres_names]],
+                             str(class_results["total positives"])]) + "\n"
+        return res
+
+    def merge(self, other):
+        """Merges the accumulated per-iteration values of another (distributed) instance into this one."""
+        self.results = None
+        super().merge(other)
+
+    def reset(self):
+        """Toggles a reset of the metric's internal state, deallocating bbox arrays."""
+        self.results = None
+        super().reset()
+
+
 @thelper.concepts.segmentation
 class IntersectionOverUnion(Metric):
     r"""Computes the intersection over union over image classes.
@@ -1409,6 +1739,8 @@ class IntersectionOverUnion(Metric):
         unions: array holding the union areas for all input samples.
     """
 
+    mergeable = True
+
     def __init__(self, target_names=None, global_score=True, max_win_size=None):
         """Initializes metric attributes.
 
@@ -1547,6 +1879,10 @@ class IntersectionOverUnion(Metric):
         # could add per-class IoU scores to some log before averaging below...
         return np.array(list(iou_map.values())).mean()
 
+    def merge(self, other):
+        """Merges the accumulated per-iteration values of another (distributed) instance into this one."""
+        self._merge_iter_arrays(other, "inters", "unions")
+
     def reset(self):
         """Toggles a reset of the metric's internal state, deallocating bbox arrays."""
         self.inters = None
@@ -17,6 +17,7 @@ import thelper.data
 import thelper.nn
 import thelper.optim
 import thelper.tasks
+import thelper.transforms
 import thelper.typedefs
 import thelper.utils
 import thelper.viz
@@ -32,6 +33,7 @@ class SessionRunner:
 
     Attributes:
         checkpoint_dir: session checkpoint output directory (located within the 'session directory').
+        checkpoint_writer: object used to write checkpoints (possibly in the background) and to prune old ones.
         config: session configuration dictionary holding all original settings, including trainer configuration.
         devices: list of (cuda) device IDs to upload the model/tensors to; can be empty if only the CPU is available.
         epochs: number of epochs to train the model for.
@@ -78,7 +80,8 @@ class SessionRunner:
         logs_dir = os.path.join(session_dir, "logs")
         os.makedirs(logs_dir, exist_ok=True)
         thelper.utils.init_logger()  # make sure all logging is initialized before attaching this part
-        thelper.utils.save_env_list(os.path.join(logs_dir, "packages.log"))
+        if thelper.utils.is_main_process():
+            thelper.utils.save_env_list(os.path.join(logs_dir, "packages.log"))
         train_logger_path = os.path.join(logs_dir, "trainer.log")
         train_logger_format = logging.Formatter("[%(asctime)s - %(process)s] %(levelname)s : %(message)s")
         train_logger_fh = logging.FileHandler(train_logger_path)
@@ -100,6 +103,11 @@ class SessionRunner:
         self.save_raw = thelper.utils.str2bool(thelper.utils.get_key_def("save_raw", trainer_config, True))
         self.checkpoint_dir = os.path.join(session_dir, "checkpoints")
         os.makedirs(self.checkpoint_dir, exist_ok=True)
+        keep_checkpoints = int(thelper.utils.get_key_def("keep_checkpoints", trainer_config, 0))
+        assert keep_checkpoints >= 0, "checkpoint keep count should be positive integer (or zero)"
+        async_checkpoints = thelper.utils.str2bool(thelper.utils.get_key_def("async_checkpoints", trainer_config, False))
+        self.checkpoint_writer = thelper.utils.CheckpointWriter(self.checkpoint_dir, keep_count=keep_checkpoints,
+                                                                background=async_checkpoints)
         output_root_dir = thelper.utils.get_key_def("output_dir", trainer_config)
         if not output_root_dir:
             # append session name for cleaner TBX folder merging
@@ -112,6 +120,9 @@ class SessionRunner:
         self.logger.debug(f"output subdirectories {'will' if unique_output_dir else 'will not'} have unique names")
         devices_str = thelper.utils.get_key_def(["device", "devices", "train_device"], trainer_config, None)
         self.devices = self._load_devices(devices_str)
+        rank, world_size = thelper.utils.get_distributed_info()
+        if world_size > 1 and len(self.devices) > 1:
+            self.devices = [self.devices[rank % len(self.devices)]]  # one device per distributed process
         self.skip_eval_iter = thelper.utils.get_key_def("skip_eval_iter", trainer_config, 0)
 
         # parse and prepare tbx stuff
@@ -209,6 +220,7 @@ class SessionRunner:
         self.current_iter = thelper.utils.get_key_def("iter", ckptdata, 0)
         self.current_epoch = thelper.utils.get_key_def("epoch", ckptdata, 0)
         self.outputs = thelper.utils.get_key_def("outputs", ckptdata, {})
+        self.resume_state = thelper.utils.get_key_def("resume", ckptdata, None)  # only set for mid-epoch checkpoints
 
         # parse callbacks (see ``thelper.typedefs.IterCallbackType`` and ``thelper.typedefs.IterCallbackParams``)
         for cname, mset in zip(["train", "valid", "test"], [self.train_metrics, self.valid_metrics, self.test_metrics]):
@@ -252,7 +264,7 @@ class SessionRunner:
             assert isinstance(viz_config, dict), f"invalid visualization configuration dictionary for type '{viz_key}'"
 
     def _init_writer(self, writer, path):
-        if self.use_tbx and not writer:
+        if self.use_tbx and not writer and thelper.utils.is_main_process():
             writer = self.tbx.SummaryWriter(path, comment=self.name)
             writer.add_text("config", json.dumps(self.config, indent=4, sort_keys=False, default=lambda x: str(x)))
             thelper.utils.save_config(self.config, os.path.join(path, "config.json"))
@@ -268,9 +280,41 @@ class SessionRunner:
         if "random" in seeds:
             random.seed(seeds["random"] + epoch)
 
+    @staticmethod
+    def _get_rng_states():
+        """Returns a copy of the current states of all RNGs used in the main process."""
+        return {
+            "torch": torch.get_rng_state(),
+            "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None,
+            "numpy": np.random.get_state(),
+            "random": random.getstate(),
+        }
+
+    @staticmethod
+    def _load_rng_states(states):
+        """Restores the states of all RNGs used in the main process from a copy obtained earlier."""
+        torch.set_rng_state(states["torch"])
+        if states["cuda"] is not None and torch.cuda.is_available():
+            torch.cuda.set_rng_state_all(states["cuda"])
+        np.random.set_state(states["numpy"])
+        random.setstate(states["random"])
+
     @staticmethod
     def _upload_model(model, dev):
-        """Uploads a model to a specific device, wrapping it in ``torch.nn.DataParallel`` if needed."""
+        """Uploads a model to a specific device, wrapping it in ``torch.nn.DataParallel`` if needed.
+
+        In distributed sessions, the model is instead wrapped in ``torch.nn.parallel.DistributedDataParallel``
+        (if it has trainable parameters) after being uploaded to the (single) device of the current process.
+        """
+        if thelper.utils.get_distributed_info()[1] > 1:
+            assert not isinstance(dev, list) or len(dev) <= 1, "distributed processes should use a single device"
+            if isinstance(dev, list):
+                model = model.cuda(dev[0]) if dev else model.cpu()
+            else:
+                model = model.to(dev)
+            if not any([param.requires_grad for param in model.parameters()]):
+                return model  # nothing to synchronize (and DDP would refuse to wrap the model)
+            return torch.nn.parallel.DistributedDataParallel(model, device_ids=dev if dev else None)
         if isinstance(dev, list):
             if len(dev) == 0:
                 return model.cpu()
@@ -401,11 +445,18 @@ class SessionRunner:
         loss_str = ""
         if loss is not None:
             loss_str = f"   loss: {loss:.6f}"
+        # the current iteration is not over yet, so the phase times of the previous one are logged instead
+        phase_timer = getattr(self, "phase_timer", None)
+        phase_times = phase_timer.last if phase_timer is not None else {}
+        phases_str = ""
+        if phase_times:
+            phases_str = f"   prev iter: {phase_times['total'] * 1000:.1f}ms (" + \
+                ", ".join([f"{name}: {val * 1000:.1f}" for name, val in phase_times.items() if name != "total"]) + ")"
         assert self.current_epoch == epoch_idx, "something's messed up"
         self.logger.info(
             f"{set_name} epoch#{epoch_idx}  (iter#{self.current_iter})" +
             f"   batch: {iter_idx + 1}/{max_iters} ({((iter_idx + 1) / max_iters) * 100.0:.0f}%)" +
-            f"{loss_str}{monitor_str}"
+            f"{loss_str}{monitor_str}{phases_str}"
         )
         writers = thelper.utils.get_key("writers", kwargs, msg="missing writers dict in iter logger args")
         if (set_name == "train" or iter_idx == max_iters - 1) and writers[set_name]:
@@ -418,6 +469,8 @@ class SessionRunner:
                     elif metric.live_eval:
                         # if live eval is not true, metric might be too heavy to compute at each iteration
                         writers[set_name].add_scalar(f"iter/{metric_name}", metric.eval(), self.current_iter)
+            for phase_name, phase_time in phase_times.items():
+                writers[set_name].add_scalar(f"iter/phases/{phase_name}_ms", phase_time * 1000, self.current_iter)
         if set_name == "train":
             self.current_iter += 1
 
@@ -462,8 +515,17 @@ class SessionRunner:
                 with open(pkl_path, "wb") as fd:
                     pickle.dump(val, fd)
 
-    def _write_metrics_data(self, epoch, metrics, tbx_writer, output_path, loss=None, optimizer=None, use_suffix=True):
-        """Writes the cumulative evaluation result of all metrics using a specific writer."""
+    def _write_metrics_data(self, epoch, metrics, tbx_writer, output_path, loss=None, optimizer=None, use_suffix=True,
+                            loader=None, phase_timer=None):
+        """Writes the cumulative evaluation result of all metrics using a specific writer.
+
+        If the provided loader profiled its transform stages (see :class:`thelper.data.loaders.DataLoader`), the
+        per-stage statistics gathered over the epoch will also be written and logged here, and so will the iteration
+        phase times of the provided timer (see :class:`thelper.train.utils.PhaseTimer`). In distributed sessions,
+        only the main process writes these results.
+        """
+        if not thelper.utils.is_main_process():
+            return
         os.makedirs(output_path, exist_ok=True)
         if tbx_writer is not None:
             if loss is not None:
@@ -490,9 +552,31 @@ class SessionRunner:
                     output[f"{metric_name}/text/extension"] = getattr(metric, "ext", "txt")
                 output[metric_name] = eval_res
             self._write_data(output, writer_prefix, file_suffix, tbx_writer, output_path, epoch)
+        stage_stats = getattr(loader, "stage_stats", None) if loader is not None else None
+        if stage_stats:
+            report = thelper.transforms.utils.report_stage_stats(stage_stats)
+            self.logger.info(f"transform stages profiling results:\n{report}")
+            output = {"transforms/text": report}
+            for stage_name, (count, elapsed_time, nbytes) in stage_stats.items():
+                output[f"transforms/{stage_name}/calls"] = count
+                output[f"transforms/{stage_name}/time_ms"] = 1000 * elapsed_time / max(count, 1)
+                output[f"transforms/{stage_name}/out_bytes"] = nbytes / max(count, 1)
+            self._write_data(output, writer_prefix, file_suffix, tbx_writer, output_path, epoch)
+        if phase_timer is not None and phase_timer.sample_counts:
+            report = phase_timer.report()
+            self.logger.info(f"iteration phases profiling results:\n{report}")
+            output = {"phases/text": report, **{f"phases/{key}": val for key, val in phase_timer.summary().items()}}
+            self._write_data(output, writer_prefix, file_suffix, tbx_writer, output_path, epoch)
 
-    def _save(self, epoch, iter, optimizer, scheduler, save_best=False):
-        """Saves a session checkpoint containing all the information required to resume training."""
+    def _save(self, epoch, iter, optimizer, scheduler, save_best=False, resume_state=None):
+        """Saves a session checkpoint containing all the information required to resume training.
+
+        For mid-epoch checkpoints, the state required to resume the interrupted epoch (e.g. loader position,
+        RNG states, consumers) should be provided via ``resume_state``. In distributed sessions, only the
+        main process saves checkpoints.
+        """
+        if not thelper.utils.is_main_process():
+            return
         # logically, this should only be called during training (i.e. with a valid optimizer)
         log_stamp = thelper.utils.get_log_stamp()
         # the saved state below should be kept compatible with the one in thelper.cli.export_model
@@ -516,11 +600,14 @@ class SessionRunner:
             "monitor_best_epoch": self.monitor_best_epoch,
             "config": self.config  # note: this is the global app config
         }
-        filename = f"ckpt.{epoch:04d}.{log_stamp}.pth"
-        filename = os.path.join(self.checkpoint_dir, filename)
-        self.logger.debug(f"writing checkpoint to {os.path.abspath(filename)}")
-        torch.save(curr_state, filename)
-        if save_best:
-            filename_best = os.path.join(self.checkpoint_dir, "ckpt.best.pth")
-            self.logger.debug(f"writing checkpoint to {os.path.abspath(filename_best)}")
-            torch.save(curr_state, filename_best)
+        if resume_state is not None:
+            curr_state["resume"] = resume_state
+        if self.checkpoint_writer.background:
+            # the state must be copied as training will keep updating the model/optimizer while it is written
+            curr_state = self.checkpoint_writer.snapshot(curr_state)
+        if resume_state is not None:
+            filename = thelper.utils.CheckpointWriter.get_mid_epoch_name(epoch, log_stamp)
+        else:
+            filename = thelper.utils.CheckpointWriter.get_epoch_name(epoch, log_stamp)
+        self.logger.debug(f"saving checkpoint as {os.path.abspath(os.path.join(self.checkpoint_dir, filename))}")
+        self.checkpoint_writer.write(curr_state, filename, save_best=save_best)
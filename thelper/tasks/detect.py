@@ -153,12 +153,12 @@ class BoundingBox:
     @property
     def width(self):
         """Returns the width of the bounding box."""
-        return (self._bbox[2] - self._bbox[0]) + 1 if self.include_margin else 0
+        return (self._bbox[2] - self._bbox[0]) + (1 if self.include_margin else 0)
 
     @property
     def height(self):
         """Returns the height of the bounding box."""
-        return (self._bbox[3] - self._bbox[1]) + 1 if self.include_margin else 0
+        return (self._bbox[3] - self._bbox[1]) + (1 if self.include_margin else 0)
 
     @property
     def centroid(self, floor=False):
@@ -329,7 +329,7 @@ class BoundingBox:
         """Gets a ``list`` representation of the underlying bounding box tuple :math:`(x_min,y_min,x_max,y_max)`.
 
         This ensures that ``Tensor`` objects are converted to native *Python* types."""
-        return self._bbox.tolist() if isinstance(self._bbox, torch.Tensor) else list(self._bbox)
+        return self._bbox.tolist() if isinstance(self._bbox, (torch.Tensor, np.ndarray)) else list(self._bbox)
 
     def json(self):
         # type: () -> thelper.typedefs.JSON
@@ -355,6 +355,245 @@ class BoundingBox:
             f"iscrowd={repr(self.iscrowd)}, confidence={repr(self.confidence)}, image_id={repr(self.image_id)})"
 
 
+@thelper.concepts.detection
+class BoundingBoxArray:
+    """Structure-of-arrays container used to hold the metadata of many bounding boxes at once.
+
+    This container holds the same metadata as :class:`thelper.tasks.detect.BoundingBox`, but stores each
+    attribute of all boxes in a single numpy array. This allows trainers, loggers and metrics to collate,
+    filter, and compare large groups of bounding boxes without looping over Python objects. Individual
+    :class:`thelper.tasks.detect.BoundingBox` objects can still be obtained by indexing or iterating over
+    the container; these are created lazily, and their coordinates share memory with the array.
+
+    Note that confidence values are limited to one scalar per bounding box; undefined confidences are
+    stored as NaN, and undefined image identifiers are stored as ``None``.
+
+    Attributes:
+        class_ids: N-element array of type identifiers (integer indices or string names).
+        bboxes: Nx4 array holding the (xmin,ymin,xmax,ymax) bounding box parameters.
+        include_margin: N-element boolean array defining whether xmax/ymax are included in the box areas.
+        difficult: N-element boolean array defining whether instances are considered "difficult".
+        occluded: N-element boolean array defining whether instances are considered "occluded".
+        truncated: N-element boolean array defining whether instances are considered "truncated".
+        iscrowd: N-element boolean array defining whether instances cover a "crowd" of objects.
+        confidences: N-element floating point array of prediction confidence values (NaN if undefined).
+        image_ids: N-element array of identifiers for the images containing the bounding boxes.
+        task: reference to the task object that holds extra metadata regarding the content of the bboxes.
+
+    .. seealso::
+        | :class:`thelper.tasks.detect.BoundingBox`
+        | :class:`thelper.tasks.detect.Detection`
+    """
+
+    def __init__(self, class_ids, bboxes, include_margin=True, difficult=False, occluded=False,
+                 truncated=False, iscrowd=False, confidences=None, image_ids=None, task=None):
+        """Receives and stores detection metadata arrays (scalar values are broadcast to all bboxes)."""
+        bboxes = self._get_array(bboxes)
+        if bboxes.size == 0:
+            bboxes = bboxes.reshape(0, 4)
+        assert bboxes.ndim == 2 and bboxes.shape[1] == 4, "bboxes should be provided as a Nx4 array"
+        assert np.issubdtype(bboxes.dtype, np.number), "input bbox values must be integer/float"
+        assert (bboxes[:, 0] <= bboxes[:, 2]).all() and (bboxes[:, 1] <= bboxes[:, 3]).all(), \
+            "invalid min/max values for bbox coordinates"
+        count = len(bboxes)
+        self.bboxes = bboxes
+        self.class_ids = self._get_array(class_ids, count)
+        assert self.class_ids.dtype.kind in "iuUO", "class should be defined as integer (index) or string (name)"
+        self.include_margin = self._get_array(include_margin, count, dtype=bool)
+        self.difficult = self._get_array(difficult, count, dtype=bool)
+        self.occluded = self._get_array(occluded, count, dtype=bool)
+        self.truncated = self._get_array(truncated, count, dtype=bool)
+        self.iscrowd = self._get_array(iscrowd, count, dtype=bool)
+        self.confidences = self._get_array(np.nan if confidences is None else confidences, count, dtype=np.float64)
+        self.image_ids = self._get_array(image_ids, count)
+        self.task = task
+
+    @staticmethod
+    def _get_array(value, count=None, dtype=None):
+        """Returns a numpy array from a list/array/tensor, or broadcasts a scalar value to an array."""
+        if isinstance(value, torch.Tensor):
+            value = value.detach().cpu().numpy()
+        if value is None or np.ndim(value) == 0:
+            assert count is not None, "cannot broadcast scalar value without a bbox count"
+            return np.full(count, value, dtype=dtype if dtype is not None or value is not None else object)
+        array = np.asarray(value, dtype=dtype)
+        assert count is None or array.shape == (count,), "unexpected bbox attribute array shape"
+        return array
+
+    @staticmethod
+    def from_bboxes(bboxes, task=None):
+        """Returns a bounding box array created from a list of bounding boxes (or of bounding box arrays).
+
+        If the input is already a :class:`thelper.tasks.detect.BoundingBoxArray`, it is returned as-is.
+        """
+        if isinstance(bboxes, BoundingBoxArray):
+            return bboxes
+        assert isinstance(bboxes, (list, tuple, np.ndarray)), "unexpected bounding box list type"
+        if len(bboxes) == 0:
+            return BoundingBoxArray(class_ids=np.empty(0, dtype=np.int64), bboxes=np.empty((0, 4)), task=task)
+        if any([isinstance(b, (BoundingBoxArray, list, tuple)) for b in bboxes]):
+            # nested lists (e.g. batches of bboxes) are flattened into a single array
+            return BoundingBoxArray.concat([BoundingBoxArray.from_bboxes(b if isinstance(b, (BoundingBoxArray, list, tuple)) else [b], task)
+                                            for b in bboxes])
+        assert all([isinstance(b, BoundingBox) for b in bboxes]), "invalid bounding box list content"
+        assert all([b.confidence is None or thelper.utils.is_scalar(b.confidence) for b in bboxes]), \
+            "bounding box arrays only support scalar confidence values"
+        if task is None:
+            task = next((b.task for b in bboxes if b.task is not None), None)
+        return BoundingBoxArray(class_ids=[b.class_id for b in bboxes],
+                                bboxes=np.asarray([b.tolist() for b in bboxes]),
+                                include_margin=[b.include_margin for b in bboxes],
+                                difficult=[b.difficult for b in bboxes],
+                                occluded=[b.occluded for b in bboxes],
+                                truncated=[b.truncated for b in bboxes],
+                                iscrowd=[b.iscrowd for b in bboxes],
+                                confidences=[np.nan if b.confidence is None else float(b.confidence) for b in bboxes],
+                                image_ids=np.asarray([b.image_id for b in bboxes]),
+                                task=task)
+
+    @staticmethod
+    def concat(arrays):
+        """Returns a bounding box array that contains the concatenated content of all input arrays."""
+        assert isinstance(arrays, (list, tuple)) and all([isinstance(a, BoundingBoxArray) for a in arrays]), \
+            "expected a list of bounding box arrays to concatenate"
+
+        def merge(values):
+            values = [v for v in values if len(v)] or values[:1]
+            kinds = set([v.dtype.kind for v in values])
+            if len(kinds) > 1 and not kinds <= set("iuf"):
+                values = [v.astype(object) for v in values]  # avoids type promotion errors (e.g. ints vs strings)
+            return np.concatenate(values)
+
+        if not arrays:
+            return BoundingBoxArray(class_ids=np.empty(0, dtype=np.int64), bboxes=np.empty((0, 4)))
+        return BoundingBoxArray(class_ids=merge([a.class_ids for a in arrays]),
+                                bboxes=merge([a.bboxes for a in arrays]),
+                                include_margin=merge([a.include_margin for a in arrays]),
+                                difficult=merge([a.difficult for a in arrays]),
+                                occluded=merge([a.occluded for a in arrays]),
+                                truncated=merge([a.truncated for a in arrays]),
+                                iscrowd=merge([a.iscrowd for a in arrays]),
+                                confidences=merge([a.confidences for a in arrays]),
+                                image_ids=merge([a.image_ids for a in arrays]),
+                                task=next((a.task for a in arrays if a.task is not None), None))
+
+    @property
+    def task(self):
+        """Returns the reference to the task object that holds extra metadata regarding the content of the bboxes."""
+        return self._task
+
+    @task.setter
+    def task(self, value):
+        """Sets the reference to the task object that holds extra metadata regarding the content of the bboxes."""
+        if value is not None:
+            assert isinstance(value, Detection), "task should be detection-related"
+            assert np.isin(self.class_ids, list(value.class_indices.values())).all(), \
+                "cannot find all class ids in task indices"
+        self._task = value
+
+    @property
+    def widths(self):
+        """Returns the widths of the bounding boxes."""
+        return (self.bboxes[:, 2] - self.bboxes[:, 0]) + self.include_margin
+
+    @property
+    def heights(self):
+        """Returns the heights of the bounding boxes."""
+        return (self.bboxes[:, 3] - self.bboxes[:, 1]) + self.include_margin
+
+    @property
+    def areas(self):
+        """Returns the total surfaces of the bounding boxes."""
+        return self.widths * self.heights
+
+    def get_class_mask(self, class_idx, class_name=None):
+        """Returns a boolean mask of the bounding boxes whose type identifier matches a class index or name."""
+        mask = np.zeros(len(self), dtype=bool)
+        if self.class_ids.dtype.kind in "iuO":
+            mask |= self.class_ids == class_idx
+        if class_name is not None and self.class_ids.dtype.kind in "UO":
+            mask |= self.class_ids == class_name
+        return mask
+
+    def intersection(self, other):
+        """Returns the matrix of intersection areas between these bboxes and the ones of another array."""
+        assert isinstance(other, BoundingBoxArray), "unexpected input bounding box array type"
+        bboxes1, bboxes2 = self.bboxes[:, None, :], other.bboxes[None, :, :]
+        margin1, margin2 = self.include_margin[:, None], other.include_margin[None, :]
+        intersection_width = np.minimum(bboxes1[..., 2] + margin1, bboxes2[..., 2] + margin2) - \
+            np.maximum(bboxes1[..., 0], bboxes2[..., 0])
+        intersection_height = np.minimum(bboxes1[..., 3] + margin1, bboxes2[..., 3] + margin2) - \
+            np.maximum(bboxes1[..., 1], bboxes2[..., 1])
+        return np.maximum(intersection_width, 0) * np.maximum(intersection_height, 0)
+
+    def iou(self, other):
+        """Returns the matrix of Intersection over Union (IoU) scores between these bboxes and another array."""
+        intersection_area = self.intersection(other)
+        union_area = self.areas[:, None] + other.areas[None, :] - intersection_area
+        return (intersection_area / union_area).astype(np.float64)
+
+    def to_target(self):
+        """Returns the content of this array as a dictionary of tensors in the torchvision detection format.
+
+        See https://pytorch.org/tutorials/intermediate/torchvision_tutorial.html for more information.
+        The original array is also stored in the dictionary under the ``refs`` key.
+        """
+        assert self.class_ids.dtype.kind in "iu" or len(self) == 0, "torchvision targets require integer class ids"
+        image_ids = self.image_ids if self.image_ids.dtype.kind in "iu" else np.full(len(self), -1)
+        return {
+            "boxes": torch.as_tensor(self.bboxes, dtype=torch.float32),
+            "labels": torch.as_tensor(self.class_ids.astype(np.int64)),
+            "image_id": torch.as_tensor(image_ids),
+            "area": torch.as_tensor(self.areas, dtype=torch.float32),
+            "iscrowd": torch.as_tensor(self.iscrowd, dtype=torch.int64),
+            "refs": self
+        }
+
+    def tolist(self):
+        # type: () -> List[BoundingBox]
+        """Returns a list of bounding box objects that are views on the content of this array."""
+        return [self[idx] for idx in range(len(self))]
+
+    def __len__(self):
+        """Returns the number of bounding boxes in the array."""
+        return len(self.bboxes)
+
+    def __iter__(self):
+        """Yields bounding box objects that are views on the content of this array."""
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def __getitem__(self, idx):
+        """Returns a bounding box view for an integer index, or a subset of the array for slices/masks/arrays."""
+        if isinstance(idx, (int, np.integer)):
+            # we bypass the setter checks, as the array content has been validated on construction
+            bbox = BoundingBox.__new__(BoundingBox)
+            bbox._class_id = self.class_ids[idx].item() if isinstance(self.class_ids[idx], np.generic) else self.class_ids[idx]
+            bbox._include_margin = bool(self.include_margin[idx])
+            bbox._bbox = self.bboxes[idx]  # this is a numpy view, so coordinate updates will affect the array
+            bbox._difficult = bool(self.difficult[idx])
+            bbox._occluded = bool(self.occluded[idx])
+            bbox._truncated = bool(self.truncated[idx])
+            bbox._iscrowd = bool(self.iscrowd[idx])
+            bbox._confidence = None if np.isnan(self.confidences[idx]) else float(self.confidences[idx])
+            image_id = self.image_ids[idx]
+            bbox._image_id = image_id.item() if isinstance(image_id, np.generic) else image_id
+            bbox._task = self.task
+            return bbox
+        return BoundingBoxArray(class_ids=self.class_ids[idx], bboxes=self.bboxes[idx],
+                                include_margin=self.include_margin[idx], difficult=self.difficult[idx],
+                                occluded=self.occluded[idx], truncated=self.truncated[idx],
+                                iscrowd=self.iscrowd[idx], confidences=self.confidences[idx],
+                                image_ids=self.image_ids[idx], task=self.task)
+
+    def __repr__(self):
+        """Creates a print-friendly representation of the bounding box array."""
+        # note: we do not export the task reference here (it might be too heavy for logs)
+        return self.__class__.__module__ + "." + self.__class__.__qualname__ + \
+            f"(class_ids={repr(self.class_ids)}, bboxes={repr(self.bboxes)}, " + \
+            f"confidences={repr(self.confidences)}, image_ids={repr(self.image_ids)})"
+
+
 @thelper.concepts.detection
 class Detection(Regression, ClassNamesHandler, ColorMapHandler):
     """Interface for object detection tasks.
@@ -107,41 +107,51 @@ class AutoEncoderTrainer(Trainer):
         assert optimizer is not None, "missing optimizer"
         assert loader, "no available data to load"
         assert isinstance(metrics, dict), "expect metrics as dict object"
-        epoch_loss = 0
         epoch_size = len(loader)
         self.logger.debug("fetching data loader samples...")
-        for idx, sample in enumerate(loader):
-            input_val, target_val = self._to_tensor(sample)
-            input_val_dev = self._move_tensor(input_val, dev)
-            target_val_dev = self._move_tensor(target_val, dev)
+        for idx, sample in self._enumerate_train_loader(loader, optimizer):
+            with self._phase("to_tensor"):
+                input_val, target_val = self._to_tensor(sample)
             assert target_val is not None, "groundtruth required when training a model"
-            optimizer.zero_grad()
-            class_logits, reconstr = model(input_val_dev)
-            classif_loss = self.classif_loss(class_logits, target_val_dev)
-            reconstr_loss = self.reconstr_l2_loss(reconstr, input_val_dev)
-            if self.reconstr_edges_layer:
-                target_edges_shape = (
-                    reconstr.shape[0],
-                    reconstr.shape[1] * 2,  # for gradX/gradY
-                    reconstr.shape[2],
-                    reconstr.shape[3],
-                )
-                reconstr_gradients = self.reconstr_edges_layer(reconstr).view(target_edges_shape)
-                input_gradients = self.reconstr_edges_layer(input_val_dev).view(target_edges_shape)
-                reconstr_edge_loss = self.reconstr_l1_loss(reconstr_gradients, input_gradients)
-                reconstr_loss += reconstr_edge_loss
-            iter_loss = classif_loss + self.reconstr_scale * reconstr_loss
-            iter_loss.backward()
-            optimizer.step()
+            if self._is_accumulation_start(idx):
+                optimizer.zero_grad()
+            loss_scale = self._get_accumulation_scale(idx, epoch_size)
+            sync = self._is_accumulation_end(idx, epoch_size)  # only sync gradients before optimizer steps
+            iter_loss, class_logits = 0, []
+            for start, end in self._get_micro_batches(len(input_val)):
+                input_val_dev = self._move_tensor(input_val[start:end], dev)
+                target_val_dev = self._move_tensor(target_val[start:end], dev)
+                with self._grad_sync(model, sync and end == len(input_val)), self._autocast():
+                    micro_logits, reconstr = model(input_val_dev)
+                    classif_loss = self.classif_loss(micro_logits, target_val_dev)
+                    reconstr_loss = self.reconstr_l2_loss(reconstr, input_val_dev)
+                    if self.reconstr_edges_layer:
+                        target_edges_shape = (
+                            reconstr.shape[0],
+                            reconstr.shape[1] * 2,  # for gradX/gradY
+                            reconstr.shape[2],
+                            reconstr.shape[3],
+                        )
+                        reconstr_gradients = self.reconstr_edges_layer(reconstr).view(target_edges_shape)
+                        input_gradients = self.reconstr_edges_layer(input_val_dev).view(target_edges_shape)
+                        reconstr_edge_loss = self.reconstr_l1_loss(reconstr_gradients, input_gradients)
+                        reconstr_loss += reconstr_edge_loss
+                    micro_loss = classif_loss + self.reconstr_scale * reconstr_loss
+                # weigh the micro-batch loss so that gradients match the full minibatch average
+                micro_weight = (end - start) / len(input_val)
+                self._backward(micro_loss * (micro_weight * loss_scale))
+                iter_loss += micro_loss.detach() * micro_weight
+                class_logits.append(micro_logits.detach())
+            class_logits = class_logits[0] if len(class_logits) == 1 else torch.cat(class_logits, dim=0)
+            if sync:
+                self._optimizer_step(optimizer)
             iter_loss = iter_loss.item()
-            for metric in metrics.values():
-                metric.update(task=self.task, input=input_val, pred=class_logits,
-                              target=target_val, sample=sample, loss=iter_loss, iter_idx=idx,
-                              max_iters=epoch_size, epoch_idx=epoch, max_epochs=self.epochs,
-                              output_path=output_path)
-            epoch_loss += iter_loss
-        epoch_loss /= epoch_size
-        return epoch_loss
+            self._update_metrics(metrics, task=self.task, input=input_val, pred=self._to_fp32_cpu(class_logits),
+                                 target=target_val, sample=sample, loss=iter_loss, iter_idx=idx,
+                                 max_iters=epoch_size, epoch_idx=epoch, max_epochs=self.epochs,
+                                 output_path=output_path)
+            self.epoch_loss_sum += iter_loss  # initialized (or restored on resume) by the loader enumerator
+        return self.epoch_loss_sum / epoch_size
 
     def eval_epoch(self, model, epoch, dev, loader, metrics, output_path):
         """Evaluates the model using the provided objects.
@@ -160,32 +170,34 @@ class AutoEncoderTrainer(Trainer):
             epoch_size = len(loader)
             self.logger.debug("fetching data loader samples...")
             display_array = []
-            for idx, sample in enumerate(loader):
+            for idx, sample in self._enumerate_eval_loader(loader):
                 if idx < self.skip_eval_iter:
                     continue  # skip until previous iter count (if set externally; no effect otherwise)
-                input_val, target_val = self._to_tensor(sample)
+                with self._phase("to_tensor"):
+                    input_val, target_val = self._to_tensor(sample)
                 input_val_dev = self._move_tensor(input_val, dev)
                 target_val_dev = self._move_tensor(target_val, dev)
-                class_logits, reconstr = model(input_val_dev)
-                classif_loss = self.classif_loss(class_logits, target_val_dev)
-                reconstr_loss = self.reconstr_l2_loss(reconstr, input_val_dev)
-                if self.reconstr_edges_layer:
-                    target_edges_shape = (
-                        reconstr.shape[0],
-                        reconstr.shape[1] * 2,  # for gradX/gradY
-                        reconstr.shape[2],
-                        reconstr.shape[3],
-                    )
-                    reconstr_gradients = self.reconstr_edges_layer(reconstr).view(target_edges_shape)
-                    input_gradients = self.reconstr_edges_layer(input_val_dev).view(target_edges_shape)
-                    reconstr_edge_loss = self.reconstr_l1_loss(reconstr_gradients, input_gradients)
-                    reconstr_loss += reconstr_edge_loss
-                iter_loss = (classif_loss + self.reconstr_scale * reconstr_loss).item()
-                for metric in metrics.values():
-                    metric.update(task=self.task, input=input_val, pred=class_logits,
-                                  target=target_val, sample=sample, loss=iter_loss, iter_idx=idx,
-                                  max_iters=epoch_size, epoch_idx=epoch, max_epochs=self.epochs,
-                                  output_path=output_path)
+                with self._autocast():
+                    class_logits, reconstr = model(input_val_dev)
+                    classif_loss = self.classif_loss(class_logits, target_val_dev)
+                    reconstr_loss = self.reconstr_l2_loss(reconstr, input_val_dev)
+                    if self.reconstr_edges_layer:
+                        target_edges_shape = (
+                            reconstr.shape[0],
+                            reconstr.shape[1] * 2,  # for gradX/gradY
+                            reconstr.shape[2],
+                            reconstr.shape[3],
+                        )
+                        reconstr_gradients = self.reconstr_edges_layer(reconstr).view(target_edges_shape)
+                        input_gradients = self.reconstr_edges_layer(input_val_dev).view(target_edges_shape)
+                        reconstr_edge_loss = self.reconstr_l1_loss(reconstr_gradients, input_gradients)
+                        reconstr_loss += reconstr_edge_loss
+                    iter_loss = (classif_loss + self.reconstr_scale * reconstr_loss).item()
+                reconstr = reconstr.float()  # for display purposes below
+                self._update_metrics(metrics, task=self.task, input=input_val, pred=self._to_fp32_cpu(class_logits),
+                                     target=target_val, sample=sample, loss=iter_loss, iter_idx=idx,
+                                     max_iters=epoch_size, epoch_idx=epoch, max_epochs=self.epochs,
+                                     output_path=output_path)
                 if self.use_tbx:
                     if isinstance(self.reconstr_display_mean, str):
                         display_mean = eval(self.reconstr_display_mean)
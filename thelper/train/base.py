@@ -3,9 +3,14 @@
 This module contains the interface required to train and/or evaluate a model based on different tasks. The trainers
 based on this interface are instantiated in launched sessions based on configuration dictionaries.
 """
+import contextlib
 import functools
+import itertools
 import logging
 import math
+import os
+import shutil
+import time
 from abc import abstractmethod
 from typing import AnyStr, Optional
 
@@ -13,6 +18,8 @@ import torch
 
 import thelper.optim
 import thelper.tasks
+import thelper.train.utils
+import thelper.utils
 from thelper.session.base import SessionRunner
 
 logger = logging.getLogger(__name__)
@@ -41,11 +48,87 @@ class Trainer(SessionRunner):
       information on special parameters.
     - ``save_freq`` (optional, default=1): checkpoint save frequency (will save every epoch multiple of given number).
     - ``save_raw`` (optional, default=True): specifies whether to save raw types or thelper objects in checkpoints.
+    - ``keep_checkpoints`` (optional, default=0): number of epoch checkpoints to keep on disk; older ones are removed
+      after each save. The best checkpoint (``ckpt.best.pth``, a hard link to its epoch checkpoint) is always kept.
+      Zero means that all checkpoints are kept. Mid-epoch checkpoints are not counted here (see ``save_iter_freq``).
+    - ``async_checkpoints`` (optional, default=False): specifies whether checkpoints should be written by a background
+      thread from a CPU snapshot of the session state instead of blocking the training loop during serialization.
+    - ``save_iter_freq`` (optional, default=0): frequency of mid-epoch checkpoint saves while training (i.e. save every X
+      training iterations). Mid-epoch checkpoints contain the sample order and position of the training loader, the
+      RNG states of the main process, and the training consumers, so that the interrupted epoch can be resumed from
+      where it was saved without loading the skipped samples again. These are saved as ``ckpt.<epoch>.<stamp>.mid.pth``
+      in a single slot: each one replaces the previous one, and all are removed once the epoch checkpoint is saved.
+      Zero means that these are never saved.
+    - ``save_time_freq`` (optional, default=0): minimum delay (in minutes) between mid-epoch checkpoint saves while
+      training. Zero means that these are never saved based on time. Note that mid-epoch checkpoints are only saved
+      after an optimizer step (i.e. at the end of a gradient accumulation window).
+    - ``compile`` (optional, default=None): sub-dictionary (or type string, or boolean) specifying how the uploaded model
+      should be compiled before training/evaluation. Its ``type`` can be ``compile`` (``torch.compile``, with extra
+      arguments given via ``params``), ``script`` (``torch.jit.script``, followed by ``torch.jit.freeze`` in evaluation
+      if ``freeze`` is true), or ``auto`` (``torch.compile`` if available, and TorchScript otherwise in evaluation). If
+      compilation fails, the eager model is used instead. Compilation is triggered by ``warmup_iters`` forward passes
+      on a minibatch (not timed, and followed by backward passes for training), after which the eager and compiled
+      models are timed over ``timing_iters`` forward passes and their latencies are logged side-by-side.
+    - ``memory_format`` (optional, default="contiguous"): memory format of the model parameters and 4D input tensors.
+      With ``channels_last``, the parameters are converted before being uploaded, and 4D floating point tensors are
+      converted when they are uploaded, so that no hook is added to the model; setting the same option in the data
+      loaders configuration allows the minibatches to be collated directly in that format instead (see
+      :func:`thelper.data.loaders.default_collate`).
+    - ``profile_phases`` (optional, default=False): specifies whether the time spent in each phase of the training
+      and evaluation iterations (loader wait, ``_to_tensor`` conversion, device transfers, forward, backward,
+      optimizer step, and metric updates) should be measured. The phase times of the previous iteration are logged
+      with each iteration, and their mean and percentiles over each epoch (along with the sample throughput) are
+      logged, written to tensorboard, and added to the session outputs. CUDA devices are synchronized at phase
+      boundaries, which may slow down training slightly. See :class:`thelper.train.utils.PhaseTimer`.
+    - ``profile_percentiles`` (optional, default=[50, 90, 99]): percentiles of the per-iteration phase times to report.
+    - ``profiler`` (optional, default=None): sub-dictionary (or boolean) specifying which iterations of the training and
+      evaluation epochs should be traced with ``torch.profiler``. The ``sets`` (default=["train"]) and ``epochs``
+      (default=None, i.e. the first epoch of each set in the current run) to trace can be selected, and the traced
+      iterations of these epochs are given by the ``skip_first`` (default=0), ``wait`` (default=1), ``warmup``
+      (default=1), ``active`` (default=3), and ``repeat`` (default=1) schedule parameters. Tensor shapes and memory
+      allocations are recorded by default (``record_shapes``, ``profile_memory``; ``with_stack`` is disabled). Each
+      trace is exported in a ``profiler`` folder of the session output directory of its set, both as a tensorboard
+      profiler plugin trace (``export_tensorboard``) and as a Chrome trace (``export_chrome``), with a summary table
+      of the ``row_limit`` (default=20) costliest operators. The profiler is only created for the selected epochs, and
+      it is stopped right after its last active iteration, so the other iterations are not slowed down.
+    - ``batch_size_finder`` (optional, default=None): sub-dictionary (or boolean) specifying whether the largest
+      training batch size whose forward and backward passes fit in a memory budget should be searched for before
+      training starts (see :meth:`thelper.train.base.Trainer.find_max_batch_size`). The ``memory_budget_mb`` (default:
+      90% of the memory of the CUDA device; mandatory on CPU) bounds the peak memory usage, and the search is done
+      between ``min_batch_size`` (default=2) and ``max_batch_size`` (default=4096) using synthetic inputs shaped from
+      the ``input_shape`` of the task or copies of a training minibatch (``source``: ``auto``, ``synthetic``, or
+      ``loader``). The batch size is written in the loaders configuration, and the learning rate of the optimizer
+      can be scaled accordingly (``scale_lr``: ``linear`` or ``sqrt``; disabled by default). The search is skipped
+      when resuming a session.
     - ``use_tbx`` (optional, default=False): defines whether to use tensorboardX writers for logging or not.
     - ``device`` (optional): specifies which device to train/evaluate the model on (default=all available).
     - ``metrics``: list of metrics to instantiate and update during training/evaluation; see related loading function for
       more information.
     - ``monitor``: specifies the name of the metric that should be monitored on the validation set for model improvement.
+    - ``batch_augments`` (optional, default=False): specifies whether the augmented copies of a minibatch (i.e. when
+      samples are turned into lists by a ``Duplicator`` or an augmentation stage) should be concatenated along the batch
+      dimension and forwarded together instead of one at a time. This assumes that the loss is averaged over samples.
+    - ``augments_max_batch_size`` (optional, default=0): maximum number of samples to forward at once when batching
+      augmented copies, used to bound memory usage (copies will be forwarded in chunks). Zero means no limit.
+    - ``precision`` (optional, default="fp32"): numerical precision to use for forward passes and loss computations. Can
+      be ``fp32``, ``bf16``, or ``fp16``. With ``bf16`` or ``fp16``, these computations are run under ``torch.autocast``;
+      ``fp16`` falls back to ``bf16`` on CPU (and vice-versa on GPUs without bf16 support), and uses a gradient scaler.
+      Predictions are always handed off to metrics as fp32 CPU tensors.
+    - ``accumulation_steps`` (optional, default=1): number of loader minibatches over which gradients are accumulated
+      before each optimizer step. Losses are normalized so that the accumulated gradients match the average over all
+      minibatches of the window (including a shorter window at the end of the epoch, where a step is always taken).
+      In distributed sessions, gradients are only averaged over processes in the last backward pass of each window.
+    - ``micro_batch_size`` (optional, default=0): maximum number of samples to forward and backpropagate at once; larger
+      loader minibatches are split in micro-batches whose gradients are summed before the optimizer step. Zero means no
+      limit. This assumes that the loss is averaged over samples; note that normalization layers will only see the
+      statistics of each micro-batch. Metrics are still updated (and iterations still counted) once per minibatch.
+    - ``async_metrics`` (optional, default=False): specifies whether consumers that are marked as thread-safe (see
+      :meth:`thelper.ifaces.PredictionConsumer.thread_safe`) should be updated from a background thread instead of
+      inside the training/evaluation loop. Metrics that are evaluated live at every iteration (including the
+      monitored one) are always updated inside the loop. Pending updates are always flushed before consumers are
+      evaluated or rendered at the end of an epoch.
+    - ``async_metrics_queue_size`` (optional, default=8): maximum number of pending minibatch updates for
+      asynchronous consumers before the training/evaluation loop blocks. Zero means no limit.
 
     Example configuration file::
 
@@ -128,6 +211,670 @@ class Trainer(SessionRunner):
                  ckptdata=None    # type: Optional[thelper.typedefs.CheckpointContentType]
                  ):
         super(Trainer, self).__init__(session_name, session_dir, model, task, loaders, config, ckptdata=ckptdata)
+        trainer_config = thelper.utils.get_key(["trainer", "runner", "tester"], config)
+        self.batch_augments = thelper.utils.str2bool(thelper.utils.get_key_def("batch_augments", trainer_config, False))
+        self.augments_max_batch_size = int(thelper.utils.get_key_def("augments_max_batch_size", trainer_config, 0))
+        assert self.augments_max_batch_size >= 0, "augmented copies max batch size should be positive integer (or zero)"
+        self.precision, self.autocast_device, self.autocast_dtype, self.grad_scaler = \
+            self._load_precision(thelper.utils.get_key_def("precision", trainer_config, "fp32"))
+        self.accumulation_steps = int(thelper.utils.get_key_def("accumulation_steps", trainer_config, 1))
+        assert self.accumulation_steps >= 1, "gradient accumulation steps should be strictly positive integer"
+        self.micro_batch_size = int(thelper.utils.get_key_def("micro_batch_size", trainer_config, 0))
+        assert self.micro_batch_size >= 0, "micro-batch size should be positive integer (or zero)"
+        self.async_metrics = thelper.utils.str2bool(thelper.utils.get_key_def("async_metrics", trainer_config, False))
+        self.async_metrics_queue_size = int(thelper.utils.get_key_def("async_metrics_queue_size", trainer_config, 8))
+        assert self.async_metrics_queue_size >= 0, "async metrics queue size should be positive integer (or zero)"
+        self.metrics_updater = None  # will be created on the first asynchronous update
+        self.save_iter_freq = int(thelper.utils.get_key_def("save_iter_freq", trainer_config, 0))
+        assert self.save_iter_freq >= 0, "mid-epoch checkpoint save frequency should be positive integer (or zero)"
+        self.save_time_freq = float(thelper.utils.get_key_def("save_time_freq", trainer_config, 0))
+        assert self.save_time_freq >= 0, "mid-epoch checkpoint save delay should be positive value (or zero)"
+        self.scheduler = None  # will be set while training, required for mid-epoch checkpoints
+        self.epoch_loss_sum = 0.  # running sum of the training losses of the current epoch
+        self.compile_config = self._load_compile_config(thelper.utils.get_key_def("compile", trainer_config, None))
+        self.memory_format = thelper.utils.get_memory_format(thelper.utils.get_key_def("memory_format", trainer_config, None))
+        self.phase_timer = None
+        if thelper.utils.str2bool(thelper.utils.get_key_def("profile_phases", trainer_config, False)):
+            percentiles = thelper.utils.get_key_def("profile_percentiles", trainer_config, [50, 90, 99])
+            self.phase_timer = thelper.train.utils.PhaseTimer(synchronize=bool(self.devices) and torch.cuda.is_available(),
+                                                              percentiles=[float(p) for p in percentiles])
+        self.profiler_config = self._load_profiler_config(thelper.utils.get_key_def("profiler", trainer_config, None))
+        self.profiled_sets = set()  # names of the sets that were already traced in the current run
+        self.batch_size_finder = self._load_batch_size_finder_config(
+            thelper.utils.get_key_def("batch_size_finder", trainer_config, None))
+
+    def _load_precision(self, precision):
+        """Parses the precision setting, and returns it with the autocast device type, dtype, and gradient scaler."""
+        precision_aliases = {"fp32": "fp32", "float32": "fp32", "32": "fp32", "full": "fp32",
+                             "bf16": "bf16", "bfloat16": "bf16",
+                             "fp16": "fp16", "float16": "fp16", "16": "fp16", "half": "fp16"}
+        assert str(precision).lower() in precision_aliases, f"unexpected precision setting '{precision}'"
+        precision = precision_aliases[str(precision).lower()]
+        autocast_device = "cuda" if self.devices else "cpu"
+        if precision == "fp32":
+            return precision, autocast_device, None, None
+        assert hasattr(torch, "autocast"), "mixed precision requires torch.autocast (PyTorch >= 1.10)"
+        if precision == "fp16" and autocast_device == "cpu":
+            self.logger.warning("fp16 autocast not supported on cpu, will use bf16 instead")
+            precision = "bf16"
+        elif precision == "bf16" and autocast_device == "cuda" and not torch.cuda.is_bf16_supported():
+            self.logger.warning("bf16 autocast not supported on current device(s), will use fp16 instead")
+            precision = "fp16"
+        grad_scaler = None
+        if precision == "fp16":  # bf16 has the same exponent range as fp32, so it does not need gradient scaling
+            grad_scaler = torch.amp.GradScaler("cuda") if hasattr(torch.amp, "GradScaler") else torch.cuda.amp.GradScaler()
+        self.logger.debug(f"will use {precision} autocast on {autocast_device}")
+        return precision, autocast_device, torch.bfloat16 if precision == "bf16" else torch.float16, grad_scaler
+
+    def _autocast(self):
+        """Returns the context manager in which forward passes and loss computations should be run."""
+        if self.autocast_dtype is None:
+            return contextlib.nullcontext()
+        return torch.autocast(device_type=self.autocast_device, dtype=self.autocast_dtype)
+
+    def _phase(self, name):
+        """Returns the context manager in which a profiled phase of the current iteration should be run."""
+        if self.phase_timer is None:
+            return contextlib.nullcontext()
+        return self.phase_timer.phase(name)
+
+    @staticmethod
+    def _grad_sync(model, sync):
+        """Returns the context in which a forward pass should be run, given whether its gradients should be synced.
+
+        Distributed models average their gradients over processes in every backward pass by default; this is only
+        needed in the last backward pass before an optimizer step, so the others skip it via ``no_sync``.
+        """
+        if not sync and isinstance(model, torch.nn.parallel.DistributedDataParallel):
+            return model.no_sync()
+        return contextlib.nullcontext()
+
+    def _backward(self, loss):
+        """Backpropagates the given loss, scaling it first if needed."""
+        with self._phase("backward"):
+            if self.grad_scaler is not None:
+                loss = self.grad_scaler.scale(loss)
+            loss.backward()
+
+    def _optimizer_step(self, optimizer):
+        """Updates the model parameters using the given optimizer, unscaling gradients first if needed."""
+        with self._phase("step"):
+            if self.grad_scaler is not None:
+                self.grad_scaler.step(optimizer)
+                self.grad_scaler.update()
+            else:
+                optimizer.step()
+
+    def _get_accumulation_scale(self, iter_idx, epoch_size):
+        """Returns the factor by which a minibatch loss should be scaled in its gradient accumulation window."""
+        window_start = (iter_idx // self.accumulation_steps) * self.accumulation_steps
+        return 1.0 / (min(window_start + self.accumulation_steps, epoch_size) - window_start)
+
+    def _is_accumulation_start(self, iter_idx):
+        """Returns whether gradients should be reset before the given minibatch."""
+        return iter_idx % self.accumulation_steps == 0
+
+    def _is_accumulation_end(self, iter_idx, epoch_size):
+        """Returns whether the optimizer should be stepped after the given minibatch."""
+        return (iter_idx + 1) % self.accumulation_steps == 0 or iter_idx + 1 == epoch_size
+
+    def _get_micro_batches(self, batch_size):
+        """Returns the (start, end) index ranges of the micro-batches in which a minibatch should be forwarded."""
+        if self.micro_batch_size <= 0 or batch_size <= self.micro_batch_size:
+            return [(0, batch_size)]
+        return [(idx, min(idx + self.micro_batch_size, batch_size)) for idx in range(0, batch_size, self.micro_batch_size)]
+
+    def _enumerate_train_loader(self, loader, optimizer):
+        """Enumerates the training minibatches while resuming epochs and saving mid-epoch checkpoints when needed.
+
+        If the current epoch was interrupted and saved in a mid-epoch checkpoint, the loader will be fast-forwarded
+        to the saved position, and the index of the first minibatch will be offset accordingly. Mid-epoch checkpoints
+        are saved between iterations, i.e. once the trainer requests the minibatch that follows the current one.
+
+        The running sum of the training losses of the epoch is (re)initialized in ``epoch_loss_sum`` before the first
+        minibatch is returned; trainers should add their iteration losses to it so that it can be saved in mid-epoch
+        checkpoints, and restored when resuming.
+        """
+        resume_state, start_idx = self.resume_state, 0
+        self.resume_state = None
+        if resume_state is not None and "ranks" in resume_state:
+            # mid-epoch checkpoints of distributed sessions contain the state of each process
+            rank, world_size = thelper.utils.get_distributed_info()
+            if len(resume_state["ranks"]) == world_size:
+                resume_state = {"epoch": resume_state["epoch"], **resume_state["ranks"][rank]}
+            else:
+                self.logger.warning(f"cannot resume epoch#{self.current_epoch} with a different process count")
+                resume_state = None
+        if resume_state is not None and resume_state["epoch"] == self.current_epoch:
+            if resume_state["loader"] is not None and hasattr(loader, "set_resume_state"):
+                self.logger.info(f"resuming epoch#{self.current_epoch} at iter#{resume_state['loader']['batch_idx']}")
+                start_idx = loader.set_resume_state(resume_state["loader"])
+                self.train_metrics.update(resume_state["consumers"])
+            else:
+                self.logger.warning(f"cannot fast-forward loader, will restart epoch#{self.current_epoch} from scratch")
+                resume_state = None
+        iterator = iter(loader)
+        self.epoch_loss_sum = 0.
+        if resume_state is not None:
+            self._load_rng_states(resume_state["rng"])  # must be done after the loader reseeds the RNGs
+            self.epoch_loss_sum = thelper.utils.get_key_def("loss_sum", resume_state, 0.)
+        epoch_size, last_save_time = len(loader), time.time()
+        for idx, sample in enumerate(self._profile_loader(iterator, "train"), start_idx):
+            yield idx, sample
+            if idx + 1 < epoch_size and self._is_accumulation_end(idx, epoch_size) and \
+                    self._is_mid_epoch_save_due(idx, last_save_time):
+                self._save_mid_epoch(loader, idx + 1, optimizer)
+                last_save_time = time.time()
+
+    def _enumerate_eval_loader(self, loader):
+        """Enumerates the evaluation minibatches (while profiling the iterations, if needed)."""
+        set_name = "test" if loader is getattr(self, "test_loader", None) else "valid"
+        return enumerate(self._profile_loader(loader, set_name))
+
+    def _profile_loader(self, iterable, set_name):
+        """Returns the minibatch iterable to loop over, wrapped for phase timing and operator tracing if needed."""
+        if self.phase_timer is not None:
+            self.phase_timer.reset()
+            count_fn = functools.partial(thelper.train.utils.get_batch_size, key=self.task.input_key)
+            iterable = self.phase_timer.iterate(iterable, count_fn)
+        profiler, max_steps = self._create_profiler(set_name)
+        if profiler is not None:
+            iterable = self._step_profiler(iterable, profiler, max_steps)
+        return iterable
+
+    @staticmethod
+    def _load_profiler_config(profiler_config):
+        """Parses the operator-level profiler settings; returns ``None`` if profiling is disabled."""
+        if profiler_config is None or isinstance(profiler_config, (bool, str)):
+            if profiler_config is None or not thelper.utils.str2bool(profiler_config):
+                return None
+            profiler_config = {}
+        assert isinstance(profiler_config, dict), "profiler config should be a dictionary or boolean"
+        sets = thelper.utils.get_key_def("sets", profiler_config, ["train"])
+        epochs = thelper.utils.get_key_def("epochs", profiler_config, None)
+        profiler_config = {
+            "sets": [sets] if isinstance(sets, str) else list(sets),
+            "epochs": [int(epochs)] if isinstance(epochs, (int, str)) else [int(e) for e in epochs] if epochs else None,
+            **{key: int(thelper.utils.get_key_def(key, profiler_config, default)) for key, default in
+               [("skip_first", 0), ("wait", 1), ("warmup", 1), ("active", 3), ("repeat", 1), ("row_limit", 20)]},
+            **{key: thelper.utils.str2bool(thelper.utils.get_key_def(key, profiler_config, default)) for key, default in
+               [("record_shapes", True), ("profile_memory", True), ("with_stack", False),
+                ("export_chrome", True), ("export_tensorboard", True)]},
+        }
+        assert all([s in ["train", "valid", "test"] for s in profiler_config["sets"]]), "unexpected profiler set name"
+        assert profiler_config["active"] >= 1, "profiler should have at least one active iteration"
+        assert all([profiler_config[key] >= 0 for key in ["skip_first", "wait", "warmup", "repeat"]]), \
+            "profiler schedule parameters should be positive integers (or zero)"
+        return profiler_config
+
+    def _create_profiler(self, set_name):
+        """Returns the profiler (and the number of steps it needs) to trace the current epoch of a set, if needed."""
+        config = self.profiler_config
+        if config is None or set_name not in config["sets"] or self.output_paths[set_name] is None:
+            return None, None
+        if (config["epochs"] is None and set_name in self.profiled_sets) or \
+                (config["epochs"] is not None and self.current_epoch not in config["epochs"]):
+            return None, None
+        self.profiled_sets.add(set_name)
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if self.devices and torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        output_dir = os.path.join(self.output_paths[set_name], "profiler")
+        rank, world_size = thelper.utils.get_distributed_info()
+        worker_name = f"{set_name}-{self.current_epoch:04d}" + (f"-rank{rank}" if world_size > 1 else "")
+        sort_key = "self_cuda_time_total" if len(activities) > 1 else "self_cpu_time_total"
+
+        def on_trace_ready(prof):
+            os.makedirs(output_dir, exist_ok=True)
+            trace_name = f"{worker_name}-step{prof.step_num:06d}"
+            trace_paths = []  # traces can only be saved once, so the first file gets copied if needed
+            if config["export_tensorboard"]:  # this naming convention is required by the tensorboard plugin
+                trace_paths.append(os.path.join(output_dir, f"{worker_name}.{time.time_ns() // 1000000}.pt.trace.json"))
+            if config["export_chrome"]:
+                trace_paths.append(os.path.join(output_dir, f"{trace_name}.chrome.json"))
+            if trace_paths:
+                prof.export_chrome_trace(trace_paths[0])
+                for trace_path in trace_paths[1:]:
+                    shutil.copyfile(trace_paths[0], trace_path)
+            table = prof.key_averages(group_by_input_shape=config["record_shapes"]).table(
+                sort_by=sort_key, row_limit=config["row_limit"])
+            with open(os.path.join(output_dir, f"{trace_name}.txt"), "w") as fd:
+                fd.write(table)
+            self.logger.info(f"{set_name} epoch#{self.current_epoch} profiler trace ready (step {prof.step_num}):\n{table}")
+
+        schedule = torch.profiler.schedule(skip_first=config["skip_first"], wait=config["wait"], warmup=config["warmup"],
+                                           active=config["active"], repeat=config["repeat"])
+        max_steps = config["skip_first"] + (config["wait"] + config["warmup"] + config["active"]) * config["repeat"] \
+            if config["repeat"] > 0 else None
+        self.logger.debug(f"will trace {set_name} epoch#{self.current_epoch} with torch.profiler in '{output_dir}'")
+        profiler = torch.profiler.profile(activities=activities, schedule=schedule, on_trace_ready=on_trace_ready,
+                                          record_shapes=config["record_shapes"], profile_memory=config["profile_memory"],
+                                          with_stack=config["with_stack"])
+        return profiler, max_steps
+
+    @staticmethod
+    def _step_profiler(iterable, profiler, max_steps):
+        """Yields the items of an iterable while stepping the profiler, which is stopped after its last step."""
+        iterator = iter(iterable)
+        with profiler:
+            for item in itertools.islice(iterator, max_steps):
+                yield item
+                profiler.step()
+        yield from iterator  # remaining iterations are not profiled at all
+
+    def _register_phase_hooks(self, model):
+        """Registers the hooks that time the forward passes of the model as a profiled phase (if needed)."""
+        if self.phase_timer is None:
+            return []
+        try:
+            return [model.register_forward_pre_hook(thelper.train.utils.PhaseHook(self.phase_timer, "forward", begin=True)),
+                    model.register_forward_hook(thelper.train.utils.PhaseHook(self.phase_timer, "forward", begin=False))]
+        except Exception as e:  # some compiled models (e.g. TorchScript) do not support python hooks
+            self.logger.warning(f"cannot profile forward passes of {type(model).__name__} model: {e}")
+            return []
+
+    def _is_mid_epoch_save_due(self, iter_idx, last_save_time):
+        """Returns whether a mid-epoch checkpoint should be saved after the given minibatch (in all processes)."""
+        save = (self.save_iter_freq > 0 and (iter_idx + 1) % self.save_iter_freq == 0) or \
+            (self.save_time_freq > 0 and time.time() - last_save_time >= self.save_time_freq * 60)
+        if self.save_time_freq > 0 and thelper.utils.get_distributed_info()[1] > 1:
+            decision = [save]  # elapsed times differ across processes, so the main process decides for all
+            torch.distributed.broadcast_object_list(decision, src=0)
+            save = decision[0]
+        return save
+
+    def _save_mid_epoch(self, loader, batch_idx, optimizer):
+        """Saves a checkpoint from which the current training epoch can be resumed at the given minibatch index."""
+        self._flush_metrics()  # consumers must be up-to-date before being saved
+        resume_state = {
+            "loader": loader.get_resume_state(batch_idx) if hasattr(loader, "get_resume_state") else None,
+            "rng": self._get_rng_states(),
+            "loss_sum": self.epoch_loss_sum,
+            # callbacks (e.g. loggers) are rebuilt from the config when the session is resumed
+            "consumers": {name: consumer for name, consumer in self.train_metrics.items()
+                          if not isinstance(consumer, thelper.train.utils.PredictionCallback)},
+        }
+        world_size = thelper.utils.get_distributed_info()[1]
+        if world_size > 1:
+            # each process has its own loader shard, RNG states, and consumers; the main process saves them all
+            rank_states = [None] * world_size
+            torch.distributed.all_gather_object(rank_states, resume_state)
+            resume_state = {"ranks": rank_states}
+        resume_state["epoch"] = self.current_epoch
+        self.logger.info(f"saving mid-epoch checkpoint @ epoch#{self.current_epoch}, iter#{batch_idx}")
+        self._save(self.current_epoch, self.current_iter, optimizer, self.scheduler, resume_state=resume_state)
+
+    @staticmethod
+    def _load_compile_config(compile_config):
+        """Parses the model compilation settings; returns ``None`` if compilation is disabled."""
+        if compile_config is None or isinstance(compile_config, bool) or isinstance(compile_config, str):
+            if compile_config is None or compile_config is False or str(compile_config).lower() in ["none", "false"]:
+                return None
+            compile_config = {"type": "auto" if compile_config is True else compile_config}
+        assert isinstance(compile_config, dict), "compile config should be a dictionary, type string, or boolean"
+        compile_config = {
+            "type": str(thelper.utils.get_key_def("type", compile_config, "auto")).lower(),
+            "params": thelper.utils.get_key_def(["params", "parameters", "kwargs"], compile_config, {}),
+            "freeze": thelper.utils.str2bool(thelper.utils.get_key_def("freeze", compile_config, True)),
+            "warmup_iters": int(thelper.utils.get_key_def("warmup_iters", compile_config, 1)),
+            "timing_iters": int(thelper.utils.get_key_def("timing_iters", compile_config, 5)),
+        }
+        assert compile_config["type"] in ["auto", "compile", "script"], f"unexpected compile type '{compile_config['type']}'"
+        assert isinstance(compile_config["params"], dict), "compile params should be a dictionary"
+        assert compile_config["warmup_iters"] >= 0 and compile_config["timing_iters"] >= 0, "invalid iteration counts"
+        return compile_config
+
+    def _apply_compile(self, module, training):
+        """Returns the compiled version of a module based on the compilation settings (may throw)."""
+        compile_type = self.compile_config["type"]
+        if compile_type == "auto":
+            compile_type = "compile" if hasattr(torch, "compile") else "script"
+            if compile_type == "script" and training:
+                raise AssertionError("torch.compile unavailable, and TorchScript models cannot be trained")
+        if compile_type == "compile":
+            assert hasattr(torch, "compile"), "torch.compile unavailable (requires PyTorch >= 2.0)"
+            return torch.compile(module, **self.compile_config["params"])
+        assert not training, "TorchScript models cannot be trained"
+        module = torch.jit.script(module.eval())
+        if self.compile_config["freeze"]:
+            module = torch.jit.freeze(module)
+        return module
+
+    def _get_compile_sample(self, loader):
+        """Returns a minibatch input tensor used to warm up (and time) compiled models, or ``None``."""
+        if not loader or not hasattr(loader, "dataset") or not hasattr(loader, "collate_fn"):
+            return None
+        # note: the minibatch is assembled directly to avoid consuming a (possibly resumed) epoch of the loader
+        sample_count = min(loader.batch_size or 1, len(loader.dataset))
+        input_val = self._to_tensor(loader.collate_fn([loader.dataset[idx] for idx in range(sample_count)]))[0]
+        return self._move_tensor(input_val, self.devices)
+
+    def _warmup_model(self, model, input_val, iters, training):
+        """Runs warm-up passes with the given model and input tensor to trigger its (lazy) compilation.
+
+        For training, the passes are run with gradients enabled and followed by backward passes so that the
+        backward graph is also compiled before the first real iteration; the caller must reset the gradients.
+        """
+        if not training:
+            with torch.no_grad(), self._autocast():
+                for _ in range(iters):
+                    model(input_val)
+            return
+        for _ in range(iters):
+            with self._autocast():
+                output = model(input_val)
+            outputs = list(output.values()) if isinstance(output, dict) else \
+                list(output) if isinstance(output, (list, tuple)) else [output]
+            outputs = [o.float().sum() for o in outputs if isinstance(o, torch.Tensor) and o.requires_grad]
+            if outputs:
+                torch.autograd.backward(outputs)
+
+    def _time_forward(self, model, input_val, iters):
+        """Returns the average latency (in seconds) of forward passes with the given model and input tensor."""
+        start_time = time.perf_counter()
+        with torch.no_grad(), self._autocast():
+            for _ in range(iters):
+                model(input_val)
+        if self.devices:
+            torch.cuda.synchronize()
+        return (time.perf_counter() - start_time) / max(iters, 1)
+
+    def _compile_model(self, model, loader, training):
+        """Compiles the uploaded model based on the compilation settings, and warms it up using the given loader.
+
+        If anything fails, the eager model is returned instead. The warm-up passes trigger the (lazy) compilation
+        and are not timed; the latency of the eager and compiled models is then measured and logged.
+        """
+        if self.compile_config is None:
+            return model
+        if isinstance(model, torch.jit.ScriptModule):
+            self.logger.info("model is already a TorchScript module, will not compile it")
+            return model
+        target = model.module if isinstance(model, torch.nn.DataParallel) else model  # compile the replicated module
+        buffers = {name: buffer.clone() for name, buffer in target.named_buffers()}  # warm-up must not update stats
+        was_training = target.training
+        if training:
+            target.train()  # warm up the same graph that will be used by the training loop
+        try:
+            compiled = self._apply_compile(target, training)
+            input_val = self._get_compile_sample(loader) if self.compile_config["warmup_iters"] else None
+            if input_val is not None:
+                self._warmup_model(compiled, input_val, self.compile_config["warmup_iters"], training)
+                if self.compile_config["timing_iters"]:
+                    eager_time = self._time_forward(target, input_val, self.compile_config["timing_iters"])
+                    compiled_time = self._time_forward(compiled, input_val, self.compile_config["timing_iters"])
+                    self.logger.info(f"model forward latency: eager = {eager_time * 1000:.3f} ms/iter, "
+                                     f"compiled = {compiled_time * 1000:.3f} ms/iter")
+        except Exception as e:
+            self.logger.warning(f"could not compile model, will use eager model instead ({type(e).__name__}: {e})")
+            return model
+        finally:
+            with torch.no_grad():
+                for name, buffer in target.named_buffers():
+                    if name in buffers:
+                        buffer.copy_(buffers[name])
+            if training:
+                target.zero_grad(set_to_none=True)  # drop the gradients accumulated by the warm-up passes
+            target.train(was_training)
+        self.logger.info(f"compiled model using '{self.compile_config['type']}' mode")
+        if isinstance(model, torch.nn.DataParallel):
+            model.module = compiled
+            return model
+        return compiled
+
+    @staticmethod
+    def _load_batch_size_finder_config(finder_config):
+        """Parses the maximum batch size search settings; returns ``None`` if the search is disabled."""
+        if finder_config is None or isinstance(finder_config, (bool, str)):
+            if finder_config is None or not thelper.utils.str2bool(finder_config):
+                return None
+            finder_config = {}
+        assert isinstance(finder_config, dict), "batch size finder config should be a dictionary or boolean"
+        memory_budget_mb = thelper.utils.get_key_def("memory_budget_mb", finder_config, None)
+        scale_lr = thelper.utils.get_key_def("scale_lr", finder_config, None)
+        if isinstance(scale_lr, bool) or scale_lr is None:
+            scale_lr = "linear" if scale_lr else None
+        else:
+            scale_lr = None if str(scale_lr).lower() in ["none", "false"] else str(scale_lr).lower()
+        finder_config = {
+            "memory_budget_mb": float(memory_budget_mb) if memory_budget_mb is not None else None,
+            "min_batch_size": int(thelper.utils.get_key_def("min_batch_size", finder_config, 2)),
+            "max_batch_size": int(thelper.utils.get_key_def("max_batch_size", finder_config, 4096)),
+            "source": str(thelper.utils.get_key_def("source", finder_config, "auto")).lower(),
+            "scale_lr": scale_lr,
+        }
+        assert finder_config["memory_budget_mb"] is None or finder_config["memory_budget_mb"] > 0, \
+            "batch size finder memory budget should be strictly positive"
+        assert 0 < finder_config["min_batch_size"] <= finder_config["max_batch_size"], "invalid batch size search range"
+        assert finder_config["source"] in ["auto", "synthetic", "loader"], f"unexpected input source '{finder_config['source']}'"
+        assert finder_config["scale_lr"] in [None, "linear", "sqrt"], f"unexpected lr scaling rule '{finder_config['scale_lr']}'"
+        return finder_config
+
+    def find_max_batch_size(self, apply=True):
+        """Searches for the largest training batch size whose forward and backward passes fit in the memory budget.
+
+        The batch size is doubled from the minimum value until the memory budget is exceeded (or until the maximum
+        value is reached), and the largest fitting value is then found by bisection. Each candidate is evaluated with
+        a forward pass of the model in training mode followed by the backward pass of the sum of its outputs, so the
+        loss itself and the optimizer state are not accounted for. The inputs are either synthetic (shaped from the
+        ``input_shape`` of the task) or copies of the samples of a training minibatch. On CUDA devices, the peak
+        allocated memory of the device is measured; on CPU, the peak resident memory of the process is measured (see
+        :func:`thelper.train.utils.get_peak_memory`). Running out of memory also counts as exceeding the budget. The
+        buffers of the model (e.g. normalization statistics) are restored afterwards.
+
+        If ``apply`` is true, the batch size is written in the loaders configuration (in its ``batch_size`` field if it
+        is specified, and in ``train_batch_size`` otherwise), the affected loaders are rebuilt with it, and the learning
+        rate of the optimizer configuration is scaled if requested. In distributed sessions, the smallest batch size
+        found by all processes is used. Returns the batch size found (or the minimum batch size, if none fits).
+        """
+        finder_config = self.batch_size_finder or self._load_batch_size_finder_config(True)
+        assert self.train_loader, "cannot search for a training batch size without training data"
+        device = torch.device("cuda", self.devices[0]) if self.devices else torch.device("cpu")
+        budget_mb = finder_config["memory_budget_mb"]
+        if budget_mb is None:
+            assert device.type == "cuda", "a memory budget must be specified to search for the batch size on CPU"
+            budget_mb = 0.9 * torch.cuda.get_device_properties(device).total_memory / 2 ** 20
+        assert device.type == "cuda" or thelper.utils.get_rss_bytes() is not None, \
+            "cannot measure the memory usage of the process on this platform"
+        input_shape, source = getattr(self.task, "input_shape", None), finder_config["source"]
+        if source == "auto":
+            source = "synthetic" if input_shape is not None else "loader"
+        if source == "synthetic":
+            assert input_shape is not None, "task does not define the input shape required for synthetic inputs"
+            base_input = torch.randn(1, *input_shape)
+        else:
+            base_input = self._get_compile_sample(self.train_loader)
+            if isinstance(base_input, list):  # augmented copies, keep only one
+                base_input = base_input[0]
+        assert isinstance(base_input, torch.Tensor), "batch size finder requires a tensor model input"
+        model = self._apply_memory_format(self.model).to(device)
+        buffers = {name: buffer.clone() for name, buffer in model.named_buffers()}
+        was_training = model.training
+        model.train()
+
+        def forward_backward(batch_size):
+            input_val = self._move_tensor(base_input[torch.arange(batch_size) % len(base_input)], device)
+            with self._autocast():
+                outputs = model(input_val)
+            outputs = [out for out in thelper.train.utils.get_tensors(outputs) if out.requires_grad]
+            if outputs:
+                torch.stack([out.float().sum() for out in outputs]).sum().backward()
+
+        def fits(batch_size):
+            thelper.train.utils.release_memory(device)
+            try:
+                _, peak = thelper.train.utils.get_peak_memory(functools.partial(forward_backward, batch_size), device)
+            except RuntimeError as e:  # includes CUDA out-of-memory errors
+                if "out of memory" not in str(e) and "can't allocate memory" not in str(e):
+                    raise
+                peak = None
+            finally:
+                model.zero_grad(set_to_none=True)
+            self.logger.debug(f"batch size {batch_size}: " +
+                              (f"peak memory = {peak / 2 ** 20:.1f} MB" if peak is not None else "out of memory"))
+            return peak is not None and peak / 2 ** 20 <= budget_mb
+
+        self.logger.info(f"searching for the largest batch size that fits in {budget_mb:.1f} MB on '{device}'...")
+        low, high, batch_size = None, None, finder_config["min_batch_size"]
+        try:
+            while high is None:
+                if not fits(batch_size):
+                    high = batch_size
+                elif batch_size >= finder_config["max_batch_size"]:
+                    low = batch_size
+                    break
+                else:
+                    low, batch_size = batch_size, min(batch_size * 2, finder_config["max_batch_size"])
+            while low is not None and high is not None and high - low > 1:
+                batch_size = (low + high) // 2
+                if fits(batch_size):
+                    low = batch_size
+                else:
+                    high = batch_size
+        finally:
+            with torch.no_grad():
+                for name, buffer in model.named_buffers():
+                    if name in buffers:
+                        buffer.copy_(buffers[name])
+            model.train(was_training)
+            thelper.train.utils.release_memory(device)
+        if low is None:
+            self.logger.warning(f"minimum batch size ({finder_config['min_batch_size']}) does not fit in the memory budget")
+            low = finder_config["min_batch_size"]
+        world_size = thelper.utils.get_distributed_info()[1]
+        if world_size > 1:
+            batch_sizes = [None] * world_size
+            torch.distributed.all_gather_object(batch_sizes, low)
+            low = min(batch_sizes)
+        elif len(self.devices) > 1:
+            low *= len(self.devices)  # minibatches are split across devices by data parallelism
+        self.logger.info(f"largest batch size that fits in the memory budget: {low}")
+        if apply:
+            self._apply_batch_size(low, finder_config["scale_lr"])
+        return low
+
+    def _apply_batch_size(self, batch_size, scale_lr=None):
+        """Writes a new training batch size in the loaders config, rebuilds the loaders, and scales the learning rate."""
+        prev_batch_size = self.train_loader.batch_size
+        loaders_config = thelper.utils.get_key_def(["data_config", "loaders"], self.config, None)
+        update_all = isinstance(loaders_config, dict) and "batch_size" in loaders_config
+        if isinstance(loaders_config, dict):
+            loaders_config["batch_size" if update_all else "train_batch_size"] = batch_size
+        else:
+            self.logger.warning("session config has no loaders section, the batch size will not be saved")
+        assert hasattr(self.train_loader, "clone"), "cannot rebuild a loader that is not derived from thelper's"
+        self.train_loader = self.train_loader.clone(batch_size=batch_size)
+        if update_all:
+            self.valid_loader, self.test_loader = [loader.clone(batch_size=batch_size) if loader else loader
+                                                   for loader in [self.valid_loader, self.test_loader]]
+        if scale_lr is None or batch_size == prev_batch_size:
+            return
+        optimizer_config = self.optimization_config.get("optimizer", None) if self.optimization_config else None
+        optimizer_params = thelper.utils.get_key_def(["params", "parameters"], optimizer_config, None) \
+            if isinstance(optimizer_config, dict) else None
+        if not isinstance(optimizer_params, dict) or "lr" not in optimizer_params:
+            self.logger.warning("optimizer config has no 'lr' parameter, cannot scale the learning rate")
+            return
+        ratio = batch_size / prev_batch_size
+        prev_lr = optimizer_params["lr"]
+        optimizer_params["lr"] = prev_lr * (ratio if scale_lr == "linear" else math.sqrt(ratio))
+        self.logger.info(f"scaled learning rate from {prev_lr} to {optimizer_params['lr']} ({scale_lr} rule)")
+
+    def _apply_memory_format(self, model):
+        """Converts the model parameters to the requested memory format (if any).
+
+        This should be done before the model is uploaded (and wrapped for data parallelism). Parameters that are
+        already in the requested memory format are left untouched. The inputs of the model are converted when
+        they are uploaded instead (see :meth:`_move_tensor`), so that no hook has to be added to the model.
+        """
+        if self.memory_format is None or self.memory_format == torch.contiguous_format:
+            return model
+        model.to(memory_format=self.memory_format)
+        self.logger.debug(f"converted model parameters to {self.memory_format} memory format")
+        return model
+
+    def _convert_memory_format(self, tensor):
+        """Returns a (nested) tensor whose 4D floating point tensors are converted to the requested memory format."""
+        if isinstance(tensor, list):
+            return [self._convert_memory_format(t) for t in tensor]
+        if isinstance(tensor, dict):
+            return {k: self._convert_memory_format(t) for k, t in tensor.items()}
+        if isinstance(tensor, torch.Tensor) and tensor.dim() == 4 and tensor.is_floating_point():
+            return tensor.contiguous(memory_format=self.memory_format)  # no-op for minibatches collated in that format
+        return tensor
+
+    def _move_tensor(self, tensor, dev, non_blocking=True, detach=False):
+        """Uploads a (nested) tensor to a specific device, converting it to the requested memory format if needed.
+
+        The upload is timed as the ``transfer`` phase of the current iteration when profiling phases.
+        """
+        with self._phase("transfer"):
+            out = super()._move_tensor(tensor, dev, non_blocking=non_blocking, detach=detach)
+            if self.memory_format is None or self.memory_format == torch.contiguous_format:
+                return out
+            return self._convert_memory_format(out)
+
+    def _update_metrics(self, metrics, **kwargs):
+        """Updates the given consumers with the latest iteration data, in the background for thread-safe ones if needed.
+
+        Metrics that are evaluated live (i.e. at every iteration by the session's iteration logger, including the
+        monitored metric) are always updated in the main thread, so that their evaluation never races with (or
+        lags behind) their updates. The keyword arguments must match the ones defined in
+        ``thelper.typedefs.IterCallbackParams``.
+        """
+        with self._phase("metrics"):
+            if not self.async_metrics:
+                for metric in metrics.values():
+                    metric.update(**kwargs)
+                return
+            if self.metrics_updater is None:
+                self.metrics_updater = thelper.train.utils.AsyncConsumerUpdater(self.async_metrics_queue_size)
+            bg_metrics = [m for m in metrics.values()
+                          if getattr(m, "thread_safe", False) and not getattr(m, "live_eval", False)]
+            self.metrics_updater.push(bg_metrics, **kwargs)
+            for metric in metrics.values():
+                if not any([metric is m for m in bg_metrics]):
+                    metric.update(**kwargs)
+
+    def _reduce_metrics(self, metrics, loss=None):
+        """Merges the consumer states of all processes (and averages their loss) in distributed sessions.
+
+        Consumers that do not support merging (see :attr:`thelper.ifaces.PredictionConsumer.mergeable`) keep
+        their local state. Returns the loss averaged over all processes (or the local loss if not distributed).
+        """
+        rank, world_size = thelper.utils.get_distributed_info()
+        if world_size == 1:
+            return loss
+        mergeable = {name: metric for name, metric in metrics.items() if getattr(metric, "mergeable", False)}
+        gathered = [None] * world_size
+        torch.distributed.all_gather_object(gathered, (mergeable, loss))
+        for other_rank, (other_metrics, _) in enumerate(gathered):
+            if other_rank != rank:
+                for name, metric in mergeable.items():
+                    metric.merge(other_metrics[name])
+        losses = [other_loss for _, other_loss in gathered if other_loss is not None]
+        return sum(losses) / len(losses) if losses else loss
+
+    def _flush_metrics(self, close=False):
+        """Waits for all pending asynchronous consumer updates to be processed (and stops the updater if needed)."""
+        if self.metrics_updater is not None:
+            if close:
+                self.metrics_updater.close()
+                self.metrics_updater = None
+            else:
+                self.metrics_updater.flush()
+
+    @staticmethod
+    def _to_fp32_cpu(tensor):
+        """Returns a detached CPU copy of a (nested) tensor, with low precision floats cast back to fp32."""
+        if isinstance(tensor, (list, tuple)):
+            return [Trainer._to_fp32_cpu(t) for t in tensor]
+        if isinstance(tensor, dict):
+            return {k: Trainer._to_fp32_cpu(t) for k, t in tensor.items()}
+        if not isinstance(tensor, torch.Tensor):
+            return tensor
+        tensor = tensor.detach().cpu()
+        return tensor.float() if tensor.dtype in (torch.float16, torch.bfloat16) else tensor
 
     def train(self):
         """Starts the training process.
@@ -139,8 +886,10 @@ class Trainer(SessionRunner):
         """
         assert self.train_loader, "missing training data, invalid loader!"
         assert not isinstance(self.model, torch.jit.ScriptModule), "current impl cannot train model traces"  # TODO
+        if self.batch_size_finder is not None and self.current_epoch == 0 and self.current_iter == 0:
+            self.find_max_batch_size()  # only done for new sessions, resumed ones use the batch size saved in the config
         self.logger.debug(f"uploading model to '{str(self.devices)}'...")
-        model = self._upload_model(self.model, self.devices)
+        model = self._upload_model(self._apply_memory_format(self.model), self.devices)
         loss, optimizer, scheduler, scheduler_step_metric = self._load_optimization(model, self.devices)
         if optimizer is not None and self.optimizer_state is not None:
             optimizer.load_state_dict(self.optimizer_state)
@@ -150,62 +899,180 @@ class Trainer(SessionRunner):
             self.scheduler_state = None
         self.logger.info(f"loss: {str(loss)}")
         self.logger.info(f"optimizer: {str(optimizer)}")
-        latest_loss = math.inf
-        while self.current_epoch < self.epochs:
-            self.writers["train"] = self._init_writer(self.writers["train"], self.output_paths["train"])
-            self.logger.info(f"at epoch#{self.current_epoch} for '{self.name}' (dev={str(self.devices)})")
-            if scheduler:
-                if scheduler_step_metric:
-                    if scheduler_step_metric == "loss":
-                        # todo: use validation loss instead? more stable?
-                        scheduler.step(metrics=latest_loss, epoch=self.current_epoch)
+        self.scheduler = scheduler
+        model = self._compile_model(model, self.train_loader, training=True)
+        phase_hooks = self._register_phase_hooks(model)
+        try:
+            latest_loss = math.inf
+            while self.current_epoch < self.epochs:
+                self.writers["train"] = self._init_writer(self.writers["train"], self.output_paths["train"])
+                self.logger.info(f"at epoch#{self.current_epoch} for '{self.name}' (dev={str(self.devices)})")
+                if scheduler:
+                    if scheduler_step_metric:
+                        if scheduler_step_metric == "loss":
+                            # todo: use validation loss instead? more stable?
+                            scheduler.step(metrics=latest_loss, epoch=self.current_epoch)
+                        else:
+                            metric = None
+                            if self.valid_loader and scheduler_step_metric in self.valid_metrics:
+                                metric = self.valid_metrics[scheduler_step_metric]
+                            elif self.train_loader and scheduler_step_metric in self.train_metrics:
+                                metric = self.train_metrics[scheduler_step_metric]
+                            # note: makes no sense to look for it in test metrics
+                            assert metric is not None, f"cannot find metric '{scheduler_step_metric}' for scheduler step"
+                            assert isinstance(metric, thelper.optim.metrics.Metric), "monitoring consumer must be metric"
+                            metric_anti_goal = thelper.optim.Metric.maximize \
+                                if metric.goal == thelper.optim.Metric.minimize \
+                                else thelper.optim.Metric.minimize
+                            metric_val = metric.eval() if self.current_epoch > 0 else metric_anti_goal
+                            scheduler.step(metrics=metric_val, epoch=self.current_epoch)
                     else:
-                        metric = None
-                        if self.valid_loader and scheduler_step_metric in self.valid_metrics:
-                            metric = self.valid_metrics[scheduler_step_metric]
-                        elif self.train_loader and scheduler_step_metric in self.train_metrics:
-                            metric = self.train_metrics[scheduler_step_metric]
-                        # note: makes no sense to look for it in test metrics
-                        assert metric is not None, f"cannot find metric '{scheduler_step_metric}' for scheduler step"
-                        assert isinstance(metric, thelper.optim.metrics.Metric), "monitoring consumer must be metric"
-                        metric_anti_goal = thelper.optim.Metric.maximize \
-                            if metric.goal == thelper.optim.Metric.minimize \
-                            else thelper.optim.Metric.minimize
-                        metric_val = metric.eval() if self.current_epoch > 0 else metric_anti_goal
-                        scheduler.step(metrics=metric_val, epoch=self.current_epoch)
-                else:
-                    scheduler.step(epoch=self.current_epoch)
-            if self.writers["train"] and not self.skip_tbx_histograms and \
-                    (self.current_epoch % self.tbx_histogram_freq) == 0:
-                for pname, param in model.named_parameters():
-                    if "bn" in pname:
-                        continue  # skip batch norm modules
-                    pname = pname.replace(".", "/")  # for proper grouping
-                    if pname.startswith("module/"):
-                        pname = pname.replace("module/", "", 1)
-                    if pname.startswith("model/"):
-                        pname = pname.replace("model/", "", 1)
-                    data = param.data.cpu().numpy().flatten()
-                    self.writers["train"].add_histogram(pname, data, self.current_epoch)
-                    if param.grad is not None:
-                        grad = param.grad.data.cpu().numpy().flatten()
-                        self.writers["train"].add_histogram(pname + '/grad', grad, self.current_epoch)
-            self.logger.debug(f"learning rate at {thelper.optim.get_lr(optimizer):.8f}")
-            self._set_rng_state(self.train_loader.seeds, self.current_epoch)
-            model.train()
-            if hasattr(self.train_loader, "set_epoch") and callable(self.train_loader.set_epoch):
-                self.train_loader.set_epoch(self.current_epoch)
-            train_loss = self.train_epoch(model, self.current_epoch, self.devices, loss, optimizer,
-                                          self.train_loader, self.train_metrics, self.output_paths["train"])
-            self._write_metrics_data(self.current_epoch, self.train_metrics,
-                                     self.writers["train"], self.output_paths["train"],
-                                     loss=train_loss, optimizer=optimizer)
-            train_metric_vals = {metric_name: metric.eval() for metric_name, metric in self.train_metrics.items()
-                                 if isinstance(metric, thelper.optim.metrics.Metric)}
-            result = {"train/loss": train_loss, "train/metrics": train_metric_vals}
-            monitor_type_key = "train/metrics"  # if we cannot run validation, will monitor progression on training metrics
-            valid_loss = None
-            if self.valid_loader:
+                        scheduler.step(epoch=self.current_epoch)
+                if self.writers["train"] and not self.skip_tbx_histograms and \
+                        (self.current_epoch % self.tbx_histogram_freq) == 0:
+                    for pname, param in model.named_parameters():
+                        if "bn" in pname:
+                            continue  # skip batch norm modules
+                        pname = pname.replace(".", "/")  # for proper grouping
+                        if pname.startswith("module/"):
+                            pname = pname.replace("module/", "", 1)
+                        if pname.startswith("model/"):
+                            pname = pname.replace("model/", "", 1)
+                        data = param.data.cpu().numpy().flatten()
+                        self.writers["train"].add_histogram(pname, data, self.current_epoch)
+                        if param.grad is not None:
+                            grad = param.grad.data.cpu().numpy().flatten()
+                            self.writers["train"].add_histogram(pname + '/grad', grad, self.current_epoch)
+                self.logger.debug(f"learning rate at {thelper.optim.get_lr(optimizer):.8f}")
+                self._set_rng_state(self.train_loader.seeds, self.current_epoch)
+                model.train()
+                if hasattr(self.train_loader, "set_epoch") and callable(self.train_loader.set_epoch):
+                    self.train_loader.set_epoch(self.current_epoch)
+                train_loss = self.train_epoch(model, self.current_epoch, self.devices, loss, optimizer,
+                                              self.train_loader, self.train_metrics, self.output_paths["train"])
+                self._flush_metrics()
+                train_loss = self._reduce_metrics(self.train_metrics, train_loss)
+                self._write_metrics_data(self.current_epoch, self.train_metrics,
+                                         self.writers["train"], self.output_paths["train"],
+                                         loss=train_loss, optimizer=optimizer, loader=self.train_loader,
+                                         phase_timer=self.phase_timer)
+                train_metric_vals = {metric_name: metric.eval() for metric_name, metric in self.train_metrics.items()
+                                     if isinstance(metric, thelper.optim.metrics.Metric)}
+                result = {"train/loss": train_loss, "train/metrics": train_metric_vals}
+                if self.phase_timer is not None:
+                    result["train/phases"] = self.phase_timer.summary()
+                monitor_type_key = "train/metrics"  # if we cannot run validation, will monitor progression on training metrics
+                valid_loss = None
+                if self.valid_loader:
+                    self._set_rng_state(self.valid_loader.seeds, self.current_epoch)
+                    model.eval()
+                    self.writers["valid"] = self._init_writer(self.writers["valid"], self.output_paths["valid"])
+                    for metric in self.valid_metrics.values():
+                        metric.reset()  # force reset here, we always evaluate from a clean state
+                    if hasattr(self.valid_loader, "set_epoch") and callable(self.valid_loader.set_epoch):
+                        self.valid_loader.set_epoch(self.current_epoch)
+                    valid_loss = self.eval_epoch(model, self.current_epoch, self.devices, self.valid_loader,
+                                                 self.valid_metrics, self.output_paths["valid"])
+                    self._flush_metrics()
+                    valid_loss = self._reduce_metrics(self.valid_metrics, valid_loss)
+                    # note: valid_loss might be None if evaluator did not implement/compute it
+                    self._write_metrics_data(self.current_epoch, self.valid_metrics,
+                                             self.writers["valid"], self.output_paths["valid"],
+                                             loss=valid_loss, loader=self.valid_loader, phase_timer=self.phase_timer)
+                    valid_metric_vals = {metric_name: metric.eval() for metric_name, metric in self.valid_metrics.items()
+                                         if isinstance(metric, thelper.optim.metrics.Metric)}
+                    result = {**result, "valid/metrics": valid_metric_vals}
+                    if self.phase_timer is not None:
+                        result["valid/phases"] = self.phase_timer.summary()
+                    monitor_type_key = "valid/metrics"  # since validation is available, use that to monitor progression
+                    uploader = functools.partial(self._move_tensor, dev=self.devices, detach=True)
+                    wrapped_loader = thelper.data.DataLoaderWrapper(self.valid_loader, uploader)
+                    for viz, kwargs in self.viz.items():
+                        viz_data = thelper.viz.visualize(model, self.task, wrapped_loader, viz_type=viz, **kwargs)
+                        self._write_data(viz_data, "epoch/", f"-{self.current_epoch:04d}", self.writers["valid"],
+                                         self.output_paths["valid"], self.current_epoch)
+                latest_loss = valid_loss if valid_loss is not None else train_loss
+                new_best = False
+                monitor_val = None
+                if self.monitor == "loss":
+                    monitor_val = latest_loss
+                    if self.monitor_best > latest_loss:
+                        new_best = True
+                for key, value in result.items():
+                    if key == monitor_type_key and self.monitor is not None and self.monitor != "loss":
+                        assert self.monitor in value, f"not monitoring required variable '{self.monitor}' in metrics"
+                        monitor_val = value[self.monitor]
+                        if (self.monitor_goal == thelper.optim.Metric.minimize and monitor_val < self.monitor_best) or \
+                           (self.monitor_goal == thelper.optim.Metric.maximize and monitor_val > self.monitor_best):
+                            self.monitor_best = monitor_val
+                            self.monitor_best_epoch = self.current_epoch
+                            new_best = True
+                    if not isinstance(value, dict):
+                        self.logger.info(f" epoch#{self.current_epoch} result =>  {str(key)}: {value}")
+                    else:
+                        for subkey, subvalue in value.items():
+                            self.logger.info(f" epoch#{self.current_epoch} result =>  {str(key)}:{str(subkey)}: {subvalue}")
+                if self.monitor is not None:
+                    assert monitor_val is not None, f"training/validation did not evaluate required metric '{self.monitor}'"
+                    if new_best:
+                        best_str = "(new best value)"
+                    else:
+                        best_str = f"(previous best = {self.monitor_best} @ epoch = {self.monitor_best_epoch})"
+                    self.logger.info(f"epoch {self.current_epoch}, monitored {self.monitor} = {monitor_val}  {best_str}")
+                self.outputs[self.current_epoch] = result
+                if new_best or (self.current_epoch % self.save_freq) == 0:
+                    self.logger.info(f"saving checkpoint @ epoch#{self.current_epoch}")
+                    self._save(self.current_epoch, self.current_iter, optimizer, scheduler, save_best=new_best)
+                self.current_epoch += 1
+        finally:
+            for hook in phase_hooks:
+                hook.remove()
+            # queued checkpoints (if any) must be written even if training was interrupted
+            self._flush_metrics(close=True)
+            self.checkpoint_writer.close()
+        self.logger.info(f"training for session '{self.name}' done")
+        return self.outputs
+
+    def eval(self):
+        """Starts the evaluation process.
+
+        This function will evaluate the model using the test data (or the validation data, if no test data is available),
+        and return the results. Note that the code related to the forwarding of samples inside the model itself is implemented
+        in a derived class via :func:`thelper.train.base.Trainer.eval_epoch`.
+        """
+        assert self.valid_loader or self.test_loader, "missing validation/test data, invalid loaders!"
+        self.logger.debug(f"uploading model to '{str(self.devices)}'...")
+        model = self._upload_model(self._apply_memory_format(self.model), self.devices)
+        model = self._compile_model(model, self.test_loader or self.valid_loader, training=False)
+        phase_hooks = self._register_phase_hooks(model)
+        try:
+            result = {}
+            output_group = None, None
+            if self.test_loader:
+                self._set_rng_state(self.test_loader.seeds, self.current_epoch)
+                model.eval()
+                self.writers["test"] = self._init_writer(self.writers["test"], self.output_paths["test"])
+                for metric in self.test_metrics.values():
+                    metric.reset()  # force reset here, we always evaluate from a clean state
+                if hasattr(self.test_loader, "set_epoch") and callable(self.test_loader.set_epoch):
+                    self.test_loader.set_epoch(self.current_epoch)
+                self.eval_epoch(model, self.current_epoch, self.devices, self.test_loader,
+                                self.test_metrics, self.output_paths["test"])
+                self._flush_metrics()
+                self._reduce_metrics(self.test_metrics)
+                self._write_metrics_data(self.current_epoch, self.test_metrics,
+                                         self.writers["test"], self.output_paths["test"], use_suffix=False,
+                                         loader=self.test_loader, phase_timer=self.phase_timer)
+                test_metric_vals = {metric_name: metric.eval() for metric_name, metric in self.test_metrics.items()
+                                    if isinstance(metric, thelper.optim.metrics.Metric)}
+                result = {**result, **test_metric_vals}
+                output_group = "test/metrics"
+                uploader = functools.partial(self._move_tensor, dev=self.devices, detach=True)
+                wrapped_loader = thelper.data.DataLoaderWrapper(self.test_loader, uploader)
+                for viz, kwargs in self.viz.items():
+                    viz_data = thelper.viz.visualize(model, self.task, wrapped_loader, viz_type=viz, **kwargs)
+                    self._write_data(viz_data, "epoch/", "", self.writers["test"], self.output_paths["test"], self.current_epoch)
+            elif self.valid_loader:
                 self._set_rng_state(self.valid_loader.seeds, self.current_epoch)
                 model.eval()
                 self.writers["valid"] = self._init_writer(self.writers["valid"], self.output_paths["valid"])
@@ -213,124 +1080,59 @@ class Trainer(SessionRunner):
                     metric.reset()  # force reset here, we always evaluate from a clean state
                 if hasattr(self.valid_loader, "set_epoch") and callable(self.valid_loader.set_epoch):
                     self.valid_loader.set_epoch(self.current_epoch)
-                valid_loss = self.eval_epoch(model, self.current_epoch, self.devices, self.valid_loader,
-                                             self.valid_metrics, self.output_paths["valid"])
-                # note: valid_loss might be None if evaluator did not implement/compute it
+                self.eval_epoch(model, self.current_epoch, self.devices, self.valid_loader,
+                                self.valid_metrics, self.output_paths["valid"])
+                self._flush_metrics()
+                self._reduce_metrics(self.valid_metrics)
                 self._write_metrics_data(self.current_epoch, self.valid_metrics,
-                                         self.writers["valid"], self.output_paths["valid"],
-                                         loss=valid_loss)
+                                         self.writers["valid"], self.output_paths["valid"], use_suffix=False,
+                                         loader=self.valid_loader, phase_timer=self.phase_timer)
                 valid_metric_vals = {metric_name: metric.eval() for metric_name, metric in self.valid_metrics.items()
                                      if isinstance(metric, thelper.optim.metrics.Metric)}
-                result = {**result, "valid/metrics": valid_metric_vals}
-                monitor_type_key = "valid/metrics"  # since validation is available, use that to monitor progression
+                result = {**result, **valid_metric_vals}
+                output_group = "valid/metrics"
                 uploader = functools.partial(self._move_tensor, dev=self.devices, detach=True)
                 wrapped_loader = thelper.data.DataLoaderWrapper(self.valid_loader, uploader)
                 for viz, kwargs in self.viz.items():
                     viz_data = thelper.viz.visualize(model, self.task, wrapped_loader, viz_type=viz, **kwargs)
-                    self._write_data(viz_data, "epoch/", f"-{self.current_epoch:04d}", self.writers["valid"],
-                                     self.output_paths["valid"], self.current_epoch)
-            latest_loss = valid_loss if valid_loss is not None else train_loss
-            new_best = False
-            monitor_val = None
-            if self.monitor == "loss":
-                monitor_val = latest_loss
-                if self.monitor_best > latest_loss:
-                    new_best = True
+                    self._write_data(viz_data, "epoch/", "", self.writers["valid"], self.output_paths["valid"], self.current_epoch)
             for key, value in result.items():
-                if key == monitor_type_key and self.monitor is not None and self.monitor != "loss":
-                    assert self.monitor in value, f"not monitoring required variable '{self.monitor}' in metrics"
-                    monitor_val = value[self.monitor]
-                    if (self.monitor_goal == thelper.optim.Metric.minimize and monitor_val < self.monitor_best) or \
-                       (self.monitor_goal == thelper.optim.Metric.maximize and monitor_val > self.monitor_best):
-                        self.monitor_best = monitor_val
-                        self.monitor_best_epoch = self.current_epoch
-                        new_best = True
                 if not isinstance(value, dict):
-                    self.logger.info(f" epoch#{self.current_epoch} result =>  {str(key)}: {value}")
+                    self.logger.info(f" final result =>  {str(key)}: {value}")
                 else:
                     for subkey, subvalue in value.items():
-                        self.logger.info(f" epoch#{self.current_epoch} result =>  {str(key)}:{str(subkey)}: {subvalue}")
-            if self.monitor is not None:
-                assert monitor_val is not None, f"training/validation did not evaluate required metric '{self.monitor}'"
-                if new_best:
-                    best_str = "(new best value)"
-                else:
-                    best_str = f"(previous best = {self.monitor_best} @ epoch = {self.monitor_best_epoch})"
-                self.logger.info(f"epoch {self.current_epoch}, monitored {self.monitor} = {monitor_val}  {best_str}")
-            self.outputs[self.current_epoch] = result
-            if new_best or (self.current_epoch % self.save_freq) == 0:
-                self.logger.info(f"saving checkpoint @ epoch#{self.current_epoch}")
-                self._save(self.current_epoch, self.current_iter, optimizer, scheduler, save_best=new_best)
-            self.current_epoch += 1
-        self.logger.info(f"training for session '{self.name}' done")
+                        self.logger.info(f" final result =>  {str(key)}:{str(subkey)}: {subvalue}")
+            if self.current_epoch not in self.outputs:
+                # probably using an 'untrained model' (such as a FCN adapted from a classifier)
+                self.outputs[self.current_epoch] = {}
+            self.outputs[self.current_epoch][output_group] = result
+            if self.phase_timer is not None:
+                self.outputs[self.current_epoch][output_group.replace("/metrics", "/phases")] = self.phase_timer.summary()
+        finally:
+            for hook in phase_hooks:
+                hook.remove()
+        self._flush_metrics(close=True)
+        self.logger.info(f"evaluation for session '{self.name}' done")
         return self.outputs
 
-    def eval(self):
-        """Starts the evaluation process.
+    def _get_augments_chunks(self, input_val):
+        """Returns the (start, end) index ranges of the augmented copies that should be forwarded together.
 
-        This function will evaluate the model using the test data (or the validation data, if no test data is available),
-        and return the results. Note that the code related to the forwarding of samples inside the model itself is implemented
-        in a derived class via :func:`thelper.train.base.Trainer.eval_epoch`.
+        If augmented copies are not batched (or if their shapes differ), each copy is forwarded on its own.
         """
-        assert self.valid_loader or self.test_loader, "missing validation/test data, invalid loaders!"
-        self.logger.debug(f"uploading model to '{str(self.devices)}'...")
-        model = self._upload_model(self.model, self.devices)
-        result = {}
-        output_group = None, None
-        if self.test_loader:
-            self._set_rng_state(self.test_loader.seeds, self.current_epoch)
-            model.eval()
-            self.writers["test"] = self._init_writer(self.writers["test"], self.output_paths["test"])
-            for metric in self.test_metrics.values():
-                metric.reset()  # force reset here, we always evaluate from a clean state
-            if hasattr(self.test_loader, "set_epoch") and callable(self.test_loader.set_epoch):
-                self.test_loader.set_epoch(self.current_epoch)
-            self.eval_epoch(model, self.current_epoch, self.devices, self.test_loader,
-                            self.test_metrics, self.output_paths["test"])
-            self._write_metrics_data(self.current_epoch, self.test_metrics,
-                                     self.writers["test"], self.output_paths["test"], use_suffix=False)
-            test_metric_vals = {metric_name: metric.eval() for metric_name, metric in self.test_metrics.items()
-                                if isinstance(metric, thelper.optim.metrics.Metric)}
-            result = {**result, **test_metric_vals}
-            output_group = "test/metrics"
-            uploader = functools.partial(self._move_tensor, dev=self.devices, detach=True)
-            wrapped_loader = thelper.data.DataLoaderWrapper(self.test_loader, uploader)
-            for viz, kwargs in self.viz.items():
-                viz_data = thelper.viz.visualize(model, self.task, wrapped_loader, viz_type=viz, **kwargs)
-                self._write_data(viz_data, "epoch/", "", self.writers["test"], self.output_paths["test"], self.current_epoch)
-        elif self.valid_loader:
-            self._set_rng_state(self.valid_loader.seeds, self.current_epoch)
-            model.eval()
-            self.writers["valid"] = self._init_writer(self.writers["valid"], self.output_paths["valid"])
-            for metric in self.valid_metrics.values():
-                metric.reset()  # force reset here, we always evaluate from a clean state
-            if hasattr(self.valid_loader, "set_epoch") and callable(self.valid_loader.set_epoch):
-                self.valid_loader.set_epoch(self.current_epoch)
-            self.eval_epoch(model, self.current_epoch, self.devices, self.valid_loader,
-                            self.valid_metrics, self.output_paths["valid"])
-            self._write_metrics_data(self.current_epoch, self.valid_metrics,
-                                     self.writers["valid"], self.output_paths["valid"], use_suffix=False)
-            valid_metric_vals = {metric_name: metric.eval() for metric_name, metric in self.valid_metrics.items()
-                                 if isinstance(metric, thelper.optim.metrics.Metric)}
-            result = {**result, **valid_metric_vals}
-            output_group = "valid/metrics"
-            uploader = functools.partial(self._move_tensor, dev=self.devices, detach=True)
-            wrapped_loader = thelper.data.DataLoaderWrapper(self.valid_loader, uploader)
-            for viz, kwargs in self.viz.items():
-                viz_data = thelper.viz.visualize(model, self.task, wrapped_loader, viz_type=viz, **kwargs)
-                self._write_data(viz_data, "epoch/", "", self.writers["valid"], self.output_paths["valid"], self.current_epoch)
-        for key, value in result.items():
-            if not isinstance(value, dict):
-                self.logger.info(f" final result =>  {str(key)}: {value}")
-            else:
-                for subkey, subvalue in value.items():
-                    self.logger.info(f" final result =>  {str(key)}:{str(subkey)}: {subvalue}")
-        if self.current_epoch not in self.outputs:
-            # probably using an 'untrained model' (such as a FCN adapted from a classifier)
-            self.outputs[self.current_epoch] = {}
-        self.outputs[self.current_epoch][output_group] = result
-        self.logger.info(f"evaluation for session '{self.name}' done")
-        return self.outputs
+        augs_count = len(input_val)
+        if not self.batch_augments or augs_count < 2 or \
+                not all([isinstance(v, torch.Tensor) and v.shape == input_val[0].shape for v in input_val]):
+            return [(idx, idx + 1) for idx in range(augs_count)]
+        chunk_size = augs_count
+        if self.augments_max_batch_size > 0:
+            chunk_size = max(self.augments_max_batch_size // max(len(input_val[0]), 1), 1)
+        return [(idx, min(idx + chunk_size, augs_count)) for idx in range(0, augs_count, chunk_size)]
+
+    @staticmethod
+    def _cat_augments(vals, start, end):
+        """Concatenates a range of augmented copies along the batch dimension (if needed)."""
+        return vals[start] if end - start == 1 else torch.cat(vals[start:end], dim=0)
 
     @abstractmethod
     def train_epoch(self, model, epoch, dev, loss, optimizer, loader, metrics, output_path):
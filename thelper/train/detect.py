@@ -61,51 +61,41 @@ class ObjDetectTrainer(Trainer):
         bboxes = None
         if self.task.gt_key in sample:
             bboxes = sample[self.task.gt_key]
-            assert isinstance(bboxes, list) and all([isinstance(bset, list) for bset in bboxes]), \
-                "bboxes should be provided as a list of lists (dims = batch x bboxes-per-image)"
-            assert all([all([isinstance(box, thelper.data.BoundingBox) for box in bset]) for bset in bboxes]), \
+            assert isinstance(bboxes, list) and \
+                all([isinstance(bset, (list, thelper.data.BoundingBoxArray)) for bset in bboxes]), \
+                "bboxes should be provided as a list of lists or arrays (dims = batch x bboxes-per-image)"
+            assert all([isinstance(bset, thelper.data.BoundingBoxArray) or
+                        all([isinstance(box, thelper.data.BoundingBox) for box in bset]) for bset in bboxes]), \
                 "bboxes should be provided as a thelper.data.BoundingBox-compat object"
-            assert all([len(np.unique([b.image_id for b in bset if b.image_id is not None])) <= 1 for bset in bboxes]), \
+            bboxes = [thelper.data.BoundingBoxArray.from_bboxes(bset) for bset in bboxes]
+            assert all([len(np.unique(bset.image_ids[np.not_equal(bset.image_ids, None)])) <= 1 for bset in bboxes]), \
                 "some bboxes tied to a single image have different reference ids"
             # here, we follow the format used in torchvision (>=0.3) for forwarding targets to detection models
             # (see https://pytorch.org/tutorials/intermediate/torchvision_tutorial.html for more info)
-            bboxes = [{
-                "boxes": torch.as_tensor([[*b.bbox] for b in bset], dtype=torch.float32),
-                "labels": torch.as_tensor([b.class_id for b in bset], dtype=torch.int64),
-                "image_id": torch.as_tensor([b.image_id if b.image_id is not None else -1 for b in bset]),
-                "area": torch.as_tensor([b.area for b in bset], dtype=torch.float32),
-                "iscrowd": torch.as_tensor([b.iscrowd for b in bset], dtype=torch.int64),
-                "refs": bset
-            } for bset in bboxes]
+            bboxes = [bset.to_target() for bset in bboxes]
         return input_val, bboxes
 
     def _from_tensor(self, bboxes, sample=None):
-        """Fetches and returns a list of bbox objects from a model-specific representation."""
+        """Fetches and returns a list of bbox arrays (one per image) from a model-specific representation."""
         # for now, we can only unpack torchvision-format bbox dictionary lists (everything else will throw)
         assert isinstance(bboxes, list), "input should be list since we do batch predictions"
         if all([isinstance(d, dict) and len(d) == 3 and
                 all([k in ["boxes", "labels", "scores"] for k in d]) for d in bboxes]):
             outputs = []
             for batch_idx, d in enumerate(bboxes):
-                boxes = d["boxes"].detach().cpu()
+                boxes = d["boxes"].detach().cpu().float()
                 labels = d["labels"].detach().cpu()
-                scores = d["scores"].detach().cpu()
+                scores = d["scores"].detach().cpu().float()
                 assert boxes.shape[0] == labels.shape[0] and boxes.shape[0] == scores.shape[0], "mismatched tensor dims"
-                curr_output = []
-                for box_idx, box in enumerate(boxes):
-                    if sample is not None and self.task.gt_key in sample and sample[self.task.gt_key][batch_idx]:
-                        gt_box = sample[self.task.gt_key][batch_idx][0]  # use first gt box to get image-level props
-                        out = thelper.data.BoundingBox(labels[box_idx].item(), box, confidence=scores[box_idx].item(),
-                                                       image_id=gt_box.image_id, task=self.task)
-
-                    elif sample is not None and "idx" in sample:
-                        out = thelper.data.BoundingBox(labels[box_idx].item(), box, confidence=scores[box_idx].item(),
-                                                       image_id=sample["idx"][batch_idx], task=self.task)
-                    else:
-                        out = thelper.data.BoundingBox(labels[box_idx].item(), box, confidence=scores[box_idx].item(),
-                                                       task=self.task)
-                    curr_output.append(out)
-                outputs.append(curr_output)
+                image_id = None
+                if sample is not None and self.task.gt_key in sample and len(sample[self.task.gt_key][batch_idx]) > 0:
+                    image_id = sample[self.task.gt_key][batch_idx][0].image_id  # use first gt box to get image-level props
+                elif sample is not None and "idx" in sample:
+                    image_id = sample["idx"][batch_idx]
+                    if isinstance(image_id, torch.Tensor):
+                        image_id = image_id.item()
+                outputs.append(thelper.data.BoundingBoxArray(labels, boxes, confidences=scores,
+                                                             image_ids=image_id, task=self.task))
             return outputs
         raise AssertionError("unrecognized packed bboxes vector format")
 
@@ -126,33 +116,43 @@ class ObjDetectTrainer(Trainer):
         assert optimizer is not None, "missing optimizer"
         assert loader, "no available data to load"
         assert isinstance(metrics, dict), "expect metrics as dict object"
-        epoch_loss = 0
         epoch_size = len(loader)
         self.logger.debug("fetching data loader samples...")
-        for idx, sample in enumerate(loader):
-            images, targets = self._to_tensor(sample)
+        for idx, sample in self._enumerate_train_loader(loader, optimizer):
+            with self._phase("to_tensor"):
+                images, targets = self._to_tensor(sample)
             assert targets is not None and not any([not bset for bset in targets]), \
                 "groundtruth required when training a model"
-            optimizer.zero_grad()
-            targets_dev = self._move_tensor(targets, dev)
-            images_dev = self._move_tensor(images, dev)
+            if self._is_accumulation_start(idx):
+                optimizer.zero_grad()
+            loss_scale = self._get_accumulation_scale(idx, epoch_size)
             if isinstance(model, thelper.nn.utils.ExternalModule):
                 model = model.model  # temporarily unwrap to simplify code below
             assert isinstance(model, torchvision.models.detection.generalized_rcnn.GeneralizedRCNN), \
                 "unknown/unhandled detection model type"  # user should probably implement their own trainer
-            # unfortunately, the default generalized RCNN model forward does not return predictions while training...
-            # loss_dict = model(images=images_dev, targets=targets)  # we basically reimplement this call below
-            original_image_sizes = [img.shape[-2:] for img in images_dev]
-            images_dev, targets_dev = model.transform(images_dev, targets_dev)
-            features = model.backbone(images_dev.tensors)
-            if isinstance(features, torch.Tensor):
-                features = collections.OrderedDict([(0, features)])
-            proposals, proposal_losses = model.rpn(images_dev, features, targets_dev)
-            pred, pred_losses = model.roi_heads(features, proposals, images_dev.image_sizes, targets_dev)
-            pred = model.transform.postprocess(pred, images_dev.image_sizes, original_image_sizes)
-            iter_loss = sum(loss for loss in {**pred_losses, **proposal_losses}.values())
-            iter_loss.backward()
-            optimizer.step()
+            iter_loss, pred = 0, []
+            for start, end in self._get_micro_batches(len(images)):
+                targets_dev = self._move_tensor(targets[start:end], dev)
+                images_dev = self._move_tensor(images[start:end], dev)
+                # unfortunately, the default generalized RCNN model forward does not return predictions while training...
+                # loss_dict = model(images=images_dev, targets=targets)  # we basically reimplement this call below
+                original_image_sizes = [img.shape[-2:] for img in images_dev]
+                with self._autocast():
+                    images_dev, targets_dev = model.transform(images_dev, targets_dev)
+                    features = model.backbone(images_dev.tensors)
+                    if isinstance(features, torch.Tensor):
+                        features = collections.OrderedDict([(0, features)])
+                    proposals, proposal_losses = model.rpn(images_dev, features, targets_dev)
+                    micro_pred, pred_losses = model.roi_heads(features, proposals, images_dev.image_sizes, targets_dev)
+                    micro_pred = model.transform.postprocess(micro_pred, images_dev.image_sizes, original_image_sizes)
+                    micro_loss = sum(loss for loss in {**pred_losses, **proposal_losses}.values())
+                # weigh the micro-batch loss so that gradients match the full minibatch average
+                micro_weight = (end - start) / len(images)
+                self._backward(micro_loss * (micro_weight * loss_scale))
+                iter_loss += micro_loss.detach() * micro_weight
+                pred.extend(micro_pred)
+            if self._is_accumulation_end(idx, epoch_size):
+                self._optimizer_step(optimizer)
             pred = self._from_tensor(pred, sample)
             target_bboxes = [target["refs"] for target in targets]
             # pack image list back into 4d tensor
@@ -160,13 +160,11 @@ class ObjDetectTrainer(Trainer):
             iter_loss = iter_loss.item()
             if not pred:  # for some reason, preds are not provided in train mode by faster-rcnn head
                 pred = [[] * images.shape[0]]  # ... create dummy list of lists for metrics
-            for metric in metrics.values():
-                metric.update(task=self.task, input=images, pred=pred, target=target_bboxes,
-                              sample=sample, loss=iter_loss, iter_idx=idx, max_iters=epoch_size,
-                              epoch_idx=epoch, max_epochs=self.epochs, output_path=output_path)
-            epoch_loss += iter_loss
-        epoch_loss /= epoch_size
-        return epoch_loss
+            self._update_metrics(metrics, task=self.task, input=images, pred=pred, target=target_bboxes,
+                                 sample=sample, loss=iter_loss, iter_idx=idx, max_iters=epoch_size,
+                                 epoch_idx=epoch, max_epochs=self.epochs, output_path=output_path)
+            self.epoch_loss_sum += iter_loss  # initialized (or restored on resume) by the loader enumerator
+        return self.epoch_loss_sum / epoch_size
 
     def eval_epoch(self, model, epoch, dev, loader, metrics, output_path):
         """Evaluates the model using the provided objects.
@@ -184,16 +182,17 @@ class ObjDetectTrainer(Trainer):
         with torch.no_grad():
             epoch_size = len(loader)
             self.logger.debug("fetching data loader samples...")
-            for idx, sample in enumerate(loader):
+            for idx, sample in self._enumerate_eval_loader(loader):
                 if idx < self.skip_eval_iter:
                     continue  # skip until previous iter count (if set externally; no effect otherwise)
-                images, targets = self._to_tensor(sample)
-                pred = model(self._move_tensor(images, dev))
+                with self._phase("to_tensor"):
+                    images, targets = self._to_tensor(sample)
+                with self._autocast():
+                    pred = model(self._move_tensor(images, dev))
                 pred = self._from_tensor(pred, sample)
                 target_bboxes = [target["refs"] for target in targets]
                 # pack image list back into 4d tensor
                 images = torch.cat(images) if len(images) > 1 else torch.unsqueeze(images[0], 0)
-                for metric in metrics.values():
-                    metric.update(task=self.task, input=images, pred=pred, target=target_bboxes,
-                                  sample=sample, loss=None, iter_idx=idx, max_iters=epoch_size,
-                                  epoch_idx=epoch, max_epochs=self.epochs, output_path=output_path)
+                self._update_metrics(metrics, task=self.task, input=images, pred=pred, target=target_bboxes,
+                                     sample=sample, loss=None, iter_idx=idx, max_iters=epoch_size,
+                                     epoch_idx=epoch, max_epochs=self.epochs, output_path=output_path)
@@ -86,32 +86,42 @@ class RegressionTrainer(Trainer):
         assert optimizer is not None, "missing optimizer"
         assert loader, "no available data to load"
         assert isinstance(metrics, dict), "expect metrics as dict object"
-        epoch_loss = 0
         epoch_size = len(loader)
         self.logger.debug("fetching data loader samples...")
-        for idx, sample in enumerate(loader):
-            input_val, target = self._to_tensor(sample)
+        for idx, sample in self._enumerate_train_loader(loader, optimizer):
+            with self._phase("to_tensor"):
+                input_val, target = self._to_tensor(sample)
             # todo: add support to fraction samples that are too big for a single iteration
             # (e.g. when batching non-image data that would be too inefficient one sample at a time)
             assert target is not None, "groundtruth required when training a model"
             assert not isinstance(input_val, list), "missing regr trainer support for duped minibatches"
-            optimizer.zero_grad()
+            if self._is_accumulation_start(idx):
+                optimizer.zero_grad()
+            loss_scale = self._get_accumulation_scale(idx, epoch_size)
+            sync = self._is_accumulation_end(idx, epoch_size)  # only sync gradients before optimizer steps
             target = self._move_tensor(target, dev)
-            iter_pred = model(self._move_tensor(input_val, dev))
-            iter_loss = loss(iter_pred, target.float())
-            iter_loss.backward()
-            optimizer.step()
-            iter_pred_cpu = self._move_tensor(iter_pred, dev="cpu", detach=True)
+            iter_loss, iter_pred = 0, []
+            for start, end in self._get_micro_batches(len(input_val)):
+                with self._grad_sync(model, sync and end == len(input_val)), self._autocast():
+                    micro_pred = model(self._move_tensor(input_val[start:end], dev))
+                    micro_loss = loss(micro_pred, target[start:end].float())
+                # weigh the micro-batch loss so that gradients match the full minibatch average
+                micro_weight = (end - start) / len(input_val)
+                self._backward(micro_loss * (micro_weight * loss_scale))
+                iter_loss += micro_loss.detach() * micro_weight
+                iter_pred.append(micro_pred.detach())
+            iter_pred = iter_pred[0] if len(iter_pred) == 1 else torch.cat(iter_pred, dim=0)
+            if sync:
+                self._optimizer_step(optimizer)
+            iter_pred_cpu = self._to_fp32_cpu(iter_pred)
             target_cpu = self._move_tensor(target, dev="cpu", detach=True)
             iter_loss = iter_loss.item()
-            for metric in metrics.values():
-                metric.update(task=self.task, input=input_val, pred=iter_pred_cpu,
-                              target=target_cpu, sample=sample, loss=iter_loss, iter_idx=idx,
-                              max_iters=epoch_size, epoch_idx=epoch, max_epochs=self.epochs,
-                              output_path=output_path)
-            epoch_loss += iter_loss
-        epoch_loss /= epoch_size
-        return epoch_loss
+            self._update_metrics(metrics, task=self.task, input=input_val, pred=iter_pred_cpu,
+                                 target=target_cpu, sample=sample, loss=iter_loss, iter_idx=idx,
+                                 max_iters=epoch_size, epoch_idx=epoch, max_epochs=self.epochs,
+                                 output_path=output_path)
+            self.epoch_loss_sum += iter_loss  # initialized (or restored on resume) by the loader enumerator
+        return self.epoch_loss_sum / epoch_size
 
     def eval_epoch(self, model, epoch, dev, loader, metrics, output_path):
         """Evaluates the model using the provided objects.
@@ -129,16 +139,17 @@ class RegressionTrainer(Trainer):
         with torch.no_grad():
             epoch_size = len(loader)
             self.logger.debug("fetching data loader samples...")
-            for idx, sample in enumerate(loader):
+            for idx, sample in self._enumerate_eval_loader(loader):
                 if idx < self.skip_eval_iter:
                     continue  # skip until previous iter count (if set externally; no effect otherwise)
-                input_val, target = self._to_tensor(sample)
+                with self._phase("to_tensor"):
+                    input_val, target = self._to_tensor(sample)
                 assert not isinstance(input_val, list), "missing regr trainer support for duped minibatches"
-                pred = model(self._move_tensor(input_val, dev))
-                pred_cpu = self._move_tensor(pred, dev="cpu", detach=True)
+                with self._autocast():
+                    pred = model(self._move_tensor(input_val, dev))
+                pred_cpu = self._to_fp32_cpu(pred)
                 target_cpu = self._move_tensor(target, dev="cpu", detach=True)
-                for metric in metrics.values():
-                    metric.update(task=self.task, input=input_val, pred=pred_cpu,
-                                  target=target_cpu, sample=sample, loss=None, iter_idx=idx,
-                                  max_iters=epoch_size, epoch_idx=epoch, max_epochs=self.epochs,
-                                  output_path=output_path)
+                self._update_metrics(metrics, task=self.task, input=input_val, pred=pred_cpu,
+                                     target=target_cpu, sample=sample, loss=None, iter_idx=idx,
+                                     max_iters=epoch_size, epoch_idx=epoch, max_epochs=self.epochs,
+                                     output_path=output_path)
@@ -84,13 +84,16 @@ class ImageSegmTrainer(Trainer):
         assert optimizer is not None, "missing optimizer"
         assert loader, "no available data to load"
         assert isinstance(metrics, dict), "expect metrics as dict object"
-        epoch_loss = 0
         epoch_size = len(loader)
         self.logger.debug("fetching data loader samples...")
-        for idx, sample in enumerate(loader):
-            input_val, label_map = self._to_tensor(sample)
+        for idx, sample in self._enumerate_train_loader(loader, optimizer):
+            with self._phase("to_tensor"):
+                input_val, label_map = self._to_tensor(sample)
             assert label_map is not None, "groundtruth required when training a model"
-            optimizer.zero_grad()
+            if self._is_accumulation_start(idx):
+                optimizer.zero_grad()
+            loss_scale = self._get_accumulation_scale(idx, epoch_size)
+            sync = self._is_accumulation_end(idx, epoch_size)  # only sync gradients before optimizer steps
             if isinstance(input_val, list):
                 # training samples got augmented, we need to backprop in multiple steps
                 assert input_val, "cannot train with empty post-augment sample lists"
@@ -100,45 +103,51 @@ class ImageSegmTrainer(Trainer):
                     self.logger.warning("using training augmentation without global shuffling, gradient steps might be affected")
                     # see the docstring of thelper.transforms.operations.Duplicator for more information
                     self.warned_no_shuffling_augments = True
-                iter_loss = None
-                iter_pred = None
+                iter_loss, iter_pred = 0, []
                 augs_count = len(input_val)
-                for aug_idx in range(augs_count):
-                    aug_pred = model(self._move_tensor(input_val[aug_idx], dev))
-                    if isinstance(aug_pred, dict):
-                        aug_pred = aug_pred[self.output_pred_key]
-                    if self.scale_preds:
-                        aug_pred = torch.nn.functional.interpolate(aug_pred, size=input_val[aug_idx].shape[-2:], mode="bilinear")
-                    aug_loss = loss(aug_pred, label_map[aug_idx].long())
-                    aug_loss.backward()  # test backprop all at once? might not fit in memory...
-                    if iter_pred is None:
-                        iter_loss = aug_loss.clone().detach()
-                        iter_pred = aug_pred.clone().detach()
-                    else:
-                        iter_loss += aug_loss.detach()
-                        iter_pred = torch.cat((aug_pred.detach(), iter_pred), dim=0)
+                for start, end in self._get_augments_chunks(input_val):
+                    aug_input = self._cat_augments(input_val, start, end)
+                    with self._grad_sync(model, sync and end == augs_count), self._autocast():
+                        aug_pred = model(self._move_tensor(aug_input, dev))
+                        if isinstance(aug_pred, dict):
+                            aug_pred = aug_pred[self.output_pred_key]
+                        if self.scale_preds:
+                            aug_pred = torch.nn.functional.interpolate(aug_pred, size=aug_input.shape[-2:], mode="bilinear")
+                        aug_loss = loss(aug_pred, self._move_tensor(self._cat_augments(label_map, start, end), dev).long())
+                    # scale the chunk loss so that gradients always match the sum over per-copy backprops
+                    self._backward(aug_loss * ((end - start) * loss_scale))
+                    iter_loss += aug_loss.detach() * (end - start)
+                    iter_pred.append(aug_pred.detach())
                 iter_loss /= augs_count
+                iter_pred = torch.cat(iter_pred, dim=0)
                 label_map = torch.cat(label_map, dim=0)
             else:  # this is the default (simple) case where we generate predictions without augmentations
-                iter_pred = model(self._move_tensor(input_val, dev))
-                if isinstance(iter_pred, dict):
-                    iter_pred = iter_pred[self.output_pred_key]
-                if self.scale_preds:
-                    iter_pred = torch.nn.functional.interpolate(iter_pred, size=input_val.shape[-2:], mode="bilinear")
-                iter_loss = loss(iter_pred, self._move_tensor(label_map, dev).long())
-                iter_loss.backward()
-            optimizer.step()
-            iter_pred_cpu = self._move_tensor(iter_pred, dev="cpu", detach=True)
+                iter_loss, iter_pred = 0, []
+                for start, end in self._get_micro_batches(len(input_val)):
+                    with self._grad_sync(model, sync and end == len(input_val)), self._autocast():
+                        micro_pred = model(self._move_tensor(input_val[start:end], dev))
+                        if isinstance(micro_pred, dict):
+                            micro_pred = micro_pred[self.output_pred_key]
+                        if self.scale_preds:
+                            micro_pred = torch.nn.functional.interpolate(micro_pred, size=input_val.shape[-2:], mode="bilinear")
+                        micro_loss = loss(micro_pred, self._move_tensor(label_map[start:end], dev).long())
+                    # weigh the micro-batch loss so that gradients match the full minibatch average
+                    micro_weight = (end - start) / len(input_val)
+                    self._backward(micro_loss * (micro_weight * loss_scale))
+                    iter_loss += micro_loss.detach() * micro_weight
+                    iter_pred.append(micro_pred.detach())
+                iter_pred = iter_pred[0] if len(iter_pred) == 1 else torch.cat(iter_pred, dim=0)
+            if sync:
+                self._optimizer_step(optimizer)
+            iter_pred_cpu = self._to_fp32_cpu(iter_pred)
             label_map_cpu = self._move_tensor(label_map, dev="cpu", detach=True)
             iter_loss = iter_loss.item()
-            for metric in metrics.values():
-                metric.update(task=self.task, input=input_val, pred=iter_pred_cpu,
-                              target=label_map_cpu, sample=sample, loss=iter_loss,
-                              iter_idx=idx, max_iters=epoch_size, epoch_idx=epoch,
-                              max_epochs=self.epochs, output_path=output_path)
-            epoch_loss += iter_loss
-        epoch_loss /= epoch_size
-        return epoch_loss
+            self._update_metrics(metrics, task=self.task, input=input_val, pred=iter_pred_cpu,
+                                 target=label_map_cpu, sample=sample, loss=iter_loss,
+                                 iter_idx=idx, max_iters=epoch_size, epoch_idx=epoch,
+                                 max_epochs=self.epochs, output_path=output_path)
+            self.epoch_loss_sum += iter_loss  # initialized (or restored on resume) by the loader enumerator
+        return self.epoch_loss_sum / epoch_size
 
     def eval_epoch(self, model, epoch, dev, loader, metrics, output_path):
         """Evaluates the model using the provided objects.
@@ -156,10 +165,11 @@ class ImageSegmTrainer(Trainer):
         with torch.no_grad():
             epoch_size = len(loader)
             self.logger.debug("fetching data loader samples...")
-            for idx, sample in enumerate(loader):
+            for idx, sample in self._enumerate_eval_loader(loader):
                 if idx < self.skip_eval_iter:
                     continue  # skip until previous iter count (if set externally; no effect otherwise)
-                input_val, label_map = self._to_tensor(sample)
+                with self._phase("to_tensor"):
+                    input_val, label_map = self._to_tensor(sample)
                 if isinstance(input_val, list):
                     # evaluation samples got augmented, we need to get the mean prediction
                     assert input_val, "cannot eval with empty post-augment sample lists"
@@ -170,25 +180,27 @@ class ImageSegmTrainer(Trainer):
                         "all label maps should be identical! (why do eval-time augment otherwise?)"
                     label_map = label_map[0]  # since all identical, just pick the first one and pretend its the only one
                     preds = None
-                    for input_idx in range(len(input_val)):
-                        pred = model(self._move_tensor(input_val[input_idx], dev))
+                    for start, end in self._get_augments_chunks(input_val):
+                        with self._autocast():
+                            pred = model(self._move_tensor(self._cat_augments(input_val, start, end), dev))
                         if isinstance(pred, dict):
                             pred = pred[self.output_pred_key]
-                        if preds is None:
-                            preds = torch.unsqueeze(pred.clone(), 0)
-                        else:
-                            preds = torch.cat((preds, torch.unsqueeze(pred, 0)), 0)
+                        pred = pred.reshape(end - start, -1, *pred.shape[1:])
+                        if preds is None:  # preallocate the prediction stack for all copies
+                            preds = pred.new_empty((len(input_val), *pred.shape[1:]))
+                        preds[start:end] = pred
                     pred = torch.mean(preds, dim=0)
                 else:  # this is the default (simple) case where we generate predictions without augmentations
-                    pred = model(self._move_tensor(input_val, dev))
+                    with self._autocast():
+                        pred = model(self._move_tensor(input_val, dev))
                     if isinstance(pred, dict):
                         pred = pred[self.output_pred_key]
                 if self.scale_preds:
-                    pred = torch.nn.functional.interpolate(pred, size=input_val.shape[-2:], mode="bilinear")
-                pred_cpu = self._move_tensor(pred, dev="cpu", detach=True)
+                    input_shape = input_val[0].shape if isinstance(input_val, list) else input_val.shape
+                    pred = torch.nn.functional.interpolate(pred, size=input_shape[-2:], mode="bilinear")
+                pred_cpu = self._to_fp32_cpu(pred)
                 label_map_cpu = self._move_tensor(label_map, dev="cpu", detach=True)
-                for metric in metrics.values():
-                    metric.update(task=self.task, input=input_val, pred=pred_cpu,
-                                  target=label_map_cpu, sample=sample, loss=None, iter_idx=idx,
-                                  max_iters=epoch_size, epoch_idx=epoch, max_epochs=self.epochs,
-                                  output_path=output_path)
+                self._update_metrics(metrics, task=self.task, input=input_val, pred=pred_cpu,
+                                     target=label_map_cpu, sample=sample, loss=None, iter_idx=idx,
+                                     max_iters=epoch_size, epoch_idx=epoch, max_epochs=self.epochs,
+                                     output_path=output_path)
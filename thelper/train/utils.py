@@ -5,14 +5,18 @@ the prediction consumer interface used by metrics and loggers to receive iterati
 training. See :mod:`thelper.optim.metrics` for more information on metrics.
 """
 
+import contextlib
+import gc
 import json
 import logging
 import os
+import queue
+import threading
+import time
 from typing import Any, AnyStr, Dict, List, Optional, Union  # noqa: F401
 
 import cv2 as cv
 import numpy as np
-import sklearn.metrics
 import torch
 
 import thelper.concepts
@@ -20,11 +24,13 @@ import thelper.ifaces
 import thelper.typedefs  # noqa: F401
 import thelper.utils
 from thelper.ifaces import ClassNamesHandler, ColorMapHandler, FormatHandler, PredictionConsumer
-from thelper.optim.eval import compute_bbox_iou
-from thelper.tasks.detect import BoundingBox
+from thelper.tasks.detect import BoundingBox, BoundingBoxArray
 
 logger = logging.getLogger(__name__)
 
+DENSE_CONFMAT_MAX_CLASSES = 1000
+"""Maximum class count for which confusion matrices are stored in a dense format by default."""
+
 
 class PredictionCallback(PredictionConsumer):
     """Callback function wrapper compatible with the consumer interface.
@@ -60,6 +66,369 @@ class PredictionCallback(PredictionConsumer):
         return self.callback_func(*args, **kwargs)
 
 
+class AsyncConsumerUpdater:
+    """Background consumer update pipeline.
+
+    This object owns a bounded queue of update packets that is consumed by a single background thread
+    in which the thread-safe prediction consumers are updated (in order). Trainers that use it should
+    only push detached tensors that will not be modified afterwards, and they must call :meth:`flush`
+    before evaluating, rendering, or writing the consumers' results. Errors raised by consumers in the
+    background thread are re-raised in the calling thread on the next push or flush.
+
+    Attributes:
+        max_queue_size: maximum number of pending update packets before pushes block (zero = unbounded).
+    """
+
+    def __init__(self, max_queue_size=8):
+        # type: (int) -> None
+        assert max_queue_size >= 0, "max queue size should be positive integer (or zero)"
+        self.max_queue_size = max_queue_size
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="thelper-consumer-updater", daemon=True)
+        self._thread.start()
+
+    def __repr__(self):
+        """Returns a generic print-friendly string containing info about this updater."""
+        return self.__class__.__module__ + "." + self.__class__.__qualname__ + \
+            f"(max_queue_size={repr(self.max_queue_size)})"
+
+    def _run(self):
+        """Updates consumers with the queued packets until the stop signal (``None``) is received."""
+        while True:
+            packet = self._queue.get()
+            try:
+                if packet is None:
+                    return
+                if self._error is None:  # skip all updates once a consumer failed
+                    consumers, kwargs = packet
+                    for consumer in consumers:
+                        consumer.update(**kwargs)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _check_error(self):
+        """Re-raises the first exception caught in the background thread, if any."""
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("exception caught while updating consumers in background thread") from error
+
+    def push(self, consumers, **kwargs):
+        """Queues an update packet for the given consumers (may block if the queue is full)."""
+        self._check_error()
+        assert self._thread.is_alive(), "consumer updater thread was already stopped"
+        if consumers:
+            self._queue.put((list(consumers), kwargs))
+
+    def flush(self):
+        """Blocks until all queued updates have been processed by the background thread."""
+        self._queue.join()
+        self._check_error()
+
+    def close(self):
+        """Processes all pending updates and stops the background thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._check_error()
+
+
+class PhaseTimer:
+    """Per-iteration phase timer used to profile training/evaluation loops.
+
+    Each iteration is split in named phases (e.g. loader wait, forward, backward) that are timed separately. Phases
+    are exclusive: a phase that is started while another one is active is ignored (re-entering the active phase is
+    allowed), so that the phase times of an iteration never overlap. The time spent in an iteration outside all
+    phases is reported as ``other``. Iterations start when the next minibatch is requested from the loader (see
+    :meth:`iterate`), and end when the one that follows it is requested.
+
+    Attributes:
+        synchronize: specifies whether CUDA devices should be synchronized at phase boundaries (required to
+            attribute asynchronous kernel times to the right phases, but adds some overhead).
+        percentiles: list of percentiles (in [0, 100]) of the per-iteration phase times to report.
+        last: phase times (in seconds) of the last completed iteration.
+    """
+
+    def __init__(self, synchronize=False, percentiles=(50, 90, 99)):
+        # type: (bool, List[float]) -> None
+        assert all([0 <= p <= 100 for p in percentiles]), "percentiles should be in [0, 100]"
+        self.synchronize = synchronize
+        self.percentiles = list(percentiles)
+        self.last = {}  # type: Dict[AnyStr, float]
+        self.reset()
+
+    def __repr__(self):
+        """Returns a generic print-friendly string containing info about this timer."""
+        return self.__class__.__module__ + "." + self.__class__.__qualname__ + \
+            f"(synchronize={repr(self.synchronize)}, percentiles={repr(self.percentiles)})"
+
+    def reset(self):
+        """Clears all the phase times accumulated so far."""
+        self.times = {}  # type: Dict[AnyStr, List[float]]
+        self.sample_counts = []  # type: List[int]
+        self._iter_times, self._iter_start = {}, None
+        self._active, self._depth, self._phase_start = None, 0, None
+
+    def _now(self):
+        if self.synchronize and torch.cuda.is_available():
+            torch.cuda.synchronize()
+        return time.perf_counter()
+
+    def start_iter(self):
+        """Starts timing a new iteration."""
+        self._iter_times, self._iter_start = {}, self._now()
+        self._active, self._depth = None, 0
+
+    def end_iter(self, sample_count=0):
+        """Ends the current iteration, and stores its phase times (including ``other``)."""
+        if self._iter_start is None:
+            return
+        iter_times = self._iter_times
+        iter_times["total"] = self._now() - self._iter_start
+        iter_times["other"] = max(iter_times["total"] - sum([v for k, v in iter_times.items() if k != "total"]), 0.)
+        for name in set(self.times) | set(iter_times):
+            # phases that were skipped in some iterations are counted as zero-time in these
+            self.times.setdefault(name, [0.] * len(self.sample_counts)).append(iter_times.get(name, 0.))
+        self.sample_counts.append(sample_count)
+        self.last, self._iter_times, self._iter_start = iter_times, {}, None
+        self._active, self._depth = None, 0
+
+    def begin(self, name):
+        """Starts timing a phase of the current iteration (if no other phase is active)."""
+        if self._iter_start is None or (self._active is not None and self._active != name):
+            return
+        if self._active is None:
+            self._active, self._phase_start = name, self._now()
+        self._depth += 1
+
+    def end(self, name):
+        """Stops timing a phase of the current iteration (if it is the active one)."""
+        if self._active != name:
+            return
+        self._depth -= 1
+        if self._depth == 0:
+            self._iter_times[name] = self._iter_times.get(name, 0.) + self._now() - self._phase_start
+            self._active = None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Returns a context manager that times the code it contains as a phase of the current iteration."""
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end(name)
+
+    def iterate(self, iterable, count_fn=None, name="loader_wait"):
+        """Yields the items of an iterable (e.g. a data loader), splitting iterations on item requests.
+
+        The time spent waiting for each item is timed as a phase, and the sample count of each iteration
+        is obtained by calling ``count_fn`` on its item (if provided).
+        """
+        iterator = iter(iterable)
+        while True:
+            self.start_iter()
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    self._iter_start = None
+                    return
+            try:
+                yield item
+            finally:  # also executed if the loop over the items is interrupted
+                self.end_iter(count_fn(item) if count_fn is not None else 0)
+
+    def summary(self):
+        """Returns a flat dictionary of the mean/percentile times (in ms) of all phases, and the sample throughput."""
+        res = {}
+        for name, times in self.times.items():
+            times = np.asarray(times) * 1000
+            res[f"{name}/mean_ms"] = float(times.mean())
+            for p, val in zip(self.percentiles, np.percentile(times, self.percentiles)):
+                res[f"{name}/p{p:g}_ms"] = float(val)
+        total_time = sum(self.times.get("total", []))
+        if total_time > 0 and sum(self.sample_counts) > 0:
+            res["samples_per_sec"] = sum(self.sample_counts) / total_time
+        return res
+
+    def report(self):
+        """Returns a print-friendly table of the phase times, sorted by decreasing mean time."""
+        if not self.sample_counts:
+            return ""
+        stats = self.summary()
+        names = sorted([n for n in self.times if n != "total"], key=lambda n: stats[f"{n}/mean_ms"], reverse=True)
+        name_len = max([len(n) for n in self.times] + [len("phase")])
+        header = f"{'phase':<{name_len}}  {'mean (ms)':>12}" + \
+            "".join([f"  {f'p{p:g} (ms)':>12}" for p in self.percentiles]) + f"  {'share (%)':>10}\n"
+        res = header + "-" * (len(header) - 1) + "\n"
+        for name in names + ["total"]:
+            share = 100 * stats[f"{name}/mean_ms"] / max(stats["total/mean_ms"], 1e-12)
+            res += f"{name:<{name_len}}  {stats[f'{name}/mean_ms']:>12.4f}" + \
+                "".join([f"  {stats[f'{name}/p{p:g}_ms']:>12.4f}" for p in self.percentiles]) + f"  {share:>10.1f}\n"
+        res += f"{len(self.sample_counts)} iterations"
+        if "samples_per_sec" in stats:
+            res += f", {stats['samples_per_sec']:.2f} samples/sec"
+        return res + "\n"
+
+
+class PhaseHook:
+    """Forward (pre-)hook that begins or ends a phase of a :class:`PhaseTimer` when a module is called.
+
+    Unlike a closure, this hook can be pickled along with the model it is registered on (e.g. in checkpoints
+    saved while training). The timer itself is not pickled, meaning that unpickled hooks do nothing.
+
+    Attributes:
+        phase_timer: the timer in which the phase is measured (``None`` once unpickled).
+        name: name of the timed phase.
+        begin: specifies whether the hook begins the phase (pre-hook) or ends it (hook).
+    """
+
+    def __init__(self, phase_timer, name, begin):
+        # type: (Optional[PhaseTimer], AnyStr, bool) -> None
+        self.phase_timer = phase_timer
+        self.name = name
+        self.begin = begin
+
+    def __getstate__(self):
+        return {**self.__dict__, "phase_timer": None}
+
+    def __call__(self, *args):
+        if self.phase_timer is not None:
+            if self.begin:
+                self.phase_timer.begin(self.name)
+            else:
+                self.phase_timer.end(self.name)
+
+
+def get_batch_size(sample, key):
+    """Returns the number of samples in a minibatch based on the length of the value of one of its keys.
+
+    Lists of tensors (e.g. augmented copies of the minibatch) are measured using their first tensor.
+    """
+    val = sample.get(key, None) if isinstance(sample, dict) else sample
+    if isinstance(val, (list, tuple)) and val and isinstance(val[0], torch.Tensor):
+        val = val[0]
+    if isinstance(val, torch.Tensor):
+        return len(val) if val.dim() > 0 else 1
+    return len(val) if isinstance(val, (list, tuple, np.ndarray)) else 0
+
+
+def get_tensors(data):
+    """Returns the list of all tensors found in a (possibly nested) list, tuple, or dictionary."""
+    if isinstance(data, torch.Tensor):
+        return [data]
+    if isinstance(data, dict):
+        data = list(data.values())
+    if isinstance(data, (list, tuple)):
+        return [tensor for val in data for tensor in get_tensors(val)]
+    return []
+
+
+def release_memory(device=None):
+    """Releases the memory that was freed by the allocators so that it can be measured (or used) again.
+
+    On CUDA devices, the cached blocks of the PyTorch allocator are released. Otherwise, the heap of the
+    process is trimmed (if the C library supports it), as freed memory would still count in its RSS.
+    """
+    gc.collect()
+    if device is not None and torch.device(device).type == "cuda":
+        torch.cuda.synchronize(device)
+        torch.cuda.empty_cache()
+        return
+    try:
+        import ctypes
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass  # not using glibc, nothing else we can do
+
+
+def get_peak_memory(func, device=None, interval=0.001):
+    """Calls a function, and returns its output along with the peak memory usage (in bytes) observed in the meantime.
+
+    On CUDA devices, the peak is obtained from the allocator statistics of the device, meaning that only tensor
+    allocations are accounted for. Otherwise, the resident set size of the process is sampled at the given interval
+    (in seconds) in a background thread (see :func:`thelper.utils.get_rss_bytes`); in that case, the memory that
+    is held by the process before the call (e.g. the model parameters) is included in the peak. If the memory usage
+    cannot be measured on the current platform, the returned peak is ``None``.
+    """
+    if device is not None and torch.device(device).type == "cuda":
+        torch.cuda.synchronize(device)
+        torch.cuda.reset_peak_memory_stats(device)
+        output = func()
+        torch.cuda.synchronize(device)
+        return output, torch.cuda.max_memory_allocated(device)
+    peak = [thelper.utils.get_rss_bytes(include_children=False)]
+    if peak[0] is None:
+        return func(), None
+    done = threading.Event()
+
+    def sample_rss():
+        while not done.wait(interval):
+            peak[0] = max(peak[0], thelper.utils.get_rss_bytes(include_children=False) or 0)
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    try:
+        output = func()
+    finally:
+        done.set()
+        sampler.join()
+    peak[0] = max(peak[0], thelper.utils.get_rss_bytes(include_children=False) or 0)
+    return output, peak[0]
+
+
+def get_confmat(target, pred, class_count, sample_weight=None, sparse=False):
+    """Returns the confusion matrix counts for the given arrays of groundtruth and predicted label indices.
+
+    Dense matrices are returned as ``class_count x class_count`` arrays where rows correspond to groundtruth
+    labels and columns to predicted labels. Sparse matrices are returned as a pair of arrays holding the
+    sorted flat indices of their non-zero cells and the counts of these cells, so that their size does not
+    grow with the square of the class count. The counts are integers unless sample weights are provided.
+    """
+    cell_idxs = np.asarray(target, dtype=np.int64) * class_count + np.asarray(pred, dtype=np.int64)
+    if not sparse:
+        counts = np.bincount(cell_idxs, weights=sample_weight, minlength=class_count * class_count)
+        return counts.reshape(class_count, class_count)
+    cell_idxs, unique_idxs = np.unique(cell_idxs, return_inverse=True)
+    return cell_idxs, np.bincount(unique_idxs, weights=sample_weight, minlength=len(cell_idxs))
+
+
+def merge_confmats(confmat, other):
+    """Returns the sum of two (dense or sparse) confusion matrices obtained via :func:`get_confmat`."""
+    if confmat is None or other is None:
+        return other if confmat is None else confmat
+    if isinstance(confmat, np.ndarray):
+        return confmat + other
+    cell_idxs, unique_idxs = np.unique(np.concatenate([confmat[0], other[0]]), return_inverse=True)
+    counts = np.zeros(len(cell_idxs), dtype=np.result_type(confmat[1], other[1]))
+    np.add.at(counts, unique_idxs, np.concatenate([confmat[1], other[1]]))
+    return cell_idxs, counts
+
+
+def get_dense_confmat(confmat, class_count):
+    """Returns the ``class_count x class_count`` array version of a (dense or sparse) confusion matrix."""
+    if isinstance(confmat, np.ndarray):
+        return confmat
+    dense_confmat = np.zeros(class_count * class_count, dtype=confmat[1].dtype)
+    dense_confmat[confmat[0]] = confmat[1]
+    return dense_confmat.reshape(class_count, class_count)
+
+
+def get_confmat_sums(confmat, class_count):
+    """Returns the per-class true positive, groundtruth and prediction counts of a (dense or sparse) confusion matrix."""
+    if isinstance(confmat, np.ndarray):
+        return np.diagonal(confmat).copy(), confmat.sum(axis=1), confmat.sum(axis=0)
+    target, pred = np.divmod(confmat[0], class_count)
+    true_pos, true_sum, pred_sum = [np.zeros(class_count, dtype=confmat[1].dtype) for _ in range(3)]
+    np.add.at(true_pos, target[target == pred], confmat[1][target == pred])
+    np.add.at(true_sum, target, confmat[1])
+    np.add.at(pred_sum, pred, confmat[1])
+    return true_pos, true_sum, pred_sum
+
+
 @thelper.concepts.classification
 class ClassifLogger(PredictionConsumer, ClassNamesHandler, FormatHandler):
     """Classification output logger.
@@ -108,6 +477,8 @@ class ClassifLogger(PredictionConsumer, ClassNamesHandler, FormatHandler):
         format: output format of the produced log (supports: text, CSV)
     """
 
+    mergeable = True
+
     def __init__(self,
                  top_k=1,               # type: int
                  conf_threshold=None,   # type: Optional[thelper.typedefs.Number]
@@ -160,6 +531,11 @@ class ClassifLogger(PredictionConsumer, ClassNamesHandler, FormatHandler):
         else:
             self.target_idx = None
 
+    @property
+    def thread_safe(self):
+        """Returns whether this consumer can be updated from a background thread or not."""
+        return True  # updates only fill the per-iteration score/label/meta slots of this logger, read at epoch end
+
     def update(self,         # see `thelper.typedefs.IterCallbackParams` for more info
                task,         # type: thelper.tasks.utils.Task
                input,        # type: thelper.typedefs.InputType
@@ -274,6 +650,10 @@ class ClassifLogger(PredictionConsumer, ClassNamesHandler, FormatHandler):
                     break
         return "\n".join([header, *lines])
 
+    def merge(self, other):
+        """Merges the accumulated per-iteration values of another (distributed) instance into this one."""
+        self._merge_iter_arrays(other, "score", "true", "meta")
+
     def reset(self):
         """Toggles a reset of the internal state, emptying storage arrays."""
         self.score = None
@@ -285,8 +665,11 @@ class ClassifLogger(PredictionConsumer, ClassNamesHandler, FormatHandler):
 class ClassifReport(PredictionConsumer, ClassNamesHandler, FormatHandler):
     """Classification report interface.
 
-    This class provides a simple interface to ``sklearn.metrics.classification_report`` so that all
-    count-based metrics can be reported at once under a string-based representation.
+    This class provides a simple interface to generate reports in the format of
+    ``sklearn.metrics.classification_report`` so that all count-based metrics can be reported at once under
+    a string-based representation. These metrics are derived from a confusion matrix that is updated at
+    every iteration, meaning that the predictions themselves are never stored. For large class counts, the
+    confusion matrix can be stored in a sparse format.
 
     Usage example inside a session configuration file::
 
@@ -311,25 +694,35 @@ class ClassifReport(PredictionConsumer, ClassNamesHandler, FormatHandler):
     Attributes:
         class_names: holds the list of class label names provided by the dataset parser. If it is not
             provided when the constructor is called, it will be set by the trainer at runtime.
-        pred: queue used to store the top-1 (best) predicted class indices at each iteration.
+        confmat: confusion matrix accumulated since the start of the current epoch (or since the last reset).
+        sparse: defines whether the confusion matrix should be stored in a sparse format or not.
         format: output format of the produced log (supports: text, JSON)
     """
 
-    def __init__(self, class_names=None, sample_weight=None, digits=4, format=None):
+    mergeable = True
+
+    def __init__(self, class_names=None, sample_weight=None, digits=4, format=None, sparse=None):
         """Receives the optional class names and arguments passed to the report generator function.
 
         Args:
             class_names: holds the list of class label names provided by the dataset parser. If it is not
                 provided when the constructor is called, it will be set by the trainer at runtime.
-            sample_weight: sample weights, forwarded to ``sklearn.metrics.classification_report``.
-            digits: metrics output digit count, forwarded to ``sklearn.metrics.classification_report``.
+            sample_weight: sample weights, applied in order to all samples that have a groundtruth label. These
+                weights are indexed by the order in which samples are received during each epoch (which only
+                matches the dataset order if the loader does not shuffle them); they are not supported in
+                distributed sessions, where each process only receives its own shard of the samples.
+            digits: metrics output digit count.
             format: output format of the produced log.
+            sparse: defines whether the confusion matrix should be stored in a sparse format or not. If
+                ``None``, a sparse format will be used for tasks with more than ``DENSE_CONFMAT_MAX_CLASSES`` classes.
         """
         self.class_names = None
         self.sample_weight = sample_weight
         self.digits = digits
-        self.pred = None
-        self.target = None
+        self.sparse = sparse
+        self.confmat = None
+        self.sample_count = 0
+        self.last_iter_idx = None
         ClassNamesHandler.__init__(self, class_names)
         FormatHandler.__init__(self, format)
 
@@ -337,7 +730,12 @@ class ClassifReport(PredictionConsumer, ClassNamesHandler, FormatHandler):
         """Returns a generic print-friendly string containing info about this consumer."""
         return f"{self.__class__.__module__}.{self.__class__.__qualname__}" + \
                f"(class_names={repr(self.class_names)}, sample_weight={repr(self.sample_weight)}, " + \
-               f"digits={repr(self.digits)})"
+               f"digits={repr(self.digits)}, sparse={repr(self.sparse)})"
+
+    @property
+    def thread_safe(self):
+        """Returns whether this consumer can be updated from a background thread or not."""
+        return True  # updates only add minibatch counts to the confusion matrix of this report, read at epoch end
 
     def update(self,         # see `thelper.typedefs.IterCallbackParams` for more info
                task,         # type: thelper.tasks.utils.Task
@@ -363,35 +761,67 @@ class ClassifReport(PredictionConsumer, ClassNamesHandler, FormatHandler):
         assert not task.multi_label, "classif report only impl for non-multi-label classif tasks"
         assert iter_idx is not None and max_iters is not None and iter_idx < max_iters, \
             "bad iteration indices given to update function"
-        if self.pred is None or self.pred.size != max_iters:
-            self.pred = np.asarray([None] * max_iters)
-            self.target = np.asarray([None] * max_iters)
+        if self.last_iter_idx is None or iter_idx <= self.last_iter_idx:
+            # new epoch (or evaluation loop), drop the counts of the previous one
+            self.confmat, self.sample_count = None, 0
+        self.last_iter_idx = iter_idx
         if task.class_names != self.class_names:
             self.class_names = task.class_names
         if target is None or target.numel() == 0:
             # only accumulate results when groundtruth is available
-            self.pred[iter_idx] = None
-            self.target[iter_idx] = None
             return
         assert pred.dim() == 2 or target.dim() == 1, "current classif report impl only supports batched 1D outputs"
         assert pred.shape[0] == target.shape[0], "prediction/gt tensors batch size mismatch"
         assert pred.shape[1] == len(self.class_names), "unexpected prediction class dimension size"
-        self.pred[iter_idx] = pred.topk(1, dim=1)[1].view(pred.shape[0]).tolist()
-        self.target[iter_idx] = target.view(target.shape[0]).tolist()
+        sample_weight = None
+        if self.sample_weight is not None:
+            assert thelper.utils.get_distributed_info()[1] == 1, "sample weights are not supported in distributed sessions"
+            sample_weight = np.asarray(self.sample_weight)[self.sample_count:self.sample_count + target.shape[0]]
+            assert len(sample_weight) == target.shape[0], "sample weight array is too short for the number of samples"
+        sparse = self.sparse if self.sparse is not None else len(self.class_names) > DENSE_CONFMAT_MAX_CLASSES
+        confmat = get_confmat(target.view(target.shape[0]).cpu().numpy(),
+                              pred.topk(1, dim=1)[1].view(pred.shape[0]).cpu().numpy(),
+                              len(self.class_names), sample_weight=sample_weight, sparse=sparse)
+        self.confmat = merge_confmats(self.confmat, confmat)
+        self.sample_count += target.shape[0]
 
     def gen_report(self, as_dict=False):
         # type: (bool) -> Union[AnyStr, thelper.typedefs.JSON]
-        if self.pred is None or self.target is None:
+        """Returns the precision, recall, f1-score and support of all classes in the sklearn report format.
+
+        Only the classes that appear as groundtruth or prediction labels are reported, and their rows are
+        sorted by name. Scores that cannot be computed due to a zero division are set to zero. As with sklearn,
+        supports are integers unless sample weights are used.
+        """
+        if self.confmat is None:
             return None
-        pred, target = zip(*[(pred, target) for preds, targets in zip(self.pred, self.target)
-                             if targets is not None for pred, target in zip(preds, targets)])
-        y_true = np.asarray(target)
-        y_pred = np.asarray(pred)
-        _y_true = [self.class_names[classid] for classid in y_true]
-        _y_pred = [self.class_names[classid] if (0 <= classid < len(self.class_names)) else "<unset>"
-                   for classid in y_pred]
-        return sklearn.metrics.classification_report(_y_true, _y_pred, sample_weight=self.sample_weight,
-                                                     digits=self.digits, output_dict=as_dict)
+        true_pos, true_sum, pred_sum = get_confmat_sums(self.confmat, len(self.class_names))
+        labels = sorted(np.flatnonzero((true_sum != 0) | (pred_sum != 0)), key=lambda idx: self.class_names[idx])
+        true_pos, true_sum, pred_sum = true_pos[labels], true_sum[labels], pred_sum[labels]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            precision = np.nan_to_num(true_pos / pred_sum)
+            recall = np.nan_to_num(true_pos / true_sum)
+            f1_score = np.nan_to_num(2 * true_pos / (true_sum + pred_sum))
+        support = np.sum(true_sum)
+        accuracy = np.sum(true_pos) / support if support else 0.
+        headers = ["precision", "recall", "f1-score", "support"]
+        rows = [[self.class_names[label], *scores] for label, scores in zip(labels, zip(precision, recall, f1_score, true_sum))]
+        averages = {"macro avg": [np.average(precision), np.average(recall), np.average(f1_score), support]}
+        weights = true_sum if support else None
+        averages["weighted avg"] = [np.average(scores, weights=weights) for scores in [precision, recall, f1_score]] + [support]
+        if as_dict:
+            report = {name: dict(zip(headers, [val.item() for val in scores])) for name, *scores in rows}
+            report["accuracy"] = float(accuracy)
+            report.update({name: dict(zip(headers, [val.item() for val in scores])) for name, scores in averages.items()})
+            return report
+        width = max(*[len(row[0]) for row in rows], len("weighted avg"), self.digits)
+        row_fmt = "{:>{width}s} " + " {:>9.{digits}f}" * 3 + " {:>9}\n"
+        report = ("{:>{width}s} " + " {:>9}" * len(headers)).format("", *headers, width=width) + "\n\n"
+        report += "".join([row_fmt.format(*row, width=width, digits=self.digits) for row in rows]) + "\n"
+        report += ("{:>{width}s} " + " {:>9.{digits}}" * 2 + " {:>9.{digits}f}" + " {:>9}\n").format(
+            "accuracy", "", "", accuracy, support, width=width, digits=self.digits)
+        report += "".join([row_fmt.format(name, *scores, width=width, digits=self.digits) for name, scores in averages.items()])
+        return report
 
     def report_text(self):
         # type: () -> Optional[AnyStr]
@@ -403,10 +833,15 @@ class ClassifReport(PredictionConsumer, ClassNamesHandler, FormatHandler):
         """Returns the classification report as a JSON formatted string."""
         return json.dumps(self.gen_report(as_dict=True), indent=4)
 
+    def merge(self, other):
+        """Merges the confusion matrix of another (distributed) instance into this one."""
+        self.confmat = merge_confmats(self.confmat, other.confmat)
+
     def reset(self):
-        """Toggles a reset of the metric's internal state, emptying queues."""
-        self.pred = None
-        self.target = None
+        """Toggles a reset of the metric's internal state, emptying the confusion matrix."""
+        self.confmat = None
+        self.sample_count = 0
+        self.last_iter_idx = None
 
 
 @thelper.concepts.detection
@@ -461,6 +896,8 @@ class DetectLogger(PredictionConsumer, ClassNamesHandler, FormatHandler):
         format: output format of the produced log (supports: text, CSV, JSON)
     """
 
+    mergeable = True
+
     def __init__(self,
                  top_k=None,            # type: Optional[int]
                  conf_threshold=None,   # type: Optional[thelper.typedefs.Number]
@@ -515,6 +952,11 @@ class DetectLogger(PredictionConsumer, ClassNamesHandler, FormatHandler):
         else:
             self.target_idx = None
 
+    @property
+    def thread_safe(self):
+        """Returns whether this consumer can be updated from a background thread or not."""
+        return True  # updates only store the minibatch bbox arrays in the per-iteration slots of this logger
+
     def update(self,         # see `thelper.typedefs.IterCallbackParams` for more info
                task,         # type: thelper.tasks.utils.Task
                input,        # type: thelper.typedefs.InputType
@@ -549,10 +991,10 @@ class DetectLogger(PredictionConsumer, ClassNamesHandler, FormatHandler):
         else:
             assert len(pred) == len(target), "prediction/target bounding boxes list batch size mismatch"
             for gt in target:
-                assert all(isinstance(bbox, BoundingBox) for bbox in gt), \
+                assert isinstance(gt, BoundingBoxArray) or all(isinstance(bbox, BoundingBox) for bbox in gt), \
                     "detect logger only supports 2D lists of bounding box targets"
         for det in pred:
-            assert all(isinstance(bbox, BoundingBox) for bbox in det), \
+            assert isinstance(det, BoundingBoxArray) or all(isinstance(bbox, BoundingBox) for bbox in det), \
                 "detect logger only supports 2D lists of bounding box predictions"
         self.bbox[iter_idx] = pred
         self.true[iter_idx] = target
@@ -571,8 +1013,8 @@ class DetectLogger(PredictionConsumer, ClassNamesHandler, FormatHandler):
         raise NotImplementedError  # TODO
 
     def group_bbox(self,
-                   target_bboxes,   # type: List[Optional[BoundingBox]]
-                   detect_bboxes,   # type: List[BoundingBox]
+                   target_bboxes,   # type: Union[List[Optional[BoundingBox]], BoundingBoxArray]
+                   detect_bboxes,   # type: Union[List[BoundingBox], BoundingBoxArray]
                    ):               # type: (...) -> List[Dict[AnyStr, Union[BoundingBox, float, None]]]
         """Groups a sample's detected bounding boxes with target bounding boxes according to configuration parameters.
 
@@ -603,37 +1045,36 @@ class DetectLogger(PredictionConsumer, ClassNamesHandler, FormatHandler):
         bounding boxes will also be sorted by highest confidence (if available) or by highest IoU as fallback.
         """
         # remove low confidence and sort by highest
-        group_bboxes = sorted(
-            [bbox for bbox in (detect_bboxes if detect_bboxes else []) if isinstance(bbox, BoundingBox)],
-            key=lambda b: b.confidence if b.confidence is not None else 0, reverse=True)
+        detect_bboxes = BoundingBoxArray.from_bboxes([bbox for bbox in (detect_bboxes if detect_bboxes is not None else [])
+                                                      if isinstance(bbox, BoundingBox)]
+                                                     if not isinstance(detect_bboxes, BoundingBoxArray) else detect_bboxes)
+        confidences = detect_bboxes.confidences
+        detect_bboxes = detect_bboxes[np.argsort(-np.nan_to_num(confidences, nan=0), kind="stable")]
         if self.conf_threshold:
-            group_bboxes = [b for b in group_bboxes if b.confidence is not None and b.confidence >= self.conf_threshold]
-        sort_by_iou = all(bbox.confidence is None for bbox in group_bboxes)
+            detect_bboxes = detect_bboxes[detect_bboxes.confidences >= self.conf_threshold]  # NaNs always fail
+        sort_by_iou = np.isnan(detect_bboxes.confidences).all()
         # group according to target count
-        target_count = len(target_bboxes)
+        target_count = len(target_bboxes) if target_bboxes is not None else 0
         if target_count == 0:
-            group_bboxes = [{"target": None, "detect": [{"bbox": bbox, "iou": None} for bbox in group_bboxes]}]
-        elif target_count == 1:
-            sorted_detect = [{"bbox": bbox, "iou": compute_bbox_iou(bbox, target_bboxes[0])} for bbox in group_bboxes]
-            if sort_by_iou:
-                sorted_detect = list(sorted(sorted_detect, key=lambda d: d["iou"], reverse=True))
-            group_bboxes = [{"target": target_bboxes[0], "detect": sorted_detect}]
+            group_bboxes = [{"target": None, "detect": [{"bbox": bbox, "iou": None} for bbox in detect_bboxes]}]
         else:
-            # regroup by highest IoU
-            target_detects = [[] for _ in range(target_count)]
-            for det in group_bboxes:
-                # FIXME:
-                #  should we do something different if all IoU = 0 (ie: false positive detection)
-                #  for now, they will all be stored in the first target, but can be tracked with IoU = 0
-                det_target_iou = [compute_bbox_iou(det, t) for t in target_bboxes]
-                best_iou_idx = int(np.argmax(det_target_iou))
-                target_detects[best_iou_idx].append({"bbox": det, "iou": det_target_iou[best_iou_idx]})
-            group_bboxes = [{
-                "target": target_bboxes[i],
-                "detect": list(
-                    sorted(target_detects[i], key=lambda d: d["iou"], reverse=True)
-                ) if sort_by_iou else target_detects[i]
-            } for i in range(target_count)]
+            # regroup by highest IoU (with a single target, all detections are assigned to it)
+            target_bboxes = BoundingBoxArray.from_bboxes(target_bboxes)
+            ious = detect_bboxes.iou(target_bboxes)
+            # FIXME:
+            #  should we do something different if all IoU = 0 (ie: false positive detection)
+            #  for now, they will all be stored in the first target, but can be tracked with IoU = 0
+            best_iou_idxs = np.argmax(ious, axis=1)
+            best_ious = ious[np.arange(len(detect_bboxes)), best_iou_idxs]
+            group_bboxes = []
+            for target_idx in range(target_count):
+                detect_idxs = np.flatnonzero(best_iou_idxs == target_idx)
+                if sort_by_iou:
+                    detect_idxs = detect_idxs[np.argsort(-best_ious[detect_idxs], kind="stable")]
+                group_bboxes.append({
+                    "target": target_bboxes[target_idx],
+                    "detect": [{"bbox": detect_bboxes[idx], "iou": float(best_ious[idx])} for idx in detect_idxs]
+                })
         # apply filters on grouped results
         if self.iou_threshold:
             for grp in group_bboxes:
@@ -756,6 +1197,10 @@ class DetectLogger(PredictionConsumer, ClassNamesHandler, FormatHandler):
             lines[i] = entry
         return "\n".join([header, *lines])
 
+    def merge(self, other):
+        """Merges the accumulated per-iteration values of another (distributed) instance into this one."""
+        self._merge_iter_arrays(other, "bbox", "true", "meta")
+
     def reset(self):
         """Toggles a reset of the internal state, emptying storage arrays."""
         self.bbox = None
@@ -836,6 +1281,11 @@ class SegmOutputGenerator(PredictionConsumer, ClassNamesHandler, FormatHandler,
             f"color_map={repr(self.color_map)}, dontcare={repr(self.dontcare)}, " + \
             f"class_names={repr(self.class_names)}, format={repr(self.format)})"
 
+    @property
+    def thread_safe(self):
+        """Returns whether this consumer can be updated from a background thread or not."""
+        return True  # updates only write images under iteration-specific file names, no state is read back
+
     def update(self,         # see `thelper.typedefs.IterCallbackParams` for more info
                task,         # type: thelper.tasks.utils.Task
                input,        # type: thelper.typedefs.InputType
@@ -929,10 +1379,10 @@ class SegmOutputGenerator(PredictionConsumer, ClassNamesHandler, FormatHandler,
 class ConfusionMatrix(PredictionConsumer, ClassNamesHandler):
     """Confusion matrix report interface.
 
-    This class provides a simple interface to ``sklearn.metrics.confusion_matrix`` so that a full
-    confusion matrix can be easily reported under a string-based representation. It also offers a
+    This class accumulates a full confusion matrix at every iteration so that it can be easily reported
+    under a string-based representation without storing the predictions themselves. It also offers a
     tensorboardX-compatible output image that can be saved locally or posted to tensorboard for
-    browser-based visualization.
+    browser-based visualization. For large class counts, the matrix can be accumulated in a sparse format.
 
     Usage example inside a session configuration file::
 
@@ -955,37 +1405,41 @@ class ConfusionMatrix(PredictionConsumer, ClassNamesHandler):
         # ...
 
     Attributes:
-        matrix: report generator function, called at evaluation time to generate the output string.
         class_names: holds the list of class label names provided by the dataset parser. If it is not
             provided when the constructor is called, it will be set by the trainer at runtime.
         draw_normalized: defines whether rendered confusion matrices should be normalized or not.
-        pred: queue used to store the top-1 (best) predicted class indices at each iteration.
+        sparse: defines whether the confusion matrix should be stored in a sparse format or not.
+        confmat: confusion matrix accumulated since the start of the current epoch (or since the last reset).
     """
 
-    def __init__(self, class_names=None, draw_normalized=True):
+    mergeable = True
+
+    def __init__(self, class_names=None, draw_normalized=True, sparse=None):
         """Receives the optional class label names used to decorate the output string.
 
         Args:
             class_names: holds the list of class label names provided by the dataset parser. If it is not
                 provided when the constructor is called, it will be set by the trainer at runtime.
             draw_normalized: defines whether rendered confusion matrices should be normalized or not.
+            sparse: defines whether the confusion matrix should be stored in a sparse format or not. If
+                ``None``, a sparse format will be used for tasks with more than ``DENSE_CONFMAT_MAX_CLASSES`` classes.
         """
-
-        def gen_matrix(y_true, y_pred, _class_names):
-            _y_true = [_class_names[classid] for classid in y_true]
-            _y_pred = [_class_names[classid] if (0 <= classid < len(_class_names)) else "<unset>" for classid in y_pred]
-            return sklearn.metrics.confusion_matrix(_y_true, _y_pred, labels=_class_names)
-
-        self.matrix = gen_matrix
         self.draw_normalized = draw_normalized
-        self.pred = None
-        self.target = None
+        self.sparse = sparse
+        self.confmat = None
+        self.last_iter_idx = None
         ClassNamesHandler.__init__(self, class_names)
 
     def __repr__(self):
         """Returns a generic print-friendly string containing info about this consumer."""
         return self.__class__.__module__ + "." + self.__class__.__qualname__ + \
-            f"(class_names={repr(self.class_names)}, draw_normalized={repr(self.draw_normalized)})"
+            f"(class_names={repr(self.class_names)}, draw_normalized={repr(self.draw_normalized)}, " + \
+            f"sparse={repr(self.sparse)})"
+
+    @property
+    def thread_safe(self):
+        """Returns whether this consumer can be updated from a background thread or not."""
+        return True  # updates only add minibatch counts to this confusion matrix, which is never evaluated live
 
     def update(self,         # see `thelper.typedefs.IterCallbackParams` for more info
                task,         # type: thelper.tasks.utils.Task
@@ -1011,38 +1465,36 @@ class ConfusionMatrix(PredictionConsumer, ClassNamesHandler):
         assert not task.multi_label, "confmat only impl for non-multi-label classif tasks"
         assert iter_idx is not None and max_iters is not None and iter_idx < max_iters, \
             "bad iteration indices given to update function"
-        if self.pred is None or self.pred.size != max_iters:
-            self.pred = np.asarray([None] * max_iters)
-            self.target = np.asarray([None] * max_iters)
+        if self.last_iter_idx is None or iter_idx <= self.last_iter_idx:
+            # new epoch (or evaluation loop), drop the counts of the previous one
+            self.confmat = None
+        self.last_iter_idx = iter_idx
         if task.class_names != self.class_names:
             self.class_names = task.class_names
         if target is None or target.numel() == 0:
             # only accumulate results when groundtruth is available
-            self.pred[iter_idx] = None
-            self.target[iter_idx] = None
             return
         assert pred.dim() == 2 or target.dim() == 1, "current confmat impl only supports batched 1D outputs"
         assert pred.shape[0] == target.shape[0], "prediction/gt tensors batch size mismatch"
         assert pred.shape[1] == len(self.class_names), "unexpected prediction class dimension size"
-        self.pred[iter_idx] = pred.topk(1, dim=1)[1].view(pred.shape[0]).tolist()
-        self.target[iter_idx] = target.view(target.shape[0]).tolist()
+        sparse = self.sparse if self.sparse is not None else len(self.class_names) > DENSE_CONFMAT_MAX_CLASSES
+        confmat = get_confmat(target.view(target.shape[0]).cpu().numpy(),
+                              pred.topk(1, dim=1)[1].view(pred.shape[0]).cpu().numpy(),
+                              len(self.class_names), sparse=sparse)
+        self.confmat = merge_confmats(self.confmat, confmat)
 
     def report(self):
         """Returns the confusion matrix as a multi-line print-friendly string."""
-        if self.pred is None or self.target is None:
+        if self.confmat is None:
             return None
-        pred, target = zip(*[(pred, target) for preds, targets in zip(self.pred, self.target)
-                             if targets is not None for pred, target in zip(preds, targets)])
-        confmat = self.matrix(np.asarray(target), np.asarray(pred), self.class_names)
+        confmat = get_dense_confmat(self.confmat, len(self.class_names))
         return "\n" + thelper.utils.stringify_confmat(confmat, self.class_names)
 
     def render(self):
         """Returns the confusion matrix as a numpy-compatible RGBA image drawn by pyplot."""
-        if self.pred is None or self.target is None:
+        if self.confmat is None:
             return None
-        pred, target = zip(*[(pred, target) for preds, targets in zip(self.pred, self.target)
-                             if targets is not None for pred, target in zip(preds, targets)])
-        confmat = self.matrix(np.asarray(target), np.asarray(pred), self.class_names)
+        confmat = get_dense_confmat(self.confmat, len(self.class_names))
         try:
             fig, ax = thelper.draw.draw_confmat(confmat, self.class_names, normalize=self.draw_normalized)
             array = thelper.draw.fig2array(fig)
@@ -1052,10 +1504,14 @@ class ConfusionMatrix(PredictionConsumer, ClassNamesHandler):
             # return None if rendering fails (probably due to matplotlib on display-less server)
             return None
 
+    def merge(self, other):
+        """Merges the confusion matrix of another (distributed) instance into this one."""
+        self.confmat = merge_confmats(self.confmat, other.confmat)
+
     def reset(self):
-        """Toggles a reset of the metric's internal state, emptying queues."""
-        self.pred = None
-        self.target = None
+        """Toggles a reset of the metric's internal state, emptying the confusion matrix."""
+        self.confmat = None
+        self.last_iter_idx = None
 
 
 def create_consumers(config):
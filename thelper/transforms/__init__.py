@@ -11,6 +11,7 @@ import thelper.transforms.utils  # noqa: F401
 import thelper.transforms.wrappers  # noqa: F401
 from thelper.transforms.composers import Compose  # noqa: F401
 from thelper.transforms.composers import CustomStepCompose  # noqa: F401
+from thelper.transforms.composers import FusedTransform  # noqa: F401
 from thelper.transforms.operations import Affine  # noqa: F401
 from thelper.transforms.operations import CenterCrop  # noqa: F401
 from thelper.transforms.operations import CopyTo  # noqa: F401
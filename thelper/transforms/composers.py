@@ -13,32 +13,270 @@ now, these representations are used for debugging more than anything else.
 """
 
 import bisect
+import copy
+import functools
 import logging
 
+import numpy as np
+import PIL.Image
+import torch
 import torchvision.utils
 
 import thelper.utils
+from thelper.transforms.operations import (CopyTo, NormalizeMinMax, NormalizeZeroMeanUnitVar, SelectChannels, ToNumpy,
+                                           Transpose, Unsqueeze)
 
 logger = logging.getLogger(__name__)
 
 
+def _fuse_to_numpy(op, sample, owned):
+    if isinstance(sample, np.ndarray):
+        return sample[..., ::-1] if op.reorder_bgr else sample, owned, 0, 0
+    out = op(sample)
+    nbytes = out.nbytes if isinstance(sample, PIL.Image.Image) or \
+        (isinstance(sample, torch.Tensor) and sample.device.type != "cpu") else 0
+    return out, False, nbytes, nbytes
+
+
+def _fuse_select_channels(op, sample, owned):
+    if not isinstance(sample, np.ndarray):
+        out = op(sample)
+        return out, True, out.nbytes, out.nbytes
+    n_from_channels = sample.shape[2]
+    assert all(c < n_from_channels for c in op.channels) and len(op.channels) <= n_from_channels, \
+        f"source channel indices ({list(op.channels)}) " \
+        f"cannot be greater than the number of available channels ({n_from_channels})"
+    inv_map = {v: k for k, v in op.channels.items()}
+    channels = [inv_map[i] for i in range(len(op.channels))]
+    out_bytes = sample.shape[0] * sample.shape[1] * len(channels) * sample.itemsize
+    if len(channels) == 1:
+        return sample[:, :, channels[0]], owned, 0, out_bytes
+    if channels == list(range(n_from_channels)):
+        return sample, owned, 0, out_bytes
+    return sample[:, :, channels], True, out_bytes, out_bytes  # advanced indexing = single gather copy
+
+
+def _fuse_normalize(op, sample, owned, offset, scale):
+    # computes '(sample - offset) / scale' with a single working buffer (reused in-place if possible)
+    if isinstance(sample, PIL.Image.Image):
+        sample, owned = np.asarray(sample), False
+    if not isinstance(sample, np.ndarray):
+        return op(sample), False, 0, 0
+    work_type = np.result_type(sample.dtype, offset.dtype)
+    out_shape = np.broadcast_shapes(sample.shape, offset.shape, scale.shape)
+    work_bytes = int(np.prod(out_shape)) * work_type.itemsize
+    out_bytes = int(np.prod(out_shape)) * np.dtype(op.out_type).itemsize
+    unfused_bytes = 2 * work_bytes + out_bytes
+    if work_type.kind != "f" or np.result_type(work_type, scale.dtype) != work_type:
+        out = op(sample)  # would change the precision of intermediate results, use the original impl
+        return out, True, unfused_bytes, unfused_bytes
+    if owned and sample.dtype == work_type and sample.shape == out_shape and sample.flags.writeable:
+        out, fused_bytes = sample, 0
+    else:
+        out, fused_bytes = np.empty(out_shape, dtype=work_type), work_bytes
+    np.subtract(sample, offset, out=out)
+    np.divide(out, scale, out=out)
+    if work_type != op.out_type:
+        out, fused_bytes = out.astype(op.out_type), fused_bytes + out_bytes
+    return out, True, fused_bytes, unfused_bytes
+
+
+def _fuse_transpose(op, sample, owned):
+    return op(sample), owned, 0, 0  # always a view
+
+
+def _fuse_unsqueeze(op, sample, owned):
+    return op(sample), owned, 0, 0  # always a view
+
+
+def _fuse_copy_to(op, sample, owned):
+    nbytes = sample.nbytes if isinstance(sample, np.ndarray) else 0
+    if owned:
+        return sample, owned, 0, nbytes  # nothing else can reference this buffer, no need to copy it
+    return op(sample), True, nbytes, nbytes
+
+
+_fusable_ops = {
+    ToNumpy: _fuse_to_numpy,
+    SelectChannels: _fuse_select_channels,
+    NormalizeZeroMeanUnitVar: lambda op, sample, owned: _fuse_normalize(op, sample, owned, op.mean, op.std),
+    NormalizeMinMax: lambda op, sample, owned: _fuse_normalize(op, sample, owned, op.min, op.diff),
+    Transpose: _fuse_transpose,
+    Unsqueeze: _fuse_unsqueeze,
+    CopyTo: _fuse_copy_to,
+}
+
+
+def _get_fusable_op(stage):
+    """Returns the fusable operation wrapped by a pipeline stage and its wrapping key, or ``None``."""
+    wrapper_key = None
+    if isinstance(stage, thelper.transforms.wrappers.TransformWrapper):
+        if stage.probability < 1 or stage.convert_pil or stage.output_keys is not None:
+            return None, None
+        opcall = stage.opcall
+        if isinstance(opcall, functools.partial):
+            if opcall.args or opcall.keywords:
+                return None, None
+            opcall = opcall.func
+        target_keys = tuple(stage.target_keys) if stage.target_keys is not None else None
+        wrapper_key, stage = (target_keys, stage.linked_fate), opcall
+    if type(stage) not in _fusable_ops:
+        return None, None
+    return stage, wrapper_key
+
+
+class FusedTransform:
+    """Applies a series of deterministic array operations in a single pass.
+
+    This operation is instantiated by :class:`thelper.transforms.composers.Compose` when fusion is
+    enabled, and should not need to be created manually. Each wrapped operation is executed through
+    a specialized kernel that produces the same values as the original operation, but that avoids
+    intermediate copies whenever the current array is known to be exclusively owned by the pipeline
+    (i.e. when it was allocated by a previous fused stage). Layout operations (transpositions and
+    channel expansions) only produce views, normalization operations run in-place or with a single
+    output buffer, and copies are elided when the input is already owned.
+
+    Attributes:
+        operations: the list of fused operations, in order of execution.
+        alloc_bytes: if not ``None``, a two-element list that accumulates the estimated number of
+            bytes allocated by the original operations and by the fused kernels, respectively.
+
+    .. seealso::
+        | :class:`thelper.transforms.composers.Compose`
+    """
+
+    def __init__(self, operations):
+        """Validates and stores the list of operations to fuse."""
+        assert isinstance(operations, list) and operations, "expected operations to be provided as a non-empty list"
+        assert all([type(op) in _fusable_ops for op in operations]), "unsupported operation type for fusion"
+        self.operations = operations
+        self.alloc_bytes = None
+
+    def __call__(self, sample):
+        """Applies all fused operations to the given sample and returns the result."""
+        owned = False
+        for op in self.operations:
+            sample, owned, fused_bytes, unfused_bytes = _fusable_ops[type(op)](op, sample, owned)
+            if self.alloc_bytes is not None:
+                self.alloc_bytes[0] += unfused_bytes
+                self.alloc_bytes[1] += fused_bytes
+        return sample
+
+    def invert(self, sample):
+        """Tries to invert the fused operations; will throw if one of them cannot be inverted."""
+        for op in reversed(self.operations):
+            sample = op.invert(sample)
+        return sample
+
+    def __repr__(self):
+        """Provides print-friendly output for class attributes."""
+        return self.__class__.__module__ + "." + self.__class__.__qualname__ + "(operations=[" + \
+            ", ".join([repr(op) for op in self.operations]) + "])"
+
+
 class Compose(torchvision.transforms.Compose):
     """Composes several transforms together (with support for invert ops).
 
     This interface is fully compatible with ``torchvision.transforms.Compose``.
 
+    If fusion is enabled, consecutive deterministic array operations (e.g. ``ToNumpy``, ``SelectChannels``,
+    ``NormalizeZeroMeanUnitVar``, ``NormalizeMinMax``, ``Transpose``, ``Unsqueeze``, and ``CopyTo``) that
+    are applied to the same sample keys will be grouped and executed in a single pass via
+    :class:`thelper.transforms.composers.FusedTransform`. The original stages are kept as-is in the
+    ``transforms`` attribute (for indexing and inversion), and the execution plan is stored in ``stages``.
+
+    Attributes:
+        transforms: list of the original transformation stages.
+        fuse: specifies whether consecutive fusable operations are executed in a single pass.
+        stages: list of stages that are actually executed when the composer is called.
+
     .. seealso::
         | :class:`thelper.transforms.composers.CustomStepCompose`
+        | :class:`thelper.transforms.composers.FusedTransform`
     """
 
-    def __init__(self, transforms):
-        """Forwards the list of transformations to the base class."""
+    def __init__(self, transforms, fuse=False):
+        """Forwards the list of transformations to the base class, and fuses stages if needed."""
         assert isinstance(transforms, list) and transforms, "expected transforms to be provided as a non-empty list"
         if all([isinstance(stage, dict) for stage in transforms]):
             transforms = thelper.transforms.load_transforms(transforms, avoid_transform_wrapper=True)
             transforms = transforms.transforms if isinstance(transforms, Compose) else transforms
             transforms = transforms if isinstance(transforms, list) else [transforms]
         super(Compose, self).__init__(transforms)
+        self.fuse = thelper.utils.str2bool(fuse)
+        self.stages = self._get_fused_stages(self.transforms) if self.fuse else self.transforms
+        if self.fuse:
+            logger.debug(f"fused {len(self.transforms)} transform stages into {len(self.stages)} stages")
+
+    @staticmethod
+    def _get_fused_stages(transforms):
+        """Returns the execution plan obtained by fusing consecutive operations of the given stages."""
+        stages, group, group_key = [], [], None
+
+        def flush():
+            if group:
+                fused = FusedTransform(list(group))
+                if group_key is not None:
+                    fused = thelper.transforms.wrappers.TransformWrapper(
+                        fused, target_keys=list(group_key[0]) if group_key[0] is not None else None,
+                        linked_fate=group_key[1])
+                stages.append(fused)
+                group.clear()
+
+        for stage in transforms:
+            op, key = _get_fusable_op(stage)
+            if op is None or (group and key != group_key):
+                flush()
+            if op is None:
+                stages.append(stage)
+            else:
+                group.append(op)
+                group_key = key
+        flush()
+        return stages
+
+    def __call__(self, img):
+        """Applies the (possibly fused) transformation stages to a sample."""
+        if not thelper.transforms.utils.is_stage_profiling_enabled():
+            for t in self.stages:
+                img = t(img)
+            return img
+        for idx, t in enumerate(self.stages):
+            img = thelper.transforms.utils.profile_stage(f"{idx}.{type(t).__name__}", t, img)
+        return img
+
+    def get_alloc_bytes(self, sample):
+        """Returns the estimated number of bytes allocated per sample before and after fusion.
+
+        The estimate is obtained by running the fused execution plan once on a copy of the given sample,
+        and only accounts for the fusable stages of the pipeline (other stages are unaffected by fusion).
+        Since all stages are executed, stochastic operations may advance their RNG states.
+
+        Args:
+            sample: the sample to transform; it will not be modified.
+
+        Returns:
+            A tuple of the estimated number of bytes allocated without and with fusion, respectively.
+        """
+        stages = self.stages if self.fuse else self._get_fused_stages(self.transforms)
+        fused_ops = []
+        for stage in stages:
+            if isinstance(stage, thelper.transforms.wrappers.TransformWrapper):
+                stage = stage.opcall.func if isinstance(stage.opcall, functools.partial) else stage.opcall
+            if isinstance(stage, FusedTransform):
+                stage.alloc_bytes = [0, 0]
+                fused_ops.append(stage)
+        try:
+            sample = copy.deepcopy(sample)
+            for t in stages:
+                sample = t(sample)
+            alloc_bytes = (sum([op.alloc_bytes[0] for op in fused_ops]), sum([op.alloc_bytes[1] for op in fused_ops]))
+        finally:
+            for op in fused_ops:
+                op.alloc_bytes = None
+        logger.debug(f"estimated transform allocations per sample: {alloc_bytes[0]} bytes before fusion, "
+                     f"{alloc_bytes[1]} bytes after fusion")
+        return alloc_bytes
 
     def invert(self, sample):
         """Tries to invert the transformations applied to a sample.
@@ -58,7 +296,7 @@ class Compose(torchvision.transforms.Compose):
     def __repr__(self):
         """Provides print-friendly output for class attributes."""
         return self.__class__.__module__ + "." + self.__class__.__qualname__ + "(transforms=[\n\t" + \
-            ",\n\t".join([repr(t) for t in self.transforms]) + "\n])"
+            ",\n\t".join([repr(t) for t in self.transforms]) + f"\n], fuse={self.fuse})"
 
     def set_seed(self, seed):
         """Sets the internal seed to use for stochastic ops."""
@@ -174,8 +412,8 @@ class CustomStepCompose(torchvision.transforms.Compose):
         """Applies the current stage of transformation operations to a sample."""
         transforms = self.transforms[self._get_stage_idx(self.epoch)]
         transforms = transforms if isinstance(transforms, list) else [transforms]
-        for t in transforms:
-            img = t(img)
+        for idx, t in enumerate(transforms):
+            img = thelper.transforms.utils.profile_stage(f"{idx}.{type(t).__name__}", t, img)
         return img
 
     def __getitem__(self, idx):
@@ -13,7 +13,6 @@ now, these representations are used for debugging more than anything else.
 """
 
 import copy
-import itertools
 import logging
 import math
 
@@ -1139,6 +1138,11 @@ class Tile:
     If a mask is used, the first tile position is tested exhaustively by iterating over all input coordinates
     starting from the top-left corner of the image. Otherwise, the first tile position is set as (0,0). Then,
     all other tiles are found by offsetting frm these coordinates, and testing for IoU with the mask (if needed).
+    The mask area covered by each candidate tile is obtained in constant time from a summed-area table.
+
+    The returned tiles are views of a single strided array built over the (possibly padded) input image, meaning
+    that no image data is copied unless the tiles fall outside the image (in which case the image is padded once).
+    Neighboring tiles may share memory if they overlap; use ``force_copy`` if the tiles must be modified in-place.
 
     Attributes:
         tile_size: size of the output tiles, provided as a single element (``edge_size``) or as a
@@ -1153,10 +1157,11 @@ class Tile:
             See ``cv2.copyMakeBorder`` for more information.
         borderval: border value to use when the image is too small for the required crop size. See
             ``cv2.copyMakeBorder`` for more information.
+        force_copy: specifies whether each tile should be returned as an independent copy instead of a view.
     """
 
     def __init__(self, tile_size, tile_overlap=0.0, min_mask_iou=1.0, offset_overlap=False,
-                 bordertype=cv.BORDER_CONSTANT, borderval=0):
+                 bordertype=cv.BORDER_CONSTANT, borderval=0, force_copy=False):
         """Validates and initializes tiling parameters.
 
         Args:
@@ -1172,6 +1177,7 @@ class Tile:
                 See ``cv2.copyMakeBorder`` for more information.
             borderval: border value to use when the image is too small for the required crop size. See
                 ``cv2.copyMakeBorder`` for more information.
+            force_copy: specifies whether each tile should be returned as an independent copy instead of a view.
         """
         if isinstance(tile_size, (tuple, list)):
             assert len(tile_size) == 2, "expected tile size to be two-element list or tuple, or single scalar"
@@ -1191,6 +1197,7 @@ class Tile:
         self.offset_overlap = offset_overlap
         self.bordertype = thelper.utils.import_class(bordertype) if isinstance(bordertype, str) else bordertype
         self.borderval = borderval
+        self.force_copy = thelper.utils.str2bool(force_copy)
 
     def __call__(self, image, mask=None):
         """Extracts and returns a list of tiles cut out from the given image.
@@ -1207,11 +1214,34 @@ class Tile:
             assert mask is None, "mask provided twice"
             # we assume that the mask was given as the 2nd element of the list
             image, mask = image[0], image[1]
-        tile_rects, tile_images = self._get_tile_rects(image, mask), []
+        if isinstance(image, PIL.Image.Image):
+            image = np.asarray(image)
+        tile_rects = self._get_tile_rects(image, mask)
+        if not tile_rects:
+            return []
+        tile_size = tile_rects[0][2], tile_rects[0][3]
+        tl = min([rect[0] for rect in tile_rects]), min([rect[1] for rect in tile_rects])
+        br = max([rect[0] for rect in tile_rects]) + tile_size[0], max([rect[1] for rect in tile_rects]) + tile_size[1]
+        if tl[0] < 0 or tl[1] < 0 or br[0] > image.shape[1] or br[1] > image.shape[0]:
+            # pad the image only once for all tiles (tiles are always placed in the padded region)
+            image = cv.copyMakeBorder(image, max(-tl[1], 0), max(br[1] - image.shape[0], 0),
+                                      max(-tl[0], 0), max(br[0] - image.shape[1], 0),
+                                      borderType=self.bordertype, value=self.borderval)
+            origin = max(tl[0], 0), max(tl[1], 0)
+        else:
+            origin = tl
+        # all tiles lie on a regular grid, so we can expose them via a single strided view of the image
+        step_size = self._get_step_size(tile_size)
+        grid_shape = (br[1] - tile_size[1] - tl[1]) // step_size[1] + 1, (br[0] - tile_size[0] - tl[0]) // step_size[0] + 1
+        image = image[origin[1]:, origin[0]:, ...]
+        tile_grid = np.lib.stride_tricks.as_strided(
+            image, shape=(*grid_shape, tile_size[1], tile_size[0], *image.shape[2:]),
+            strides=(image.strides[0] * step_size[1], image.strides[1] * step_size[0], *image.strides),
+            writeable=image.flags.writeable)
+        tile_images = []
         for rect in tile_rects:
-            tile_images.append(thelper.draw.safe_crop(image, (rect[0], rect[1]),
-                                                      (rect[0] + rect[2], rect[1] + rect[3]),
-                                                      self.bordertype, self.borderval))
+            tile = tile_grid[(rect[1] - tl[1]) // step_size[1], (rect[0] - tl[0]) // step_size[0]]
+            tile_images.append(np.copy(tile) if self.force_copy else tile)
         return tile_images
 
     def count_tiles(self, image, mask=None):
@@ -1231,6 +1261,19 @@ class Tile:
             image, mask = image[0], image[1]
         return len(self._get_tile_rects(image, mask))
 
+    def _get_step_size(self, tile_size):
+        overlap = (int(round(tile_size[0] * self.tile_overlap)), int(round(tile_size[1] * self.tile_overlap)))
+        return max(tile_size[0] - (overlap[0] // 2) * 2, 1), max(tile_size[1] - (overlap[1] // 2) * 2, 1)
+
+    @staticmethod
+    def _get_mask_counts(mask_sat, rows, cols, tile_size):
+        """Returns the count of nonzero mask pixels in tiles (vectorized over top-left row/col arrays)."""
+        # the summed-area table has an extra leading row/col of zeros, and tile regions are clipped to the mask
+        height, width = mask_sat.shape[0] - 1, mask_sat.shape[1] - 1
+        row0, row1 = np.clip(rows, 0, height), np.clip(rows + tile_size[1], 0, height)
+        col0, col1 = np.clip(cols, 0, width), np.clip(cols + tile_size[0], 0, width)
+        return mask_sat[row1, col1] - mask_sat[row0, col1] - mask_sat[row1, col0] + mask_sat[row0, col0]
+
     def _get_tile_rects(self, image, mask=None):
         assert isinstance(image, (PIL.Image.Image, np.ndarray)), \
             "image type should be np.ndarray or PIL image"
@@ -1249,17 +1292,20 @@ class Tile:
             tile_size = self.tile_size
         overlap = (int(round(tile_size[0] * self.tile_overlap)), int(round(tile_size[1] * self.tile_overlap)))
         overlap_offset = (-overlap[0] // 2, -overlap[1] // 2) if self.offset_overlap else (0, 0)
-        step_size = (max(tile_size[0] - (overlap[0] // 2) * 2, 1), max(tile_size[1] - (overlap[1] // 2) * 2, 1))
+        step_size = self._get_step_size(tile_size)
         req_mask_area = tile_size[0] * tile_size[1] * self.min_mask_iou
+        mask_sat = None
         if mask is not None:
             assert height == mask.shape[0] and width == mask.shape[1], "image and mask dimensions mismatch"
             assert mask.ndim == 2, "mask should be 2d binary (uchar) array"
+            mask_sat = np.zeros((height + 1, width + 1), dtype=np.int64)
+            np.cumsum(np.cumsum(mask != 0, axis=0, dtype=np.int64), axis=1, out=mask_sat[1:, 1:])
             offset_coord = None
-            row_range = range(overlap_offset[1], height - overlap_offset[1] - tile_size[1] + 1)
-            col_range = range(overlap_offset[0], width - overlap_offset[0] - tile_size[0] + 1)
-            for row, col in itertools.product(row_range, col_range):
-                crop = thelper.draw.safe_crop(mask, (col, row), (col + tile_size[0], row + tile_size[1]))
-                if np.count_nonzero(crop) >= req_mask_area:
+            col_range = np.arange(overlap_offset[0], width - overlap_offset[0] - tile_size[0] + 1)
+            for row in range(overlap_offset[1], height - overlap_offset[1] - tile_size[1] + 1):
+                valid_cols = np.flatnonzero(self._get_mask_counts(mask_sat, row, col_range, tile_size) >= req_mask_area)
+                if len(valid_cols):
+                    col = int(col_range[valid_cols[0]])
                     offset_coord = (overlap_offset[0] + ((col - overlap_offset[0]) % step_size[0]),
                                     overlap_offset[1] + ((row - overlap_offset[1]) % step_size[1]))
                     break
@@ -1267,18 +1313,14 @@ class Tile:
                 return tile_rects
         else:
             offset_coord = overlap_offset
-        row = offset_coord[1]
-        while row + tile_size[1] <= height - overlap_offset[1]:
-            col = offset_coord[0]
-            while col + tile_size[0] <= width - overlap_offset[0]:
-                if mask is not None:
-                    crop = thelper.draw.safe_crop(mask, (col, row), (col + tile_size[0], row + tile_size[1]))
-                    if np.count_nonzero(crop) >= req_mask_area:
-                        tile_rects.append((col, row, tile_size[0], tile_size[1]))  # rect = (x, y, w, h)
-                else:
-                    tile_rects.append((col, row, tile_size[0], tile_size[1]))  # rect = (x, y, w, h)
-                col += step_size[0]
-            row += step_size[1]
+        rows = np.arange(offset_coord[1], height - overlap_offset[1] - tile_size[1] + 1, step_size[1])
+        cols = np.arange(offset_coord[0], width - overlap_offset[0] - tile_size[0] + 1, step_size[0])
+        if mask_sat is not None:
+            valid = self._get_mask_counts(mask_sat, rows[:, np.newaxis], cols[np.newaxis, :], tile_size) >= req_mask_area
+        else:
+            valid = np.ones((len(rows), len(cols)), dtype=bool)
+        for row_idx, col_idx in zip(*np.nonzero(valid)):  # row-major order, as in a top-left scan
+            tile_rects.append((int(cols[col_idx]), int(rows[row_idx]), tile_size[0], tile_size[1]))  # rect = (x, y, w, h)
         return tile_rects
 
     def invert(self, image, mask=None):
@@ -1290,7 +1332,8 @@ class Tile:
         """Provides print-friendly output for class attributes."""
         return self.__class__.__module__ + "." + self.__class__.__qualname__ + \
                f"(tile_size={self.tile_size}, tile_overlap={self.tile_overlap}, min_mask_iou={self.min_mask_iou}, " + \
-               f"offset_overlap={self.offset_overlap}, bordertype={self.bordertype}, borderval={self.borderval})"
+               f"offset_overlap={self.offset_overlap}, bordertype={self.bordertype}, borderval={self.borderval}, " + \
+               f"force_copy={self.force_copy})"
 
 
 class NormalizeZeroMeanUnitVar:
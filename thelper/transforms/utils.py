@@ -4,7 +4,10 @@ This module contains utility functions used to instantiate transformation/augmen
 """
 
 import logging
+import time
 
+import numpy as np
+import torch
 import torchvision.transforms
 import torchvision.utils
 
@@ -12,8 +15,12 @@ import thelper.utils
 
 logger = logging.getLogger(__name__)
 
+_stage_profiling = False  # toggled per-process (see thelper.data.loaders.DataLoader)
+_stage_scope = []  # names of the stages currently being executed (for nested pipelines)
+_stage_stats = {}  # maps stage names to [call count, wall time (sec), output bytes]
 
-def load_transforms(stages, avoid_transform_wrapper=False):
+
+def load_transforms(stages, avoid_transform_wrapper=False, fuse=False):
     """Loads a transformation pipeline from a list of stages.
 
     Each entry in the provided list will be considered a stage in the pipeline. The ordering of the stages
@@ -74,6 +81,9 @@ def load_transforms(stages, avoid_transform_wrapper=False):
 
     Args:
         stages: a list defining a series of transformations to apply as a single pipeline.
+        avoid_transform_wrapper: specifies whether operations should be left unwrapped or not.
+        fuse: specifies whether consecutive array operations should be fused into a single pass. See
+            :class:`thelper.transforms.composers.Compose` for more information.
 
     Returns:
         A transformation pipeline object compatible with the ``torchvision.transforms`` interface.
@@ -160,8 +170,8 @@ def load_transforms(stages, avoid_transform_wrapper=False):
                                                                                output_keys=operation_outputs))
             else:
                 operations.append(operation)
-    if len(operations) > 1:
-        return thelper.transforms.Compose(operations)
+    if len(operations) > 1 or (operations and fuse):
+        return thelper.transforms.Compose(operations, fuse=fuse)
     elif len(operations) == 1:
         return operations[0]
     else:
@@ -188,6 +198,8 @@ def load_augments(config):
             "train_augments": {
                 # specifies whether to apply the augmentations before or after the base transforms
                 "append": false,
+                # specifies whether to fuse consecutive array operations (optional, default=false)
+                "fuse": false,
                 "transforms": [
                     {
                         # here, we use a single stage, which is actually an augmentor sub-pipeline
@@ -223,6 +235,121 @@ def load_augments(config):
     augments_append = False
     if "append" in config:
         augments_append = thelper.utils.str2bool(config["append"])
+    fuse = thelper.utils.str2bool(thelper.utils.get_key_def("fuse", config, False))
     if "transforms" in config and config["transforms"]:
-        augments = thelper.transforms.load_transforms(config["transforms"])
+        augments = thelper.transforms.load_transforms(config["transforms"], fuse=fuse)
     return augments, augments_append
+
+
+def set_stage_profiling(enabled=True):
+    """Toggles the per-stage timing instrumentation of transform pipelines in the current process.
+
+    When enabled, the stages of :class:`thelper.transforms.composers.Compose` objects and the operations
+    called by the transform wrappers will record their call count, wall time, and output size (in bytes).
+    These statistics are accumulated in the current process (i.e. in each data loader worker), and can be
+    fetched using :func:`thelper.transforms.utils.get_stage_stats`. When disabled (the default), the
+    instrumentation overhead is limited to a single flag check per stage.
+
+    .. seealso::
+        | :func:`thelper.transforms.utils.profile_stage`
+        | :func:`thelper.transforms.utils.get_stage_stats`
+        | :class:`thelper.data.loaders.DataLoader`
+    """
+    global _stage_profiling
+    _stage_profiling = bool(enabled)
+
+
+def is_stage_profiling_enabled():
+    """Returns whether the per-stage timing instrumentation of transform pipelines is enabled or not."""
+    return _stage_profiling
+
+
+def get_sample_bytes(sample):
+    """Returns the number of bytes held by the arrays and tensors of a (possibly nested) sample."""
+    if isinstance(sample, np.ndarray):
+        return sample.nbytes
+    elif isinstance(sample, torch.Tensor):
+        return sample.element_size() * sample.nelement()
+    elif isinstance(sample, dict):
+        return sum([get_sample_bytes(v) for v in sample.values()])
+    elif isinstance(sample, (list, tuple)):
+        return sum([get_sample_bytes(v) for v in sample])
+    elif hasattr(sample, "size") and hasattr(sample, "mode") and hasattr(sample, "getbands"):
+        # PIL images do not expose their buffer size directly; we assume one byte per band
+        return sample.size[0] * sample.size[1] * len(sample.getbands())
+    return 0
+
+
+def profile_stage(name, operation, *args, **kwargs):
+    """Calls an operation and records its call count, wall time, and output size under the given stage name.
+
+    If stage profiling is disabled, the operation is simply called with the provided arguments. Otherwise,
+    the stage name is prefixed by the names of all parent stages currently being executed, so that nested
+    pipelines produce hierarchical names (e.g. ``"1.Compose/0.TransformWrapper/CenterCrop"``). The time of a
+    parent stage always includes the time of its children.
+
+    Args:
+        name: the name of the stage to record the statistics under.
+        operation: the callable object to execute.
+        args: the positional arguments to forward to the operation.
+        kwargs: the keyword arguments to forward to the operation.
+
+    Returns:
+        The output of the operation.
+    """
+    if not _stage_profiling:
+        return operation(*args, **kwargs)
+    _stage_scope.append(name)
+    key = "/".join(_stage_scope)
+    start_time = time.perf_counter()
+    try:
+        output = operation(*args, **kwargs)
+    finally:
+        _stage_scope.pop()
+    elapsed_time = time.perf_counter() - start_time
+    stats = _stage_stats.setdefault(key, [0, 0.0, 0])
+    stats[0] += 1
+    stats[1] += elapsed_time
+    stats[2] += get_sample_bytes(output)
+    return output
+
+
+def get_stage_stats(reset=False):
+    """Returns a copy of the per-stage statistics accumulated in the current process.
+
+    Args:
+        reset: specifies whether the accumulated statistics should be cleared after being copied.
+
+    Returns:
+        A dictionary that maps stage names to ``[call count, wall time (sec), output bytes]`` lists.
+    """
+    stats = {key: list(val) for key, val in _stage_stats.items()}
+    if reset:
+        _stage_stats.clear()
+    return stats
+
+
+def merge_stage_stats(stats, new_stats):
+    """Accumulates (in-place) per-stage statistics into a dictionary, and returns it."""
+    assert isinstance(stats, dict) and isinstance(new_stats, dict), "invalid stage stats (should be dicts)"
+    for key, (count, elapsed_time, nbytes) in new_stats.items():
+        curr_stats = stats.setdefault(key, [0, 0.0, 0])
+        curr_stats[0] += count
+        curr_stats[1] += elapsed_time
+        curr_stats[2] += nbytes
+    return stats
+
+
+def report_stage_stats(stats):
+    """Returns a print-friendly table of per-stage statistics, sorted by decreasing total wall time."""
+    assert isinstance(stats, dict), "invalid stage stats (should be dict)"
+    if not stats:
+        return ""
+    name_len = max([len(key) for key in stats] + [len("stage")])
+    header = f"{'stage':<{name_len}}  {'calls':>10}  {'total (s)':>12}  {'mean (ms)':>12}  {'mean out (KB)':>14}\n"
+    res = header + "-" * (len(header) - 1) + "\n"
+    for key, (count, elapsed_time, nbytes) in sorted(stats.items(), key=lambda kv: kv[1][1], reverse=True):
+        mean_time = 1000 * elapsed_time / max(count, 1)
+        mean_kbytes = nbytes / max(count, 1) / 1024
+        res += f"{key:<{name_len}}  {count:>10d}  {elapsed_time:>12.4f}  {mean_time:>12.4f}  {mean_kbytes:>14.2f}\n"
+    return res
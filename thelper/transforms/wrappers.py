@@ -11,13 +11,38 @@ import random
 import numpy as np
 import PIL.Image
 import torch
+import torchvision
+import torchvision.transforms
 
 import thelper.data
+import thelper.transforms.utils
 import thelper.utils
 
 logger = logging.getLogger(__name__)
 
 
+def _check_native_array(operation, image):
+    """Returns whether an operation can process the given (HxW or HxWxC) array as a CxHxW tensor."""
+    return image.ndim in (2, 3) and image.dtype in (np.uint8, np.float32, np.float64)
+
+
+native_ops = {}
+"""Maps operation types that can natively process CxHxW tensors to a capability check function.
+
+The check function receives the operation object and the HxW or HxWxC array to transform, and returns
+whether the native tensor path can be used for it. When it can, :class:`TransformWrapper` will call the
+operation once on a tensor view of the full array instead of converting it to PIL image(s). Types can be
+added to this registry to enable the native path for other operations.
+"""
+
+if tuple([int(v) for v in torchvision.__version__.split("+")[0].split(".")[:2]]) >= (0, 8):
+    # geometric ops that have supported tensors with an arbitrary number of channels since torchvision v0.8
+    for _op_name in ["CenterCrop", "GaussianBlur", "Pad", "RandomAffine", "RandomCrop", "RandomHorizontalFlip",
+                     "RandomPerspective", "RandomResizedCrop", "RandomRotation", "RandomVerticalFlip", "Resize"]:
+        if hasattr(torchvision.transforms, _op_name):
+            native_ops[getattr(torchvision.transforms, _op_name)] = _check_native_array
+
+
 class AlbumentationsWrapper:
     """Albumentations pipeline wrapper that allows dictionary unpacking.
 
@@ -119,7 +144,7 @@ class AlbumentationsWrapper:
                 params["bboxes"] = []
             if self.mask_key in sample and sample[self.mask_key] is not None:
                 params["mask"] = sample[self.mask_key]
-            output = self.pipeline(**params)
+            output = thelper.transforms.utils.profile_stage("albumentations.Compose", self.pipeline, **params)
             sample[self.image_key] = output["image"]
             if "keypoints" in output:
                 sample[self.keypoints_key] = output["keypoints"]
@@ -142,7 +167,7 @@ class AlbumentationsWrapper:
             if sample is None:
                 return None
             params["image"] = sample
-        output = self.pipeline(**params)
+        output = thelper.transforms.utils.profile_stage("albumentations.Compose", self.pipeline, **params)
         return output["image"]
 
     def __repr__(self):
@@ -271,7 +296,7 @@ class AugmentorWrapper:
                         r = round(np.random.uniform(0, 1), 1)
                         if r <= operation.probability:
                             if sample[idx] is not None:
-                                sample[idx] = operation.perform_operation([sample[idx]])[0]
+                                sample[idx] = self._perform_operation(operation, sample[idx])
         else:  # each element of the top array will be processed independently below (current seeds are kept)
             cvts = [False] * len(sample)
             for idx, _ in enumerate(sample):
@@ -286,7 +311,7 @@ class AugmentorWrapper:
                         r = round(np.random.uniform(0, 1), 1)
                         if r <= operation.probability:
                             if sample[idx] is not None:
-                                sample[idx] = operation.perform_operation([sample[idx]])[0]
+                                sample[idx] = self._perform_operation(operation, sample[idx])
         # noinspection PyProtectedMember
         sample, cvts = TransformWrapper._pack(sample, cvts, convert_pil=True)
         assert len(sample) == len(cvts), "messed up packing/unpacking logic"
@@ -295,6 +320,13 @@ class AugmentorWrapper:
             cvts = cvts[0]
         return (sample, cvts) if out_cvts else sample
 
+    @staticmethod
+    def _perform_operation(operation, image):
+        """Applies a single augmentor operation to an image (with optional stage profiling)."""
+        if not thelper.transforms.utils.is_stage_profiling_enabled():
+            return operation.perform_operation([image])[0]
+        return thelper.transforms.utils.profile_stage(type(operation).__name__, operation.perform_operation, [image])[0]
+
     def __repr__(self):
         """Create a print-friendly representation of inner augmentation stages."""
         # for debug purposes only, pipeline probably cannot be expressed as a string
@@ -331,6 +363,12 @@ class TransformWrapper:
         ``torchvision.transforms.RandomApply``, or simply provide the probability of applying the
         transforms to this wrapper's constructor.
 
+    Operations whose type is found in the :attr:`thelper.transforms.wrappers.native_ops` registry (e.g. the
+    geometric ops of ``torchvision.transforms``) are called once on a CxHxW tensor view of each array instead
+    of going through PIL images, even if ``convert_pil`` is set. This avoids splitting multi-channel arrays
+    that are not stored as bytes into one PIL image per channel. Note that interpolation results might differ
+    slightly from the ones obtained with PIL.
+
     Attributes:
         operation: the wrapped operation (callable object or class name string to import).
         params: the parameters that are passed to the operation when init'd or called.
@@ -352,7 +390,8 @@ class TransformWrapper:
             operation: the wrapped operation (callable object or class name string to import).
             params: the parameters that are passed to the operation when init'd or called.
             probability: the probability that the wrapped operation will be applied.
-            convert_pil: specifies whether images should be forced into PIL format or not.
+            convert_pil: specifies whether images should be forced into PIL format or not (unless the
+                operation can natively process them as tensors).
             target_keys: the sample keys to apply the pipeline to (when dictionaries are passed in).
             linked_fate: specifies whether images given in a list/tuple should have the same fate or not.
         """
@@ -372,7 +411,7 @@ class TransformWrapper:
         self.output_keys = output_keys
 
     @staticmethod
-    def _unpack(sample, force_flatten=False, convert_pil=False):
+    def _unpack(sample, force_flatten=False, convert_pil=False, native_check=None):
         if isinstance(sample, (list, tuple)):
             if len(sample) > 1:
                 if not force_flatten:
@@ -394,6 +433,8 @@ class TransformWrapper:
         if convert_pil:
             if isinstance(sample, torch.Tensor):
                 sample = sample.numpy()
+            if native_check is not None and isinstance(sample, np.ndarray) and native_check(sample):
+                return sample, False  # the array will be processed as-is via the native tensor path
             if isinstance(sample, np.ndarray) and sample.ndim > 2 and \
                     sample.shape[-1] > 1 and (sample.dtype != np.uint8):
                 # PIL images cannot handle multi-channel non-byte arrays; we handle these manually
@@ -475,7 +516,7 @@ class TransformWrapper:
         skip_unpack = in_cvts is not None and isinstance(in_cvts, bool) and in_cvts
         if self.linked_fate or force_linked_fate:  # process all content with the same operations below
             if not skip_unpack:
-                sample, cvts = self._unpack(sample, convert_pil=self.convert_pil)
+                sample, cvts = self._unpack(sample, convert_pil=self.convert_pil, native_check=self._is_native_input)
                 if not isinstance(sample, (list, tuple)):
                     sample = [sample]
                     cvts = [cvts]
@@ -494,11 +535,12 @@ class TransformWrapper:
                         # watch out: if operation is stochastic and we cannot seed above, then there is no
                         # guarantee that the content will truly have a 'linked fate' (this might cause issues!)
                         if sample[idx] is not None:
-                            sample[idx] = self.opcall(sample[idx])
+                            sample[idx] = self._call_operation(sample[idx])
         else:  # each element of the top array will be processed independently below (current seeds are kept)
             cvts = [False] * len(sample)
             for idx, _ in enumerate(sample):
-                sample[idx], cvts[idx] = self._unpack(sample[idx], convert_pil=self.convert_pil)
+                sample[idx], cvts[idx] = self._unpack(sample[idx], convert_pil=self.convert_pil,
+                                                      native_check=self._is_native_input)
                 if self.probability >= 1 or round(np.random.uniform(0, 1), 1) <= self.probability:
                     if isinstance(sample[idx], (list, tuple)):
                         # we will now force fate linkage for all sub-elements of this array
@@ -506,7 +548,7 @@ class TransformWrapper:
                                                       op_seed=op_seed, in_cvts=cvts[idx])
                     else:
                         if sample[idx] is not None:
-                            sample[idx] = self.opcall(sample[idx])
+                            sample[idx] = self._call_operation(sample[idx])
         sample, cvts = TransformWrapper._pack(sample, cvts, convert_pil=self.convert_pil)
         assert len(sample) == len(cvts), "messed up packing/unpacking logic"
         if (skip_unpack or not out_list) and len(sample) == 1:
@@ -514,6 +556,33 @@ class TransformWrapper:
             cvts = cvts[0]
         return (sample, cvts) if out_cvts else sample
 
+    def _is_native_input(self, image):
+        """Returns whether the wrapped operation can process the given array via the native tensor path."""
+        operation = self.opcall.func if isinstance(self.opcall, functools.partial) else self.opcall
+        native_check = native_ops.get(type(operation))
+        return native_check is not None and isinstance(image, np.ndarray) and native_check(operation, image)
+
+    def _call_native(self, image):
+        """Applies the wrapped operation once to a CxHxW tensor view of an HxW or HxWxC array."""
+        if any([stride < 0 for stride in image.strides]):
+            image = np.ascontiguousarray(image)  # tensors cannot wrap arrays with negative strides
+        tensor = torch.from_numpy(image if image.ndim == 3 else image[..., np.newaxis]).permute(2, 0, 1)
+        output = self.opcall(tensor)
+        assert isinstance(output, torch.Tensor) and output.ndim == 3, "unexpected native operation output"
+        output = output.permute(1, 2, 0).numpy()
+        return np.ascontiguousarray(output if image.ndim == 3 else output[..., 0])
+
+    def _call_operation(self, image):
+        """Applies the wrapped operation to a single element (with optional stage profiling)."""
+        operation = self._call_native if self._is_native_input(image) else self.opcall
+        if not thelper.transforms.utils.is_stage_profiling_enabled():
+            return operation(image)
+        if isinstance(self.operation, str):
+            name = self.operation.rsplit(".", 1)[-1]
+        else:
+            name = getattr(self.operation, "__name__", type(self.operation).__name__)
+        return thelper.transforms.utils.profile_stage(name, operation, image)
+
     def __repr__(self):
         """Create a print-friendly representation of inner augmentation stages."""
         return self.__class__.__module__ + "." + self.__class__.__qualname__ + \
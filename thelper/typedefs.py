@@ -13,6 +13,7 @@ ModelType = "thelper.nn.Module"
 LoaderType = "thelper.data.loaders.DataLoader"
 TaskType = "thelper.tasks.Task"
 BoundingBox = "thelper.tasks.detect.BoundingBox"
+BoundingBoxArray = "thelper.tasks.detect.BoundingBoxArray"
 
 ArrayType = np.ndarray  # generic definition
 ArrayShapeType = typing.Union[typing.List[int], typing.Tuple[int]]
@@ -41,8 +42,8 @@ ClassificationPredictionType = torch.Tensor
 ClassificationTargetType = torch.Tensor
 SegmentationPredictionType = torch.Tensor
 SegmentationTargetType = torch.Tensor
-DetectionPredictionType = typing.List[typing.List[BoundingBox]]
-DetectionTargetType = typing.List[typing.List[BoundingBox]]
+DetectionPredictionType = typing.List[typing.Union[typing.List[BoundingBox], BoundingBoxArray]]
+DetectionTargetType = typing.List[typing.Union[typing.List[BoundingBox], BoundingBoxArray]]
 RegressionPredictionType = torch.Tensor
 RegressionTargetType = torch.Tensor
 
@@ -18,8 +18,11 @@ import os
 import pathlib
 import pickle
 import platform
+import queue
 import re
+import shutil
 import sys
+import threading
 import time
 from distutils.version import LooseVersion
 from typing import TYPE_CHECKING
@@ -94,6 +97,23 @@ def get_available_cuda_devices(attempts_per_device=5):
     return [device_id for device_id, available in enumerate(devices_available) if available]
 
 
+def get_distributed_info():
+    # type: () -> Tuple[int, int]
+    """Returns the rank of the current process and the size of the default distributed process group.
+
+    If no distributed process group was initialized (i.e. in regular sessions), ``(0, 1)`` is returned.
+    """
+    if torch.distributed.is_available() and torch.distributed.is_initialized():
+        return torch.distributed.get_rank(), torch.distributed.get_world_size()
+    return 0, 1
+
+
+def is_main_process():
+    # type: () -> bool
+    """Returns whether the current process should write session outputs (i.e. if it is the rank 0 process)."""
+    return get_distributed_info()[0] == 0
+
+
 def setup_plt(config):
     """Parses the provided config for matplotlib flags and sets up its global state accordingly."""
     import matplotlib.pyplot as plt
@@ -174,17 +194,61 @@ def setup_globals(config):
     setup_cudnn(config)
 
 
+_checkpoint_scan_cache = {}  # (search dir, always load latest) => (dir modif time, checkpoint path)
+
+
+def _find_checkpoint(search_dir, always_load_latest=False):
+    """Returns the path to the checkpoint to load from a directory, reusing the previous scan result if possible.
+
+    The scan result is cached until the modification time of the directory changes (i.e. when checkpoints
+    are added, renamed, or removed).
+    """
+    cache_key = (os.path.abspath(search_dir), always_load_latest)
+    dir_mtime = os.stat(search_dir).st_mtime_ns
+    if cache_key in _checkpoint_scan_cache:
+        cached_mtime, cached_path = _checkpoint_scan_cache[cache_key]
+        if cached_mtime == dir_mtime and os.path.isfile(cached_path):
+            return cached_path
+    ckpt_paths = glob.glob(os.path.join(search_dir, "ckpt.*.pth"))
+    if not ckpt_paths:
+        raise AssertionError("could not find any valid checkpoint files in directory '%s'" % search_dir)
+    ckpt = search_dir
+    latest_epoch, latest_day, latest_time = -1, -1, -1
+    for ckpt_path in ckpt_paths:
+        # note: the 2nd field in the name should be the epoch index, or 'best' if final checkpoint
+        split = os.path.basename(ckpt_path).split(".")
+        tag = split[1]
+        if tag == "best" and (not always_load_latest or latest_epoch == -1):
+            # if eval-only, always pick the best checkpoint; otherwise, only pick if nothing else exists
+            ckpt = ckpt_path
+            if not always_load_latest:
+                break
+        elif tag != "best":
+            log_stamp = split[2] if len(split) > 2 else ""
+            log_stamp = "fake-0-0" if log_stamp.count("-") != 2 else log_stamp
+            epoch_stamp, day_stamp, time_stamp = int(tag), int(log_stamp.split("-")[1]), int(log_stamp.split("-")[2])
+            if epoch_stamp > latest_epoch or day_stamp > latest_day or time_stamp > latest_time:
+                ckpt, latest_epoch, latest_day, latest_time = ckpt_path, epoch_stamp, day_stamp, time_stamp
+    if not os.path.isfile(ckpt):
+        raise AssertionError("could not find valid checkpoint at '%s'" % ckpt)
+    _checkpoint_scan_cache[cache_key] = (dir_mtime, ckpt)
+    return ckpt
+
+
 def load_checkpoint(ckpt,                      # type: thelper.typedefs.CheckpointLoadingType
                     map_location=None,         # type: Optional[thelper.typedefs.MapLocationType]
                     always_load_latest=False,  # type: Optional[bool]
                     check_version=True,        # type: Optional[bool]
+                    mmap=False,                # type: Optional[bool]
+                    sections=None,             # type: Optional[List[AnyStr]]
                     ):                         # type: (...) -> thelper.typedefs.CheckpointContentType
     """Loads a session checkpoint via PyTorch, check its compatibility, and returns its data.
 
     If the ``ckpt`` parameter is a path to a valid directory, then that directly will be searched for
     a checkpoint. If multiple checkpoints are found, the latest will be returned (based on the epoch
     index in its name). iF ``always_load_latest`` is set to False and if a checkpoint named
-    ``ckpt.best.pth`` is found, it will be returned instead.
+    ``ckpt.best.pth`` is found, it will be returned instead. The result of the directory search is
+    cached until the content of the directory changes.
 
     Args:
         ckpt: a file-like object or a path to the checkpoint file or session directory.
@@ -194,6 +258,11 @@ def load_checkpoint(ckpt,                      # type: thelper.typedefs.Checkpoi
             if a session directory is provided (instead of loading the 'best' checkpoint).
         check_version: toggles whether the checkpoint's version should be checked for
             compatibility issues, and query the user for how to proceed.
+        mmap: toggles whether tensor storages should be memory-mapped instead of being read
+            from the file right away (only for checkpoint paths, and if supported by PyTorch).
+            Tensors that are never accessed (e.g. in unused sections) are then never loaded.
+        sections: list of top-level checkpoint fields (e.g. ``model``, ``task``) to keep in
+            the returned data; all fields are kept if ``None``.
 
     Returns:
         Content of the checkpoint (a dictionary).
@@ -207,27 +276,7 @@ def load_checkpoint(ckpt,                      # type: thelper.typedefs.Checkpoi
             search_dir = search_ckpt_dir
         else:
             search_dir = ckpt
-        ckpt_paths = glob.glob(os.path.join(search_dir, "ckpt.*.pth"))
-        if not ckpt_paths:
-            raise AssertionError("could not find any valid checkpoint files in directory '%s'" % search_dir)
-        latest_epoch, latest_day, latest_time = -1, -1, -1
-        for ckpt_path in ckpt_paths:
-            # note: the 2nd field in the name should be the epoch index, or 'best' if final checkpoint
-            split = os.path.basename(ckpt_path).split(".")
-            tag = split[1]
-            if tag == "best" and (not always_load_latest or latest_epoch == -1):
-                # if eval-only, always pick the best checkpoint; otherwise, only pick if nothing else exists
-                ckpt = ckpt_path
-                if not always_load_latest:
-                    break
-            elif tag != "best":
-                log_stamp = split[2] if len(split) > 2 else ""
-                log_stamp = "fake-0-0" if log_stamp.count("-") != 2 else log_stamp
-                epoch_stamp, day_stamp, time_stamp = int(tag), int(log_stamp.split("-")[1]), int(log_stamp.split("-")[2])
-                if epoch_stamp > latest_epoch or day_stamp > latest_day or time_stamp > latest_time:
-                    ckpt, latest_epoch, latest_day, latest_time = ckpt_path, epoch_stamp, day_stamp, time_stamp
-        if not os.path.isfile(ckpt):
-            raise AssertionError("could not find valid checkpoint at '%s'" % ckpt)
+        ckpt = _find_checkpoint(search_dir, always_load_latest=always_load_latest)
     basepath = None
     if isinstance(ckpt, str):
         logger.debug("parsing checkpoint at '%s'" % ckpt)
@@ -236,7 +285,19 @@ def load_checkpoint(ckpt,                      # type: thelper.typedefs.Checkpoi
         if hasattr(ckpt, "name"):
             logger.debug("parsing checkpoint provided via file object")
             basepath = os.path.dirname(os.path.abspath(ckpt.name))
-    ckptdata = torch.load(ckpt, map_location=map_location)
+    ckptdata = None
+    # session checkpoints hold more than weights (e.g. RNG states and consumers of mid-epoch checkpoints)
+    load_kwargs = {"weights_only": False} if "weights_only" in inspect.signature(torch.load).parameters else {}
+    if mmap and isinstance(ckpt, str):
+        if "mmap" in inspect.signature(torch.load).parameters:
+            try:
+                ckptdata = torch.load(ckpt, map_location=map_location, mmap=True, **load_kwargs)
+            except RuntimeError:  # legacy (non-zip) serialization format cannot be memory-mapped
+                logger.debug("could not memory-map checkpoint, will load it fully instead")
+        else:
+            logger.debug("current PyTorch version cannot memory-map checkpoints, will load it fully instead")
+    if ckptdata is None:
+        ckptdata = torch.load(ckpt, map_location=map_location, **load_kwargs)
     if not isinstance(ckptdata, dict):
         raise AssertionError("unexpected checkpoint data type")
     if check_version:
@@ -267,6 +328,8 @@ def load_checkpoint(ckpt,                      # type: thelper.typedefs.Checkpoi
                 logger.warning("will attempt to load checkpoint anyway (might crash later due to incompatibilities)")
             elif answer == "migrate":
                 ckptdata = migrate_checkpoint(ckptdata)
+    if sections is not None:
+        ckptdata = {key: val for key, val in ckptdata.items() if key in sections}
     # load model trace if needed (we do it here since we can locate the neighboring file)
     if "model" in ckptdata and isinstance(ckptdata["model"], str):
         trace_path = None
@@ -276,12 +339,182 @@ def load_checkpoint(ckpt,                      # type: thelper.typedefs.Checkpoi
             trace_path = os.path.join(basepath, ckptdata["model"])
         if trace_path is not None:
             if trace_path.endswith(".pth"):
-                ckptdata["model"] = torch.load(trace_path, map_location=map_location)
+                ckptdata["model"] = torch.load(trace_path, map_location=map_location, **load_kwargs)
             elif trace_path.endswith(".zip"):
                 ckptdata["model"] = torch.jit.load(trace_path, map_location=map_location)
     return ckptdata
 
 
+class CheckpointWriter:
+    """Session checkpoint writer with atomic renames, best checkpoint linking, and retention policy.
+
+    Checkpoints are always serialized to a temporary file that is renamed once complete, so that a crash
+    during a save can never leave a truncated checkpoint behind. When a checkpoint is also the new 'best'
+    one, ``ckpt.best.pth`` is created as a hard link to the epoch checkpoint instead of serializing the
+    same state twice (with a file copy as fallback for file systems that do not support hard links).
+
+    If ``background`` is toggled, the state to save should be a snapshot (see :meth:`snapshot`) as it will
+    be serialized in a separate thread while training continues. At most one snapshot can wait for the
+    writer at any time; further saves will block until the previous one is written. Errors raised in the
+    background thread are re-raised in the calling thread on the next write or flush. The background thread
+    is not a daemon: checkpoints that are still queued when the main thread exits are written before the
+    interpreter shuts down.
+
+    Mid-epoch checkpoints (see :meth:`get_mid_epoch_name`) are kept in a single slot that is separate from
+    the epoch checkpoints: each new one replaces the previous one, they are not counted in ``keep_count``,
+    and they are all removed once an epoch checkpoint is written.
+
+    Attributes:
+        checkpoint_dir: directory where checkpoint files are written.
+        keep_count: number of epoch checkpoints to keep on disk (zero = keep all); the best one is never removed.
+        background: specifies whether checkpoints should be serialized in a background thread.
+    """
+
+    best_name = "ckpt.best.pth"
+    """Name of the file that holds (or links to) the best checkpoint in the checkpoint directory."""
+
+    mid_epoch_suffix = ".mid.pth"
+    """Suffix of the mid-epoch checkpoint file names, which are kept apart from the epoch checkpoints."""
+
+    def __init__(self, checkpoint_dir, keep_count=0, background=False):
+        # type: (str, int, bool) -> None
+        assert keep_count >= 0, "checkpoint keep count should be positive integer (or zero)"
+        self.checkpoint_dir = checkpoint_dir
+        self.keep_count = keep_count
+        self.background = background
+        self._queue, self._thread, self._error = None, None, None
+
+    def __repr__(self):
+        """Returns a generic print-friendly string containing info about this writer."""
+        return self.__class__.__module__ + "." + self.__class__.__qualname__ + \
+            f"(checkpoint_dir={repr(self.checkpoint_dir)}, keep_count={repr(self.keep_count)}, " + \
+            f"background={repr(self.background)})"
+
+    @staticmethod
+    def snapshot(state):
+        """Returns a copy of a (nested) checkpoint state with all tensors detached and cloned on the CPU."""
+        if isinstance(state, torch.Tensor):
+            return state.detach().to("cpu", copy=True)
+        if isinstance(state, dict):
+            return type(state)((k, CheckpointWriter.snapshot(v)) for k, v in state.items())
+        if isinstance(state, (list, tuple)) and not hasattr(state, "_fields"):
+            return type(state)(CheckpointWriter.snapshot(v) for v in state)
+        return copy.deepcopy(state)
+
+    @staticmethod
+    def _replace_with_link(src_path, dst_path):
+        """Atomically replaces the destination file with a hard link (or a copy) of the source file."""
+        tmp_path = dst_path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            os.link(src_path, tmp_path)
+        except OSError:
+            shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, dst_path)
+
+    @staticmethod
+    def get_epoch_name(epoch, log_stamp):
+        """Returns the file name of the checkpoint saved at the end of the given epoch."""
+        return f"ckpt.{epoch:04d}.{log_stamp}.pth"
+
+    @staticmethod
+    def get_mid_epoch_name(epoch, log_stamp):
+        """Returns the file name of a checkpoint saved in the middle of the given epoch."""
+        return f"ckpt.{epoch:04d}.{log_stamp}{CheckpointWriter.mid_epoch_suffix}"
+
+    def _get_mid_epoch_checkpoints(self):
+        """Returns the list of mid-epoch checkpoint paths found in the checkpoint directory."""
+        return glob.glob(os.path.join(self.checkpoint_dir, "ckpt.*" + self.mid_epoch_suffix))
+
+    def _get_epoch_checkpoints(self):
+        """Returns the list of epoch checkpoint paths found in the checkpoint directory, sorted by epoch/stamp."""
+        ckpt_paths = []
+        for ckpt_path in glob.glob(os.path.join(self.checkpoint_dir, "ckpt.*.pth")):
+            split = os.path.basename(ckpt_path).split(".")
+            if split[1].isdigit() and not ckpt_path.endswith(self.mid_epoch_suffix):
+                ckpt_paths.append((int(split[1]), split[2] if len(split) > 3 else "", ckpt_path))
+        return [ckpt_path for _, _, ckpt_path in sorted(ckpt_paths)]
+
+    def _write(self, state, filename, save_best):
+        """Serializes the given state to the checkpoint directory, updating the best link and pruning old files."""
+        path = os.path.join(self.checkpoint_dir, filename)
+        logger.debug(f"writing checkpoint to {os.path.abspath(path)}")
+        tmp_path = path + ".tmp"
+        torch.save(state, tmp_path)
+        os.replace(tmp_path, path)
+        if save_best:
+            best_path = os.path.join(self.checkpoint_dir, self.best_name)
+            logger.debug(f"linking best checkpoint at {os.path.abspath(best_path)}")
+            self._replace_with_link(path, best_path)
+        # there is a single mid-epoch slot, and it is superseded by any newer checkpoint
+        for old_path in self._get_mid_epoch_checkpoints():
+            if old_path != path:
+                logger.debug(f"removing old mid-epoch checkpoint at {os.path.abspath(old_path)}")
+                os.remove(old_path)
+        if self.keep_count > 0 and not filename.endswith(self.mid_epoch_suffix):
+            # the best checkpoint is a separate link, so it survives the removal of its epoch file
+            for old_path in self._get_epoch_checkpoints()[:-self.keep_count]:
+                logger.debug(f"removing old checkpoint at {os.path.abspath(old_path)}")
+                os.remove(old_path)
+
+    def _run(self):
+        """Writes the queued checkpoints until the stop signal (``None``) is received or the main thread exits."""
+        while True:
+            try:
+                packet = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if not threading.main_thread().is_alive():
+                    return  # all queued checkpoints were written, and nobody is left to close the writer
+                continue
+            try:
+                if packet is None:
+                    return
+                self._write(*packet)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _check_error(self):
+        """Re-raises the first exception caught in the background thread, if any."""
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("exception caught while writing checkpoint in background thread") from error
+
+    def write(self, state, filename, save_best=False):
+        """Writes (or queues the writing of) a checkpoint state under the given file name.
+
+        Args:
+            state: the checkpoint state to save; should be a snapshot if writing in the background.
+            filename: the name of the checkpoint file to create in the checkpoint directory.
+            save_best: specifies whether the best checkpoint should also point to this new checkpoint.
+        """
+        self._check_error()
+        if not self.background:
+            self._write(state, filename, save_best)
+            return
+        if self._thread is None or not self._thread.is_alive():
+            self._queue = queue.Queue(maxsize=1)
+            self._thread = threading.Thread(target=self._run, name="thelper-checkpoint-writer", daemon=False)
+            self._thread.start()
+        self._queue.put((state, filename, save_best))
+
+    def flush(self):
+        """Blocks until all queued checkpoints have been written."""
+        if self._queue is not None:
+            self._queue.join()
+        self._check_error()
+
+    def close(self):
+        """Writes all queued checkpoints and stops the background thread (if any)."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._thread, self._queue = None, None
+        self._check_error()
+
+
 def check_version(version_check, version_required):
     # type: (AnyStr, AnyStr) -> Tuple[bool, List[Union[int, AnyStr]], List[Union[int, AnyStr]]]
     """Verifies that the checked version is not greater than the required one (ie: not a future version).
@@ -1031,6 +1264,24 @@ def str2bool(s):
     raise AssertionError("unrecognized input type")
 
 
+def get_memory_format(s):
+    """Converts a string to a ``torch.memory_format`` object.
+
+    The string can be ``contiguous`` (or ``channels_first``) or ``channels_last``. If ``None`` is provided,
+    the function returns ``None`` (i.e. the memory format of tensors should be left untouched).
+    """
+    if s is None or isinstance(s, torch.memory_format):
+        return s
+    memory_formats = {
+        "contiguous": torch.contiguous_format,
+        "contiguous_format": torch.contiguous_format,
+        "channels_first": torch.contiguous_format,
+        "channels_last": torch.channels_last,
+    }
+    assert isinstance(s, str) and s.lower() in memory_formats, f"unexpected memory format '{s}'"
+    return memory_formats[s.lower()]
+
+
 def clipstr(s, size, fill=" "):
     """Clips a string to a specific length, with an optional fill character."""
     if len(s) > size:
@@ -1482,6 +1733,43 @@ def check_installed(package_name):
         return False
 
 
+def get_rss_bytes(include_children=True):
+    # type: (bool) -> Optional[int]
+    """Returns the resident set size (in bytes) of the current process, and of its children if needed.
+
+    The children processes (e.g. data loader workers) are only accounted for if ``include_children`` is
+    ``True``. The ``psutil`` package is used if it is installed; otherwise, the ``/proc`` filesystem is
+    parsed directly. If the memory usage cannot be measured on the current platform, ``None`` is returned.
+    """
+    if check_installed("psutil"):
+        import psutil
+        proc = psutil.Process()
+        procs = [proc] + (proc.children(recursive=True) if include_children else [])
+        rss = 0
+        for p in procs:
+            try:
+                rss += p.memory_info().rss
+            except psutil.Error:
+                pass  # the process might have exited in the meantime
+        return rss
+    if not os.path.isdir("/proc"):
+        return None
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    pids, rss = [os.getpid()], 0
+    while pids:
+        pid = pids.pop()
+        try:
+            with open(f"/proc/{pid}/statm") as fd:
+                rss += int(fd.read().split()[1]) * page_size
+            if include_children:
+                with open(f"/proc/{pid}/task/{pid}/children") as fd:
+                    pids.extend([int(child) for child in fd.read().split()])
+        except (OSError, ValueError, IndexError):
+            if pid == os.getpid():
+                return None
+    return rss
+
+
 def set_matplotlib_agg():
     """Sets the matplotlib backend to Agg."""
     import matplotlib